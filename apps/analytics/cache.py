@@ -0,0 +1,253 @@
+"""
+Memoization for analytics reports and dashboard widgets.
+
+``DashboardView._get_widget_data`` used the AnalyticsCache table as its
+cache: a SELECT per widget and, on a miss, an INSERT on a unique key that
+already existed once the previous entry had expired. Expired rows were never
+removed. Every dashboard that loaded during a miss recomputed the report.
+
+Results now live in the ``analytics`` cache alias (Redis) and go through
+three stages:
+
+    fresh   age < ttl                   returned as is
+    stale   ttl <= age < ttl+stale_ttl  returned at once; one caller refreshes
+                                        it in a background thread
+    gone    evicted by the cache TTL    one caller recomputes (single flight),
+                                        the others wait up to
+                                        ANALYTICS_CACHE_LOCK_WAIT for its result
+
+The single flight uses ``cache.add`` on a lock key, so it holds across all
+workers that share the cache. Keys contain the tenant schema and the exact
+arguments. Rolling "until now" ranges opt in with ``rolling=True``: the
+latest datetime argument is rounded down to ttl+stale_ttl, the lifetime of
+an entry, and the others are keyed by their offset from it. "Last 30 days
+until now" therefore keeps one key while its entry goes from fresh to stale
+and is refreshed in the background; the refresh recomputes with the
+caller's actual arguments.
+
+If the cache is unreachable, reports are computed directly.
+"""
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from django.db import connection, connections
+from django.db.models import Model
+from django_tenants.utils import schema_context
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsMemo:
+    """Tenant-scoped, single-flight, stale-while-revalidate result cache."""
+
+    KEY_PREFIX = 'analytics'
+
+    def __init__(self):
+        self.alias = getattr(settings, 'ANALYTICS_CACHE_ALIAS', 'analytics')
+        self.ttl = getattr(settings, 'ANALYTICS_CACHE_TTL', 300)
+        self.stale_ttl = getattr(settings, 'ANALYTICS_CACHE_STALE_TTL', 1800)
+        self.lock_ttl = getattr(settings, 'ANALYTICS_CACHE_LOCK_TTL', 120)
+        self.lock_wait = getattr(settings, 'ANALYTICS_CACHE_LOCK_WAIT', 10)
+        self.refresh_workers = getattr(settings, 'ANALYTICS_CACHE_REFRESH_WORKERS', 2)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def cache(self):
+        try:
+            return caches[self.alias]
+        except InvalidCacheBackendError:
+            return caches['default']
+
+    # ────────────────────────────────────────────────────────────────
+    # KEYS
+    # ────────────────────────────────────────────────────────────────
+
+    def _datetimes(self, value):
+        if isinstance(value, datetime):
+            yield value
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                yield from self._datetimes(item)
+        elif isinstance(value, dict):
+            for item in value.values():
+                yield from self._datetimes(item)
+
+    def _token(self, value, resolution: Optional[int] = None, anchor: Optional[datetime] = None):
+        """JSON-safe, stable stand-in for an argument."""
+        if isinstance(value, datetime):
+            if resolution is None:
+                return value.isoformat()
+            # Window of the latest datetime, plus the offset from it, so
+            # (now - 30 days, now) keeps its key until "now" leaves the window
+            anchor = anchor or value
+            offset = (value - anchor).total_seconds()
+            return [int(anchor.timestamp()) // resolution, round(offset / resolution)]
+        if isinstance(value, date):
+            return value.isoformat()
+        if isinstance(value, Model):
+            return f"{value._meta.label_lower}:{value.pk}"
+        if isinstance(value, (list, tuple)):
+            return [self._token(item, resolution, anchor) for item in value]
+        if isinstance(value, dict):
+            return {str(k): self._token(v, resolution, anchor) for k, v in value.items()}
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        return repr(value)
+
+    def key(self, name: str, args=(), kwargs=None, resolution: Optional[int] = None,
+            rolling: bool = False) -> str:
+        arguments = [list(args), kwargs or {}]
+        if rolling:
+            anchor = max(self._datetimes(arguments), default=None)
+            token = self._token(arguments, resolution or self.ttl + self.stale_ttl, anchor)
+        else:
+            token = self._token(arguments)
+        payload = json.dumps(token, sort_keys=True)
+        digest = hashlib.sha1(payload.encode()).hexdigest()[:16]
+        return f"{self.KEY_PREFIX}:{connection.schema_name}:{name}:{digest}"
+
+    # ────────────────────────────────────────────────────────────────
+    # CACHE ACCESS (failures degrade to "no cache")
+    # ────────────────────────────────────────────────────────────────
+
+    def _get(self, key: str):
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"[ANALYTICS CACHE] Read failed for {key}: {e}")
+            return None
+
+    def _acquire(self, key: str) -> bool:
+        try:
+            return self.cache.add(f"{key}:lock", 1, self.lock_ttl)
+        except Exception:
+            return True
+
+    def _release(self, key: str):
+        try:
+            self.cache.delete(f"{key}:lock")
+        except Exception:
+            pass
+
+    def _compute(self, key: str, compute: Callable, ttl: int, stale_ttl: int):
+        value = compute()
+        try:
+            self.cache.set(key, {'value': value, 'fresh_until': time.time() + ttl}, ttl + stale_ttl)
+        except Exception as e:
+            logger.warning(f"[ANALYTICS CACHE] Write failed for {key}: {e}")
+        return value
+
+    # ────────────────────────────────────────────────────────────────
+    # BACKGROUND REFRESH
+    # ────────────────────────────────────────────────────────────────
+
+    def _refresh_later(self, key: str, compute: Callable, ttl: int, stale_ttl: int):
+        schema_name = connection.schema_name
+
+        def refresh():
+            try:
+                with schema_context(schema_name):
+                    self._compute(key, compute, ttl, stale_ttl)
+            except Exception as e:
+                logger.error(f"[ANALYTICS CACHE] Background refresh of {key} failed: {e}")
+            finally:
+                self._release(key)
+                connections.close_all()
+
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.refresh_workers, thread_name_prefix='analytics-refresh'
+                )
+        self._executor.submit(refresh)
+
+    # ────────────────────────────────────────────────────────────────
+    # PUBLIC API
+    # ────────────────────────────────────────────────────────────────
+
+    def get_or_compute(self, name: str, compute: Callable[[], Any], args=(), kwargs=None,
+                       ttl: Optional[int] = None, stale_ttl: Optional[int] = None,
+                       rolling: bool = False) -> Any:
+        """
+        Cached result of ``compute()`` for (tenant, name, args, kwargs).
+
+        Args:
+            name: Report or widget name (part of the key)
+            compute: Zero-argument callable producing the result
+            args, kwargs: Arguments identifying the result
+            ttl: Seconds the result is fresh (default ANALYTICS_CACHE_TTL)
+            stale_ttl: Seconds a stale result is still served while it is
+                       refreshed (default ANALYTICS_CACHE_STALE_TTL)
+            rolling: The latest datetime argument is "now"; key it by its
+                     ttl+stale_ttl window instead of exactly
+        """
+        ttl = ttl or self.ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        key = self.key(name, args, kwargs, ttl + stale_ttl, rolling)
+
+        entry = self._get(key)
+        if entry is not None:
+            if entry['fresh_until'] <= time.time() and self._acquire(key):
+                self._refresh_later(key, compute, ttl, stale_ttl)
+            return entry['value']
+
+        if self._acquire(key):
+            try:
+                return self._compute(key, compute, ttl, stale_ttl)
+            finally:
+                self._release(key)
+
+        # Another worker is computing this result; wait for it
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = self._get(key)
+            if entry is not None:
+                return entry['value']
+
+        logger.warning(f"[ANALYTICS CACHE] Timed out waiting for {key}, computing directly")
+        return compute()
+
+    def delete(self, name: str, args=(), kwargs=None, ttl: Optional[int] = None,
+               stale_ttl: Optional[int] = None, rolling: bool = False):
+        ttl = ttl or self.ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        try:
+            self.cache.delete(self.key(name, args, kwargs, ttl + stale_ttl, rolling))
+        except Exception:
+            pass
+
+
+# Singleton instance
+analytics_cache = AnalyticsMemo()
+
+
+def memoize(name: str, ttl: Optional[int] = None, stale_ttl: Optional[int] = None,
+            rolling: bool = False):
+    """
+    Cache a report function through ``analytics_cache``.
+
+    Pass ``rolling=True`` only for functions always called with a range
+    ending "now" (see ``AnalyticsMemo.get_or_compute``). The undecorated
+    function stays available as ``.uncached``.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return analytics_cache.get_or_compute(
+                name, lambda: func(*args, **kwargs), args, kwargs, ttl, stale_ttl, rolling
+            )
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,362 @@
+"""
+Streaming exports for customers, invoices, payments and reports.
+
+The export views used to serialize the whole queryset with DRF serializers
+into a list and then build the CSV in memory. 100k invoices exhausted worker
+memory and ran past the gunicorn timeout.
+
+Exports now:
+
+    1. project only the exported columns with ``values_list()``
+    2. read them with ``iterator(chunk_size=EXPORT_CHUNK_SIZE)``, which on
+       PostgreSQL uses a server-side cursor
+    3. write each row to a ``StreamingHttpResponse`` as it arrives
+
+Memory stays flat and the first bytes go out immediately. XLSX is a zip
+archive and cannot be streamed. It is written in openpyxl's write-only mode
+to a temporary file, which is then sent.
+
+Exports above EXPORT_ASYNC_THRESHOLD rows (or requested with
+``background``) run as the ``run_export`` Celery task. The task writes the
+file (optionally gzipped) to a private storage under EXPORT_STORAGE_ROOT,
+outside MEDIA_ROOT, so it is never served publicly. ExportDownloadView
+serves it to authenticated staff of the same tenant. Files are deleted by
+``purge_expired_exports`` once their job record (JOB_TTL) has expired.
+"""
+import csv
+import gzip
+import io
+import logging
+import os
+import tempfile
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django_tenants.utils import schema_context
+
+try:
+    from openpyxl import Workbook
+    XLSX_AVAILABLE = True
+except ImportError:
+    XLSX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────────────────────
+# EXPORT DEFINITIONS
+# ────────────────────────────────────────────────────────────────
+
+def _customers_on_plan(queryset, value):
+    ServiceConnection = apps.get_model('customers', 'ServiceConnection')
+    return queryset.filter(
+        pk__in=ServiceConnection.objects.filter(plan__name__icontains=value).values('customer_id')
+    )
+
+
+EXPORTS = {
+    'customers': {
+        'model': 'customers.Customer',
+        'columns': [
+            ('Customer Code', 'customer_code'),
+            ('First Name', 'user__first_name'),
+            ('Last Name', 'user__last_name'),
+            ('Email', 'user__email'),
+            ('Phone', 'user__phone_number'),
+            ('Type', 'customer_type'),
+            ('Category', 'category'),
+            ('Status', 'status'),
+            ('Activation Date', 'activation_date'),
+            ('Outstanding Balance', 'outstanding_balance'),
+            ('Created At', 'created_at'),
+        ],
+        'filters': {
+            'status': 'status',
+            'plan': _customers_on_plan,
+            'date_from': 'created_at__gte',
+            'date_to': 'created_at__lte',
+        },
+    },
+    'invoices': {
+        'model': 'billing.Invoice',
+        'columns': [
+            ('Invoice Number', 'invoice_number'),
+            ('Customer Code', 'customer__customer_code'),
+            ('Plan', 'plan__name'),
+            ('Billing Date', 'billing_date'),
+            ('Due Date', 'due_date'),
+            ('Subtotal', 'subtotal'),
+            ('Tax', 'tax_amount'),
+            ('Total', 'total_amount'),
+            ('Paid', 'amount_paid'),
+            ('Balance', 'balance'),
+            ('Status', 'status'),
+        ],
+        'filters': {
+            'status': 'status',
+            'date_from': 'billing_date__gte',
+            'date_to': 'billing_date__lte',
+        },
+    },
+    'payments': {
+        'model': 'billing.Payment',
+        'columns': [
+            ('Payment Number', 'payment_number'),
+            ('Customer Code', 'customer__customer_code'),
+            ('Invoice Number', 'invoice__invoice_number'),
+            ('Amount', 'amount'),
+            ('Method', 'payment_method__name'),
+            ('Reference', 'payment_reference'),
+            ('M-Pesa Receipt', 'mpesa_receipt'),
+            ('Status', 'status'),
+            ('Payment Date', 'payment_date'),
+        ],
+        'filters': {
+            'status': 'status',
+            'method': 'payment_method__method_type',
+            'date_from': 'payment_date__gte',
+            'date_to': 'payment_date__lte',
+        },
+    },
+}
+
+
+class _Echo:
+    """File-like object whose write() returns the line (for csv.writer)."""
+
+    def write(self, value):
+        return value
+
+
+class ExportEngine:
+    """Streams tabular exports and runs large ones as background jobs."""
+
+    JOB_KEY = 'export_job:{job_id}'
+    JOB_TTL = 24 * 3600
+    FORMATS = ('csv', 'xlsx')
+
+    def __init__(self):
+        self.chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+        self.async_threshold = getattr(settings, 'EXPORT_ASYNC_THRESHOLD', 50000)
+
+    @property
+    def storage(self) -> FileSystemStorage:
+        # Outside MEDIA_ROOT: files are only reachable through ExportDownloadView
+        return FileSystemStorage(
+            location=getattr(settings, 'EXPORT_STORAGE_ROOT', os.path.join(settings.BASE_DIR, 'private', 'exports'))
+        )
+
+    # ────────────────────────────────────────────────────────────────
+    # QUERIES
+    # ────────────────────────────────────────────────────────────────
+
+    def queryset(self, export_type: str, filters: Optional[Dict] = None):
+        """Filtered (unprojected) queryset for an export type."""
+        spec = EXPORTS[export_type]
+        queryset = apps.get_model(spec['model'])._default_manager.all()
+        for name, value in (filters or {}).items():
+            lookup = spec['filters'].get(name)
+            if lookup is None or value in (None, ''):
+                continue
+            queryset = lookup(queryset, value) if callable(lookup) else queryset.filter(**{lookup: value})
+        return queryset
+
+    def is_large(self, queryset) -> bool:
+        """True if the export has more than EXPORT_ASYNC_THRESHOLD rows (no full COUNT)."""
+        return queryset.order_by().values_list('pk', flat=True)[
+            self.async_threshold:self.async_threshold + 1
+        ].exists()
+
+    @staticmethod
+    def _cell(value):
+        if isinstance(value, datetime):
+            if timezone.is_aware(value):
+                value = timezone.localtime(value)
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        if isinstance(value, date):
+            return value.isoformat()
+        return '' if value is None else value
+
+    def table(self, export_type: str, filters: Optional[Dict] = None) -> Tuple[List[str], Iterable[list]]:
+        """Header row and a lazy row iterator for an export."""
+        columns = EXPORTS[export_type]['columns']
+        rows = (
+            self.queryset(export_type, filters)
+            .order_by('pk')
+            .values_list(*[field for _, field in columns])
+        )
+        return [header for header, _ in columns], self.iterate(rows, connection.schema_name)
+
+    def iterate(self, rows, schema_name: str) -> Iterable[list]:
+        # The response body is consumed after the view returns; pin the schema
+        with schema_context(schema_name):
+            for row in rows.iterator(chunk_size=self.chunk_size):
+                yield [self._cell(value) for value in row]
+
+    # ────────────────────────────────────────────────────────────────
+    # WRITERS
+    # ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def csv_lines(rows: Iterable[list]) -> Iterable[str]:
+        writer = csv.writer(_Echo())
+        for row in rows:
+            yield writer.writerow(row)
+
+    @staticmethod
+    def write_xlsx(rows: Iterable[list], fileobj, title: str = 'Export'):
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=title[:31])
+        for row in rows:
+            sheet.append(row)
+        workbook.save(fileobj)
+
+    def stream_csv(self, rows: Iterable[list], filename: str) -> StreamingHttpResponse:
+        response = StreamingHttpResponse(self.csv_lines(rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+        return response
+
+    def xlsx_response(self, rows: Iterable[list], filename: str) -> FileResponse:
+        tmp = tempfile.TemporaryFile()
+        self.write_xlsx(rows, tmp, title=filename)
+        tmp.seek(0)
+        return FileResponse(
+            tmp,
+            as_attachment=True,
+            filename=f"{filename}.xlsx",
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+
+    def response(self, export_type: str, filters: Optional[Dict] = None, fmt: str = 'csv'):
+        headers, rows = self.table(export_type, filters)
+        filename = f"{export_type}_{timezone.localdate()}"
+        rows = self._with_header(headers, rows)
+        if fmt == 'xlsx':
+            return self.xlsx_response(rows, filename)
+        return self.stream_csv(rows, filename)
+
+    @staticmethod
+    def _with_header(headers: List[str], rows: Iterable[list]) -> Iterable[list]:
+        yield headers
+        yield from rows
+
+    # ────────────────────────────────────────────────────────────────
+    # BACKGROUND JOBS
+    # ────────────────────────────────────────────────────────────────
+
+    def _set_job(self, job_id: str, **fields):
+        key = self.JOB_KEY.format(job_id=job_id)
+        state = cache.get(key) or {}
+        state.update(fields, updated_at=timezone.now().isoformat())
+        cache.set(key, state, self.JOB_TTL)
+
+    def job_status(self, job_id: str) -> Optional[Dict]:
+        return cache.get(self.JOB_KEY.format(job_id=job_id))
+
+    def start_job(self, export_type: str, filters: Optional[Dict], fmt: str,
+                  compress: bool, schema_name: str) -> str:
+        """Queue a file export and return its job id."""
+        from apps.analytics.tasks import run_export
+
+        job_id = uuid.uuid4().hex
+        self._set_job(
+            job_id, status='queued', schema_name=schema_name, export_type=export_type,
+            filters=filters or {}, format=fmt, gzip=compress and fmt == 'csv', rows=0,
+        )
+        transaction.on_commit(lambda: run_export.delay(schema_name, job_id))
+        return job_id
+
+    def run_job(self, job_id: str) -> Dict:
+        """Task body: write the export to the private export storage."""
+        job = self.job_status(job_id)
+        if job is None:
+            raise ValueError(f"Unknown export job {job_id}")
+        self._set_job(job_id, status='running')
+
+        headers, rows = self.table(job['export_type'], job['filters'])
+        counted = {'rows': 0}
+
+        def progress(rows):
+            for row in rows:
+                counted['rows'] += 1
+                if counted['rows'] % (self.chunk_size * 10) == 0:
+                    self._set_job(job_id, rows=counted['rows'])
+                yield row
+
+        filename = f"{job['export_type']}_{timezone.localdate()}.{job['format']}"
+        if job['gzip']:
+            filename += '.gz'
+
+        try:
+            with tempfile.TemporaryFile() as tmp:
+                content = self._with_header(headers, progress(rows))
+                if job['format'] == 'xlsx':
+                    self.write_xlsx(content, tmp, title=job['export_type'])
+                else:
+                    raw = gzip.GzipFile(fileobj=tmp, mode='wb') if job['gzip'] else tmp
+                    text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+                    csv.writer(text).writerows(content)
+                    text.flush()
+                    text.detach()
+                    if job['gzip']:
+                        raw.close()
+                tmp.seek(0)
+                path = self.storage.save(os.path.join(job['schema_name'], job_id, filename), File(tmp))
+        except Exception as e:
+            self._set_job(job_id, status='failed', error=str(e))
+            raise
+
+        self._set_job(
+            job_id, status='completed', rows=counted['rows'], path=path,
+            filename=filename, completed_at=timezone.now().isoformat(),
+        )
+        logger.info(f"Export {job_id} ({job['export_type']}): {counted['rows']} rows -> {path}")
+        return {'job_id': job_id, 'rows': counted['rows'], 'path': path}
+
+    def open_file(self, job: Dict):
+        """Open a completed job's file for download (None once purged)."""
+        path = job.get('path')
+        if job.get('status') != 'completed' or not path or not self.storage.exists(path):
+            return None
+        return self.storage.open(path, 'rb')
+
+    def purge_expired(self, now: Optional[datetime] = None) -> int:
+        """Delete export files older than JOB_TTL (their job record is gone)."""
+        storage = self.storage
+        if not os.path.isdir(storage.location):
+            return 0
+
+        cutoff = (now or timezone.now()) - timedelta(seconds=self.JOB_TTL)
+        deleted = 0
+        schemas, _ = storage.listdir('')
+        for schema_name in schemas:
+            jobs, _ = storage.listdir(schema_name)
+            for job_id in jobs:
+                job_dir = os.path.join(schema_name, job_id)
+                _, files = storage.listdir(job_dir)
+                for name in files:
+                    path = os.path.join(job_dir, name)
+                    if storage.get_modified_time(path) < cutoff:
+                        storage.delete(path)
+                        deleted += 1
+                try:
+                    os.rmdir(storage.path(job_dir))
+                except OSError:
+                    pass  # still holds a live export
+
+        if deleted:
+            logger.info(f"Purged {deleted} expired export files")
+        return deleted
+
+
+# Singleton instance
+export_engine = ExportEngine()
@@ -0,0 +1,243 @@
+"""
+Daily analytics fact tables.
+
+``AnalyticsDashboardView`` used to aggregate Payment, Customer and
+ServiceConnection live on every request. Some sections looped per month or
+per plan, so a ``12m`` dashboard cost dozens of full scans and got slower as
+the tenant grew. The dashboard now reads three small per-day tables:
+
+    DailyRevenueFact     completed payments per day × plan × method × connection type
+    DailyCustomerFact    customers added / churned per day
+    DailyPlanActiveFact  active connections per plan at the end of each day
+
+One year is at most a few thousand fact rows. Every dashboard section is an
+indexed range scan on ``date``.
+
+Refreshing (Celery, per tenant):
+
+    refresh_analytics_today    every 15 min  today's revenue/customer facts
+                                             and the live active snapshot
+    refresh_analytics_nightly  00:15         the last ANALYTICS_FACTS_NIGHTLY_DAYS
+                                             (late payments, status changes),
+                                             yesterday's closing snapshot, and a
+                                             backfill when a tenant has no facts yet
+
+A day is recomputed with one GROUP BY per source and replaced in a single
+transaction, so readers never see a half-written day. Days follow TIME_ZONE.
+
+Active counts of past days cannot be recomputed from current status, so the
+refreshes keep them as snapshots. The backfill rebuilds missing days from
+activation and termination dates; suspensions are not visible there.
+"""
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CHURN_STATUSES = ('TERMINATED', 'INACTIVE')
+
+
+class FactRefresher:
+    """Recomputes the daily fact tables of the current tenant."""
+
+    def __init__(self):
+        self.nightly_days = getattr(settings, 'ANALYTICS_FACTS_NIGHTLY_DAYS', 3)
+        self.backfill_days = getattr(settings, 'ANALYTICS_FACTS_BACKFILL_DAYS', 400)
+
+    # ────────────────────────────────────────────────────────────────
+    # DAYS
+    # ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def today() -> date:
+        return timezone.localdate()
+
+    @staticmethod
+    def day_start(day: date) -> datetime:
+        """Local midnight at the start of ``day`` (aware)."""
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    @staticmethod
+    def days(start: date, end: date) -> Iterable[date]:
+        for offset in range((end - start).days + 1):
+            yield start + timedelta(days=offset)
+
+    # ────────────────────────────────────────────────────────────────
+    # REVENUE AND CUSTOMERS
+    # ────────────────────────────────────────────────────────────────
+
+    def _revenue_facts(self, start: date, end: date, now: datetime):
+        from apps.billing.models.payment_models import Payment
+        from .models import DailyRevenueFact
+
+        rows = (
+            Payment.objects
+            .filter(
+                status='COMPLETED',
+                payment_date__gte=self.day_start(start),
+                payment_date__lt=self.day_start(end + timedelta(days=1)),
+            )
+            .annotate(day=TruncDate('payment_date'))
+            .values(
+                'day',
+                'invoice__plan_id',
+                'payment_method__method_type',
+                'invoice__service_connection__auth_connection_type',
+            )
+            .annotate(amount=Sum('amount'), transactions=Count('id'), max_amount=Max('amount'))
+            .order_by()
+        )
+        return [
+            DailyRevenueFact(
+                date=row['day'],
+                plan_id=row['invoice__plan_id'],
+                method_type=row['payment_method__method_type'] or '',
+                connection_type=row['invoice__service_connection__auth_connection_type'] or '',
+                amount=row['amount'],
+                transactions=row['transactions'],
+                max_amount=row['max_amount'],
+                refreshed_at=now,
+            )
+            for row in rows
+        ]
+
+    def _customer_facts(self, start: date, end: date, now: datetime):
+        from apps.customers.models import Customer
+        from .models import DailyCustomerFact
+
+        added = dict(
+            Customer.objects
+            .filter(
+                created_at__gte=self.day_start(start),
+                created_at__lt=self.day_start(end + timedelta(days=1)),
+            )
+            .exclude(status='LEAD')
+            .annotate(day=TruncDate('created_at'))
+            .values('day')
+            .annotate(total=Count('id'))
+            .order_by()
+            .values_list('day', 'total')
+        )
+        churned = dict(
+            Customer.objects
+            .filter(status__in=CHURN_STATUSES, deactivation_date__range=(start, end))
+            .values('deactivation_date')
+            .annotate(total=Count('id'))
+            .order_by()
+            .values_list('deactivation_date', 'total')
+        )
+        return [
+            DailyCustomerFact(
+                date=day,
+                added=added.get(day, 0),
+                churned=churned.get(day, 0),
+                refreshed_at=now,
+            )
+            for day in sorted(set(added) | set(churned))
+        ]
+
+    def refresh_range(self, start: date, end: date) -> Dict:
+        """Replace the revenue and customer facts of ``start``..``end`` (inclusive)."""
+        from .models import DailyCustomerFact, DailyRevenueFact
+
+        now = timezone.now()
+        revenue = self._revenue_facts(start, end, now)
+        customers = self._customer_facts(start, end, now)
+
+        with transaction.atomic():
+            DailyRevenueFact.objects.filter(date__range=(start, end)).delete()
+            DailyCustomerFact.objects.filter(date__range=(start, end)).delete()
+            DailyRevenueFact.objects.bulk_create(revenue)
+            DailyCustomerFact.objects.bulk_create(customers)
+
+        return {'start': start.isoformat(), 'end': end.isoformat(),
+                'revenue_rows': len(revenue), 'customer_rows': len(customers)}
+
+    # ────────────────────────────────────────────────────────────────
+    # ACTIVE SUBSCRIPTIONS
+    # ────────────────────────────────────────────────────────────────
+
+    def _write_active(self, day: date, counts, now: datetime):
+        from .models import DailyPlanActiveFact
+
+        with transaction.atomic():
+            DailyPlanActiveFact.objects.filter(date=day).delete()
+            DailyPlanActiveFact.objects.bulk_create([
+                DailyPlanActiveFact(date=day, plan_id=row['plan_id'], active=row['total'], refreshed_at=now)
+                for row in counts
+            ])
+
+    def snapshot_active(self, day: Optional[date] = None) -> int:
+        """Record the current ACTIVE connections per plan as ``day``'s count."""
+        from apps.customers.models import ServiceConnection
+
+        counts = list(
+            ServiceConnection.objects.filter(status='ACTIVE')
+            .values('plan_id').annotate(total=Count('id')).order_by()
+        )
+        self._write_active(day or self.today(), counts, timezone.now())
+        return sum(row['total'] for row in counts)
+
+    def rebuild_active(self, start: date, end: date) -> int:
+        """Fill days without a snapshot from activation/termination dates."""
+        from apps.customers.models import ServiceConnection
+        from .models import DailyPlanActiveFact
+
+        known = set(
+            DailyPlanActiveFact.objects.filter(date__range=(start, end))
+            .values_list('date', flat=True).distinct()
+        )
+        now = timezone.now()
+        rebuilt = 0
+        for day in self.days(start, end):
+            if day in known:
+                continue
+            closing = self.day_start(day + timedelta(days=1))
+            counts = list(
+                ServiceConnection.objects
+                .filter(activation_date__lt=closing)
+                .filter(Q(termination_date__isnull=True) | Q(termination_date__gte=closing))
+                .exclude(status='PENDING')
+                .values('plan_id').annotate(total=Count('id')).order_by()
+            )
+            self._write_active(day, counts, now)
+            rebuilt += 1
+        return rebuilt
+
+    # ────────────────────────────────────────────────────────────────
+    # SCHEDULED REFRESHES
+    # ────────────────────────────────────────────────────────────────
+
+    def refresh_today(self) -> Dict:
+        """Intra-day refresh: today's facts and the live active snapshot."""
+        today = self.today()
+        result = self.refresh_range(today, today)
+        result['active'] = self.snapshot_active(today)
+        return result
+
+    def refresh_nightly(self) -> Dict:
+        """Recompute the last few days, close yesterday and backfill if empty."""
+        from .models import DailyCustomerFact, DailyRevenueFact
+
+        today = self.today()
+        yesterday = today - timedelta(days=1)
+
+        empty = not (DailyRevenueFact.objects.exists() or DailyCustomerFact.objects.exists())
+        start = today - timedelta(days=self.backfill_days if empty else self.nightly_days)
+
+        result = self.refresh_range(start, today)
+        result['active'] = self.snapshot_active(yesterday)
+        result['active_days_rebuilt'] = self.rebuild_active(start, yesterday)
+        self.snapshot_active(today)
+        return result
+
+
+# Singleton instance
+fact_refresher = FactRefresher()
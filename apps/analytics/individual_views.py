@@ -5,10 +5,10 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
 from django.http import HttpResponse
-import csv
+from django.utils import timezone
 import json
-from io import StringIO
 from .views_v1 import AnalyticsDashboardView
+from .exports import export_engine
 
 
 class AnalyticsKPIsView(APIView):
@@ -159,43 +159,39 @@ class AnalyticsExportView(APIView):
     
     def export_csv(self, dashboard, start_date, time_range):
         """Export analytics data as CSV"""
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow(['ISP Analytics Report', f'Time Range: {time_range}'])
-        writer.writerow(['Generated', timezone.now().strftime('%Y-%m-%d %H:%M:%S')])
-        writer.writerow([])
-        
-        # Write KPIs
-        writer.writerow(['Key Performance Indicators'])
-        writer.writerow(['Metric', 'Value'])
         kpis = dashboard.get_kpis(start_date)
-        for key, value in kpis.items():
-            writer.writerow([key.replace('_', ' ').title(), value])
-        
-        writer.writerow([])
-        
-        # Write Revenue Data
-        writer.writerow(['Monthly Revenue Data'])
-        writer.writerow(['Month', 'Revenue', 'Target', 'Users'])
         revenue_data = dashboard.get_revenue_data(start_date)
-        for item in revenue_data:
-            writer.writerow([item['month'], item['revenue'], item['target'], item['users']])
-        
-        writer.writerow([])
-        
-        # Write User Growth
-        writer.writerow(['User Growth Data'])
-        writer.writerow(['Month', 'New Users', 'Churn', 'Net Growth'])
         growth_data = dashboard.get_user_growth_data(start_date)
-        for item in growth_data:
-            writer.writerow([item['month'], item['new_users'], item['churn'], item['net_growth']])
         
-        output.seek(0)
-        response = HttpResponse(output, content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename=analytics_{time_range}_{timezone.now().date()}.csv'
-        return response
+        def rows():
+            # Write header
+            yield ['ISP Analytics Report', f'Time Range: {time_range}']
+            yield ['Generated', timezone.now().strftime('%Y-%m-%d %H:%M:%S')]
+            yield []
+            
+            # Write KPIs
+            yield ['Key Performance Indicators']
+            yield ['Metric', 'Value']
+            for key, value in kpis.items():
+                yield [key.replace('_', ' ').title(), value]
+            
+            yield []
+            
+            # Write Revenue Data
+            yield ['Monthly Revenue Data']
+            yield ['Month', 'Revenue', 'Target', 'Users']
+            for item in revenue_data:
+                yield [item['month'], item['revenue'], item['target'], item['users']]
+            
+            yield []
+            
+            # Write User Growth
+            yield ['User Growth Data']
+            yield ['Month', 'New Users', 'Churn', 'Net Growth']
+            for item in growth_data:
+                yield [item['month'], item['new_users'], item['churn'], item['net_growth']]
+        
+        return export_engine.stream_csv(rows(), f"analytics_{time_range}_{timezone.now().date()}")
     
     def export_json(self, dashboard, start_date, time_range):
         """Export analytics data as JSON"""
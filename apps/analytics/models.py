@@ -102,3 +102,70 @@ class AnalyticsCache(models.Model):
     class Meta:
         app_label = 'analytics'
         ordering = ['-created_at']
+
+
+# ────────────────────────────────────────────────────────────────
+# DAILY FACT TABLES (refreshed by apps.analytics.facts)
+# ────────────────────────────────────────────────────────────────
+
+class DailyRevenueFact(models.Model):
+    """Completed payments per day, plan, payment method and connection type"""
+    
+    date = models.DateField()
+    plan = models.ForeignKey(
+        'billing.Plan', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    method_type = models.CharField(max_length=20, blank=True)
+    connection_type = models.CharField(max_length=20, blank=True)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transactions = models.PositiveIntegerField(default=0)
+    max_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.date} {self.method_type}: {self.amount}"
+    
+    class Meta:
+        app_label = 'analytics'
+        ordering = ['date']
+        indexes = [
+            models.Index(fields=['date'], name='revenue_fact_date_idx'),
+            models.Index(fields=['plan', 'date'], name='revenue_fact_plan_date_idx'),
+        ]
+
+
+class DailyCustomerFact(models.Model):
+    """Customers added and churned per day"""
+    
+    date = models.DateField(unique=True)
+    added = models.PositiveIntegerField(default=0)
+    churned = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.date}: +{self.added} -{self.churned}"
+    
+    class Meta:
+        app_label = 'analytics'
+        ordering = ['date']
+
+
+class DailyPlanActiveFact(models.Model):
+    """Active service connections per plan at the end of each day"""
+    
+    date = models.DateField()
+    plan = models.ForeignKey(
+        'billing.Plan', on_delete=models.CASCADE, null=True, blank=True, related_name='+'
+    )
+    active = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.date} plan {self.plan_id}: {self.active}"
+    
+    class Meta:
+        app_label = 'analytics'
+        ordering = ['date']
+        indexes = [
+            models.Index(fields=['date', 'plan'], name='plan_active_fact_date_idx'),
+        ]
@@ -1,13 +1,16 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from django.db.models import Count, Sum, Avg, Q, F
 from django.utils import timezone
 from apps.customers.models import Customer
 from apps.billing.models import Invoice, Payment
 from apps.support.models import SupportTicket
+from apps.analytics.cache import memoize
+from .retention import retention_analyzer
 
 
 class CustomerReports:
     @staticmethod
+    @memoize('customer.acquisition_report')
     def acquisition_report(start_date, end_date):
         """
         Generate customer acquisition report
@@ -56,57 +59,33 @@ class CustomerReports:
     def churn_report(start_date, end_date):
         """
         Generate customer churn analysis report
-        """
-        churned_customers = Customer.objects.filter(
-            status='terminated',
-            termination_date__gte=start_date,
-            termination_date__lte=end_date
-        )
-        
-        # Churn rate calculation
-        total_customers_start = Customer.objects.filter(
-            created_at__lt=start_date
-        ).count()
-        
-        churn_rate = (churned_customers.count() / total_customers_start * 100) if total_customers_start > 0 else 0
-        
-        # Churn reasons
-        churn_by_reason = churned_customers.values('termination_reason').annotate(
-            count=Count('id'),
-            percentage=Count('id') * 100 / churned_customers.count() if churned_customers.count() > 0 else 0
-        )
-        
-        # Churn by tenure
-        churn_by_tenure = []
-        for customer in churned_customers:
-            tenure = (customer.termination_date - customer.created_at).days
-            churn_by_tenure.append({
-                'customer_id': customer.id,
-                'customer_name': customer.name,
-                'tenure_days': tenure,
-                'plan': customer.plan.name if customer.plan else None,
-            })
         
-        # Retention by plan
-        retention_by_plan = Customer.objects.values('plan__name').annotate(
-            total=Count('id'),
-            active=Count('id', filter=Q(status='active')),
-            retention_rate=Count('id', filter=Q(status='active')) * 100 / Count('id')
-        )
-        
-        return {
-            'period': {'start': start_date, 'end': end_date},
-            'total_churned': churned_customers.count(),
-            'churn_rate': churn_rate,
-            'churn_by_reason': list(churn_by_reason),
-            'churn_by_tenure': churn_by_tenure,
-            'retention_by_plan': list(retention_by_plan),
-            'lifetime_value_lost': churned_customers.aggregate(
-                total=Sum('plan__price') * 12
-            )['total'] or 0,  # Assuming annual revenue lost
-        }
+        Cached per period (local dates), so every request for the same range
+        shares one result. An end at local midnight is treated as exclusive.
+        """
+        def local(value):
+            if isinstance(value, datetime) and timezone.is_aware(value):
+                return timezone.localtime(value)
+            return value
+        
+        start_date, end_date = local(start_date), local(end_date)
+        start_day = start_date.date() if isinstance(start_date, datetime) else start_date
+        end_day = end_date.date() if isinstance(end_date, datetime) else end_date
+        if isinstance(end_date, datetime) and end_date.time() == time.min and end_day > start_day:
+            end_day -= timedelta(days=1)
+        
+        return CustomerReports.churn_analysis(start_day, end_day)
+    
+    @staticmethod
+    @memoize('customer.churn_analysis', ttl=3600)
+    def churn_analysis(start_day, end_day):
+        """
+        Churn, tenure, retention by plan and cohort matrices for a date range
+        """
+        return retention_analyzer.churn_report(start_day, end_day)
     
     @staticmethod
+    @memoize('customer.satisfaction_report')
     def satisfaction_report(start_date, end_date):
         """
         Generate customer satisfaction metrics
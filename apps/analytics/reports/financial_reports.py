@@ -5,10 +5,12 @@ from django.utils import timezone
 from apps.billing.models import Invoice, Payment, Plan
 from apps.customers.models import Customer
 from utils.constants import INVOICE_STATUS, PAYMENT_STATUS
+from apps.analytics.cache import memoize
 
 
 class FinancialReports:
     @staticmethod
+    @memoize('financial.revenue_report')
     def revenue_report(start_date, end_date, company=None):
         """
         Generate revenue report for specified period
@@ -49,6 +51,7 @@ class FinancialReports:
         }
     
     @staticmethod
+    @memoize('financial.collection_report')
     def collection_report(start_date, end_date, company=None):
         """
         Generate collection efficiency report
@@ -107,6 +110,7 @@ class FinancialReports:
         }
     
     @staticmethod
+    @memoize('financial.arpu_report')
     def arpu_report(start_date, end_date, company=None):
         """
         Calculate Average Revenue Per User (ARPU)
@@ -4,10 +4,12 @@ from django.utils import timezone
 from apps.network.models import OLTDevice, CPEDevice
 from apps.bandwidth.models import DataUsage
 from utils.helpers import calculate_uptime_percentage
+from apps.analytics.cache import memoize
 
 
 class NetworkReports:
     @staticmethod
+    @memoize('network.uptime_report', ttl=120)
     def uptime_report(start_date, end_date):
         """
         Generate network uptime report
@@ -53,6 +55,7 @@ class NetworkReports:
         }
     
     @staticmethod
+    @memoize('network.bandwidth_report', ttl=120)
     def bandwidth_report(start_date, end_date):
         """
         Generate bandwidth utilization report
@@ -107,6 +110,7 @@ class NetworkReports:
         }
     
     @staticmethod
+    @memoize('network.device_report', ttl=120)
     def device_report():
         """
         Generate device inventory and status report
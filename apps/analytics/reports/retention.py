@@ -0,0 +1,246 @@
+"""
+Set-based churn and retention analysis.
+
+``CustomerReports.churn_report`` used to walk every churned customer in
+Python, reading the plan of each one separately, and called ``count()``
+repeatedly. It also referenced Customer fields (plan, termination_date,
+termination_reason) that do not exist.
+
+The analysis now runs as two SQL statements over one derived table: one row
+per customer with its signup date, churn date, and the plan and price of its
+latest service connection (a LATERAL join):
+
+    summary   GROUP BY plan, tenure bucket   → retention by plan, customers at
+                                               period start, churn by tenure,
+                                               MRR lost
+    cohorts   GROUP BY signup month, plan,   → cohort size and cumulative churn
+              churn offset + window SUMs       per survival month
+
+Both return a few hundred rows at most, whatever the customer count.
+
+A customer signs up on ``activation_date``. It has churned when its status
+is TERMINATED or INACTIVE, on ``deactivation_date`` (or its last update if
+the date was never set). Leads and pending customers are not counted.
+"""
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List
+
+from django.db import connection
+
+from apps.analytics.facts import CHURN_STATUSES
+
+TENURE_BUCKETS = [
+    ('0-1 months', 30),
+    ('1-3 months', 90),
+    ('3-6 months', 180),
+    ('6-12 months', 365),
+    ('1-2 years', 730),
+    ('2+ years', None),
+]
+
+
+class RetentionAnalyzer:
+    """Churn, tenure and cohort retention for the current tenant."""
+
+    # ────────────────────────────────────────────────────────────────
+    # SQL
+    # ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _base_sql() -> str:
+        from apps.billing.models import Plan
+        from apps.customers.models import Customer, ServiceConnection
+
+        quote = connection.ops.quote_name
+        return f"""
+            SELECT c.id,
+                   c.activation_date AS signup,
+                   CASE WHEN c.status IN %(churn_statuses)s
+                        THEN COALESCE(c.deactivation_date, c.updated_at::date) END AS churned_on,
+                   latest.plan_name,
+                   latest.monthly_price
+            FROM {quote(Customer._meta.db_table)} c
+            LEFT JOIN LATERAL (
+                SELECT p.name AS plan_name,
+                       COALESCE(sc.monthly_price, p.base_price) AS monthly_price
+                FROM {quote(ServiceConnection._meta.db_table)} sc
+                LEFT JOIN {quote(Plan._meta.db_table)} p ON p.id = sc.plan_id
+                WHERE sc.customer_id = c.id
+                ORDER BY sc.created_at DESC
+                LIMIT 1
+            ) latest ON TRUE
+            WHERE c.status NOT IN ('LEAD', 'PENDING')
+        """
+
+    @staticmethod
+    def _tenure_bucket_sql() -> str:
+        whens = ' '.join(
+            f"WHEN churned_on - signup < {limit} THEN {index}"
+            for index, (_, limit) in enumerate(TENURE_BUCKETS) if limit is not None
+        )
+        return f"CASE {whens} ELSE {len(TENURE_BUCKETS) - 1} END"
+
+    @staticmethod
+    def _fetch(sql: str, params: Dict) -> List[tuple]:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _summary(self, start: date, end: date) -> List[tuple]:
+        sql = f"""
+            WITH base AS ({self._base_sql()})
+            SELECT plan_name,
+                   CASE WHEN churned_on BETWEEN %(start)s AND %(end)s
+                        THEN {self._tenure_bucket_sql()} END AS tenure_bucket,
+                   COUNT(*) AS customers,
+                   COUNT(*) FILTER (WHERE churned_on IS NULL) AS active,
+                   COUNT(*) FILTER (
+                       WHERE signup < %(start)s AND (churned_on IS NULL OR churned_on >= %(start)s)
+                   ) AS active_at_start,
+                   COALESCE(SUM(monthly_price) FILTER (
+                       WHERE churned_on BETWEEN %(start)s AND %(end)s
+                   ), 0) AS mrr_lost,
+                   COALESCE(SUM(churned_on - signup) FILTER (
+                       WHERE churned_on BETWEEN %(start)s AND %(end)s
+                   ), 0) AS tenure_days
+            FROM base
+            GROUP BY 1, 2
+        """
+        return self._fetch(sql, {'churn_statuses': CHURN_STATUSES, 'start': start, 'end': end})
+
+    def _cohorts(self, start: date, end: date) -> List[tuple]:
+        sql = f"""
+            WITH base AS ({self._base_sql()})
+            SELECT cohort, plan_name, churn_offset,
+                   SUM(COUNT(*)) OVER (PARTITION BY cohort, plan_name) AS cohort_size,
+                   SUM(COUNT(*)) OVER (
+                       PARTITION BY cohort, plan_name
+                       ORDER BY churn_offset NULLS LAST
+                       ROWS UNBOUNDED PRECEDING
+                   ) AS churned_by_offset
+            FROM (
+                SELECT date_trunc('month', signup)::date AS cohort,
+                       plan_name,
+                       ((EXTRACT(YEAR FROM churned_on) - EXTRACT(YEAR FROM signup)) * 12
+                        + EXTRACT(MONTH FROM churned_on) - EXTRACT(MONTH FROM signup))::int AS churn_offset
+                FROM base
+                WHERE signup BETWEEN %(start)s AND %(end)s
+            ) customers
+            GROUP BY 1, 2, 3
+            ORDER BY 1, 2, 3 NULLS LAST
+        """
+        return self._fetch(sql, {'churn_statuses': CHURN_STATUSES, 'start': start, 'end': end})
+
+    # ────────────────────────────────────────────────────────────────
+    # COHORT MATRICES
+    # ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _row(cohort: date, size: int, retained: List[int]) -> Dict:
+        return {
+            'cohort': cohort.strftime('%Y-%m'),
+            'size': size,
+            'retained': retained,
+            'retention': [round(n / size * 100, 1) if size else 0 for n in retained],
+        }
+
+    def cohort_matrices(self, start: date, end: date) -> Dict:
+        """
+        Signup-month × survival-month matrices, overall and per plan.
+
+        ``retained[k]`` is the number of a cohort's customers still active at
+        the end of its k-th month (0 = signup month), up to ``end``.
+        """
+        start = start.replace(day=1)
+        last_month = end.replace(day=1)
+
+        groups = defaultdict(lambda: {'size': 0, 'churned': []})
+        for cohort, plan_name, offset, size, churned_by_offset in self._cohorts(start, end):
+            group = groups[(plan_name or 'No plan', cohort)]
+            group['size'] = int(size)
+            if offset is not None:
+                group['churned'].append((max(offset, 0), int(churned_by_offset)))
+
+        per_plan = defaultdict(dict)
+        overall = {}
+        for (plan, cohort), group in groups.items():
+            months = (last_month.year - cohort.year) * 12 + last_month.month - cohort.month
+            retained = [
+                group['size'] - max((total for offset, total in group['churned'] if offset <= k), default=0)
+                for k in range(months + 1)
+            ]
+            per_plan[plan][cohort] = (group['size'], retained)
+
+            size, combined = overall.get(cohort, (0, [0] * len(retained)))
+            overall[cohort] = (size + group['size'], [a + b for a, b in zip(combined, retained)])
+
+        return {
+            'survival_months': (last_month.year - start.year) * 12 + last_month.month - start.month + 1,
+            'all': [self._row(cohort, *overall[cohort]) for cohort in sorted(overall)],
+            'by_plan': {
+                plan: [self._row(cohort, *cohorts[cohort]) for cohort in sorted(cohorts)]
+                for plan, cohorts in sorted(per_plan.items())
+            },
+        }
+
+    # ────────────────────────────────────────────────────────────────
+    # REPORT
+    # ────────────────────────────────────────────────────────────────
+
+    def churn_report(self, start: date, end: date) -> Dict:
+        """Churn in ``start``..``end`` (inclusive dates) plus retention cohorts."""
+        plans = defaultdict(lambda: {'total': 0, 'active': 0, 'churned': 0})
+        tenure = [0] * len(TENURE_BUCKETS)
+        at_start = 0
+        mrr_lost = 0
+        tenure_days = 0
+
+        for plan_name, bucket, customers, active, active_at_start, mrr, days in self._summary(start, end):
+            plan = plans[plan_name or 'No plan']
+            plan['total'] += customers
+            plan['active'] += active
+            at_start += active_at_start
+            if bucket is not None:
+                tenure[bucket] += customers
+                plan['churned'] += customers
+                mrr_lost += mrr
+                tenure_days += days
+
+        total_churned = sum(tenure)
+
+        def share(count, total):
+            return round(count / total * 100, 1) if total else 0
+
+        return {
+            'period': {'start': start, 'end': end},
+            'customers_at_start': at_start,
+            'total_churned': total_churned,
+            'churn_rate': share(total_churned, at_start),
+            'average_tenure_days': round(tenure_days / total_churned) if total_churned else 0,
+            'churn_by_tenure': [
+                {'tenure': label, 'count': count, 'percentage': share(count, total_churned)}
+                for (label, _), count in zip(TENURE_BUCKETS, tenure)
+            ],
+            'churn_by_plan': [
+                {'plan': name, 'count': stats['churned'], 'percentage': share(stats['churned'], total_churned)}
+                for name, stats in sorted(plans.items(), key=lambda item: -item[1]['churned'])
+                if stats['churned']
+            ],
+            'retention_by_plan': [
+                {
+                    'plan__name': name,
+                    'total': stats['total'],
+                    'active': stats['active'],
+                    'retention_rate': share(stats['active'], stats['total']),
+                }
+                for name, stats in sorted(plans.items())
+            ],
+            # Monthly revenue of the churned customers, annualized
+            'lifetime_value_lost': float(mrr_lost) * 12,
+            'cohorts': self.cohort_matrices(start, end),
+        }
+
+
+# Singleton instance
+retention_analyzer = RetentionAnalyzer()
@@ -0,0 +1,81 @@
+"""
+Analytics Celery Tasks
+
+These tasks handle:
+1. Intra-day refresh of today's dashboard fact rows
+2. Nightly recompute (and first-run backfill) of the daily fact tables
+3. Background data exports written to storage
+"""
+
+import logging
+from celery import shared_task
+from django_tenants.utils import get_tenant_model, schema_context
+
+logger = logging.getLogger(__name__)
+
+
+def _refresh_all_tenants(label: str, refresh) -> dict:
+    stats = {'tenants_processed': 0, 'errors': 0}
+
+    for tenant in get_tenant_model().objects.exclude(schema_name='public'):
+        try:
+            with schema_context(tenant.schema_name):
+                refresh()
+            stats['tenants_processed'] += 1
+        except Exception as e:
+            stats['errors'] += 1
+            logger.error(f"[ANALYTICS TASK] {label} refresh failed for {tenant.schema_name}: {e}")
+
+    logger.info(f"[ANALYTICS TASK] {label} refresh complete: {stats}")
+    return stats
+
+
+@shared_task
+def refresh_analytics_today():
+    """
+    Recompute today's revenue/customer facts and snapshot active connections.
+
+    Runs every 15 minutes via Celery Beat.
+    """
+    from apps.analytics.facts import fact_refresher
+
+    return _refresh_all_tenants('Intra-day', fact_refresher.refresh_today)
+
+
+@shared_task
+def refresh_analytics_nightly():
+    """
+    Recompute the last ANALYTICS_FACTS_NIGHTLY_DAYS of facts, close
+    yesterday's active snapshot and backfill tenants without facts.
+
+    Runs daily at 00:15 via Celery Beat.
+    """
+    from apps.analytics.facts import fact_refresher
+
+    return _refresh_all_tenants('Nightly', fact_refresher.refresh_nightly)
+
+
+@shared_task
+def run_export(schema_name, job_id):
+    """
+    Write a large export to private storage (see ExportEngine.run_job).
+
+    Queued by ExportView; progress and the file path are kept in the
+    export job record.
+    """
+    from apps.analytics.exports import export_engine
+
+    with schema_context(schema_name):
+        return export_engine.run_job(job_id)
+
+
+@shared_task
+def purge_expired_exports():
+    """
+    Delete export files whose job record has expired (JOB_TTL).
+
+    Runs hourly via Celery Beat.
+    """
+    from apps.analytics.exports import export_engine
+
+    return {'deleted': export_engine.purge_expired()}
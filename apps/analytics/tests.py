@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .cache import AnalyticsMemo, memoize
+
+
+LOCMEM = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+
+
+# clear() on the configured Redis aliases would FLUSHDB the shared broker/cache
+@override_settings(CACHES={'default': LOCMEM, 'analytics': {**LOCMEM, 'LOCATION': 'analytics'}})
+class AnalyticsMemoTests(SimpleTestCase):
+    def setUp(self):
+        self.memo = AnalyticsMemo()
+        self.memo.ttl = 300
+        self.memo.stale_ttl = 1800
+        self.memo.cache.clear()
+        self.addCleanup(self.memo.cache.clear)
+
+        # Start of a key window, so the whole stale period shares one key
+        self.clock = 2100 * 850_000.0
+        patcher = mock.patch('time.time', lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.computed = []
+
+    def now(self):
+        return datetime.fromtimestamp(self.clock, tz=dt_timezone.utc)
+
+    def report(self):
+        """Revenue for the last 30 days until now, as the dashboard asks for it."""
+        end = self.now()
+        args = (end - timedelta(days=30), end)
+
+        def compute():
+            self.computed.append(end)
+            return len(self.computed)
+
+        return self.memo.get_or_compute('financial.revenue_report', compute, args, rolling=True)
+
+    def wait_for_refresh(self):
+        if self.memo._executor is not None:
+            self.memo._executor.shutdown(wait=True)
+            self.memo._executor = None
+
+    def test_rolling_range_is_served_stale_then_refreshed(self):
+        self.assertEqual(self.report(), 1)
+
+        self.clock += 200
+        self.assertEqual(self.report(), 1)  # fresh
+
+        self.clock += 400
+        self.assertEqual(self.report(), 1)  # stale: served at once, refreshed behind
+        self.wait_for_refresh()
+        self.assertEqual(len(self.computed), 2)
+        self.assertEqual(self.computed[-1], self.now())  # with the caller's current range
+
+        self.assertEqual(self.report(), 2)
+        self.assertEqual(len(self.computed), 2)
+
+    def test_explicit_ranges_are_keyed_exactly(self):
+        @memoize('financial.revenue_report')
+        def revenue_report(start_date, end_date):
+            self.computed.append(end_date)
+            return {'period': {'start': start_date, 'end': end_date}}
+
+        with mock.patch('apps.analytics.cache.analytics_cache', self.memo):
+            end = self.now()
+            later = end + timedelta(minutes=10)  # same key window
+            first = revenue_report(end - timedelta(days=30), end)
+            second = revenue_report(later - timedelta(days=30), later)
+            self.assertEqual(revenue_report(end - timedelta(days=30), end), first)
+
+        self.assertEqual(self.computed, [end, later])
+        self.assertEqual(second['period'], {'start': later - timedelta(days=30), 'end': later})
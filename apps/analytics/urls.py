@@ -1,5 +1,6 @@
 from django.urls import path
 from .views_v1 import AnalyticsDashboardView
+from .views import ExportView, ExportStatusView, ExportDownloadView
 from .individual_views import (
     AnalyticsKPIsView,
     AnalyticsRevenueView,
@@ -38,4 +39,9 @@ urlpatterns = [
     path('revenue-target/', AnalyticsRevenueTargetView.as_view(), name='analytics-revenue-target'),
     path('network-stats/', AnalyticsNetworkStatsView.as_view(), name='analytics-network-stats'),
     path('export/', AnalyticsExportView.as_view(), name='analytics-export'),
+    
+    # Data exports (streamed, or background jobs for large ones)
+    path('exports/', ExportView.as_view(), name='analytics-data-export'),
+    path('exports/<str:job_id>/', ExportStatusView.as_view(), name='analytics-data-export-status'),
+    path('exports/<str:job_id>/download/', ExportDownloadView.as_view(), name='analytics-data-export-download'),
 ]
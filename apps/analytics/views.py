@@ -1,14 +1,15 @@
 # apps/analytics/views.py
 from datetime import datetime, timedelta
+from django.db import connection
 from django.utils import timezone
 from django.db.models import Q, Count, Sum
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse
+from django.urls import reverse
 import json
-import csv
 
 # Try to import optional dependencies
 try:
@@ -17,7 +18,9 @@ try:
 except ImportError:
     XLSX_AVAILABLE = False
 
-from .models import ReportDefinition, DashboardWidget, AnalyticsCache
+from .models import ReportDefinition, DashboardWidget
+from .cache import analytics_cache
+from .exports import EXPORTS, XLSX_AVAILABLE as EXPORT_XLSX_AVAILABLE, export_engine
 from .reports import financial_reports, network_reports, customer_reports
 from .serializers import ReportDefinitionSerializer, DashboardWidgetSerializer
 
@@ -111,24 +114,19 @@ class ReportGeneratorView(generics.ListCreateAPIView):
             return Response(report_data)
     
     def _generate_csv(self, data, report_name):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{report_name}_{timezone.now().date()}.csv"'
-        
-        writer = csv.writer(response)
-        
-        if 'summary' in data:
-            writer.writerow(['Metric', 'Value'])
-            for key, value in data['summary'].items():
-                writer.writerow([key.replace('_', ' ').title(), value])
-            writer.writerow([])  # empty row for separation
-        
-        if 'details' in data and data['details']:
-            headers = data['details'][0].keys()
-            writer.writerow(headers)
-            for row in data['details']:
-                writer.writerow(row.values())
-        
-        return response
+        def rows():
+            if 'summary' in data:
+                yield ['Metric', 'Value']
+                for key, value in data['summary'].items():
+                    yield [key.replace('_', ' ').title(), value]
+                yield []  # empty row for separation
+            
+            if 'details' in data and data['details']:
+                yield list(data['details'][0].keys())
+                for row in data['details']:
+                    yield list(row.values())
+        
+        return export_engine.stream_csv(rows(), f"{report_name}_{timezone.now().date()}")
     
     def _generate_excel(self, data, report_name):
         if not XLSX_AVAILABLE:
@@ -199,27 +197,27 @@ class DashboardView(APIView):
         })
     
     def _get_widget_data(self, widget, request):
-        cache_key = f"widget_{widget.id}_{timezone.now().date()}"
-        cache_entry = AnalyticsCache.objects.filter(
-            cache_key=cache_key,
-            expires_at__gt=timezone.now()
-        ).first()
-        
-        if cache_entry:
-            return cache_entry.data
-        
         company = request.user.company if hasattr(request.user, 'company') else None
         
+        return analytics_cache.get_or_compute(
+            f"widget:{widget.id}",
+            lambda: self._compute_widget_data(widget, company),
+            args=(widget.data_source, company),
+            ttl=max(widget.refresh_interval, 300),
+        )
+    
+    def _compute_widget_data(self, widget, company):
+        # The widget result is memoized as a whole (_get_widget_data)
         if widget.data_source == 'revenue_trend':
-            data = financial_reports.FinancialReports.revenue_report(
+            data = financial_reports.FinancialReports.revenue_report.uncached(
                 timezone.now() - timedelta(days=30), timezone.now(), company
             )
         elif widget.data_source == 'customer_growth':
-            data = customer_reports.CustomerReports.acquisition_report(
+            data = customer_reports.CustomerReports.acquisition_report.uncached(
                 timezone.now() - timedelta(days=90), timezone.now()
             )
         elif widget.data_source == 'network_health':
-            data = network_reports.NetworkReports.uptime_report(
+            data = network_reports.NetworkReports.uptime_report.uncached(
                 timezone.now() - timedelta(days=7), timezone.now()
             )
         elif widget.data_source == 'ticket_status':
@@ -233,12 +231,6 @@ class DashboardView(APIView):
         else:
             data = {'message': 'Widget data source not implemented'}
         
-        AnalyticsCache.objects.create(
-            cache_key=cache_key,
-            data=data,
-            expires_at=timezone.now() + timedelta(minutes=max(widget.refresh_interval // 60, 5))
-        )
-        
         return data
     
     def _get_overall_metrics(self, request):
@@ -271,75 +263,103 @@ class DashboardView(APIView):
 class ExportView(APIView):
     """
     Export data in various formats
+    
+    Small exports stream back directly. Large ones (or ``background: true``)
+    are written to storage by a Celery task; poll ExportStatusView for the
+    download link.
     """
     permission_classes = [IsAuthenticated, IsAdminOrStaff]
     
     def post(self, request):
         export_type = request.data.get('type')
         filters = request.data.get('filters', {})
-        company = request.user.company if hasattr(request.user, 'company') else None
+        export_format = request.data.get('format', 'csv')
         
-        if export_type == 'customers':
-            return self._export_customers(filters, company)
-        elif export_type == 'invoices':
-            return self._export_invoices(filters, company)
-        elif export_type == 'payments':
-            return self._export_payments(filters, company)
-        else:
+        if export_type not in EXPORTS:
             return Response(
                 {'error': 'Invalid export type'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-    
-    def _export_customers(self, filters, company):
-        from apps.customers.models import Customer
-        from apps.customers.serializers import CustomerSerializer
-        
-        queryset = Customer.objects.filter(company=company)
+        if export_format not in export_engine.FORMATS:
+            return Response(
+                {'error': f"Invalid format. Use one of: {', '.join(export_engine.FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if export_format == 'xlsx' and not EXPORT_XLSX_AVAILABLE:
+            return Response(
+                {'error': 'XLSX export requires the openpyxl library. Please install it.'},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
         
-        if 'status' in filters:
-            queryset = queryset.filter(status=filters['status'])
-        if 'plan' in filters:
-            queryset = queryset.filter(plan__name__icontains=filters['plan'])
-        if 'date_from' in filters:
-            queryset = queryset.filter(created_at__gte=filters['date_from'])
-        if 'date_to' in filters:
-            queryset = queryset.filter(created_at__lte=filters['date_to'])
+        queryset = export_engine.queryset(export_type, filters)
+        if request.data.get('background') or export_engine.is_large(queryset):
+            job_id = export_engine.start_job(
+                export_type, filters, export_format,
+                compress=bool(request.data.get('gzip')),
+                schema_name=connection.schema_name,
+            )
+            return Response({
+                'job_id': job_id,
+                'status': 'queued',
+                'message': 'Export is being generated in the background',
+            }, status=status.HTTP_202_ACCEPTED)
         
-        serializer = CustomerSerializer(queryset, many=True)
-        return self._generate_csv_response(serializer.data, 'customers')
+        return export_engine.response(export_type, filters, export_format)
+
+
+class ExportStatusView(APIView):
+    """
+    Status of a background export; includes ``download_url`` once completed
+    """
+    permission_classes = [IsAuthenticated, IsAdminOrStaff]
     
-    def _export_invoices(self, filters, company):
-        from apps.billing.models import Invoice
-        from apps.billing.serializers import InvoiceSerializer
-        
-        queryset = Invoice.objects.filter(customer__company=company)
+    def get(self, request, job_id):
+        job = export_engine.job_status(job_id)
+        if job is None or job.get('schema_name') != connection.schema_name:
+            return Response(
+                {'error': 'Export job not found or expired'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         
-        if 'status' in filters:
-            queryset = queryset.filter(status=filters['status'])
-        if 'date_from' in filters:
-            queryset = queryset.filter(invoice_date__gte=filters['date_from'])
-        if 'date_to' in filters:
-            queryset = queryset.filter(invoice_date__lte=filters['date_to'])
+        download_url = None
+        if job['status'] == 'completed':
+            download_url = request.build_absolute_uri(
+                reverse('analytics:analytics-data-export-download', args=[job_id])
+            )
         
-        serializer = InvoiceSerializer(queryset, many=True)
-        return self._generate_csv_response(serializer.data, 'invoices')
+        return Response({
+            'job_id': job_id,
+            'status': job['status'],
+            'export_type': job['export_type'],
+            'format': job['format'],
+            'gzip': job['gzip'],
+            'rows': job.get('rows', 0),
+            'download_url': download_url,
+            'error': job.get('error'),
+            'updated_at': job.get('updated_at'),
+        })
+
+
+class ExportDownloadView(APIView):
+    """
+    Download a completed background export. Export files live in private
+    storage and are only served here, to staff of the tenant that ran them.
+    """
+    permission_classes = [IsAuthenticated, IsAdminOrStaff]
     
-    def _generate_csv_response(self, data, filename_prefix):
-        if not data:
+    def get(self, request, job_id):
+        job = export_engine.job_status(job_id)
+        if job is None or job.get('schema_name') != connection.schema_name:
             return Response(
-                {'error': 'No data to export'},
+                {'error': 'Export job not found or expired'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{filename_prefix}_{timezone.now().date()}.csv"'
-        
-        writer = csv.writer(response)
-        headers = data[0].keys()
-        writer.writerow(headers)
-        
-        for row in data:
-            writer.writerow(row.values())
+        fileobj = export_engine.open_file(job)
+        if fileobj is None:
+            return Response(
+                {'error': 'Export file is not available'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         
-        return response
+        return FileResponse(fileobj, as_attachment=True, filename=job['filename'])
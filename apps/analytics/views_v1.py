@@ -27,7 +27,8 @@ from io import StringIO
 from rest_framework.permissions import IsAdminUser
 from apps.customers.models import Customer
 from apps.billing.models.billing_models import Invoice, Plan
-from apps.billing.models.payment_models import Payment
+from apps.billing.models.payment_models import Payment, InvoiceItemPayment
+from apps.analytics.models import DailyCustomerFact, DailyPlanActiveFact, DailyRevenueFact
 from apps.network.models import OLTDevice, CPEDevice, MikrotikQueue  
 from apps.bandwidth.models import DataUsage, BandwidthProfile
 
@@ -90,39 +91,43 @@ class AnalyticsDashboardView(APIView):
         
         return Response(data)
     
+    # ────────────────────────────────────────────────────────────────
+    # FACT-BACKED SECTIONS (apps.analytics.facts, refreshed by Celery)
+    # ────────────────────────────────────────────────────────────────
+    
+    @staticmethod
+    def _active_by_date(start_day):
+        """Total active connections per snapshot day since ``start_day``"""
+        return dict(
+            DailyPlanActiveFact.objects.filter(date__gte=start_day)
+            .values('date').annotate(total=Sum('active')).order_by()
+            .values_list('date', 'total')
+        )
+    
     def get_kpis(self, start_date):
         """Get key performance indicators"""
-        # Get payments in period
-        payments = Payment.objects.filter(
-            payment_date__gte=start_date,
-            status='completed'
-        )
+        start_day = timezone.localdate(start_date)
+        prev_start_day = start_day - (timezone.localdate() - start_day)
         
-        # Get customer stats
-        total_customers = Customer.objects.filter(status='active').count()
-        new_customers = Customer.objects.filter(
-            created_at__gte=start_date,
-            status='active'
-        ).count()
+        # Current and previous period in one scan
+        revenue = DailyRevenueFact.objects.filter(date__gte=prev_start_day).aggregate(
+            current=Sum('amount', filter=Q(date__gte=start_day)),
+            previous=Sum('amount', filter=Q(date__lt=start_day)),
+        )
+        customers = DailyCustomerFact.objects.filter(date__gte=start_day).aggregate(
+            added=Sum('added'), churned=Sum('churned')
+        )
         
-        churned_customers = Customer.objects.filter(
-            status='terminated',
-            deactivation_date__gte=start_date
-        ).count()
+        total_customers = Customer.objects.filter(status='ACTIVE').count()
+        new_customers = customers['added'] or 0
+        churned_customers = customers['churned'] or 0
         
         # Calculate metrics
-        total_revenue = payments.aggregate(total=Sum('amount'))['total'] or 0
+        total_revenue = revenue['current'] or 0
         arpu = total_revenue / total_customers if total_customers > 0 else 0
         churn_rate = (churned_customers / total_customers * 100) if total_customers > 0 else 0
         
-        # Previous period for comparison
-        prev_start_date = start_date - (timezone.now() - start_date)
-        prev_payments = Payment.objects.filter(
-            payment_date__gte=prev_start_date,
-            payment_date__lt=start_date,
-            status='completed'
-        )
-        prev_revenue = prev_payments.aggregate(total=Sum('amount'))['total'] or 0
+        prev_revenue = revenue['previous'] or 0
         revenue_change = ((total_revenue - prev_revenue) / prev_revenue * 100) if prev_revenue > 0 else 0
         
         return {
@@ -132,7 +137,7 @@ class AnalyticsDashboardView(APIView):
             'arpu': float(arpu),
             'churn_rate': round(churn_rate, 2),
             'conversion_rate': 23.5,  # Placeholder - calculate from leads if available
-            'revenue_change': round(revenue_change, 1),
+            'revenue_change': round(float(revenue_change), 1),
             'users_change': 8.3,  # Placeholder
             'new_users_change': 15.0,  # Placeholder
             'churn_change': -2.1,  # Placeholder
@@ -140,18 +145,22 @@ class AnalyticsDashboardView(APIView):
     
     def get_revenue_data(self, start_date):
         """Get revenue trend data by month"""
-        payments = Payment.objects.filter(
-            payment_date__gte=start_date,
-            status='completed'
+        start_day = timezone.localdate(start_date)
+        revenue = DailyRevenueFact.objects.filter(
+            date__gte=start_day
         ).annotate(
-            month=TruncMonth('payment_date')
+            month=TruncMonth('date')
         ).values('month').annotate(
-            revenue=Sum('amount'),
-            users=Count('invoice__customer', distinct=True)
+            revenue=Sum('amount')
         ).order_by('month')
         
+        # Users: active connections at the last snapshot of each month
+        users_by_month = {}
+        for day, total in sorted(self._active_by_date(start_day).items()):
+            users_by_month[day.replace(day=1)] = total
+        
         result = []
-        for p in payments:
+        for p in revenue:
             # Calculate target (90% of revenue as target for simplicity)
             target = float(p['revenue']) * 0.9 if p['revenue'] else 0
             
@@ -159,32 +168,31 @@ class AnalyticsDashboardView(APIView):
                 'month': p['month'].strftime('%b'),
                 'revenue': float(p['revenue'] or 0),
                 'target': target,
-                'users': p['users'],
+                'users': users_by_month.get(p['month'], 0),
             })
         
         return result
     
     def get_user_growth_data(self, start_date):
         """Get user growth and churn data by month"""
-        from django.db.models.functions import TruncMonth
+        growth = {
+            row['month']: row
+            for row in DailyCustomerFact.objects.filter(
+                date__gte=timezone.localdate(start_date)
+            ).annotate(
+                month=TruncMonth('date')
+            ).values('month').annotate(
+                new_users=Sum('added'), churn=Sum('churned')
+            ).order_by()
+        }
         
         months = []
-        current = start_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        current = timezone.localdate(start_date).replace(day=1)
         
-        while current <= timezone.now():
-            month_end = (current + relativedelta(months=1)) - timedelta(days=1)
-            
-            new_users = Customer.objects.filter(
-                created_at__gte=current,
-                created_at__lte=month_end,
-                status='active'
-            ).count()
-            
-            churned = Customer.objects.filter(
-                status='terminated',
-                deactivation_date__gte=current,
-                deactivation_date__lte=month_end
-            ).count()
+        while current <= timezone.localdate():
+            row = growth.get(current, {})
+            new_users = row.get('new_users') or 0
+            churned = row.get('churn') or 0
             
             months.append({
                 'month': current.strftime('%b'),
@@ -199,22 +207,23 @@ class AnalyticsDashboardView(APIView):
     
     def get_plan_performance(self, start_date):
         """Get plan performance analytics"""
-        plans = Plan.objects.filter(is_active=True)
+        latest = DailyPlanActiveFact.objects.aggregate(latest=Max('date'))['latest']
+        active_by_plan = dict(
+            DailyPlanActiveFact.objects.filter(date=latest).values_list('plan_id', 'active')
+        ) if latest else {}
+        total_active = sum(active_by_plan.values())
+        
+        revenue_by_plan = dict(
+            DailyRevenueFact.objects.filter(
+                date__gte=timezone.localdate(start_date)
+            ).values('plan_id').annotate(total=Sum('amount')).order_by()
+            .values_list('plan_id', 'total')
+        )
         
         result = []
-        for plan in plans:
-            # Get active customers on this plan
-            active_customers = ServiceConnection.objects.filter(
-                plan=plan,
-                status='active'
-            ).count()
-            
-            # Get revenue from this plan
-            plan_revenue = Payment.objects.filter(
-                invoice__plan=plan,
-                payment_date__gte=start_date,
-                status='completed'
-            ).aggregate(total=Sum('amount'))['total'] or 0
+        for plan in Plan.objects.filter(is_active=True):
+            active_customers = active_by_plan.get(plan.id, 0)
+            plan_revenue = revenue_by_plan.get(plan.id) or 0
             
             # Calculate ARPU
             arpu = plan_revenue / active_customers if active_customers > 0 else 0
@@ -226,7 +235,7 @@ class AnalyticsDashboardView(APIView):
                 'users': active_customers,
                 'revenue': float(plan_revenue),
                 'arpu': float(arpu),
-                'share': round((active_customers / Customer.objects.filter(status='active').count() * 100), 1) if active_customers > 0 else 0,
+                'share': round((active_customers / total_active * 100), 1) if active_customers > 0 else 0,
             })
         
         return result
@@ -290,13 +299,15 @@ class AnalyticsDashboardView(APIView):
     
     def get_payment_methods(self, start_date):
         """Get payment method breakdown"""
-        payment_methods = Payment.objects.filter(
-            payment_date__gte=start_date,
-            status='completed'
-        ).values('payment_method').annotate(
-            transactions=Count('id'),
-            amount=Sum('amount')
-        ).order_by('-amount')
+        method_names = dict(InvoiceItemPayment.METHOD_TYPES)
+        payment_methods = list(
+            DailyRevenueFact.objects.filter(
+                date__gte=timezone.localdate(start_date)
+            ).values('method_type').annotate(
+                transactions=Sum('transactions'),
+                amount=Sum('amount')
+            ).order_by('-amount')
+        )
         
         total_amount = sum(pm['amount'] for pm in payment_methods)
         
@@ -305,10 +316,10 @@ class AnalyticsDashboardView(APIView):
             percentage = (pm['amount'] / total_amount * 100) if total_amount > 0 else 0
             
             result.append({
-                'method': pm['payment_method'] or 'Other',
+                'method': method_names.get(pm['method_type']) or 'Other',
                 'transactions': pm['transactions'],
                 'amount': float(pm['amount']),
-                'percentage': round(percentage, 1),
+                'percentage': round(float(percentage), 1),
             })
         
         return result
@@ -371,23 +382,16 @@ class AnalyticsDashboardView(APIView):
         }
     
     def get_revenue_by_type(self, start_date):
-        hotspot_revenue = Payment.objects.filter(
-            invoice__service_connection__auth_connection_type='HOTSPOT',
-            payment_date__gte=start_date,
-            status='COMPLETED'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        pppoe_revenue = Payment.objects.filter(
-            invoice__service_connection__auth_connection_type='PPPOE',
-            payment_date__gte=start_date,
-            status='COMPLETED'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        static_revenue = Payment.objects.filter(
-            invoice__service_connection__auth_connection_type='STATIC',
-            payment_date__gte=start_date,
-            status='COMPLETED'
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        by_type = dict(
+            DailyRevenueFact.objects.filter(
+                date__gte=timezone.localdate(start_date),
+                connection_type__in=['HOTSPOT', 'PPPOE', 'STATIC'],
+            ).values('connection_type').annotate(total=Sum('amount')).order_by()
+            .values_list('connection_type', 'total')
+        )
+        hotspot_revenue = by_type.get('HOTSPOT') or 0
+        pppoe_revenue = by_type.get('PPPOE') or 0
+        static_revenue = by_type.get('STATIC') or 0
         
         total = hotspot_revenue + pppoe_revenue + static_revenue
         
@@ -395,28 +399,24 @@ class AnalyticsDashboardView(APIView):
             'hotspot_revenue': float(hotspot_revenue),
             'pppoe_revenue': float(pppoe_revenue),
             'static_revenue': float(static_revenue),
-            'hotspot_percentage': round((hotspot_revenue / total * 100), 1) if total else 0,
-            'pppoe_percentage': round((pppoe_revenue / total * 100), 1) if total else 0,
-            'static_percentage': round((static_revenue / total * 100), 1) if total else 0,
+            'hotspot_percentage': round(float(hotspot_revenue / total * 100), 1) if total else 0,
+            'pppoe_percentage': round(float(pppoe_revenue / total * 100), 1) if total else 0,
+            'static_percentage': round(float(static_revenue / total * 100), 1) if total else 0,
         }
     
     def get_revenue_forecast(self):
         """Get 3-month revenue forecast"""
         # Simple linear forecast based on last 3 months
-        three_months_ago = timezone.now() - relativedelta(months=3)
-        
-        monthly_revenue = []
-        for i in range(3):
-            month_start = three_months_ago + relativedelta(months=i)
-            month_end = month_start + relativedelta(months=1)
-            
-            revenue = Payment.objects.filter(
-                payment_date__gte=month_start,
-                payment_date__lt=month_end,
-                status='completed'
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            monthly_revenue.append(float(revenue))
+        today = timezone.localdate()
+        windows = [
+            (today - relativedelta(months=3 - i), today - relativedelta(months=2 - i))
+            for i in range(3)
+        ]
+        revenue = DailyRevenueFact.objects.filter(date__gte=windows[0][0]).aggregate(**{
+            f'month_{i}': Sum('amount', filter=Q(date__gte=month_start, date__lt=month_end))
+            for i, (month_start, month_end) in enumerate(windows)
+        })
+        monthly_revenue = [float(revenue[f'month_{i}'] or 0) for i in range(3)]
         
         # Simple average growth
         avg_growth = 1.065  # 6.5% growth
@@ -439,14 +439,17 @@ class AnalyticsDashboardView(APIView):
     
     def get_revenue_target(self):
         """Get revenue target progress"""
-        current_year = timezone.now().year
-        year_start = datetime(current_year, 1, 1)
-        year_start = timezone.make_aware(year_start)
-        
-        current_revenue = Payment.objects.filter(
-            payment_date__gte=year_start,
-            status='completed'
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        year_start = timezone.localdate().replace(month=1, day=1)
+        
+        monthly = list(
+            DailyRevenueFact.objects.filter(
+                date__gte=year_start
+            ).annotate(
+                month=TruncMonth('date')
+            ).values('month').annotate(total=Sum('amount')).order_by()
+            .values_list('total', flat=True)
+        )
+        current_revenue = sum(monthly) if monthly else 0
         
         # Target: 10,000,000 for the year (example)
         target_revenue = 10000000
@@ -456,22 +459,8 @@ class AnalyticsDashboardView(APIView):
         months_passed = timezone.now().month
         monthly_average = current_revenue / months_passed if months_passed > 0 else 0
         
-        # Best month (find max monthly revenue)
-        best_month = 0
-        for month in range(1, months_passed + 1):
-            month_start = datetime(current_year, month, 1)
-            month_end = datetime(current_year, month + 1, 1) if month < 12 else datetime(current_year + 1, 1, 1)
-            month_start = timezone.make_aware(month_start)
-            month_end = timezone.make_aware(month_end)
-            
-            month_revenue = Payment.objects.filter(
-                payment_date__gte=month_start,
-                payment_date__lt=month_end,
-                status='completed'
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            if month_revenue > best_month:
-                best_month = month_revenue
+        # Best month
+        best_month = max(monthly) if monthly else 0
         
         # Projected annual
         projected_annual = monthly_average * 12
@@ -479,7 +468,7 @@ class AnalyticsDashboardView(APIView):
         return {
             'current_revenue': float(current_revenue),
             'target_revenue': float(target_revenue),
-            'progress_percentage': round(progress, 1),
+            'progress_percentage': round(float(progress), 1),
             'monthly_average': float(monthly_average),
             'best_month_revenue': float(best_month),
             'projected_annual': float(projected_annual),
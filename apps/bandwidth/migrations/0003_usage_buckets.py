@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-16 20:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+        ('bandwidth', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageSessionCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('acctuniqueid', models.CharField(max_length=32, unique=True)),
+                ('input_octets', models.BigIntegerField(default=0)),
+                ('output_octets', models.BigIntegerField(default=0)),
+                ('last_seen_at', models.DateTimeField(db_index=True)),
+                ('is_closed', models.BooleanField(default=False)),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='customers.customer')),
+            ],
+            options={
+                'verbose_name': 'Usage Session Cursor',
+                'verbose_name_plural': 'Usage Session Cursors',
+            },
+        ),
+        migrations.CreateModel(
+            name='UsageBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily'), ('month', 'Monthly')], max_length=5)),
+                ('bucket_start', models.DateTimeField()),
+                ('download_bytes', models.BigIntegerField(default=0)),
+                ('upload_bytes', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_buckets', to='customers.customer')),
+            ],
+            options={
+                'verbose_name': 'Usage Bucket',
+                'verbose_name_plural': 'Usage Buckets',
+                'ordering': ['customer', 'granularity', 'bucket_start'],
+                'unique_together': {('customer', 'granularity', 'bucket_start')},
+            },
+        ),
+    ]
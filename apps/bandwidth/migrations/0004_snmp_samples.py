@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-16 20:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0001_initial'),
+        ('bandwidth', '0003_usage_buckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterfaceSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sampled_at', models.DateTimeField()),
+                ('if_index', models.PositiveIntegerField()),
+                ('if_name', models.CharField(blank=True, max_length=100)),
+                ('in_bytes', models.BigIntegerField(default=0)),
+                ('out_bytes', models.BigIntegerField(default=0)),
+                ('in_bps', models.BigIntegerField(default=0)),
+                ('out_bps', models.BigIntegerField(default=0)),
+                ('olt', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='network.oltdevice')),
+                ('router', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='network.router')),
+            ],
+            options={
+                'verbose_name': 'Interface Sample',
+                'verbose_name_plural': 'Interface Samples',
+                'ordering': ['-sampled_at', 'if_index'],
+                'indexes': [models.Index(fields=['router', 'if_index', 'sampled_at'], name='bandwidth_i_router__0f89e8_idx'), models.Index(fields=['olt', 'if_index', 'sampled_at'], name='bandwidth_i_olt_id_6f1fb9_idx'), models.Index(fields=['sampled_at'], name='bandwidth_i_sampled_d843ed_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DeviceSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sampled_at', models.DateTimeField()),
+                ('reachable', models.BooleanField(default=True)),
+                ('uptime_seconds', models.BigIntegerField(blank=True, null=True)),
+                ('cpu_load', models.FloatField(blank=True, null=True)),
+                ('memory_percent', models.FloatField(blank=True, null=True)),
+                ('rx_bps', models.BigIntegerField(blank=True, null=True)),
+                ('tx_bps', models.BigIntegerField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('olt', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='snmp_samples', to='network.oltdevice')),
+                ('router', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='snmp_samples', to='network.router')),
+            ],
+            options={
+                'verbose_name': 'Device Sample',
+                'verbose_name_plural': 'Device Samples',
+                'ordering': ['-sampled_at'],
+                'indexes': [models.Index(fields=['router', 'sampled_at'], name='bandwidth_d_router__ca76dc_idx'), models.Index(fields=['olt', 'sampled_at'], name='bandwidth_d_olt_id_9207a1_idx'), models.Index(fields=['sampled_at'], name='bandwidth_d_sampled_4ffa56_idx')],
+            },
+        ),
+    ]
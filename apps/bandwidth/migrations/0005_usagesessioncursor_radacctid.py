@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bandwidth', '0004_snmp_samples'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usagesessioncursor',
+            name='radacctid',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+    ]
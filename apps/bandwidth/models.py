@@ -173,6 +173,164 @@ class DataUsage(models.Model):
         return 0
 
 
+class UsageBucket(models.Model):
+    """
+    Pre-aggregated customer traffic (from RADIUS accounting) per hour, day
+    and month. Written by UsageStore.ingest_accounting; charts read these
+    rows instead of scanning radacct.
+    """
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+        ('month', 'Monthly'),
+    ]
+    
+    customer = models.ForeignKey(
+        'customers.Customer',
+        on_delete=models.CASCADE,
+        related_name='usage_buckets'
+    )
+    granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    
+    download_bytes = models.BigIntegerField(default=0)
+    upload_bytes = models.BigIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        app_label = 'bandwidth'
+        ordering = ['customer', 'granularity', 'bucket_start']
+        verbose_name = "Usage Bucket"
+        verbose_name_plural = "Usage Buckets"
+        unique_together = ['customer', 'granularity', 'bucket_start']
+    
+    def __str__(self):
+        return f"{self.customer_id} {self.granularity} {self.bucket_start:%Y-%m-%d %H:00}"
+    
+    @property
+    def total_bytes(self):
+        return self.download_bytes + self.upload_bytes
+
+
+class UsageSessionCursor(models.Model):
+    """
+    Last octet counters seen per RADIUS session (radacct.acctuniqueid).
+    radacct holds cumulative counters, so each ingestion adds only the
+    difference to the customer's buckets.
+    """
+    acctuniqueid = models.CharField(max_length=32, unique=True)
+    radacctid = models.BigIntegerField(default=0, db_index=True)
+    customer = models.ForeignKey(
+        'customers.Customer',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    input_octets = models.BigIntegerField(default=0)
+    output_octets = models.BigIntegerField(default=0)
+    last_seen_at = models.DateTimeField(db_index=True)
+    is_closed = models.BooleanField(default=False)
+    
+    class Meta:
+        app_label = 'bandwidth'
+        verbose_name = "Usage Session Cursor"
+        verbose_name_plural = "Usage Session Cursors"
+    
+    def __str__(self):
+        return self.acctuniqueid
+
+
+class DeviceSample(models.Model):
+    """
+    One SNMP poll of a router or OLT (apps.bandwidth.monitoring.snmp_poller).
+    Rates are summed over the device's interfaces and are empty on the first
+    poll, after a reboot, or when the device did not answer.
+    """
+    router = models.ForeignKey(
+        'network.Router',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='snmp_samples'
+    )
+    olt = models.ForeignKey(
+        'network.OLTDevice',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='snmp_samples'
+    )
+    sampled_at = models.DateTimeField()
+
+    reachable = models.BooleanField(default=True)
+    uptime_seconds = models.BigIntegerField(null=True, blank=True)
+    cpu_load = models.FloatField(null=True, blank=True)  # %
+    memory_percent = models.FloatField(null=True, blank=True)
+    rx_bps = models.BigIntegerField(null=True, blank=True)
+    tx_bps = models.BigIntegerField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        app_label = 'bandwidth'
+        ordering = ['-sampled_at']
+        verbose_name = "Device Sample"
+        verbose_name_plural = "Device Samples"
+        indexes = [
+            models.Index(fields=['router', 'sampled_at']),
+            models.Index(fields=['olt', 'sampled_at']),
+            models.Index(fields=['sampled_at']),
+        ]
+
+    def __str__(self):
+        device = f"router {self.router_id}" if self.router_id else f"olt {self.olt_id}"
+        return f"{device} @ {self.sampled_at:%Y-%m-%d %H:%M}"
+
+
+class InterfaceSample(models.Model):
+    """
+    Traffic of one interface between two SNMP polls. Stores the octet deltas
+    (already corrected for counter wrap), not the raw counters.
+    """
+    router = models.ForeignKey(
+        'network.Router',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    olt = models.ForeignKey(
+        'network.OLTDevice',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    sampled_at = models.DateTimeField()
+    if_index = models.PositiveIntegerField()
+    if_name = models.CharField(max_length=100, blank=True)
+
+    in_bytes = models.BigIntegerField(default=0)
+    out_bytes = models.BigIntegerField(default=0)
+    in_bps = models.BigIntegerField(default=0)
+    out_bps = models.BigIntegerField(default=0)
+
+    class Meta:
+        app_label = 'bandwidth'
+        ordering = ['-sampled_at', 'if_index']
+        verbose_name = "Interface Sample"
+        verbose_name_plural = "Interface Samples"
+        indexes = [
+            models.Index(fields=['router', 'if_index', 'sampled_at']),
+            models.Index(fields=['olt', 'if_index', 'sampled_at']),
+            models.Index(fields=['sampled_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.if_name or self.if_index} @ {self.sampled_at:%Y-%m-%d %H:%M}"
+
+
 class BandwidthAlert(models.Model):
     """Alerts for bandwidth usage thresholds"""
     ALERT_TYPES = [
@@ -0,0 +1,309 @@
+"""
+Minimal asyncio SNMPv2c client (GET and GETBULK walks).
+
+The poller only needs read access to a handful of MIB-II / HOST-RESOURCES
+tables, so this speaks just enough SNMPv2c over UDP:
+
+    get(oids)       one GetRequest
+    walk(oid)       GetBulkRequests until the subtree ends
+
+Messages are BER encoded here and need no pysnmp/net-snmp bindings. Each
+client owns one UDP socket. Requests are matched on request-id, so several
+walks can run over the same socket concurrently.
+"""
+import asyncio
+import random
+from typing import Dict, List, Tuple
+
+# PDU tags
+GET_REQUEST = 0xA0
+GET_NEXT_REQUEST = 0xA1
+RESPONSE = 0xA2
+GET_BULK_REQUEST = 0xA5
+
+# Value tags
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_IDENTIFIER = 0x06
+SEQUENCE = 0x30
+IP_ADDRESS = 0x40
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIMETICKS = 0x43
+OPAQUE = 0x44
+COUNTER64 = 0x46
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+
+EXCEPTION_TAGS = (NO_SUCH_OBJECT, NO_SUCH_INSTANCE, END_OF_MIB_VIEW)
+
+OID = Tuple[int, ...]
+
+
+class SNMPError(Exception):
+    """The agent answered with an error or an unparseable message."""
+
+
+class SNMPTimeout(SNMPError):
+    """No response after all retries."""
+
+
+# ────────────────────────────────────────────────────────────────
+# BER
+# ────────────────────────────────────────────────────────────────
+
+def parse_oid(oid) -> OID:
+    if isinstance(oid, tuple):
+        return oid
+    return tuple(int(part) for part in oid.strip('.').split('.'))
+
+
+def format_oid(oid: OID) -> str:
+    return '.'.join(str(part) for part in oid)
+
+
+def _length(n: int) -> bytes:
+    if n < 0x80:
+        return bytes([n])
+    raw = n.to_bytes((n.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(raw)]) + raw
+
+
+def tlv(tag: int, payload: bytes) -> bytes:
+    return bytes([tag]) + _length(len(payload)) + payload
+
+
+def encode_integer(value: int, tag: int = INTEGER) -> bytes:
+    if tag == INTEGER:
+        raw = value.to_bytes(max(1, (value.bit_length() + 8) // 8), 'big', signed=True)
+    else:
+        # Unsigned application types (Counter32/64, Gauge32, TimeTicks)
+        raw = value.to_bytes(max(1, (value.bit_length() + 8) // 8), 'big')
+    return tlv(tag, raw)
+
+
+def encode_oid(oid) -> bytes:
+    parts = parse_oid(oid)
+    body = bytearray([parts[0] * 40 + parts[1]])
+    for part in parts[2:]:
+        chunk = [part & 0x7F]
+        part >>= 7
+        while part:
+            chunk.append(0x80 | (part & 0x7F))
+            part >>= 7
+        body.extend(reversed(chunk))
+    return tlv(OBJECT_IDENTIFIER, bytes(body))
+
+
+def encode_value(tag: int, value) -> bytes:
+    if tag in (NULL,) + EXCEPTION_TAGS:
+        return tlv(tag, b'')
+    if tag == OBJECT_IDENTIFIER:
+        return encode_oid(value)
+    if tag in (OCTET_STRING, IP_ADDRESS, OPAQUE):
+        return tlv(tag, value.encode() if isinstance(value, str) else bytes(value))
+    return encode_integer(value, tag)
+
+
+def decode_tlv(data: bytes, offset: int = 0) -> Tuple[int, bytes, int]:
+    """(tag, value bytes, offset after the element)"""
+    try:
+        tag = data[offset]
+        length = data[offset + 1]
+        offset += 2
+        if length & 0x80:
+            size = length & 0x7F
+            length = int.from_bytes(data[offset:offset + size], 'big')
+            offset += size
+    except IndexError:
+        raise SNMPError("Truncated BER element")
+    end = offset + length
+    if end > len(data):
+        raise SNMPError("Truncated BER element")
+    return tag, data[offset:end], end
+
+
+def decode_sequence(payload: bytes) -> List[Tuple[int, bytes]]:
+    items, offset = [], 0
+    while offset < len(payload):
+        tag, value, offset = decode_tlv(payload, offset)
+        items.append((tag, value))
+    return items
+
+
+def decode_oid(payload: bytes) -> OID:
+    first = payload[0]
+    parts = [first // 40, first % 40] if first < 80 else [2, first - 80]
+    value = 0
+    for byte in payload[1:]:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            parts.append(value)
+            value = 0
+    return tuple(parts)
+
+
+def decode_value(tag: int, payload: bytes):
+    if tag == INTEGER:
+        return int.from_bytes(payload, 'big', signed=True) if payload else 0
+    if tag in (COUNTER32, GAUGE32, TIMETICKS, COUNTER64):
+        return int.from_bytes(payload, 'big') if payload else 0
+    if tag == OCTET_STRING:
+        return payload
+    if tag == OBJECT_IDENTIFIER:
+        return decode_oid(payload)
+    if tag == IP_ADDRESS:
+        return '.'.join(str(b) for b in payload)
+    if tag in (NULL,) + EXCEPTION_TAGS:
+        return None
+    return payload
+
+
+# ────────────────────────────────────────────────────────────────
+# MESSAGES
+# ────────────────────────────────────────────────────────────────
+
+def encode_message(community: str, pdu_type: int, request_id: int,
+                   varbinds: List[Tuple[OID, int, object]], field2: int = 0, field3: int = 0) -> bytes:
+    """
+    SNMPv2c message. ``field2``/``field3`` are error-status/error-index, or
+    non-repeaters/max-repetitions for GetBulk.
+    """
+    bindings = b''.join(
+        tlv(SEQUENCE, encode_oid(oid) + encode_value(tag, value))
+        for oid, tag, value in varbinds
+    )
+    pdu = tlv(pdu_type, (
+        encode_integer(request_id)
+        + encode_integer(field2)
+        + encode_integer(field3)
+        + tlv(SEQUENCE, bindings)
+    ))
+    return tlv(SEQUENCE, encode_integer(1) + tlv(OCTET_STRING, community.encode()) + pdu)
+
+
+def decode_message(data: bytes) -> Dict:
+    """{'community', 'pdu_type', 'request_id', 'field2', 'field3', 'varbinds': [(oid, tag, value)]}"""
+    tag, body, _ = decode_tlv(data)
+    if tag != SEQUENCE:
+        raise SNMPError("Not an SNMP message")
+    (_, version), (_, community), (pdu_type, pdu) = decode_sequence(body)[:3]
+    fields = decode_sequence(pdu)
+    if len(fields) != 4:
+        raise SNMPError("Malformed PDU")
+    varbinds = []
+    for _, binding in decode_sequence(fields[3][1]):
+        (_, oid), (value_tag, value) = decode_sequence(binding)
+        varbinds.append((decode_oid(oid), value_tag, decode_value(value_tag, value)))
+    return {
+        'version': decode_value(INTEGER, version),
+        'community': community.decode(errors='replace'),
+        'pdu_type': pdu_type,
+        'request_id': decode_value(INTEGER, fields[0][1]),
+        'field2': decode_value(INTEGER, fields[1][1]),
+        'field3': decode_value(INTEGER, fields[2][1]),
+        'varbinds': varbinds,
+    }
+
+
+# ────────────────────────────────────────────────────────────────
+# CLIENT
+# ────────────────────────────────────────────────────────────────
+
+class _ClientProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.pending: Dict[int, asyncio.Future] = {}
+
+    def datagram_received(self, data, addr):
+        try:
+            message = decode_message(data)
+        except (SNMPError, ValueError, IndexError):
+            return
+        future = self.pending.pop(message['request_id'], None)
+        if future and not future.done():
+            future.set_result(message)
+
+    def error_received(self, exc):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(SNMPError(str(exc)))
+        self.pending.clear()
+
+
+class SNMPClient:
+    """
+    One device, one UDP socket::
+
+        async with SNMPClient('10.0.0.1', 'public') as client:
+            uptime = await client.get(['1.3.6.1.2.1.1.3.0'])
+            table = await client.walk('1.3.6.1.2.1.31.1.1.1.6')
+    """
+
+    def __init__(self, host: str, community: str = 'public', port: int = 161,
+                 timeout: float = 2.0, retries: int = 1, max_repetitions: int = 25):
+        self.host = host
+        self.community = community
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.max_repetitions = max_repetitions
+        self._transport = None
+        self._protocol = None
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        self._transport, self._protocol = await loop.create_datagram_endpoint(
+            _ClientProtocol, remote_addr=(self.host, self.port)
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._transport:
+            self._transport.close()
+
+    async def _request(self, pdu_type: int, oids: List[OID], field2: int = 0, field3: int = 0) -> List:
+        loop = asyncio.get_running_loop()
+        request_id = random.randint(1, 2 ** 31 - 1)
+        message = encode_message(
+            self.community, pdu_type, request_id, [(oid, NULL, None) for oid in oids], field2, field3
+        )
+
+        for _ in range(self.retries + 1):
+            future = loop.create_future()
+            self._protocol.pending[request_id] = future
+            self._transport.sendto(message)
+            try:
+                response = await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                continue
+            finally:
+                self._protocol.pending.pop(request_id, None)
+            if response['field2']:
+                raise SNMPError(f"{self.host}: error-status {response['field2']} at index {response['field3']}")
+            return response['varbinds']
+
+        raise SNMPTimeout(f"{self.host}: no response after {self.retries + 1} attempts")
+
+    async def get(self, oids: List) -> Dict[str, object]:
+        """{oid: value}; missing objects map to None."""
+        varbinds = await self._request(GET_REQUEST, [parse_oid(oid) for oid in oids])
+        return {format_oid(oid): value for oid, _, value in varbinds}
+
+    async def walk(self, base) -> Dict[OID, object]:
+        """{index suffix: value} for every object under ``base``."""
+        base = parse_oid(base)
+        results: Dict[OID, object] = {}
+        current = base
+        while True:
+            varbinds = await self._request(GET_BULK_REQUEST, [current], 0, self.max_repetitions)
+            if not varbinds:
+                return results
+            for oid, tag, value in varbinds:
+                # Stop at the end of the subtree, the MIB, or a non-increasing agent
+                if tag == END_OF_MIB_VIEW or oid[:len(base)] != base or oid <= current:
+                    return results
+                if tag not in EXCEPTION_TAGS:
+                    results[oid[len(base):]] = value
+                current = oid
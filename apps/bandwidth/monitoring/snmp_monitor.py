@@ -29,29 +29,37 @@ class SNMPMonitor:
         logger.info("Stopping SNMP monitoring service")
     
     async def monitor_device(self, device_ip: str, device_type: str = 'mikrotik') -> Dict[str, Any]:
-        """Monitor a single device using SNMP"""
-        try:
-            # This is a simplified implementation
-            # In production, you would use aiosnmp or pysnmp
-            return {
-                'device_ip': device_ip,
-                'device_type': device_type,
-                'status': 'online',
-                'timestamp': timezone.now(),
-                'cpu_load': 20.5,  # Example value
-                'memory_used': 45.2,  # Example value
-                'uptime': '10 days, 5 hours'
-            }
-                
-        except Exception as e:
-            logger.error(f"Error monitoring device {device_ip}: {e}")
+        """Poll a single device over SNMP (CPU, memory, uptime, interface counters)"""
+        from .snmp_poller import PollTarget, snmp_poller
+        
+        target = PollTarget(
+            schema_name='', kind=device_type, device_id=None, name=device_ip,
+            host=device_ip, community=self.community_string, vendor=device_type,
+        )
+        result = await snmp_poller.poll_one(target)
+        if not result.reachable:
+            logger.error(f"Error monitoring device {device_ip}: {result.error}")
             return {
                 'device_ip': device_ip,
                 'device_type': device_type,
                 'status': 'offline',
-                'error': str(e),
+                'error': result.error,
                 'timestamp': timezone.now()
             }
+        
+        summary = snmp_poller.summary(result, {})
+        uptime = timedelta(seconds=summary['uptime_seconds'] or 0)
+        return {
+            'device_ip': device_ip,
+            'device_type': device_type,
+            'status': 'online',
+            'timestamp': summary['timestamp'],
+            'cpu_load': summary['cpu_load'],
+            'memory_used': summary['memory_percent'],
+            'uptime': f"{uptime.days} days, {uptime.seconds // 3600} hours",
+            'uptime_seconds': summary['uptime_seconds'],
+            'interfaces': summary['interfaces'],
+        }
     
     async def update_data_usage(self, customer_id: int, usage_data: Dict[str, Any]):
         """Update customer data usage records"""
@@ -151,25 +159,50 @@ class BandwidthCollector:
     
     @staticmethod
     def collect_from_mikrotik(device_id: int) -> Dict[str, Any]:
-        """Collect bandwidth data from Mikrotik device"""
-        # This would integrate with Mikrotik API
-        # Placeholder implementation
+        """
+        Poll a router's interface counters over SNMP and record a sample.
+        Rates are relative to the previous poll (fleet poll or this method).
+        """
+        from django.db import connection
+        from apps.network.models import Router
+        from .snmp_poller import snmp_poller
+        
+        router = Router.objects.get(id=device_id)
+        summary = snmp_poller.poll([snmp_poller.router_target(router, connection.schema_name)])[0]
         return {
             'device_id': device_id,
-            'total_tx': 0,
-            'total_rx': 0,
-            'active_users': 0,
-            'timestamp': timezone.now()
+            'total_tx': summary['total_tx'],
+            'total_rx': summary['total_rx'],
+            'rx_bps': summary['rx_bps'],
+            'tx_bps': summary['tx_bps'],
+            'cpu_load': summary['cpu_load'],
+            'memory_percent': summary['memory_percent'],
+            'reachable': summary['reachable'],
+            'error': summary['error'],
+            'interfaces': summary['interfaces'],
+            'active_users': router.active_users,
+            'timestamp': summary['timestamp']
         }
     
     @staticmethod
     def collect_from_olt(olt_id: int) -> Dict[str, Any]:
-        """Collect bandwidth data from OLT"""
-        # This would integrate with OLT SNMP/API
-        # Placeholder implementation
+        """Poll an OLT's port counters over SNMP and record a sample"""
+        from django.db import connection
+        from apps.network.models import OLTDevice
+        from .snmp_poller import snmp_poller
+        
+        olt = OLTDevice.objects.get(id=olt_id)
+        summary = snmp_poller.poll([snmp_poller.olt_target(olt, connection.schema_name)])[0]
         return {
             'olt_id': olt_id,
-            'pon_usage': {},
-            'total_bandwidth': 0,
-            'timestamp': timezone.now()
+            'pon_usage': {
+                row['name']: {'rx_bps': row['rx_bps'], 'tx_bps': row['tx_bps']}
+                for row in summary['interfaces']
+            },
+            'total_bandwidth': (summary['rx_bps'] or 0) + (summary['tx_bps'] or 0),
+            'cpu_load': summary['cpu_load'],
+            'memory_percent': summary['memory_percent'],
+            'reachable': summary['reachable'],
+            'error': summary['error'],
+            'timestamp': summary['timestamp']
         }
@@ -0,0 +1,398 @@
+"""
+Fleet-wide SNMP polling of routers and OLTs.
+
+Each poll reads, per device:
+
+    sysUpTime                           reboot detection, uptime
+    ifName, ifHCIn/OutOctets            64-bit interface counters
+    (ifIn/OutOctets if ifHC* is empty)  32-bit fallback
+    hrProcessorLoad                     CPU % (averaged over cores)
+    hrStorageTable RAM row              memory %
+
+Vendors without HOST-RESOURCES-MIB (many OLTs) can point CPU and memory at
+their own percentage OIDs through SNMP_VENDOR_OIDS.
+
+All devices are polled from one asyncio loop over UDP. SNMP_MAX_CONCURRENCY
+caps the number of devices in flight, and each device has SNMP_DEVICE_TIMEOUT
+seconds in total. A device that is down costs one timeout, not a blocked
+worker. A few hundred devices finish well inside the 60 second beat interval.
+
+Rates come from the difference to the previous poll. The previous counters
+are kept in the cache (one get_many/set_many per run):
+
+- deltas are taken modulo 2**64 (or 2**32), so a wrapped counter is counted
+  correctly
+- a lower sysUpTime means the device rebooted; that poll records no rates
+- deltas implying more than SNMP_MAX_INTERFACE_BPS are dropped as counter
+  resets
+
+Samples (DeviceSample, InterfaceSample) are bulk inserted per tenant.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django_tenants.utils import get_tenant_model, schema_context
+
+from .snmp_client import SNMPClient, SNMPError, format_oid, parse_oid
+
+logger = logging.getLogger(__name__)
+
+SYS_UPTIME = '1.3.6.1.2.1.1.3.0'
+IF_NAME = '1.3.6.1.2.1.31.1.1.1.1'
+IF_HC_IN_OCTETS = '1.3.6.1.2.1.31.1.1.1.6'
+IF_HC_OUT_OCTETS = '1.3.6.1.2.1.31.1.1.1.10'
+IF_IN_OCTETS = '1.3.6.1.2.1.2.2.1.10'
+IF_OUT_OCTETS = '1.3.6.1.2.1.2.2.1.16'
+HR_PROCESSOR_LOAD = '1.3.6.1.2.1.25.3.3.1.2'
+HR_STORAGE_TYPE = '1.3.6.1.2.1.25.2.3.1.2'
+HR_STORAGE_UNITS = '1.3.6.1.2.1.25.2.3.1.4'
+HR_STORAGE_SIZE = '1.3.6.1.2.1.25.2.3.1.5'
+HR_STORAGE_USED = '1.3.6.1.2.1.25.2.3.1.6'
+HR_STORAGE_RAM = parse_oid('1.3.6.1.2.1.25.2.1.2')
+
+
+@dataclass
+class PollTarget:
+    schema_name: str
+    kind: str  # 'router' or 'olt'
+    device_id: Optional[int]  # None for ad-hoc polls (nothing is stored)
+    name: str
+    host: str
+    community: str
+    vendor: str = ''
+
+    @property
+    def key(self) -> str:
+        return f"{self.schema_name}:{self.kind}:{self.device_id}"
+
+
+@dataclass
+class PollResult:
+    target: PollTarget
+    polled_at: float
+    reachable: bool = True
+    uptime_ticks: Optional[int] = None
+    cpu_load: Optional[float] = None
+    memory_percent: Optional[float] = None
+    counter_bits: int = 64
+    counters: Dict[int, Tuple[int, int]] = field(default_factory=dict)  # if_index: (in, out)
+    names: Dict[int, str] = field(default_factory=dict)
+    error: str = ''
+
+
+class SNMPPoller:
+    """Polls devices concurrently and turns counter deltas into rates."""
+
+    STATE_KEY = 'snmp_counters:{key}'
+    STATE_TTL = 900  # older counters are not used for rates
+    LOCK_KEY = 'snmp_poll_fleet:lock'
+
+    def __init__(self):
+        self.community = getattr(settings, 'SNMP_COMMUNITY', 'public')
+        self.port = getattr(settings, 'SNMP_PORT', 161)
+        self.request_timeout = getattr(settings, 'SNMP_REQUEST_TIMEOUT', 2.0)
+        self.retries = getattr(settings, 'SNMP_RETRIES', 1)
+        self.device_timeout = getattr(settings, 'SNMP_DEVICE_TIMEOUT', 10.0)
+        self.max_concurrency = getattr(settings, 'SNMP_MAX_CONCURRENCY', 200)
+        self.max_bps = getattr(settings, 'SNMP_MAX_INTERFACE_BPS', 400_000_000_000)
+        self.vendor_oids = getattr(settings, 'SNMP_VENDOR_OIDS', {})
+        self.retention = timedelta(days=getattr(settings, 'SNMP_SAMPLE_RETENTION_DAYS', 30))
+
+    # ────────────────────────────────────────────────────────────────
+    # TARGETS
+    # ────────────────────────────────────────────────────────────────
+
+    def router_target(self, router, schema_name: str) -> PollTarget:
+        return PollTarget(
+            schema_name=schema_name, kind='router', device_id=router.id, name=router.name,
+            # Routers behind the VPN are only reachable on their tunnel address
+            host=router.vpn_ip_address or router.ip_address,
+            community=self.community, vendor=router.router_type,
+        )
+
+    def olt_target(self, olt, schema_name: str) -> PollTarget:
+        return PollTarget(
+            schema_name=schema_name, kind='olt', device_id=olt.id, name=olt.name,
+            host=olt.ip_address, community=olt.community_string or self.community, vendor=olt.vendor,
+        )
+
+    def tenant_targets(self, schema_name: str) -> List[PollTarget]:
+        """Pollable devices of the current tenant."""
+        from apps.network.models import OLTDevice, Router
+
+        routers = (
+            Router.objects.filter(is_active=True)
+            .exclude(status='maintenance')
+            .only('id', 'name', 'ip_address', 'vpn_ip_address', 'router_type')
+        )
+        olts = (
+            OLTDevice.objects.filter(status__in=['ACTIVE', 'OFFLINE'])
+            .only('id', 'name', 'ip_address', 'community_string', 'vendor')
+        )
+        targets = [self.router_target(router, schema_name) for router in routers]
+        targets += [self.olt_target(olt, schema_name) for olt in olts]
+        return [target for target in targets if target.host]
+
+    def fleet(self) -> List[PollTarget]:
+        targets = []
+        for tenant in get_tenant_model().objects.exclude(schema_name='public'):
+            with schema_context(tenant.schema_name):
+                targets.extend(self.tenant_targets(tenant.schema_name))
+        return targets
+
+    # ────────────────────────────────────────────────────────────────
+    # POLLING (asyncio)
+    # ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _average(values) -> Optional[float]:
+        values = [v for v in values if isinstance(v, int)]
+        return round(sum(values) / len(values), 1) if values else None
+
+    async def _memory(self, client: SNMPClient) -> Optional[float]:
+        types = await client.walk(HR_STORAGE_TYPE)
+        rows = [index for index, storage_type in types.items() if storage_type == HR_STORAGE_RAM]
+        if not rows:
+            return None
+        row = format_oid(rows[0])
+        values = await client.get([f"{oid}.{row}" for oid in (HR_STORAGE_SIZE, HR_STORAGE_USED)])
+        size, used = values.get(f"{HR_STORAGE_SIZE}.{row}"), values.get(f"{HR_STORAGE_USED}.{row}")
+        if not isinstance(size, int) or not isinstance(used, int) or size <= 0:
+            return None
+        return round(used / size * 100, 1)
+
+    async def _resources(self, client: SNMPClient, target: PollTarget) -> Tuple[Optional[float], Optional[float]]:
+        vendor = self.vendor_oids.get(target.vendor) or self.vendor_oids.get(target.vendor.upper())
+        if vendor:
+            cpu, memory = await asyncio.gather(
+                client.walk(vendor['cpu']) if vendor.get('cpu') else asyncio.sleep(0, {}),
+                client.walk(vendor['memory']) if vendor.get('memory') else asyncio.sleep(0, {}),
+            )
+            return self._average(cpu.values()), self._average(memory.values())
+        cpu, memory = await asyncio.gather(client.walk(HR_PROCESSOR_LOAD), self._memory(client))
+        return self._average(cpu.values()), memory
+
+    async def _collect(self, target: PollTarget, result: PollResult) -> PollResult:
+        async with SNMPClient(target.host, target.community, self.port,
+                              self.request_timeout, self.retries) as client:
+            names, rx, tx, (cpu, memory) = await asyncio.gather(
+                client.walk(IF_NAME), client.walk(IF_HC_IN_OCTETS), client.walk(IF_HC_OUT_OCTETS),
+                self._resources(client, target),
+            )
+            if not rx:
+                rx, tx = await asyncio.gather(client.walk(IF_IN_OCTETS), client.walk(IF_OUT_OCTETS))
+                result.counter_bits = 32
+            # Timestamp the counters right after reading them, on both clocks
+            result.polled_at = time.time()
+            uptime = (await client.get([SYS_UPTIME])).get(SYS_UPTIME)
+
+        result.uptime_ticks = uptime if isinstance(uptime, int) else None
+        result.cpu_load, result.memory_percent = cpu, memory
+        result.names = {index[-1]: name.decode(errors='replace') for index, name in names.items()
+                        if isinstance(name, bytes)}
+        result.counters = {index[-1]: (rx[index], tx[index]) for index in rx if index in tx}
+        return result
+
+    async def poll_one(self, target: PollTarget) -> PollResult:
+        """Poll one device; never raises, failures come back as unreachable."""
+        result = PollResult(target=target, polled_at=time.time())
+        try:
+            return await asyncio.wait_for(self._collect(target, result), self.device_timeout)
+        except asyncio.TimeoutError:
+            error = f"no answer within {self.device_timeout}s"
+        except (SNMPError, OSError) as e:
+            error = str(e)
+        return PollResult(target=target, polled_at=result.polled_at, reachable=False, error=error[:255])
+
+    async def poll_many(self, targets: List[PollTarget]) -> List[PollResult]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(target):
+            async with semaphore:
+                return await self.poll_one(target)
+
+        return await asyncio.gather(*(bounded(target) for target in targets))
+
+    # ────────────────────────────────────────────────────────────────
+    # RATES
+    # ────────────────────────────────────────────────────────────────
+
+    def rates(self, result: PollResult, previous: Optional[Dict]) -> Dict[int, Tuple[int, int, int, int]]:
+        """{if_index: (in_bytes, out_bytes, in_bps, out_bps)} since ``previous``."""
+        if not previous or previous['bits'] != result.counter_bits:
+            return {}
+        if result.uptime_ticks is not None and previous['uptime'] is not None \
+                and result.uptime_ticks < previous['uptime']:
+            return {}  # rebooted: the counters started again from zero
+        elapsed = result.polled_at - previous['at']
+        if result.uptime_ticks is not None and previous['uptime'] is not None:
+            # The agent's clock, read with the counters, is not skewed by queueing
+            elapsed = (result.uptime_ticks - previous['uptime']) / 100
+        if elapsed <= 0 or elapsed > self.STATE_TTL:
+            return {}
+
+        modulus = 2 ** result.counter_bits
+        rates = {}
+        for index, (rx, tx) in result.counters.items():
+            if index not in previous['counters']:
+                continue
+            prev_rx, prev_tx = previous['counters'][index]
+            rx_bytes, tx_bytes = (rx - prev_rx) % modulus, (tx - prev_tx) % modulus
+            rx_bps, tx_bps = int(rx_bytes * 8 / elapsed), int(tx_bytes * 8 / elapsed)
+            if max(rx_bps, tx_bps) > self.max_bps:
+                continue  # counter reset without a reboot (interface re-created, agent restart)
+            rates[index] = (rx_bytes, tx_bytes, rx_bps, tx_bps)
+        return rates
+
+    @staticmethod
+    def summary(result: PollResult, rates: Dict) -> Dict:
+        interfaces = [
+            {
+                'if_index': index,
+                'name': result.names.get(index, str(index)),
+                'rx_bytes': rx,
+                'tx_bytes': tx,
+                'rx_bps': rates[index][2] if index in rates else None,
+                'tx_bps': rates[index][3] if index in rates else None,
+            }
+            for index, (rx, tx) in sorted(result.counters.items())
+        ]
+        return {
+            'kind': result.target.kind,
+            'device_id': result.target.device_id,
+            'name': result.target.name,
+            'host': result.target.host,
+            'reachable': result.reachable,
+            'error': result.error,
+            'timestamp': datetime.fromtimestamp(result.polled_at, tz=dt_timezone.utc),
+            'uptime_seconds': result.uptime_ticks // 100 if result.uptime_ticks is not None else None,
+            'cpu_load': result.cpu_load,
+            'memory_percent': result.memory_percent,
+            'counter_bits': result.counter_bits,
+            'total_rx': sum(rx for rx, _ in result.counters.values()),
+            'total_tx': sum(tx for _, tx in result.counters.values()),
+            'rx_bps': sum(rate[2] for rate in rates.values()) if rates else None,
+            'tx_bps': sum(rate[3] for rate in rates.values()) if rates else None,
+            'interfaces': interfaces,
+        }
+
+    # ────────────────────────────────────────────────────────────────
+    # RECORDING
+    # ────────────────────────────────────────────────────────────────
+
+    def _samples(self, summary: Dict, rates: Dict):
+        from apps.bandwidth.models import DeviceSample, InterfaceSample
+
+        owner = {'router_id': summary['device_id']} if summary['kind'] == 'router' else {'olt_id': summary['device_id']}
+        device = DeviceSample(
+            sampled_at=summary['timestamp'], reachable=summary['reachable'],
+            uptime_seconds=summary['uptime_seconds'], cpu_load=summary['cpu_load'],
+            memory_percent=summary['memory_percent'], rx_bps=summary['rx_bps'], tx_bps=summary['tx_bps'],
+            error=summary['error'], **owner,
+        )
+        interfaces = [
+            InterfaceSample(
+                sampled_at=summary['timestamp'], if_index=row['if_index'], if_name=row['name'][:100],
+                in_bytes=rates[row['if_index']][0], out_bytes=rates[row['if_index']][1],
+                in_bps=row['rx_bps'], out_bps=row['tx_bps'], **owner,
+            )
+            for row in summary['interfaces'] if row['if_index'] in rates
+        ]
+        return device, interfaces
+
+    def record(self, results: List[PollResult], save: bool = True) -> List[Dict]:
+        """Compute rates against the previous poll, store samples, return summaries."""
+        from apps.bandwidth.models import DeviceSample, InterfaceSample
+
+        keys = {
+            id(result): self.STATE_KEY.format(key=result.target.key)
+            for result in results if result.target.device_id is not None
+        }
+        try:
+            previous = cache.get_many(list(keys.values()))
+        except Exception as e:
+            logger.warning(f"[SNMP] Counter state unavailable, no rates this poll: {e}")
+            previous = {}
+
+        state, summaries = {}, []
+        samples = defaultdict(lambda: ([], []))
+        for result in results:
+            key = keys.get(id(result))
+            rates = self.rates(result, previous.get(key)) if key and result.reachable else {}
+            summary = self.summary(result, rates)
+            summaries.append(summary)
+            if key is None:
+                continue
+            if result.reachable:
+                state[key] = {
+                    'at': result.polled_at, 'uptime': result.uptime_ticks,
+                    'bits': result.counter_bits, 'counters': result.counters,
+                }
+            if save:
+                device, interfaces = self._samples(summary, rates)
+                samples[result.target.schema_name][0].append(device)
+                samples[result.target.schema_name][1].extend(interfaces)
+
+        try:
+            cache.set_many(state, self.STATE_TTL)
+        except Exception as e:
+            logger.warning(f"[SNMP] Could not store counter state: {e}")
+
+        for schema_name, (devices, interfaces) in samples.items():
+            with schema_context(schema_name):
+                DeviceSample.objects.bulk_create(devices, batch_size=500)
+                InterfaceSample.objects.bulk_create(interfaces, batch_size=1000)
+        return summaries
+
+    # ────────────────────────────────────────────────────────────────
+    # PUBLIC API
+    # ────────────────────────────────────────────────────────────────
+
+    def poll(self, targets: List[PollTarget], save: bool = True) -> List[Dict]:
+        """Poll ``targets`` and record the results (blocking; call outside an event loop)."""
+        if not targets:
+            return []
+        return self.record(asyncio.run(self.poll_many(targets)), save)
+
+    def poll_fleet(self) -> Dict:
+        """Poll every router and OLT of every tenant once."""
+        if not cache.add(self.LOCK_KEY, 1, 55):
+            return {'skipped': 'previous poll still running'}
+        try:
+            started = time.monotonic()
+            targets = self.fleet()
+            summaries = self.poll(targets)
+            reachable = sum(1 for summary in summaries if summary['reachable'])
+            stats = {
+                'devices': len(summaries),
+                'reachable': reachable,
+                'unreachable': len(summaries) - reachable,
+                'interfaces': sum(len(summary['interfaces']) for summary in summaries),
+                'seconds': round(time.monotonic() - started, 1),
+            }
+            logger.info(f"[SNMP] Fleet poll: {stats}")
+            return stats
+        finally:
+            cache.delete(self.LOCK_KEY)
+
+    def prune(self, now: Optional[datetime] = None) -> Dict:
+        """Drop samples older than SNMP_SAMPLE_RETENTION_DAYS (current tenant)."""
+        from apps.bandwidth.models import DeviceSample, InterfaceSample
+
+        cutoff = (now or timezone.now()) - self.retention
+        interfaces, _ = InterfaceSample.objects.filter(sampled_at__lt=cutoff).delete()
+        devices, _ = DeviceSample.objects.filter(sampled_at__lt=cutoff).delete()
+        return {'device_samples': devices, 'interface_samples': interfaces}
+
+
+# Singleton instance
+snmp_poller = SNMPPoller()
@@ -0,0 +1,174 @@
+"""
+Local SNMPv2c agent simulating a router or OLT, for development and tests.
+
+It answers Get, GetNext and GetBulk for:
+- sysUpTime
+- ifName, plus 64- and 32-bit octet counters (ifHCIn/OutOctets and
+  ifIn/OutOctets) that grow at a fixed rate per interface
+- hrProcessorLoad
+- a RAM row in hrStorageTable
+
+Counters can start close to their wrap point to exercise wrap handling::
+
+    python -m apps.bandwidth.monitoring.snmp_simulator --port 1161 --interfaces 8
+
+Point devices at 127.0.0.1 and set SNMP_PORT=1161 to poll it. In tests, run
+``SNMPSimulator(...).start()`` inside the event loop and poll its ``port``.
+"""
+import argparse
+import asyncio
+import bisect
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .snmp_client import (
+    COUNTER32, COUNTER64, END_OF_MIB_VIEW, GET_BULK_REQUEST, GET_NEXT_REQUEST,
+    GET_REQUEST, INTEGER, NO_SUCH_OBJECT, OBJECT_IDENTIFIER, OCTET_STRING, RESPONSE, TIMETICKS,
+    OID, SNMPError, decode_message, encode_message, parse_oid,
+)
+
+HR_STORAGE_RAM = '1.3.6.1.2.1.25.2.1.2'
+
+
+class _AgentProtocol(asyncio.DatagramProtocol):
+    def __init__(self, simulator: 'SNMPSimulator'):
+        self.simulator = simulator
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        response = self.simulator.handle(data)
+        if response is not None:
+            self.transport.sendto(response, addr)
+
+
+class SNMPSimulator:
+    """In-process SNMP agent with synthetic, steadily increasing counters."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, community: str = 'public',
+                 interfaces: int = 4, rate_bps: int = 50_000_000, cpu_load: int = 17,
+                 memory_total_kb: int = 262_144, memory_used_kb: int = 98_304,
+                 counter_start: int = 0, counter32_start: int = 0, drop: bool = False):
+        self.host = host
+        self.port = port
+        self.community = community
+        self.drop = drop  # simulate an unreachable device
+        self.started = time.monotonic()
+        self.transport = None
+
+        octets_per_second = rate_bps // 8
+        table: Dict[OID, Tuple[int, Callable[[], object]]] = {
+            parse_oid('1.3.6.1.2.1.1.3.0'): (TIMETICKS, lambda: self.elapsed_ticks()),
+            parse_oid('1.3.6.1.2.1.25.3.3.1.2.1'): (INTEGER, lambda: cpu_load),
+            parse_oid('1.3.6.1.2.1.25.2.3.1.2.65536'): (OBJECT_IDENTIFIER, lambda: parse_oid(HR_STORAGE_RAM)),
+            parse_oid('1.3.6.1.2.1.25.2.3.1.4.65536'): (INTEGER, lambda: 1024),
+            parse_oid('1.3.6.1.2.1.25.2.3.1.5.65536'): (INTEGER, lambda: memory_total_kb),
+            parse_oid('1.3.6.1.2.1.25.2.3.1.6.65536'): (INTEGER, lambda: memory_used_kb),
+        }
+        for index in range(1, interfaces + 1):
+            rx, tx = octets_per_second * index, octets_per_second * index // 2
+            table[parse_oid(f'1.3.6.1.2.1.31.1.1.1.1.{index}')] = (OCTET_STRING, lambda i=index: f'ether{i}')
+            table[parse_oid(f'1.3.6.1.2.1.31.1.1.1.6.{index}')] = (COUNTER64, self._counter(counter_start, rx, 64))
+            table[parse_oid(f'1.3.6.1.2.1.31.1.1.1.10.{index}')] = (COUNTER64, self._counter(counter_start, tx, 64))
+            table[parse_oid(f'1.3.6.1.2.1.2.2.1.10.{index}')] = (COUNTER32, self._counter(counter32_start, rx, 32))
+            table[parse_oid(f'1.3.6.1.2.1.2.2.1.16.{index}')] = (COUNTER32, self._counter(counter32_start, tx, 32))
+
+        self.table = table
+        self.oids: List[OID] = sorted(table)
+
+    def elapsed_ticks(self) -> int:
+        return int((time.monotonic() - self.started) * 100)
+
+    def _counter(self, start: int, per_second: int, bits: int) -> Callable[[], int]:
+        return lambda: int(start + per_second * (time.monotonic() - self.started)) % (2 ** bits)
+
+    # ────────────────────────────────────────────────────────────────
+    # REQUEST HANDLING
+    # ────────────────────────────────────────────────────────────────
+
+    def _value(self, oid: OID):
+        tag, produce = self.table[oid]
+        return oid, tag, produce()
+
+    def _next(self, oid: OID) -> Tuple:
+        position = bisect.bisect_right(self.oids, oid)
+        if position >= len(self.oids):
+            return oid, END_OF_MIB_VIEW, None
+        return self._value(self.oids[position])
+
+    def handle(self, data: bytes) -> Optional[bytes]:
+        if self.drop:
+            return None
+        try:
+            request = decode_message(data)
+        except (SNMPError, ValueError, IndexError):
+            return None
+        if request['community'] != self.community:
+            return None  # agents silently ignore unknown communities
+
+        oids = [oid for oid, _, _ in request['varbinds']]
+        if request['pdu_type'] == GET_REQUEST:
+            varbinds = [self._value(oid) if oid in self.table else (oid, NO_SUCH_OBJECT, None) for oid in oids]
+        elif request['pdu_type'] == GET_NEXT_REQUEST:
+            varbinds = [self._next(oid) for oid in oids]
+        elif request['pdu_type'] == GET_BULK_REQUEST:
+            non_repeaters, repetitions = request['field2'], max(request['field3'], 1)
+            varbinds = [self._next(oid) for oid in oids[:non_repeaters]]
+            for oid in oids[non_repeaters:]:
+                for _ in range(repetitions):
+                    oid, tag, value = self._next(oid)
+                    varbinds.append((oid, tag, value))
+                    if tag == END_OF_MIB_VIEW:
+                        break
+        else:
+            return None
+
+        return encode_message(self.community, RESPONSE, request['request_id'], varbinds)
+
+    # ────────────────────────────────────────────────────────────────
+    # LIFECYCLE
+    # ────────────────────────────────────────────────────────────────
+
+    async def start(self) -> 'SNMPSimulator':
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: _AgentProtocol(self), local_addr=(self.host, self.port)
+        )
+        self.port = self.transport.get_extra_info('sockname')[1]
+        return self
+
+    def stop(self):
+        if self.transport:
+            self.transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulated SNMPv2c router/OLT agent')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1161)
+    parser.add_argument('--community', default='public')
+    parser.add_argument('--interfaces', type=int, default=4)
+    parser.add_argument('--rate-bps', type=int, default=50_000_000)
+    parser.add_argument('--counter-start', type=int, default=0,
+                        help='Initial 64-bit counter value (e.g. 18446744073709000000 to test wrap)')
+    parser.add_argument('--counter32-start', type=int, default=0)
+    args = parser.parse_args()
+
+    async def serve():
+        simulator = await SNMPSimulator(
+            host=args.host, port=args.port, community=args.community, interfaces=args.interfaces,
+            rate_bps=args.rate_bps, counter_start=args.counter_start, counter32_start=args.counter32_start,
+        ).start()
+        print(f"SNMP simulator listening on {args.host}:{simulator.port} (community '{args.community}')")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 import logging
 import json
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 from django.utils import timezone
 from django.conf import settings
 from django.db import transaction
@@ -48,21 +48,22 @@ class UsageCollector:
             return False
     
     def aggregate_hourly_usage(self) -> Dict[str, int]:
-        """Aggregate hourly usage data and update database"""
+        """Fold new RADIUS accounting traffic into the hourly/daily/monthly usage buckets"""
+        from .usage_store import usage_store
+        
         try:
             now = timezone.now()
             hour_start = now.replace(minute=0, second=0, microsecond=0)
             
-            # In production, this would query a real data store
-            hourly_aggregates = {}
+            result = usage_store.ingest_accounting()
             
-            logger.info(f"Aggregated hourly usage for {hour_start}")
+            logger.info(f"Aggregated hourly usage for {hour_start}: {result}")
             
             return {
                 'hour': hour_start.isoformat(),
-                'devices_processed': 0,
-                'total_download_bytes': 0,
-                'total_upload_bytes': 0
+                'sessions_processed': result['sessions'],
+                'total_bytes': result['bytes'],
+                'unattributed_bytes': result['unattributed'],
             }
             
         except Exception as e:
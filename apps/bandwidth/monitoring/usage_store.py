@@ -0,0 +1,299 @@
+"""
+Customer usage time series built from RADIUS accounting.
+
+FreeRADIUS writes accounting for every tenant to ``public.radacct`` (one
+row per session, tagged with ``tenant_schema``) and overwrites the
+cumulative octet counters on every Interim-Update. ``ingest_accounting``
+reads the current tenant's sessions that were still open at the last run
+(by acctuniqueid, so a Stop the NAS delivers late is still seen) and the
+sessions inserted since, above the highest radacctid it has seen. It
+subtracts the counters seen last time (UsageSessionCursor, stored in the
+tenant schema) and adds the difference to the customer's hour, day and
+month UsageBuckets with one upsert per chunk:
+
+    INSERT ... ON CONFLICT (customer, granularity, bucket_start)
+    DO UPDATE SET download_bytes = download_bytes + EXCLUDED.download_bytes
+
+The daily and monthly rollups are therefore always current, and charts read
+at most a few hundred pre-aggregated rows. Day and month boundaries follow
+TIME_ZONE. Hourly buckets are pruned after USAGE_HOURLY_RETENTION_DAYS.
+
+Direction follows the NAS: acctinputoctets is what the subscriber sent
+(upload) and acctoutputoctets what they received (download).
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class UsageStore:
+    """Ingests radacct deltas into UsageBucket and serves chart series."""
+
+    def __init__(self):
+        self.chunk_size = getattr(settings, 'USAGE_INGEST_CHUNK', 2000)
+        self.lookback = timedelta(hours=getattr(settings, 'USAGE_INGEST_LOOKBACK_HOURS', 24))
+        self.hourly_retention = timedelta(days=getattr(settings, 'USAGE_HOURLY_RETENTION_DAYS', 90))
+
+    # ────────────────────────────────────────────────────────────────
+    # BUCKETS
+    # ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def bucket_starts(moment: datetime) -> Dict[str, datetime]:
+        """Start of the hour, day and month containing ``moment`` (local time)."""
+        local = timezone.localtime(moment)
+        hour = local.replace(minute=0, second=0, microsecond=0)
+        day = hour.replace(hour=0)
+        return {'hour': hour, 'day': day, 'month': day.replace(day=1)}
+
+    @staticmethod
+    def _upsert(deltas: Dict):
+        """Add {(customer_id, granularity, bucket_start): [down, up]} to the buckets."""
+        from apps.bandwidth.models import UsageBucket
+
+        if not deltas:
+            return
+        table = connection.ops.quote_name(UsageBucket._meta.db_table)
+        now = timezone.now()
+        rows, params = [], []
+        for (customer_id, granularity, bucket_start), (down, up) in deltas.items():
+            rows.append('(%s, %s, %s, %s, %s, %s)')
+            params.extend([customer_id, granularity, bucket_start, down, up, now])
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} "
+                f"(customer_id, granularity, bucket_start, download_bytes, upload_bytes, updated_at) "
+                f"VALUES {', '.join(rows)} "
+                f"ON CONFLICT (customer_id, granularity, bucket_start) DO UPDATE SET "
+                f"download_bytes = {table}.download_bytes + EXCLUDED.download_bytes, "
+                f"upload_bytes = {table}.upload_bytes + EXCLUDED.upload_bytes, "
+                f"updated_at = EXCLUDED.updated_at",
+                params
+            )
+
+    # ────────────────────────────────────────────────────────────────
+    # INGESTION
+    # ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _high_water_mark() -> int:
+        """Highest radacctid ingested for this tenant (0 before the first run)."""
+        from apps.bandwidth.models import UsageSessionCursor
+
+        return UsageSessionCursor.objects.aggregate(last=Max('radacctid'))['last'] or 0
+
+    def _ingest_chunk(self, sessions: List[Dict], since: Optional[datetime], now: datetime) -> Dict:
+        from apps.bandwidth.models import UsageSessionCursor
+        from apps.radius.models import CustomerRadiusCredentials
+
+        cursors = UsageSessionCursor.objects.in_bulk(
+            [s['acctuniqueid'] for s in sessions], field_name='acctuniqueid'
+        )
+        customers_by_username = dict(
+            CustomerRadiusCredentials.objects.filter(username__in={s['username'] for s in sessions})
+            .values_list('username', 'customer_id')
+        )
+
+        deltas = defaultdict(lambda: [0, 0])
+        updated = []
+        stats = {'sessions': 0, 'bytes': 0, 'unattributed': 0}
+
+        for session in sessions:
+            customer_id = customers_by_username.get(session['username'])
+            seen_at = session['acctstoptime'] or session['acctupdatetime'] or session['acctstarttime'] or now
+            current_in = session['acctinputoctets'] or 0
+            current_out = session['acctoutputoctets'] or 0
+            cursor = cursors.get(session['acctuniqueid'])
+
+            if cursor is None:
+                # On the first run, sessions older than the lookback only get a baseline
+                started = session['acctstarttime']
+                baseline = bool(since and started and started < since)
+                delta_in = 0 if baseline else current_in
+                delta_out = 0 if baseline else current_out
+            else:
+                if (cursor.input_octets, cursor.output_octets) == (current_in, current_out) \
+                        and cursor.is_closed == bool(session['acctstoptime']):
+                    continue
+                # A counter that went backwards was reset by the NAS
+                delta_in = current_in - cursor.input_octets if current_in >= cursor.input_octets else current_in
+                delta_out = current_out - cursor.output_octets if current_out >= cursor.output_octets else current_out
+
+            updated.append(UsageSessionCursor(
+                acctuniqueid=session['acctuniqueid'],
+                radacctid=session['radacctid'],
+                customer_id=customer_id,
+                input_octets=current_in,
+                output_octets=current_out,
+                last_seen_at=seen_at,
+                is_closed=bool(session['acctstoptime']),
+            ))
+
+            if not (delta_in or delta_out):
+                continue
+            if not customer_id:
+                stats['unattributed'] += delta_in + delta_out
+                continue
+            for granularity, bucket_start in self.bucket_starts(seen_at).items():
+                bucket = deltas[(customer_id, granularity, bucket_start)]
+                bucket[0] += delta_out
+                bucket[1] += delta_in
+            stats['sessions'] += 1
+            stats['bytes'] += delta_in + delta_out
+
+        with transaction.atomic():
+            self._upsert(deltas)
+            UsageSessionCursor.objects.bulk_create(
+                updated,
+                update_conflicts=True,
+                unique_fields=['acctuniqueid'],
+                update_fields=['radacctid', 'customer', 'input_octets', 'output_octets',
+                               'last_seen_at', 'is_closed'],
+            )
+        return stats
+
+    SESSION_COLUMNS = (
+        "radacctid, acctuniqueid, username, acctinputoctets, acctoutputoctets, "
+        "acctstarttime, acctupdatetime, acctstoptime"
+    )
+
+    def _fetch(self, sql: str, params: List) -> List[Dict]:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {self.SESSION_COLUMNS} FROM public.radacct WHERE {sql}", params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def _sessions(self, schema_name: str, last_id: int, since: Optional[datetime] = None) -> List[Dict]:
+        """Next chunk of the tenant's sessions above ``last_id`` from the shared radacct."""
+        if since is None:
+            # idx_radacct_tenant_id in scripts/create_public_radius_tables.sql
+            return self._fetch(
+                "tenant_schema = %s AND radacctid > %s ORDER BY radacctid LIMIT %s",
+                [schema_name, last_id, self.chunk_size]
+            )
+        # First run: open sessions and those stopped within the lookback. Each
+        # side of the OR has its own index (idx_radacct_tenant_open,
+        # idx_radacct_tenant_stop)
+        return self._fetch(
+            "tenant_schema = %s AND radacctid > %s "
+            "AND (acctstoptime IS NULL OR acctstoptime >= %s) "
+            "ORDER BY radacctid LIMIT %s",
+            [schema_name, last_id, since, self.chunk_size]
+        )
+
+    def _open_sessions(self, schema_name: str, acctuniqueids: List[str]) -> List[Dict]:
+        """Current radacct rows of sessions that were open at the last run."""
+        return self._fetch(
+            "tenant_schema = %s AND acctuniqueid = ANY(%s)", [schema_name, acctuniqueids]
+        )
+
+    def _refresh_open(self, schema_name: str, now: datetime, totals: Dict):
+        """
+        Ingest interim updates and Stops of sessions still open at the last run,
+        however late the NAS delivered them.
+        """
+        from apps.bandwidth.models import UsageSessionCursor
+
+        open_ids = list(
+            UsageSessionCursor.objects.filter(is_closed=False)
+            .order_by('acctuniqueid').values_list('acctuniqueid', flat=True)
+        )
+        vanished = []
+        for i in range(0, len(open_ids), self.chunk_size):
+            chunk_ids = open_ids[i:i + self.chunk_size]
+            sessions = self._open_sessions(schema_name, chunk_ids)
+            found = {session['acctuniqueid'] for session in sessions}
+            vanished.extend(uid for uid in chunk_ids if uid not in found)
+            if sessions:
+                for key, value in self._ingest_chunk(sessions, None, now).items():
+                    totals[key] += value
+
+        if vanished:
+            # radacct rows deleted by housekeeping: nothing more will arrive
+            UsageSessionCursor.objects.filter(acctuniqueid__in=vanished).update(is_closed=True)
+
+    def ingest_accounting(self) -> Dict:
+        """Add new radacct traffic to the current tenant's usage buckets."""
+        schema_name = connection.schema_name
+        now = timezone.now()
+        last_id = self._high_water_mark()
+        # Before the first run there is no high-water mark; start from the lookback
+        since = None if last_id else now - self.lookback
+
+        totals = {'since_id': last_id, 'sessions': 0, 'bytes': 0, 'unattributed': 0}
+        if last_id:
+            self._refresh_open(schema_name, now, totals)
+
+        while True:
+            chunk = self._sessions(schema_name, last_id, since)
+            if not chunk:
+                break
+            last_id = chunk[-1]['radacctid']
+            for key, value in self._ingest_chunk(chunk, since, now).items():
+                totals[key] += value
+
+        self.prune(now)
+        return totals
+
+    def prune(self, now: Optional[datetime] = None):
+        """Drop expired hourly buckets and cursors of long-closed sessions."""
+        from apps.bandwidth.models import UsageBucket, UsageSessionCursor
+
+        now = now or timezone.now()
+        UsageBucket.objects.filter(granularity='hour', bucket_start__lt=now - self.hourly_retention).delete()
+        # The newest cursor carries the high-water mark and is kept
+        UsageSessionCursor.objects.filter(
+            is_closed=True, last_seen_at__lt=now - self.lookback
+        ).exclude(radacctid=self._high_water_mark()).delete()
+
+    # ────────────────────────────────────────────────────────────────
+    # QUERIES
+    # ────────────────────────────────────────────────────────────────
+
+    def series(self, customer, granularity: str, start: datetime, end: Optional[datetime] = None) -> List[Dict]:
+        """Buckets of one granularity for a customer, oldest first."""
+        from apps.bandwidth.models import UsageBucket
+
+        buckets = UsageBucket.objects.filter(
+            customer=customer,
+            granularity=granularity,
+            bucket_start__gte=self.bucket_starts(start)[granularity],
+        )
+        if end is not None:
+            buckets = buckets.filter(bucket_start__lte=end)
+        return list(
+            buckets.order_by('bucket_start').values('bucket_start', 'download_bytes', 'upload_bytes')
+        )
+
+    def totals(self, customer, granularity: str, start: datetime) -> Dict:
+        """Summed traffic and the busiest bucket since ``start``."""
+        from apps.bandwidth.models import UsageBucket
+
+        buckets = UsageBucket.objects.filter(
+            customer=customer,
+            granularity=granularity,
+            bucket_start__gte=self.bucket_starts(start)[granularity],
+        )
+        result = buckets.aggregate(
+            download=Sum('download_bytes'),
+            upload=Sum('upload_bytes'),
+            peak=Max(F('download_bytes') + F('upload_bytes')),
+        )
+        return {
+            'download_bytes': result['download'] or 0,
+            'upload_bytes': result['upload'] or 0,
+            'peak_bucket_bytes': result['peak'] or 0,
+        }
+
+
+# Singleton instance
+usage_store = UsageStore()
@@ -0,0 +1,236 @@
+import asyncio
+from datetime import timedelta
+from unittest import mock
+
+from django.db.models import Sum
+from django.db.models.signals import post_save
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+
+from apps.core.models import Company, User
+from apps.customers.models import Customer
+from apps.radius.models import CustomerRadiusCredentials
+from apps.radius.signals_auto_sync import sync_customer_status_to_radius
+
+from .models import UsageBucket, UsageSessionCursor
+from .monitoring.snmp_client import parse_oid
+from .monitoring.snmp_poller import (
+    IF_HC_IN_OCTETS, IF_HC_OUT_OCTETS, PollResult, PollTarget, SNMPPoller,
+)
+from .monitoring.snmp_simulator import SNMPSimulator
+from .monitoring.usage_store import UsageStore
+
+RATE_BPS = 80_000_000
+
+
+class SNMPPollerSimulatorTests(SimpleTestCase):
+    """Polls an in-process SNMPSimulator over UDP on 127.0.0.1."""
+
+    def setUp(self):
+        self.poller = SNMPPoller()
+        self.poller.request_timeout = 0.5
+        self.poller.retries = 0
+        self.poller.device_timeout = 2.0
+        self.target = PollTarget(
+            schema_name='test', kind='router', device_id=1, name='core-1',
+            host='127.0.0.1', community='public',
+        )
+
+    @staticmethod
+    def without_hc_counters(simulator):
+        """Make the simulator look like a device with 32-bit counters only."""
+        prefixes = [parse_oid(IF_HC_IN_OCTETS), parse_oid(IF_HC_OUT_OCTETS)]
+        for oid in list(simulator.table):
+            if any(oid[:len(prefix)] == prefix for prefix in prefixes):
+                del simulator.table[oid]
+        simulator.oids = sorted(simulator.table)
+        return simulator
+
+    def poll_twice(self, simulator, interval=0.5):
+        async def run():
+            await simulator.start()
+            self.poller.port = simulator.port
+            try:
+                first = await self.poller.poll_one(self.target)
+                await asyncio.sleep(interval)
+                second = await self.poller.poll_one(self.target)
+            finally:
+                simulator.stop()
+            return first, second
+
+        return asyncio.run(run())
+
+    @staticmethod
+    def state(result):
+        return {
+            'at': result.polled_at, 'uptime': result.uptime_ticks,
+            'bits': result.counter_bits, 'counters': result.counters,
+        }
+
+    def assertRate(self, bps, expected):
+        self.assertAlmostEqual(bps / expected, 1, delta=0.25)
+
+    def test_reads_interfaces_and_resources(self):
+        first, _ = self.poll_twice(SNMPSimulator(interfaces=2, rate_bps=RATE_BPS), interval=0)
+
+        self.assertTrue(first.reachable, first.error)
+        self.assertEqual(first.counter_bits, 64)
+        self.assertEqual(first.names, {1: 'ether1', 2: 'ether2'})
+        self.assertEqual(set(first.counters), {1, 2})
+        self.assertEqual(first.cpu_load, 17.0)
+        self.assertEqual(first.memory_percent, 37.5)
+
+    def test_rates_match_simulated_traffic(self):
+        first, second = self.poll_twice(SNMPSimulator(interfaces=2, rate_bps=RATE_BPS))
+        rates = self.poller.rates(second, self.state(first))
+
+        # Interface n receives n * RATE_BPS and sends half of that
+        self.assertEqual(set(rates), {1, 2})
+        for index in (1, 2):
+            in_bytes, out_bytes, in_bps, out_bps = rates[index]
+            self.assertGreater(in_bytes, 0)
+            self.assertRate(in_bps, RATE_BPS * index)
+            self.assertRate(out_bps, RATE_BPS * index / 2)
+
+    def test_64bit_counter_wrap(self):
+        simulator = SNMPSimulator(interfaces=1, rate_bps=RATE_BPS, counter_start=2 ** 64 - 2_000_000)
+        first, second = self.poll_twice(simulator)
+
+        self.assertLess(second.counters[1][0], first.counters[1][0])  # wrapped between polls
+        in_bytes, _, in_bps, _ = self.poller.rates(second, self.state(first))[1]
+        self.assertLess(in_bytes, 2 ** 32)
+        self.assertRate(in_bps, RATE_BPS)
+
+    def test_32bit_counter_fallback_and_wrap(self):
+        simulator = self.without_hc_counters(
+            SNMPSimulator(interfaces=1, rate_bps=RATE_BPS, counter32_start=2 ** 32 - 2_000_000)
+        )
+        first, second = self.poll_twice(simulator)
+
+        self.assertEqual(first.counter_bits, 32)
+        self.assertLess(second.counters[1][0], first.counters[1][0])
+        _, _, in_bps, out_bps = self.poller.rates(second, self.state(first))[1]
+        self.assertRate(in_bps, RATE_BPS)
+        self.assertRate(out_bps, RATE_BPS / 2)
+
+    def test_silent_device_is_unreachable(self):
+        first, _ = self.poll_twice(SNMPSimulator(drop=True), interval=0)
+
+        self.assertFalse(first.reachable)
+        self.assertEqual(first.counters, {})
+
+
+class SNMPRateMathTests(SimpleTestCase):
+    def setUp(self):
+        self.poller = SNMPPoller()
+        self.target = PollTarget(
+            schema_name='test', kind='router', device_id=1, name='core-1',
+            host='127.0.0.1', community='public',
+        )
+        self.previous = {'at': 1000.0, 'uptime': 10_000, 'bits': 32, 'counters': {1: (2 ** 32 - 100, 50)}}
+
+    def result(self, uptime, counters, bits=32):
+        return PollResult(target=self.target, polled_at=1010.0, uptime_ticks=uptime,
+                          counter_bits=bits, counters=counters)
+
+    def test_wrapped_counter_uses_agent_uptime(self):
+        # 1000 bytes each way over 2 s of agent uptime (not the 10 s between polls)
+        rates = self.poller.rates(self.result(10_200, {1: (900, 1050)}), self.previous)
+        self.assertEqual(rates, {1: (1000, 1000, 4000, 4000)})
+
+    def test_no_rates_after_reboot_or_counter_width_change(self):
+        self.assertEqual(self.poller.rates(self.result(500, {1: (900, 1050)}), self.previous), {})
+        self.assertEqual(self.poller.rates(self.result(10_200, {1: (900, 1050)}, bits=64), self.previous), {})
+        self.assertEqual(self.poller.rates(self.result(10_200, {1: (900, 1050)}), None), {})
+
+    def test_implausible_jump_is_dropped(self):
+        self.poller.max_bps = 1_000_000
+        rates = self.poller.rates(self.result(10_100, {1: (2 ** 32 - 200, 100)}), self.previous)
+        self.assertEqual(rates, {})
+
+
+class UsageIngestTests(TenantTestCase):
+    """Ingests from an in-memory stand-in for public.radacct."""
+
+    @classmethod
+    def setup_tenant(cls, tenant):
+        # The tenant is dropped after each class, its company is not
+        tenant.company, _ = Company.objects.get_or_create(name='Test ISP', defaults=dict(
+            slug='test-isp', email='isp@example.com',
+            phone_number='254700000000', address='Moi Avenue', city='Nairobi',
+        ))
+        tenant.subdomain = 'test'
+        tenant.database_name = 'test'
+
+    def setUp(self):
+        # The radius app ships no migrations, so its tables are not in test schemas
+        post_save.disconnect(sync_customer_status_to_radius, sender=Customer)
+        self.addCleanup(post_save.connect, sync_customer_status_to_radius, sender=Customer)
+
+        user = User.objects.create_user(
+            email='jane@example.com', password='x', phone_number='254711111111',
+            first_name='Jane', last_name='Doe',
+        )
+        self.customer = Customer.objects.create(user=user, customer_code='CUS-1', id_number='12345678')
+        credentials = mock.patch.object(CustomerRadiusCredentials, 'objects')
+        credentials.start().filter.return_value.values_list.return_value = [
+            ('jane', self.customer.pk), ('jane-2', self.customer.pk),
+        ]
+        self.addCleanup(credentials.stop)
+
+        self.store = UsageStore()
+        self.radacct = {}
+        for name, fake in (('_sessions', self.sessions), ('_open_sessions', self.open_sessions)):
+            patcher = mock.patch.object(self.store, name, side_effect=fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.t0 = timezone.now()
+
+    def sessions(self, schema_name, last_id, since=None):
+        return [
+            dict(row) for row in sorted(self.radacct.values(), key=lambda row: row['radacctid'])
+            if row['radacctid'] > last_id and (since is None or not row['acctstoptime']
+                                               or row['acctstoptime'] >= since)
+        ]
+
+    def open_sessions(self, schema_name, acctuniqueids):
+        return [dict(self.radacct[uid]) for uid in acctuniqueids if uid in self.radacct]
+
+    def account(self, radacctid, uid, username, octets_in, octets_out, updated, stopped=None):
+        self.radacct[uid] = {
+            'radacctid': radacctid, 'acctuniqueid': uid, 'username': username,
+            'acctinputoctets': octets_in, 'acctoutputoctets': octets_out,
+            'acctstarttime': self.t0 - timedelta(hours=1), 'acctupdatetime': updated,
+            'acctstoptime': stopped,
+        }
+
+    def ingest(self, at):
+        with mock.patch('django.utils.timezone.now', return_value=at):
+            return self.store.ingest_accounting()
+
+    def total_bytes(self):
+        totals = UsageBucket.objects.filter(granularity='month').aggregate(
+            down=Sum('download_bytes'), up=Sum('upload_bytes'))
+        return (totals['down'] or 0) + (totals['up'] or 0)
+
+    def test_late_stop_is_ingested_and_its_cursor_pruned(self):
+        self.account(1, 'a', 'jane', 100, 1000, self.t0 - timedelta(minutes=5))
+        self.ingest(self.t0)
+        self.assertEqual(self.total_bytes(), 1100)
+
+        # A newer session keeps reporting while the first one's Stop is held back
+        self.account(2, 'b', 'jane-2', 10, 10, self.t0 + timedelta(minutes=50))
+        self.ingest(self.t0 + timedelta(hours=1))
+        self.assertEqual(self.total_bytes(), 1120)
+
+        # The NAS delivers the Stop (timestamped 4 minutes after the first run) an hour late
+        self.account(1, 'a', 'jane', 150, 1500, self.t0 + timedelta(minutes=4), stopped=self.t0 + timedelta(minutes=4))
+        self.ingest(self.t0 + timedelta(hours=2))
+        self.assertEqual(self.total_bytes(), 1670)
+        self.assertTrue(UsageSessionCursor.objects.get(acctuniqueid='a').is_closed)
+
+        self.ingest(self.t0 + timedelta(days=2))
+        self.assertEqual(
+            list(UsageSessionCursor.objects.values_list('acctuniqueid', flat=True)), ['b']
+        )
@@ -2,7 +2,6 @@ from decimal import Decimal
 from datetime import timedelta
 from django.utils import timezone
 from django.db.models import Sum, Q
-from apps.customers.models import ServiceConnection
 from ..models.billing_models import Plan, Invoice, InvoiceItem
 
 
@@ -112,21 +111,16 @@ class InvoiceCalculator:
 
     @staticmethod
     def generate_bulk_invoices(company, billing_cycle):
-        """Generate invoices for all active services in a company"""
-        active_services = ServiceConnection.objects.filter(
-            customer__company=company,
-            status='ACTIVE',
-            is_active=True
-        )
+        """
+        Generate invoices for all active services in the current tenant.
         
-        invoices = []
-        for service in active_services:
-            invoice = InvoiceCalculator.generate_invoice_for_service(service)
-            invoice.billing_cycle = billing_cycle
-            invoice.save()
-            invoices.append(invoice)
+        Delegates to the chunked BillingRunEngine; ``company`` is kept for
+        callers, the tenant schema already scopes the connections.
+        """
+        from ..services.billing_run import billing_run_engine
         
-        return invoices
+        state = billing_run_engine.run(billing_cycle)
+        return Invoice.objects.filter(internal_notes=billing_run_engine.marker(state['run_id']))
 
     @staticmethod
     def calculate_outstanding_balance(customer):
@@ -1,6 +1,5 @@
 from decimal import Decimal
 from datetime import datetime
-from utils.constants import KENYAN_TAX_RATES
 
 
 class TaxCalculator:
@@ -5,6 +5,8 @@ from django.utils import timezone
 from datetime import datetime
 from decimal import Decimal
 
+from utils.http_client import get_http_session
+
 logger = logging.getLogger(__name__)
 
 
@@ -286,8 +288,6 @@ class SMSService:
         try:
             # Africa's Talking doesn't have a direct balance API in the SDK
             # We can use the application API to get balance
-            import requests
-            
             username = self.config['username']
             api_key = self.config['api_key']
             
@@ -300,7 +300,7 @@ class SMSService:
                 'Content-Type': 'application/json'
             }
             
-            response = requests.get(url, headers=headers)
+            response = get_http_session('africastalking').get(url, headers=headers)
             
             if response.status_code == 200:
                 data = response.json()
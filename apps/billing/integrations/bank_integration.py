@@ -1,4 +1,3 @@
-import requests
 import json
 import base64
 from datetime import datetime
@@ -9,6 +8,8 @@ from decimal import Decimal
 import hashlib
 import hmac
 
+from utils.http_client import get_http_session
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,6 +23,11 @@ class BankTransferService:
         self.company = company
         self.config = self._get_config()
     
+    @staticmethod
+    def _http(bank):
+        """Pooled session per bank, each with its own circuit breaker"""
+        return get_http_session(f'bank:{bank}')
+    
     def _get_config(self):
         """Get bank integration configuration for the company"""
         if self.company and hasattr(self.company, 'bank_integration_config'):
@@ -112,7 +118,7 @@ class BankTransferService:
                 'accountName': account_name
             }
             
-            response = requests.post(api_url, json=payload, headers=headers)
+            response = self._http('equity').post(api_url, json=payload, headers=headers)
             
             if response.status_code == 200:
                 data = response.json()
@@ -144,7 +150,7 @@ class BankTransferService:
             api_url = f"{config['api_url']}/v1/accounts/validate"
             
             # Get access token first
-            token_response = requests.post(
+            token_response = self._http('kcb').post(
                 f"{config['api_url']}/oauth/token",
                 data={
                     'grant_type': 'client_credentials',
@@ -171,7 +177,7 @@ class BankTransferService:
                 'accountName': account_name
             }
             
-            response = requests.post(api_url, json=payload, headers=headers)
+            response = self._http('kcb').post(api_url, json=payload, headers=headers)
             
             if response.status_code == 200:
                 data = response.json()
@@ -210,7 +216,7 @@ class BankTransferService:
                 'accountName': account_name
             }
             
-            response = requests.post(api_url, json=payload, auth=auth)
+            response = self._http('coop').post(api_url, json=payload, auth=auth)
             
             if response.status_code == 200:
                 data = response.json()
@@ -298,7 +304,7 @@ class BankTransferService:
                 'transactionDate': datetime.now().strftime('%Y%m%d')
             }
             
-            response = requests.post(api_url, json=payload, headers=headers)
+            response = self._http('equity').post(api_url, json=payload, headers=headers)
             
             if response.status_code == 200:
                 data = response.json()
@@ -328,7 +334,7 @@ class BankTransferService:
         """Initiate KCB Bank transfer"""
         try:
             # Get access token first
-            token_response = requests.post(
+            token_response = self._http('kcb').post(
                 f"{config['api_url']}/oauth/token",
                 data={
                     'grant_type': 'client_credentials',
@@ -362,7 +368,7 @@ class BankTransferService:
                 'paymentDate': datetime.now().isoformat()
             }
             
-            response = requests.post(api_url, json=payload, headers=headers)
+            response = self._http('kcb').post(api_url, json=payload, headers=headers)
             
             if response.status_code == 200:
                 data = response.json()
@@ -404,7 +410,7 @@ class BankTransferService:
                 'transactionDate': datetime.now().strftime('%Y-%m-%d')
             }
             
-            response = requests.post(api_url, json=payload, auth=auth)
+            response = self._http('coop').post(api_url, json=payload, auth=auth)
             
             if response.status_code == 200:
                 data = response.json()
@@ -478,7 +484,7 @@ class BankTransferService:
                 'X-Signature': self._generate_equity_signature(config)
             }
             
-            response = requests.get(api_url, headers=headers)
+            response = self._http('equity').get(api_url, headers=headers)
             
             if response.status_code == 200:
                 data = response.json()
@@ -508,7 +514,7 @@ class BankTransferService:
         """Check KCB Bank transfer status"""
         try:
             # Get access token first
-            token_response = requests.post(
+            token_response = self._http('kcb').post(
                 f"{config['api_url']}/oauth/token",
                 data={
                     'grant_type': 'client_credentials',
@@ -531,7 +537,7 @@ class BankTransferService:
                 'Authorization': f"Bearer {access_token}"
             }
             
-            response = requests.get(api_url, headers=headers)
+            response = self._http('kcb').get(api_url, headers=headers)
             
             if response.status_code == 200:
                 data = response.json()
@@ -564,7 +570,7 @@ class BankTransferService:
             
             auth = (config['username'], config['password'])
             
-            response = requests.get(api_url, auth=auth)
+            response = self._http('coop').get(api_url, auth=auth)
             
             if response.status_code == 200:
                 data = response.json()
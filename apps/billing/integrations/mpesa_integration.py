@@ -1,4 +1,3 @@
-import requests
 import json
 import base64
 from datetime import datetime
@@ -10,6 +9,9 @@ import logging
 from cryptography.fernet import Fernet
 from decimal import Decimal
 
+from utils.token_cache import oauth_token_cache
+from utils.http_client import get_http_session
+
 logger = logging.getLogger(__name__)
 
 
@@ -37,22 +39,39 @@ class MpesaSTKPush:
                 'environment': settings.MPESA_ENVIRONMENT,
             }
     
+    def _token_key(self):
+        """Token cache key for this company's Daraja credentials"""
+        return oauth_token_cache.credential_key(
+            'daraja',
+            getattr(self.company, 'id', None),
+            self.config['environment'],
+            self.config['consumer_key'],
+        )
+
+    def _http(self):
+        """Pooled session per credential set, so one tenant's failures do not trip the others"""
+        return get_http_session(f"daraja:{getattr(self.company, 'id', None) or 'platform'}")
+
+    def _fetch_access_token(self):
+        """Request a new OAuth access token from Safaricom API"""
+        if self.config['environment'] == 'sandbox':
+            url = 'https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials'
+        else:
+            url = 'https://api.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials'
+
+        auth = (self.config['consumer_key'], self.config['consumer_secret'])
+        response = self._http().get(url, auth=auth)
+
+        if response.status_code != 200:
+            raise Exception(f"Failed to get access token: {response.text}")
+
+        data = response.json()
+        return data['access_token'], int(data.get('expires_in', 3599))
+
     def _get_access_token(self):
-        """Get OAuth access token from Safaricom API"""
+        """Get OAuth access token (shared across processes, see utils.token_cache)"""
         try:
-            if self.config['environment'] == 'sandbox':
-                url = 'https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials'
-            else:
-                url = 'https://api.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials'
-            
-            auth = (self.config['consumer_key'], self.config['consumer_secret'])
-            response = requests.get(url, auth=auth)
-            
-            if response.status_code == 200:
-                return response.json()['access_token']
-            else:
-                logger.error(f"Failed to get access token: {response.text}")
-                return None
+            return oauth_token_cache.get_token(self._token_key(), self._fetch_access_token)
         except Exception as e:
             logger.error(f"Error getting access token: {str(e)}")
             return None
@@ -132,7 +151,10 @@ class MpesaSTKPush:
             }
             
             # Send request
-            response = requests.post(url, json=payload, headers=headers)
+            response = self._http().post(url, json=payload, headers=headers)
+            if response.status_code == 401:
+                # Token revoked before its expiry; next call fetches a new one
+                oauth_token_cache.invalidate(self._token_key())
             response_data = response.json()
             
             if response.status_code == 200:
@@ -205,7 +227,10 @@ class MpesaSTKPush:
                 'Content-Type': 'application/json'
             }
             
-            response = requests.post(url, json=payload, headers=headers)
+            response = self._http().post(url, json=payload, headers=headers)
+            if response.status_code == 401:
+                # Token revoked before its expiry; next call fetches a new one
+                oauth_token_cache.invalidate(self._token_key())
             response_data = response.json()
             
             if response.status_code == 200:
@@ -231,6 +256,9 @@ class MpesaSTKPush:
 class MpesaCallback:
     """
     Handle M-Pesa callback responses
+
+    These only parse payloads. Callback endpoints persist the raw payload
+    via webhook_ingestion_service; the billing queue applies it.
     """
     
     @staticmethod
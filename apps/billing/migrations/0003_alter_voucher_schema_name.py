@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-16 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='voucher',
+            name='schema_name',
+            field=models.SlugField(default='default_schema', editable=False, max_length=63),
+        ),
+    ]
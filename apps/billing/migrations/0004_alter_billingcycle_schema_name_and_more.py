@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-16 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_alter_voucher_schema_name'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='billingcycle',
+            name='schema_name',
+            field=models.SlugField(default='default_schema', editable=False, max_length=63),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='schema_name',
+            field=models.SlugField(default='default_schema', editable=False, max_length=63),
+        ),
+        migrations.AlterField(
+            model_name='invoiceitem',
+            name='schema_name',
+            field=models.SlugField(default='default_schema', editable=False, max_length=63),
+        ),
+        migrations.AlterField(
+            model_name='plan',
+            name='schema_name',
+            field=models.SlugField(default='default_schema', editable=False, max_length=63),
+        ),
+    ]
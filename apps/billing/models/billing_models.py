@@ -1,5 +1,5 @@
 # apps/billing/models/billing_models.py
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from django.db.models import Sum, Q
@@ -7,6 +7,7 @@ from decimal import Decimal
 import uuid
 from django.utils.text import slugify
 from apps.core.models import Company
+from apps.core.sequences import sequence_allocator
 
 from utils.constants import KENYAN_COUNTIES, TAX_RATES, TAX_TYPES
 
@@ -415,24 +416,6 @@ class Invoice(models.Model):
         return f"Invoice #{self.invoice_number} - {self.customer.customer_code}"
 
     def save(self, *args, **kwargs):
-        if not self.invoice_number:
-            # Generate invoice number: INV-YYYYMM-XXXXX
-            year_month = timezone.now().strftime('%Y%m')
-            last_invoice = Invoice.objects.filter(
-                invoice_number__startswith=f'INV-{year_month}'
-            ).order_by('-invoice_number').first()
-            
-            if last_invoice:
-                try:
-                    last_num = int(last_invoice.invoice_number.split('-')[-1])
-                    new_num = last_num + 1
-                except ValueError:
-                    new_num = 1
-            else:
-                new_num = 1
-            
-            self.invoice_number = f"INV-{year_month}-{new_num:05d}"
-        
         # Calculate balance
         self.balance = Decimal(self.total_amount) - Decimal(self.amount_paid)
         
@@ -447,7 +430,13 @@ class Invoice(models.Model):
                 self.is_overdue = False
                 self.overdue_days = 0
         
-        super().save(*args, **kwargs)
+        # Number and row commit together: a failed save leaves no gap
+        with transaction.atomic():
+            if not self.invoice_number:
+                # Generate invoice number: INV-YYYYMM-XXXXX
+                year_month = timezone.now().strftime('%Y%m')
+                sequence_allocator.assign(self, 'invoice_number', f'INV-{year_month}-', width=5)
+            super().save(*args, **kwargs)
 
     def calculate_totals(self):
         items = self.items.all()
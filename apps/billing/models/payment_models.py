@@ -1,9 +1,10 @@
 # apps/billing/models/payment_models.py
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from decimal import Decimal
 from apps.core.models import Company
+from apps.core.sequences import sequence_allocator
 #from apps.customers.models import Customer
 from .billing_models import Invoice
 
@@ -186,12 +187,6 @@ class Payment(models.Model):
         return f"Payment #{self.payment_number} - {self.customer.customer_code}"
 
     def save(self, *args, **kwargs):
-        if not self.payment_number:
-            date_str = timezone.now().strftime('%Y%m%d')
-            last_payment = Payment.objects.filter(payment_number__startswith=f'PAY-{date_str}').order_by('-payment_number').first()
-            new_num = int(last_payment.payment_number.split('-')[-1]) + 1 if last_payment else 1
-            self.payment_number = f"PAY-{date_str}-{new_num:05d}"
-
         if not self.net_amount:
             self.net_amount = self.amount - self.transaction_fee
 
@@ -202,7 +197,12 @@ class Payment(models.Model):
         if not self.payer_email and self.customer:
             self.payer_email = self.customer.user.email
 
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if not self.payment_number:
+                # Generate payment number: PAY-YYYYMMDD-XXXXX
+                date_str = timezone.now().strftime('%Y%m%d')
+                sequence_allocator.assign(self, 'payment_number', f'PAY-{date_str}-', width=5)
+            super().save(*args, **kwargs)
 
         if self.invoice and self.status == 'COMPLETED':
             self.invoice.add_payment(self.amount, self.payment_method)
@@ -321,21 +321,6 @@ class Receipt(models.Model):
         return f"Receipt #{self.receipt_number}"
 
     def save(self, *args, **kwargs):
-        if not self.receipt_number:
-            # Generate receipt number: RCPT-YYYY-XXXXX
-            year = timezone.now().year
-            last_receipt = Receipt.objects.filter(
-                receipt_number__startswith=f'RCPT-{year}'
-            ).order_by('-receipt_number').first()
-            
-            if last_receipt:
-                last_num = int(last_receipt.receipt_number.split('-')[-1])
-                new_num = last_num + 1
-            else:
-                new_num = 1
-            
-            self.receipt_number = f"RCPT-{year}-{new_num:05d}"
-        
         # Set amount from payment if not set
         if not self.amount and self.payment:
             self.amount = self.payment.amount
@@ -348,7 +333,12 @@ class Receipt(models.Model):
         if not self.payment_reference and self.payment:
             self.payment_reference = self.payment.payment_reference
         
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if not self.receipt_number:
+                # Generate receipt number: RCPT-YYYY-XXXXX
+                year = timezone.now().year
+                sequence_allocator.assign(self, 'receipt_number', f'RCPT-{year}-', width=5)
+            super().save(*args, **kwargs)
 
     def issue_receipt(self, user):
         if self.status == 'DRAFT':
@@ -1,11 +1,12 @@
 #  apps/billing/models/voucher_models.py
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from django.utils.crypto import get_random_string
 from decimal import Decimal
 import uuid
 from apps.core.models import Company
+from apps.core.sequences import sequence_allocator
 from apps.customers.models import Customer
 from .billing_models import Invoice
 
@@ -91,21 +92,6 @@ class VoucherBatch(models.Model):
         return f"{self.name} (Batch: {self.batch_number})"
 
     def save(self, *args, **kwargs):
-        if not self.batch_number:
-            # Generate batch number: BATCH-YYYYMM-XXXX
-            year_month = timezone.now().strftime('%Y%m')
-            last_batch = VoucherBatch.objects.filter(
-                batch_number__startswith=f'BATCH-{year_month}'
-            ).order_by('-batch_number').first()
-            
-            if last_batch:
-                last_num = int(last_batch.batch_number.split('-')[-1])
-                new_num = last_num + 1
-            else:
-                new_num = 1
-            
-            self.batch_number = f"BATCH-{year_month}-{new_num:04d}"
-        
         # Calculate available count
         self.available_count = self.quantity - self.issued_count
         
@@ -114,7 +100,12 @@ class VoucherBatch(models.Model):
             self.status = 'EXPIRED'
             self.is_active = False
         
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if not self.batch_number:
+                # Generate batch number: BATCH-YYYYMM-XXXX
+                year_month = timezone.now().strftime('%Y%m')
+                sequence_allocator.assign(self, 'batch_number', f'BATCH-{year_month}-', width=4)
+            super().save(*args, **kwargs)
 
     def generate_vouchers(self, count=None):
         if not count:
@@ -123,35 +114,9 @@ class VoucherBatch(models.Model):
         if count <= 0 or count > (self.quantity - self.issued_count):
             return []
         
-        vouchers = []
-        for _ in range(count):
-            # Generate unique voucher code
-            while True:
-                code = self.prefix + get_random_string(
-                    length=self.length - len(self.prefix),
-                    allowed_chars=self.charset
-                )
-                if not Voucher.objects.filter(code=code).exists():
-                    break
-            
-            voucher = Voucher.objects.create(
-                batch=self,
-                code=code,
-                face_value=self.face_value,
-                sale_price=self.sale_price,
-                valid_from=self.valid_from,
-                valid_to=self.valid_to,
-                is_reusable=self.is_reusable,
-                max_uses=self.max_uses,
-                status='ACTIVE',
-                created_by=self.created_by
-            )
-            vouchers.append(voucher)
-        
-        self.issued_count += count
-        self.save()
-        
-        return vouchers
+        # Set-based: one collision query and one INSERT per chunk
+        from ..services.voucher_generator import voucher_generator
+        return voucher_generator.generate(self, count)
 
     def activate_batch(self, user):
         if self.status == 'DRAFT':
@@ -190,10 +155,9 @@ class Voucher(models.Model):
     max_uses = models.PositiveIntegerField(default=1)
     use_count = models.PositiveIntegerField(default=0)
     
-    # Tenant schema field
+    # Tenant schema field (not unique: every voucher of a tenant has the same value)
     schema_name = models.SlugField(
         max_length=63,
-        unique=True,
         editable=False,
         default="default_schema"
     )
@@ -0,0 +1,369 @@
+# apps/billing/services/billing_run.py
+"""
+Billing Run Engine
+
+``InvoiceCalculator.generate_bulk_invoices`` billed one ServiceConnection at
+a time. Each one needed an Invoice INSERT, an InvoiceItem INSERT (whose save
+recalculated the invoice), two more Invoice saves, the numbering query and
+the post_save signals. Month-end for a 40k-subscriber tenant took hours.
+
+A billing run now works on chunks of BILLING_RUN_CHUNK connections, walked
+in primary-key order:
+
+    1. load the chunk with its customer and plan        → 1 query
+    2. skip connections already invoiced for the cycle  → 1 query
+    3. price, prorate and tax in memory (TaxCalculator)
+    4. reserve the chunk's invoice numbers              → 1 statement
+    5. bulk_create invoices, then items                 → 2 INSERTs
+    6. checkpoint the last connection id in the cache
+
+Each chunk commits on its own. A run that dies can be resumed with its
+run_id and continues after the last checkpoint. Connections that already
+have an invoice for the cycle are never billed twice, even when the
+checkpoint is lost.
+
+``dry_run`` prices everything without writing and returns totals plus a
+preview. Notifications for issued invoices are sent afterwards by the
+``send_billing_run_notifications`` task, not by per-row signals.
+"""
+
+import logging
+import uuid
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.core.sequences import sequence_allocator
+from ..calculators.invoice_calculator import InvoiceCalculator
+from ..calculators.tax_calculator import TaxCalculator
+
+logger = logging.getLogger(__name__)
+
+
+class BillingRunEngine:
+    """Chunked, resumable invoice generation for a BillingCycle."""
+
+    RUN_KEY = 'billing_run:{schema_name}:{run_id}'
+    LOCK_KEY = 'billing_run_lock:{schema_name}:{cycle_id}'
+    RUN_TTL = 7 * 24 * 3600
+    PREVIEW_SIZE = 20
+
+    def __init__(self):
+        self.chunk_size = getattr(settings, 'BILLING_RUN_CHUNK', 1000)
+        self.vat_rate = getattr(settings, 'BILLING_RUN_VAT_RATE', 16.0)
+
+    # ────────────────────────────────────────────────────────────────
+    # RUN STATE
+    # ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def marker(run_id: str) -> str:
+        """Written to Invoice.internal_notes so a run's invoices can be found."""
+        return f"billing_run:{run_id}"
+
+    def _state_key(self, schema_name: str, run_id: str) -> str:
+        # Cache keys are shared by all tenants
+        return self.RUN_KEY.format(schema_name=schema_name, run_id=run_id)
+
+    def run_status(self, run_id: str) -> Optional[Dict]:
+        """State of a run owned by the current tenant, or None."""
+        state = cache.get(self._state_key(connection.schema_name, run_id))
+        if not state or state.get('schema_name') != connection.schema_name:
+            return None
+        return state
+
+    def _save_state(self, state: Dict):
+        state['updated_at'] = timezone.now().isoformat()
+        cache.set(self._state_key(state['schema_name'], state['run_id']), state, self.RUN_TTL)
+
+    def _new_state(self, billing_cycle, run_id: str, dry_run: bool, issue: bool) -> Dict:
+        return {
+            'run_id': run_id,
+            'schema_name': connection.schema_name,
+            'billing_cycle_id': billing_cycle.pk,
+            'status': 'queued',
+            'dry_run': dry_run,
+            'issue': issue,
+            'last_connection_id': 0,
+            'chunks': 0,
+            'created': 0,
+            'skipped': 0,
+            'subtotal': '0.00',
+            'tax_amount': '0.00',
+            'total_amount': '0.00',
+            'started_at': timezone.now().isoformat(),
+        }
+
+    def _lock_key(self, billing_cycle) -> str:
+        return self.LOCK_KEY.format(schema_name=connection.schema_name, cycle_id=billing_cycle.pk)
+
+    def active_run(self, billing_cycle) -> Optional[str]:
+        """Id of the queued or running run that holds ``billing_cycle``, if any."""
+        run_id = cache.get(self._lock_key(billing_cycle))
+        state = self.run_status(run_id) if run_id else None
+        if state and state['status'] in ('queued', 'running'):
+            return run_id
+        return None
+
+    def _acquire(self, billing_cycle, run_id: str) -> bool:
+        """Take the cycle's lock for ``run_id`` unless another run holds it."""
+        key = self._lock_key(billing_cycle)
+        if cache.add(key, run_id, self.RUN_TTL) or cache.get(key) == run_id:
+            return True
+        if self.active_run(billing_cycle) is None:
+            # The previous holder finished without releasing the lock
+            cache.set(key, run_id, self.RUN_TTL)
+            return True
+        return False
+
+    def prepare(self, billing_cycle, dry_run: bool = False, issue: bool = False) -> Optional[str]:
+        """
+        Create the state record for a run that will be queued.
+
+        Returns None if another run of ``billing_cycle`` is queued or running.
+        """
+        run_id = uuid.uuid4().hex
+        if not dry_run and not self._acquire(billing_cycle, run_id):
+            return None
+        self._save_state(self._new_state(billing_cycle, run_id, dry_run, issue))
+        return run_id
+
+    # ────────────────────────────────────────────────────────────────
+    # PRICING (in memory)
+    # ────────────────────────────────────────────────────────────────
+
+    def _price(self, service, billing_cycle) -> Dict:
+        """Amount, tax and service period for one connection."""
+        plan = service.plan
+        price = Decimal(service.monthly_price or (plan.base_price if plan else 0))
+        period_start = billing_cycle.start_date
+        period_end = billing_cycle.end_date
+        cycle_days = (period_end - period_start).days + 1
+
+        # Connections activated mid-cycle pay for the days they had service
+        activated = service.activation_date.date() if service.activation_date else None
+        if service.prorated_billing and activated and period_start < activated <= period_end:
+            period_start = activated
+            price = InvoiceCalculator.calculate_prorated_amount(
+                price, period_start, period_end, cycle_days
+            )
+
+        tax_rate = Decimal(str(getattr(plan, 'tax_rate', self.vat_rate)))
+        vat = TaxCalculator.calculate_vat(price, tax_rate=tax_rate)
+        return {
+            'unit_price': vat['base_amount'],
+            'tax_rate': tax_rate,
+            'tax_amount': vat['vat_amount'],
+            'total_amount': vat['total_amount'],
+            'period_start': period_start,
+            'period_end': period_end,
+        }
+
+    def _build(self, service, billing_cycle, state: Dict, user):
+        """Unsaved (Invoice, InvoiceItem) pair mirroring Invoice/InvoiceItem.save()."""
+        from ..models.billing_models import Invoice, InvoiceItem
+
+        priced = self._price(service, billing_cycle)
+        plan = service.plan
+        now = timezone.now()
+
+        invoice = Invoice(
+            customer_id=service.customer_id,
+            service_connection=service,
+            plan=plan,
+            billing_cycle=billing_cycle,
+            billing_date=now.date(),
+            due_date=billing_cycle.due_date,
+            service_period_start=priced['period_start'],
+            service_period_end=priced['period_end'],
+            subtotal=priced['unit_price'],
+            tax_amount=priced['tax_amount'],
+            total_amount=priced['total_amount'],
+            balance=priced['total_amount'],
+            status='ISSUED' if state['issue'] else 'DRAFT',
+            issued_by=user if state['issue'] else None,
+            issued_at=now if state['issue'] else None,
+            internal_notes=self.marker(state['run_id']),
+            created_by=user or service.customer.user,
+        )
+        item = InvoiceItem(
+            description=f"{plan.name if plan else service.get_service_type_display()} - Monthly Service",
+            quantity=1,
+            unit_price=priced['unit_price'],
+            tax_rate=priced['tax_rate'],
+            tax_amount=priced['tax_amount'],
+            total=priced['unit_price'],
+            service_type=plan.plan_type if plan else service.service_type,
+            service_period_start=priced['period_start'],
+            service_period_end=priced['period_end'],
+        )
+        return invoice, item
+
+    # ────────────────────────────────────────────────────────────────
+    # CHUNKS
+    # ────────────────────────────────────────────────────────────────
+
+    def _next_chunk(self, after_id: int) -> List:
+        from apps.customers.models import ServiceConnection
+
+        return list(
+            ServiceConnection.objects
+            .filter(status='ACTIVE', pk__gt=after_id)
+            .select_related('customer__user', 'plan')
+            .order_by('pk')[:self.chunk_size]
+        )
+
+    def _insert(self, pairs):
+        """Number and insert one chunk; caller holds the transaction."""
+        from ..models.billing_models import Invoice, InvoiceItem
+
+        invoices = [invoice for invoice, _ in pairs]
+        prefix = f"INV-{timezone.now().strftime('%Y%m')}-"
+        numbers = sequence_allocator.reserve(Invoice, 'invoice_number', prefix, len(invoices), width=5)
+        for invoice, number in zip(invoices, numbers):
+            invoice.invoice_number = number
+
+        Invoice.objects.bulk_create(invoices)
+        for invoice, item in pairs:
+            item.invoice = invoice
+        InvoiceItem.objects.bulk_create([item for _, item in pairs])
+
+    # ────────────────────────────────────────────────────────────────
+    # RUN
+    # ────────────────────────────────────────────────────────────────
+
+    def run(self, billing_cycle, run_id: Optional[str] = None, dry_run: bool = False,
+            issue: bool = False, user=None) -> Dict:
+        """
+        Invoice every active connection for ``billing_cycle``.
+
+        Args:
+            run_id: Resume this run from its last checkpoint (or use the
+                    state created by ``prepare``)
+            dry_run: Price everything without writing
+            issue: Create invoices as ISSUED and notify customers afterwards
+
+        Returns:
+            The run state (counts, totals, status; a preview for dry runs)
+        """
+        from ..models.billing_models import Invoice
+
+        state = self.run_status(run_id) if run_id else None
+        if state is None:
+            state = self._new_state(billing_cycle, run_id or uuid.uuid4().hex, dry_run, issue)
+        if state['status'] == 'completed':
+            return state
+        dry_run = state['dry_run']
+
+        lock_key = self._lock_key(billing_cycle)
+        if not dry_run and not self._acquire(billing_cycle, state['run_id']):
+            state['status'] = 'failed'
+            state['error'] = f"Billing cycle {billing_cycle.cycle_code} already has a run in progress"
+            self._save_state(state)
+            raise ValueError(state['error'])
+
+        state['status'] = 'running'
+        self._save_state(state)
+        totals = {name: Decimal(state[name]) for name in ('subtotal', 'tax_amount', 'total_amount')}
+        preview = []
+
+        try:
+            while True:
+                chunk = self._next_chunk(state['last_connection_id'])
+                if not chunk:
+                    break
+
+                billed = set(
+                    Invoice.objects.filter(
+                        billing_cycle=billing_cycle,
+                        service_connection_id__in=[service.pk for service in chunk],
+                    ).values_list('service_connection_id', flat=True)
+                )
+                pairs = [
+                    self._build(service, billing_cycle, state, user)
+                    for service in chunk if service.pk not in billed
+                ]
+
+                if pairs and not dry_run:
+                    with transaction.atomic():
+                        self._insert(pairs)
+
+                for invoice, _ in pairs:
+                    totals['subtotal'] += invoice.subtotal
+                    totals['tax_amount'] += invoice.tax_amount
+                    totals['total_amount'] += invoice.total_amount
+                if dry_run and len(preview) < self.PREVIEW_SIZE:
+                    preview.extend(
+                        {
+                            'service_connection_id': invoice.service_connection_id,
+                            'customer_id': invoice.customer_id,
+                            'period_start': invoice.service_period_start.isoformat(),
+                            'total_amount': str(invoice.total_amount),
+                        }
+                        for invoice, _ in pairs[:self.PREVIEW_SIZE - len(preview)]
+                    )
+
+                # Checkpoint: a resumed run continues after this connection
+                state['last_connection_id'] = chunk[-1].pk
+                state['chunks'] += 1
+                state['created'] += len(pairs)
+                state['skipped'] += len(billed)
+                state.update({name: str(value) for name, value in totals.items()})
+                self._save_state(state)
+        except Exception as e:
+            state['status'] = 'failed'
+            state['error'] = str(e)
+            self._save_state(state)
+            logger.error(f"Billing run {state['run_id']} failed after {state['chunks']} chunks: {e}")
+            raise
+        finally:
+            if not dry_run and cache.get(lock_key) == state['run_id']:
+                cache.delete(lock_key)
+
+        state['status'] = 'completed'
+        state['completed_at'] = timezone.now().isoformat()
+        if dry_run:
+            state['preview'] = preview
+        else:
+            billing_cycle.calculate_totals()
+        self._save_state(state)
+
+        logger.info(
+            f"Billing run {state['run_id']} for {billing_cycle.cycle_code}: "
+            f"{state['created']} invoices, {state['skipped']} already billed"
+            f"{' (dry run)' if dry_run else ''}"
+        )
+        return state
+
+    # ────────────────────────────────────────────────────────────────
+    # POST-RUN NOTIFICATIONS
+    # ────────────────────────────────────────────────────────────────
+
+    def notify(self, run_id: str, company=None) -> Dict:
+        """Send invoice SMS for a run's issued invoices, one SDK client for the run."""
+        from ..models.billing_models import Invoice
+        from ..integrations.africastalking import SMSService
+
+        invoices = (
+            Invoice.objects
+            .filter(internal_notes=self.marker(run_id), status='ISSUED')
+            .select_related('customer__user')
+            .order_by('pk')
+        )
+        stats = {'sent': 0, 'failed': 0}
+        sms_service = SMSService(company)
+
+        for invoice in invoices.iterator(chunk_size=self.chunk_size):
+            result = sms_service.send_invoice_reminder(invoice.customer, invoice)
+            stats['sent' if result.get('success') else 'failed'] += 1
+
+        logger.info(f"Billing run {run_id} notifications: {stats}")
+        return stats
+
+
+# Singleton instance
+billing_run_engine = BillingRunEngine()
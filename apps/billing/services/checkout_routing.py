@@ -0,0 +1,184 @@
+# apps/billing/services/checkout_routing.py
+"""
+Checkout Routing - constant-cost tenant resolution for payment callbacks
+
+Payment callbacks only carry the provider's checkout id (and, for PayHero,
+our external reference). Without help the webhook has to enter every tenant
+schema until it finds the matching session.
+
+The reference is echoed back by the provider and can be forged, so the hint
+is only used when it is a plain schema name (``[a-z0-9_]+``) that belongs to
+a tenant. Anything else falls through to the routing table.
+
+Resolution order:
+
+    1. Tenant hint in the external reference ("HS_..._ABCD--tenant_schema")
+       → 1 indexed query (the hint must name an existing tenant schema)
+    2. core.CheckoutRoute row written when the STK push was initiated
+       → 1 indexed query
+    3. Legacy scan over all tenant schemas (CHECKOUT_ROUTE_SCAN_FALLBACK)
+       → only for payments initiated before routing existed
+"""
+
+import logging
+import re
+from typing import Callable, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django_tenants.utils import schema_context, get_public_schema_name
+
+logger = logging.getLogger(__name__)
+
+HINT_SEPARATOR = '--'
+SCHEMA_HINT_RE = re.compile(r'^[a-z0-9_]+$')
+
+
+class CheckoutRoutingService:
+    """Maps provider checkout ids to the tenant schema that owns them."""
+
+    def __init__(self):
+        self.scan_fallback = getattr(settings, 'CHECKOUT_ROUTE_SCAN_FALLBACK', True)
+
+    # ────────────────────────────────────────────────────────────────
+    # REFERENCES
+    # ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def build_reference(reference: str, schema_name: str = None) -> str:
+        """Append the tenant hint to an external reference."""
+        schema_name = schema_name or connection.schema_name
+        if not schema_name or schema_name == get_public_schema_name():
+            return reference
+        return f"{reference}{HINT_SEPARATOR}{schema_name}"
+
+    @staticmethod
+    def parse_reference(external_reference: str) -> Tuple[str, Optional[str]]:
+        """Split an external reference into (reference, schema hint)."""
+        if not external_reference or HINT_SEPARATOR not in external_reference:
+            return external_reference, None
+        reference, _, schema_name = external_reference.rpartition(HINT_SEPARATOR)
+        return reference, schema_name or None
+
+    @staticmethod
+    def is_tenant_schema(schema_name: Optional[str]) -> bool:
+        """True if ``schema_name`` is a well-formed name of an existing tenant schema."""
+        from apps.core.models import Tenant
+
+        if not schema_name or not SCHEMA_HINT_RE.match(schema_name):
+            return False
+        if schema_name == get_public_schema_name():
+            return False
+        with schema_context(get_public_schema_name()):
+            return Tenant.objects.filter(schema_name=schema_name).exists()
+
+    # ────────────────────────────────────────────────────────────────
+    # ROUTING TABLE
+    # ────────────────────────────────────────────────────────────────
+
+    def register(self, kind: str, checkout_request_id: str, object_id: str,
+                 external_reference: str = '', provider: str = 'payhero') -> bool:
+        """Record which tenant owns a checkout. Call from the tenant schema."""
+        from apps.core.models import CheckoutRoute, Tenant
+
+        if not checkout_request_id:
+            return False
+
+        schema_name = connection.schema_name
+        tenant = getattr(connection, 'tenant', None)
+
+        try:
+            with schema_context(get_public_schema_name()):
+                if not isinstance(tenant, Tenant):
+                    tenant = Tenant.objects.get(schema_name=schema_name)
+                CheckoutRoute.objects.update_or_create(
+                    provider=provider,
+                    checkout_request_id=checkout_request_id,
+                    defaults={
+                        'tenant': tenant,
+                        'schema_name': schema_name,
+                        'kind': kind,
+                        'object_id': str(object_id),
+                        'external_reference': external_reference or '',
+                    }
+                )
+            return True
+        except Exception as e:
+            # The webhook still resolves through the hint or the scan
+            logger.error(f"[CHECKOUT ROUTE] Failed to register {provider}:{checkout_request_id}: {e}")
+            return False
+
+    def resolve(self, kind: str, checkout_request_id: str, external_reference: str = None,
+                finder: Callable[[str], object] = None, provider: str = 'payhero'):
+        """
+        Find the object a callback settles.
+
+        Args:
+            kind: Route kind ('hotspot', 'billing')
+            checkout_request_id: Provider checkout id from the callback
+            external_reference: Our reference echoed back by the provider
+            finder: Called as finder(schema_name) inside that schema's context;
+                    returns the object or None
+
+        Returns:
+            (schema_name, obj) or (None, None)
+        """
+        from apps.core.models import CheckoutRoute
+
+        _, hint = self.parse_reference(external_reference)
+        if hint and not self.is_tenant_schema(hint):
+            logger.warning(f"[CHECKOUT ROUTE] Ignoring invalid tenant hint {hint!r} for {checkout_request_id}")
+            hint = None
+        if hint:
+            obj = self._try(hint, finder)
+            if obj is not None:
+                return hint, obj
+
+        with schema_context(get_public_schema_name()):
+            schema_name = (
+                CheckoutRoute.objects
+                .filter(provider=provider, checkout_request_id=checkout_request_id, kind=kind)
+                .values_list('schema_name', flat=True)
+                .first()
+            )
+        if schema_name and schema_name != hint:
+            obj = self._try(schema_name, finder)
+            if obj is not None:
+                return schema_name, obj
+
+        if not self.scan_fallback:
+            return None, None
+
+        return self._scan(finder, skip={hint, schema_name})
+
+    @staticmethod
+    def _try(schema_name: str, finder):
+        try:
+            with schema_context(schema_name):
+                return finder(schema_name)
+        except Exception as e:
+            logger.warning(f"[CHECKOUT ROUTE] Lookup in {schema_name} failed: {e}")
+            return None
+
+    def _scan(self, finder, skip=()):
+        """Legacy O(tenants) scan, used only for unrouted checkouts."""
+        from apps.core.models import Tenant
+
+        with schema_context(get_public_schema_name()):
+            schemas = list(
+                Tenant.objects.exclude(schema_name=get_public_schema_name())
+                .values_list('schema_name', flat=True)
+            )
+
+        for schema_name in schemas:
+            if schema_name in skip:
+                continue
+            obj = self._try(schema_name, finder)
+            if obj is not None:
+                logger.info(f"[CHECKOUT ROUTE] Resolved unrouted checkout by scan in {schema_name}")
+                return schema_name, obj
+        return None, None
+
+
+# Singleton instance
+checkout_routing_service = CheckoutRoutingService()
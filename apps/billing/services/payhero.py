@@ -22,6 +22,8 @@ from typing import Any, Dict, Optional, Union
 from django.conf import settings
 from django.utils import timezone
 
+from utils.http_client import get_http_session
+
 logger = logging.getLogger(__name__)
 
 
@@ -220,7 +222,7 @@ class PayHeroClient:
         logger.debug(f"Request data: {json.dumps(data, default=str) if data else 'None'}")
         
         try:
-            response = requests.request(
+            response = get_http_session('payhero').request(
                 method=method,
                 url=url,
                 headers=headers,
@@ -543,6 +545,9 @@ class PayHeroClient:
         secret = secret or getattr(settings, 'PAYHERO_WEBHOOK_SECRET', '')
         
         if not secret:
+            if getattr(settings, 'PAYHERO_REQUIRE_SIGNED_WEBHOOKS', False):
+                logger.error("PayHero webhook secret not configured, rejecting webhook")
+                return False
             logger.warning("PayHero webhook secret not configured, skipping verification")
             return True  # Skip verification if no secret configured
         
@@ -0,0 +1,244 @@
+# apps/billing/services/voucher_generator.py
+"""
+Bulk Voucher Generator
+
+``VoucherBatch.generate_vouchers`` used to run, for every voucher, an
+``exists()`` query per candidate code and a ``Voucher.objects.create()``.
+Printing 50,000 hotspot vouchers took more than 100k queries.
+
+Generation now works in chunks (VOUCHER_BULK_CHUNK):
+
+    1. draw candidate codes for the whole chunk (with a small surplus) and
+       dedupe them in memory
+    2. drop collisions with existing vouchers → 1 query per chunk
+    3. lock the batch row and cap the chunk at what is left of its quantity
+    4. bulk_create the chunk → 1 INSERT per chunk
+    5. advance batch.issued_count with an F() update and report progress
+
+Large requests run as the ``generate_voucher_batch`` Celery task, one job per
+batch at a time. The API returns a job id whose progress is kept in the cache
+(``job_status``).
+"""
+
+import logging
+import random
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PIN_CHARS = '0123456789'
+
+
+class VoucherGenerator:
+    """Set-based voucher code generation for a VoucherBatch."""
+
+    JOB_KEY = 'voucher_job:{job_id}'
+    BATCH_JOB_KEY = 'voucher_job:{schema_name}:batch:{batch_id}'
+    JOB_TTL = 24 * 3600
+
+    def __init__(self):
+        self.chunk_size = getattr(settings, 'VOUCHER_BULK_CHUNK', 5000)
+        self.async_threshold = getattr(settings, 'VOUCHER_ASYNC_THRESHOLD', 1000)
+        self._random = random.SystemRandom()
+
+    # ────────────────────────────────────────────────────────────────
+    # CODES
+    # ────────────────────────────────────────────────────────────────
+
+    def _draw_codes(self, batch, count: int, exclude: set) -> List[str]:
+        """Draw ``count`` unique codes not in ``exclude`` or the database."""
+        from apps.billing.models.voucher_models import Voucher
+
+        body_length = batch.length - len(batch.prefix)
+        charset = batch.charset
+        codes = set()
+
+        while len(codes) < count:
+            # 10% surplus absorbs in-memory duplicates and DB collisions
+            need = count - len(codes)
+            candidates = {
+                batch.prefix + ''.join(self._random.choices(charset, k=body_length))
+                for _ in range(need + need // 10 + 1)
+            }
+            candidates -= exclude
+            candidates -= codes
+            if candidates:
+                taken = set(
+                    Voucher.objects.filter(code__in=candidates).values_list('code', flat=True)
+                )
+                candidates -= taken
+            codes.update(list(candidates)[:need])
+
+        return list(codes)
+
+    def _build(self, batch, codes: List[str]):
+        from apps.billing.models.voucher_models import Voucher
+
+        # Mirror Voucher.save(), which bulk_create bypasses
+        expired = bool(batch.valid_to and timezone.now() > batch.valid_to)
+        return [
+            Voucher(
+                batch=batch,
+                code=code,
+                pin=''.join(self._random.choices(PIN_CHARS, k=6)),
+                face_value=batch.face_value,
+                sale_price=batch.sale_price,
+                remaining_value=batch.face_value,
+                valid_from=batch.valid_from,
+                valid_to=batch.valid_to,
+                is_reusable=batch.is_reusable,
+                max_uses=batch.max_uses,
+                status='EXPIRED' if expired else 'ACTIVE',
+                created_by=batch.created_by,
+            )
+            for code in codes
+        ]
+
+    # ────────────────────────────────────────────────────────────────
+    # GENERATION
+    # ────────────────────────────────────────────────────────────────
+
+    def generate(self, batch, count: int,
+                 progress: Optional[Callable[[int, int], None]] = None,
+                 return_vouchers: bool = True) -> List:
+        """
+        Generate up to ``count`` vouchers for ``batch``.
+
+        Never issues more than the batch's remaining quantity, even when
+        several generations run against the same batch at once.
+
+        Args:
+            progress: Called as progress(created, total) after every chunk
+            return_vouchers: Keep and return the created Voucher objects
+                             (turn off for very large background runs)
+
+        Returns:
+            Created vouchers (empty if return_vouchers is False)
+        """
+        from apps.billing.models.voucher_models import Voucher, VoucherBatch
+
+        created = []
+        done = 0
+        seen = set()
+        collisions = 0
+
+        while done < count:
+            codes = self._draw_codes(batch, min(self.chunk_size, count - done), seen)
+
+            try:
+                with transaction.atomic():
+                    # Concurrent generations for this batch queue up here
+                    locked = VoucherBatch.objects.select_for_update().only(
+                        'quantity', 'issued_count'
+                    ).get(pk=batch.pk)
+                    size = min(len(codes), locked.quantity - locked.issued_count)
+                    if size <= 0:
+                        break
+                    codes = codes[:size]
+                    vouchers = Voucher.objects.bulk_create(self._build(batch, codes))
+                    VoucherBatch.objects.filter(pk=batch.pk).update(
+                        issued_count=F('issued_count') + size,
+                        available_count=F('quantity') - F('issued_count') - size,
+                        updated_at=timezone.now(),
+                    )
+            except IntegrityError:
+                # Only a concurrent writer taking one of the codes is worth a redraw
+                if not Voucher.objects.filter(code__in=codes).exists():
+                    raise
+                collisions += 1
+                if collisions > 3:
+                    raise
+                logger.warning(f"Voucher code collision in batch {batch.batch_number}, redrawing chunk")
+                continue
+
+            collisions = 0
+            seen.update(codes)
+            done += size
+            if return_vouchers:
+                created.extend(vouchers)
+            if progress:
+                progress(done, count)
+
+        batch.refresh_from_db(fields=['issued_count', 'available_count', 'updated_at'])
+        logger.info(f"Generated {done} vouchers for batch {batch.batch_number}")
+        return created
+
+    # ────────────────────────────────────────────────────────────────
+    # BACKGROUND JOBS
+    # ────────────────────────────────────────────────────────────────
+
+    def _set_job(self, job_id: str, **fields):
+        key = self.JOB_KEY.format(job_id=job_id)
+        state = cache.get(key) or {}
+        state.update(fields, updated_at=timezone.now().isoformat())
+        cache.set(key, state, self.JOB_TTL)
+
+    def job_status(self, job_id: str) -> Optional[Dict]:
+        return cache.get(self.JOB_KEY.format(job_id=job_id))
+
+    def _batch_job_key(self, batch, schema_name: str) -> str:
+        # Batch pks repeat across tenant schemas
+        return self.BATCH_JOB_KEY.format(schema_name=schema_name, batch_id=batch.pk)
+
+    def active_job(self, batch, schema_name: str) -> Optional[str]:
+        """Id of the queued or running job for ``batch``, if any."""
+        job_id = cache.get(self._batch_job_key(batch, schema_name))
+        job = self.job_status(job_id) if job_id else None
+        if job and job.get('status') in ('queued', 'running'):
+            return job_id
+        return None
+
+    def start_job(self, batch, count: int, schema_name: str) -> Optional[str]:
+        """
+        Queue a background generation run and return its job id.
+
+        Returns None if another job for ``batch`` is still queued or running.
+        """
+        from apps.billing.tasks import generate_voucher_batch
+
+        job_id = uuid.uuid4().hex
+        key = self._batch_job_key(batch, schema_name)
+        if not cache.add(key, job_id, self.JOB_TTL):
+            if self.active_job(batch, schema_name):
+                return None
+            # The previous job finished without releasing its slot
+            cache.set(key, job_id, self.JOB_TTL)
+        self._set_job(
+            job_id, status='queued', schema_name=schema_name, batch_id=batch.pk, total=count, created=0
+        )
+        transaction.on_commit(
+            lambda: generate_voucher_batch.delay(schema_name, batch.pk, count, job_id)
+        )
+        return job_id
+
+    def run_job(self, batch, count: int, job_id: str) -> Dict:
+        """Task body: generate with progress written to the job record."""
+        issued = batch.issued_count
+        self._set_job(job_id, status='running')
+        try:
+            self.generate(
+                batch, count,
+                progress=lambda done, total: self._set_job(job_id, created=done),
+                return_vouchers=False,
+            )
+        except Exception as e:
+            self._set_job(job_id, status='failed', error=str(e))
+            raise
+        finally:
+            key = self._batch_job_key(batch, connection.schema_name)
+            if cache.get(key) == job_id:
+                cache.delete(key)
+        created = batch.issued_count - issued
+        self._set_job(job_id, status='completed', created=created)
+        return {'job_id': job_id, 'created': created}
+
+
+# Singleton instance
+voucher_generator = VoucherGenerator()
@@ -0,0 +1,536 @@
+# apps/billing/services/webhook_ingestion.py
+"""
+Webhook Ingestion - persist, acknowledge, process on the billing queue
+
+PayHero and M-Pesa callbacks used to do all their work (marking payments,
+activating hotspot sessions, commission ledger, invoices) inside the
+callback request, and provider retries repeated that work.
+
+Callback endpoints now only call ``ingest``:
+
+    1. INSERT the raw payload into core.WebhookEvent (public schema).
+       The unique (provider, event_type, provider_reference) key turns a
+       retried callback into a no-op.
+    2. Queue ``process_webhook_event`` on the billing queue and ack.
+
+``process`` claims the event with a row lock, runs the handler for
+(provider, event_type) and records the outcome. Failed events are retried
+with exponential backoff by ``retry_webhook_events``, oldest first, so
+retries keep the order callbacks arrived in. After WEBHOOK_MAX_ATTEMPTS an
+event is marked 'dead' for manual review.
+
+WEBHOOK_PROCESSING_MODE='sync' processes inline (old behaviour, still
+deduplicated).
+"""
+
+import logging
+import random
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_tenants.utils import schema_context, get_public_schema_name
+
+from .checkout_routing import checkout_routing_service
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_payhero_payload(data) -> dict:
+    """Normalize the field names PayHero uses in different scenarios."""
+    return {
+        'checkout_request_id': (
+            data.get('CheckoutRequestID') or
+            data.get('checkout_request_id') or
+            data.get('reference')
+        ),
+        'result_code': data.get('ResultCode', data.get('result_code', 0)),
+        'result_desc': data.get('ResultDesc', data.get('result_desc', '')),
+        'amount': data.get('Amount', data.get('amount')),
+        'mpesa_receipt': (
+            data.get('MpesaReceiptNumber') or
+            data.get('mpesa_receipt') or
+            data.get('provider_reference')
+        ),
+        'phone_number': data.get('PhoneNumber', data.get('phone_number')),
+        'transaction_date': data.get('TransactionDate', data.get('completed_at')),
+        'external_reference': (
+            data.get('ExternalReference') or
+            data.get('external_reference')
+        ),
+        'raw': data,
+    }
+
+
+class WebhookIngestionService:
+    """Durable, deduplicated intake and processing of payment callbacks."""
+
+    MODE_QUEUE = 'queue'
+    MODE_SYNC = 'sync'
+
+    def __init__(self):
+        self.mode = getattr(settings, 'WEBHOOK_PROCESSING_MODE', self.MODE_QUEUE)
+        self.max_attempts = getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 8)
+        self.retry_base = getattr(settings, 'WEBHOOK_RETRY_BASE_SECONDS', 30)
+        self.lease_seconds = getattr(settings, 'WEBHOOK_PROCESSING_LEASE', 300)
+        self.handlers = {
+            ('payhero', 'subscription'): self._handle_payhero_subscription,
+            ('payhero', 'hotspot'): self._handle_payhero_hotspot,
+            ('payhero', 'billing'): self._handle_payhero_billing,
+            ('mpesa', 'stk'): self._handle_mpesa_stk,
+            ('mpesa', 'c2b'): self._handle_mpesa_c2b,
+        }
+
+    # ────────────────────────────────────────────────────────────────
+    # INTAKE
+    # ────────────────────────────────────────────────────────────────
+
+    def ingest(self, provider: str, event_type: str, provider_reference: str,
+               payload: dict, schema_name: str = '') -> Tuple[Optional[int], bool]:
+        """
+        Persist a callback and schedule its processing.
+
+        Returns:
+            (event_id, created) - created is False for a duplicate callback
+        """
+        from apps.core.models import WebhookEvent
+
+        with schema_context(get_public_schema_name()):
+            try:
+                with transaction.atomic():
+                    event = WebhookEvent.objects.create(
+                        provider=provider,
+                        event_type=event_type,
+                        provider_reference=str(provider_reference)[:100],
+                        schema_name=schema_name or '',
+                        payload=payload,
+                    )
+            except IntegrityError:
+                logger.info(f"[WEBHOOK] Duplicate {provider}/{event_type} callback {provider_reference} ignored")
+                return None, False
+
+        transaction.on_commit(lambda: self.dispatch(event.id))
+        return event.id, True
+
+    def dispatch(self, event_id: int):
+        """Hand an event to the billing queue (or process it inline)."""
+        if self.mode == self.MODE_SYNC:
+            self.process(event_id)
+            return
+
+        from apps.billing.tasks import process_webhook_event
+        try:
+            process_webhook_event.apply_async(args=[event_id])
+        except Exception as e:
+            # Event is stored; retry_webhook_events picks it up
+            logger.warning(f"[WEBHOOK] Could not queue event {event_id}, leaving it for the retry sweep: {e}")
+
+    # ────────────────────────────────────────────────────────────────
+    # PROCESSING
+    # ────────────────────────────────────────────────────────────────
+
+    def _claimable(self, now):
+        return (
+            Q(status='received') |
+            Q(status='failed', next_attempt_at__lte=now) |
+            # Worker died mid-processing
+            Q(status='processing', next_attempt_at__lte=now)
+        )
+
+    def _claim(self, event_id: int):
+        from apps.core.models import WebhookEvent
+
+        now = timezone.now()
+        with schema_context(get_public_schema_name()), transaction.atomic():
+            event = (
+                WebhookEvent.objects.select_for_update(skip_locked=True)
+                .filter(self._claimable(now), id=event_id)
+                .first()
+            )
+            if event is None:
+                return None
+            event.status = 'processing'
+            event.attempts += 1
+            event.next_attempt_at = now + timedelta(seconds=self.lease_seconds)
+            event.save(update_fields=['status', 'attempts', 'next_attempt_at'])
+        return event
+
+    def _finish(self, event, **fields):
+        from apps.core.models import WebhookEvent
+
+        with schema_context(get_public_schema_name()):
+            WebhookEvent.objects.filter(id=event.id).update(**fields)
+
+    def process(self, event_id: int) -> Dict:
+        """Process one event. Safe to call concurrently and repeatedly."""
+        event = self._claim(event_id)
+        if event is None:
+            return {'event_id': event_id, 'status': 'skipped'}
+
+        handler = self.handlers.get((event.provider, event.event_type))
+        try:
+            if handler is None:
+                raise ValueError(f"No handler for {event.provider}/{event.event_type}")
+            result = handler(event) or {}
+        except Exception as e:
+            return self._fail(event, e)
+
+        self._finish(
+            event,
+            status='processed',
+            result=result,
+            last_error='',
+            next_attempt_at=None,
+            processed_at=timezone.now(),
+        )
+        logger.info(f"[WEBHOOK] Processed {event}: {result}")
+        return {'event_id': event.id, 'status': 'processed', **result}
+
+    def _fail(self, event, error: Exception) -> Dict:
+        if event.attempts >= self.max_attempts:
+            self._finish(event, status='dead', last_error=str(error)[:2000], next_attempt_at=None)
+            logger.error(f"[WEBHOOK] {event} gave up after {event.attempts} attempts: {error}")
+            return {'event_id': event.id, 'status': 'dead', 'error': str(error)}
+
+        delay = min(self.retry_base * 2 ** (event.attempts - 1), 3600)
+        delay += random.uniform(0, delay / 4)
+        self._finish(
+            event,
+            status='failed',
+            last_error=str(error)[:2000],
+            next_attempt_at=timezone.now() + timedelta(seconds=delay),
+        )
+        logger.warning(f"[WEBHOOK] {event} attempt {event.attempts} failed, retrying in {int(delay)}s: {error}")
+        return {'event_id': event.id, 'status': 'failed', 'error': str(error), 'retry_in': int(delay)}
+
+    def retry_due(self, limit: int = 200) -> Dict[str, int]:
+        """Re-process due events oldest first, preserving arrival order."""
+        from apps.core.models import WebhookEvent
+
+        stats = {'due': 0, 'processed': 0, 'failed': 0, 'dead': 0, 'skipped': 0}
+        with schema_context(get_public_schema_name()):
+            due = list(
+                WebhookEvent.objects
+                .filter(self._claimable(timezone.now()))
+                .order_by('received_at')
+                .values_list('id', flat=True)[:limit]
+            )
+        stats['due'] = len(due)
+
+        for event_id in due:
+            result = self.process(event_id)
+            stats[result['status']] += 1
+        return stats
+
+    # ────────────────────────────────────────────────────────────────
+    # PAYHERO HANDLERS
+    # ────────────────────────────────────────────────────────────────
+
+    def _handle_payhero_subscription(self, event) -> Dict:
+        """ISP subscription payments (ISP → Netily), public schema."""
+        from apps.subscriptions.models import SubscriptionPayment
+
+        payload = normalize_payhero_payload(event.payload)
+        checkout_id = payload['checkout_request_id']
+
+        with schema_context(get_public_schema_name()), transaction.atomic():
+            try:
+                payment = SubscriptionPayment.objects.select_for_update().select_related(
+                    'subscription__company'
+                ).get(payhero_checkout_id=checkout_id)
+            except SubscriptionPayment.DoesNotExist:
+                logger.error(f"Subscription payment not found: {checkout_id}")
+                return {'outcome': 'not_found'}
+
+            if payment.status == 'completed':
+                return {'outcome': 'already_settled'}
+
+            if int(payload['result_code']) == 0:
+                # Success
+                payment.mark_completed(payload['mpesa_receipt'])
+
+                # Check if this is a trial conversion
+                subscription = payment.subscription
+                if subscription.is_trial:
+                    # Convert from trial to paid subscription
+                    subscription.convert_from_trial(billing_period=subscription.billing_period)
+                    logger.info(
+                        f"Trial converted to paid: {subscription.company.name} "
+                        f"- Plan: {subscription.plan.name}"
+                    )
+                else:
+                    # Regular subscription renewal/extension
+                    subscription.extend_subscription()
+
+                logger.info(
+                    f"Subscription payment completed: {subscription.company.name} "
+                    f"- KES {payment.amount} - {payload['mpesa_receipt']}"
+                )
+                return {'outcome': 'completed'}
+
+            payment.mark_failed(payload['result_desc'])
+            logger.info(
+                f"Subscription payment failed: {payment.subscription.company.name} "
+                f"- {payload['result_desc']}"
+            )
+            return {'outcome': 'failed'}
+
+    def _record_commission(self, schema_name: str, payment_type: str, reference: str, amount):
+        """Record Netily's commission in the public schema."""
+        from apps.subscriptions.models import CommissionLedger
+        from apps.core.models import Company
+
+        with schema_context(get_public_schema_name()):
+            company = Company.objects.filter(tenant__schema_name=schema_name).first()
+            if company:
+                CommissionLedger.record_commission(
+                    company=company,
+                    payment_type=payment_type,
+                    payment_reference=reference,
+                    gross_amount=amount,
+                )
+
+    def _handle_payhero_hotspot(self, event) -> Dict:
+        """Hotspot WiFi purchases (End User → Netily → ISP), tenant schema."""
+        from apps.billing.models.hotspot_models import HotspotSession
+
+        payload = normalize_payhero_payload(event.payload)
+        checkout_id = payload['checkout_request_id']
+
+        def find_session(schema_name):
+            return HotspotSession.objects.filter(payhero_checkout_id=checkout_id).only('id').first()
+
+        schema_name, found = checkout_routing_service.resolve(
+            kind='hotspot',
+            checkout_request_id=checkout_id,
+            external_reference=payload['external_reference'],
+            finder=find_session,
+        )
+        if not found:
+            logger.error(f"Hotspot session not found: {checkout_id}")
+            return {'outcome': 'not_found'}
+
+        with schema_context(schema_name), transaction.atomic():
+            session = HotspotSession.objects.select_for_update().select_related(
+                'router', 'plan'
+            ).get(pk=found.pk)
+
+            if session.status in ('paid', 'active'):
+                return {'outcome': 'already_settled', 'schema': schema_name}
+
+            if int(payload['result_code']) != 0:
+                session.mark_failed(payload['result_desc'])
+                logger.info(f"Hotspot payment failed: {session.session_id} - {payload['result_desc']}")
+                return {'outcome': 'failed', 'schema': schema_name}
+
+            # Success - mark paid and activate
+            session.mark_paid(payload['mpesa_receipt'])
+            session.activate(self._activate_hotspot_user(session))
+
+            logger.info(
+                f"Hotspot payment completed: {session.session_id} "
+                f"- KES {session.amount} - {payload['mpesa_receipt']}"
+            )
+
+            try:
+                self._record_commission(schema_name, 'hotspot', session.session_id, session.amount)
+            except Exception as e:
+                logger.error(f"Error recording hotspot commission: {e}")
+
+        return {'outcome': 'completed', 'schema': schema_name}
+
+    def _activate_hotspot_user(self, session) -> str:
+        """
+        Activate user on MikroTik router.
+        Returns the access code.
+        """
+        # Generate access code
+        access_code = session.generate_access_code()
+
+        # TODO: Implement MikroTik API call
+        # This would connect to the router and create a hotspot user
+        # (api.path('ip', 'hotspot', 'user').add(name=access_code, ...))
+
+        logger.info(f"Activated hotspot user: {access_code} on {session.router.name}")
+
+        return access_code
+
+    def _handle_payhero_billing(self, event) -> Dict:
+        """Customer billing payments (Customer → Netily → ISP), tenant schema."""
+        from apps.billing.models.payment_models import Payment
+
+        payload = normalize_payhero_payload(event.payload)
+        checkout_id = payload['checkout_request_id']
+
+        def find_payment(schema_name):
+            # Billing STK pushes store the checkout id in transaction_id
+            return Payment.objects.filter(transaction_id=checkout_id).only('id').first()
+
+        schema_name, found = checkout_routing_service.resolve(
+            kind='billing',
+            checkout_request_id=checkout_id,
+            external_reference=payload['external_reference'],
+            finder=find_payment,
+        )
+        if not found:
+            logger.error(f"Billing payment not found: {checkout_id}")
+            return {'outcome': 'not_found'}
+
+        with schema_context(schema_name), transaction.atomic():
+            payment = Payment.objects.select_for_update().select_related('customer').get(pk=found.pk)
+
+            if payment.status == 'COMPLETED':
+                return {'outcome': 'already_settled', 'schema': schema_name}
+
+            if int(payload['result_code']) != 0:
+                payment.status = 'FAILED'
+                payment.failure_reason = payload['result_desc']
+                payment.raw_callback = payload['raw']
+                payment.save()
+                logger.info(f"Billing payment failed: {payment.customer.full_name} - {payload['result_desc']}")
+                return {'outcome': 'failed', 'schema': schema_name}
+
+            # Success; Payment.save applies a completed payment to its invoice and
+            # the post_save signal credits the customer's outstanding balance
+            payment.status = 'COMPLETED'
+            payment.mpesa_receipt = payload['mpesa_receipt'] or ''
+            payment.processed_at = timezone.now()
+            payment.raw_callback = payload['raw']
+            payment.save()
+
+            customer = payment.customer
+            customer.refresh_from_db(fields=['outstanding_balance', 'status'])
+
+            # Reactivate suspended customers who are now paid up
+            if customer.status == 'SUSPENDED' and customer.outstanding_balance <= 0:
+                customer.status = 'ACTIVE'
+                customer.save(update_fields=['status'])
+                # TODO: Reactivate on router
+
+            logger.info(
+                f"Billing payment completed: {customer.full_name} "
+                f"- KES {payment.amount} - {payload['mpesa_receipt']}"
+            )
+
+            try:
+                self._record_commission(
+                    schema_name,
+                    'invoice' if payment.invoice else 'recharge',
+                    str(payment.id),
+                    payment.amount,
+                )
+            except Exception as e:
+                logger.error(f"Error recording billing commission: {e}")
+
+        return {'outcome': 'completed', 'schema': schema_name}
+
+    # ────────────────────────────────────────────────────────────────
+    # M-PESA HANDLERS
+    # ────────────────────────────────────────────────────────────────
+
+    def _handle_mpesa_stk(self, event) -> Dict:
+        """Daraja STK Push results for payments started by PaymentViewSet."""
+        from apps.billing.integrations.mpesa_integration import MpesaCallback
+        from apps.billing.models.payment_models import Payment
+
+        result = MpesaCallback.handle_stk_callback(event.payload)
+        if 'status' not in result:
+            raise ValueError(result.get('message', 'Unparseable STK callback'))
+
+        checkout_request_id = result['checkout_request_id']
+
+        with schema_context(event.schema_name), transaction.atomic():
+            payment = (
+                Payment.objects.select_for_update()
+                .select_related('customer')
+                .filter(transaction_id=checkout_request_id)
+                .first()
+            )
+            if payment is None:
+                return {'outcome': 'not_found'}
+            if payment.status not in ('PENDING', 'PROCESSING'):
+                return {'outcome': 'already_settled'}
+
+            if result['status'] != 'SUCCESS':
+                payment.status = 'FAILED'
+                payment.failure_reason = result.get('error_message', 'Transaction failed')
+                payment.save()
+                return {'outcome': 'failed'}
+
+            transaction_data = result['transaction_data']
+            payment.mpesa_receipt = transaction_data.get('mpesa_receipt', '')
+            payment.mpesa_phone = str(transaction_data.get('phone_number', ''))
+            payment.payment_date = timezone.now()
+            payment.mark_as_completed(payment.created_by)
+
+            transaction.on_commit(lambda: self._send_payment_confirmation(event.schema_name, payment.id))
+
+        return {'outcome': 'completed', 'payment_id': str(payment.id)}
+
+    def _send_payment_confirmation(self, schema_name: str, payment_id):
+        from apps.billing.models.payment_models import Payment
+        from apps.billing.integrations.africastalking import SMSService
+
+        try:
+            with schema_context(schema_name):
+                payment = Payment.objects.select_related('customer').get(id=payment_id)
+                SMSService(payment.company).send_payment_confirmation(payment.customer, payment)
+        except Exception:
+            pass
+
+    def _handle_mpesa_c2b(self, event) -> Dict:
+        """
+        Paybill/Till confirmations. BillRefNumber is the customer code; the
+        payment is recorded against the tenant's active M-Pesa method.
+        """
+        from apps.billing.integrations.mpesa_integration import MpesaCallback
+        from apps.billing.models.payment_models import Payment, InvoiceItemPayment
+        from apps.customers.models import Customer
+
+        parsed = MpesaCallback.handle_c2b_callback(event.payload)
+        if not parsed.get('success'):
+            raise ValueError(parsed.get('message', 'Unparseable C2B callback'))
+        data = parsed['data']
+
+        with schema_context(event.schema_name), transaction.atomic():
+            if Payment.objects.filter(mpesa_receipt=data['trans_id']).exists():
+                return {'outcome': 'already_settled'}
+
+            customer = Customer.objects.filter(
+                customer_code__iexact=(data['bill_ref_number'] or '').strip()
+            ).first()
+            if customer is None:
+                # Nothing to retry: leave it for manual allocation
+                return {'outcome': 'unmatched', 'bill_ref_number': data['bill_ref_number']}
+
+            payment_method = InvoiceItemPayment.objects.filter(
+                method_type__in=['MPESA_PAYBILL', 'MPESA_TILL'], is_active=True
+            ).first()
+            if payment_method is None:
+                raise ValueError('No active M-Pesa Paybill/Till payment method configured')
+
+            names = [data.get('first_name'), data.get('middle_name'), data.get('last_name')]
+            payment = Payment.objects.create(
+                customer=customer,
+                amount=Decimal(str(data['trans_amount'])),
+                payment_method=payment_method,
+                status='COMPLETED',
+                payment_reference=data['bill_ref_number'] or '',
+                transaction_id=data['trans_id'],
+                mpesa_receipt=data['trans_id'],
+                mpesa_phone=str(data.get('msisdn') or ''),
+                mpesa_name=' '.join(n for n in names if n),
+                processed_at=timezone.now(),
+                raw_callback=event.payload,
+            )
+            customer.update_balance(-payment.amount)
+
+        return {'outcome': 'completed', 'payment_id': str(payment.id)}
+
+
+# Singleton instance
+webhook_ingestion_service = WebhookIngestionService()
@@ -1,6 +1,9 @@
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
 from django.utils import timezone
+from decimal import Decimal
 from .models.billing_models import Invoice, InvoiceItem
 from .models.payment_models import Payment
 from .models.voucher_models import Voucher
@@ -26,11 +29,13 @@ def handle_payment_completion(sender, instance, created, **kwargs):
         # Update customer balance
         customer = instance.customer
         if customer:
-            customer.outstanding_balance = max(
-                0,
-                customer.outstanding_balance - instance.amount
+            # Atomic decrement, floored at zero
+            type(customer).objects.filter(pk=customer.pk).update(
+                outstanding_balance=Greatest(
+                    F('outstanding_balance') - instance.amount, Value(Decimal('0'))
+                ),
+                updated_at=timezone.now()
             )
-            customer.save(update_fields=['outstanding_balance', 'updated_at'])
         
         # Update invoice if exists
         if instance.invoice:
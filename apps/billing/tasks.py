@@ -4,6 +4,7 @@ Billing Celery Tasks — Cloud Controller Hotspot Tasks
 Periodic tasks for:
 - Cleaning up expired hotspot sessions + RADIUS entries
 - Expiring stale pending payments
+- Processing ingested payment webhooks (PayHero, M-Pesa)
 """
 
 import logging
@@ -72,3 +73,180 @@ def expire_stale_pending_payments():
     except Exception as e:
         logger.error(f"Stale payment cleanup task failed: {e}", exc_info=True)
         return {'error': str(e)}
+
+
+@shared_task(name='apps.billing.tasks.process_webhook_event')
+def process_webhook_event(event_id):
+    """
+    Process one persisted payment callback (core.WebhookEvent).
+    
+    Queued by the callback endpoints right after the event is stored.
+    Failures are scheduled for retry_webhook_events rather than retried
+    here, so retries run in arrival order.
+    """
+    from apps.billing.services.webhook_ingestion import webhook_ingestion_service
+    
+    return webhook_ingestion_service.process(event_id)
+
+
+@shared_task(name='apps.billing.tasks.retry_webhook_events')
+def retry_webhook_events():
+    """
+    Periodic task: Re-process webhook events that failed, were never queued
+    (broker down) or were abandoned by a dead worker, oldest first.
+    
+    Runs every minute via Celery Beat.
+    """
+    try:
+        from apps.billing.services.webhook_ingestion import webhook_ingestion_service
+        
+        stats = webhook_ingestion_service.retry_due()
+        
+        if stats['due']:
+            logger.info(f"Webhook retry sweep: {stats}")
+        
+        return stats
+    except Exception as e:
+        logger.error(f"Webhook retry sweep failed: {e}", exc_info=True)
+        return {'error': str(e)}
+
+
+@shared_task(name='apps.billing.tasks.fold_pending_balances')
+def fold_pending_balances():
+    """
+    Periodic task: Fold unsettled CommissionLedger entries into
+    ISPPayoutConfig.pending_balance for journal-mode ISPs.
+    
+    Runs every minute via Celery Beat; a no-op in 'atomic' mode unless
+    individual ISPs are listed in PENDING_BALANCE_JOURNAL_COMPANIES.
+    """
+    from django.conf import settings
+    from django_tenants.utils import get_public_schema_name, schema_context
+    from apps.subscriptions.models import ISPPayoutConfig
+    
+    if getattr(settings, 'PENDING_BALANCE_MODE', 'atomic') == 'journal':
+        filters = {}
+    else:
+        companies = getattr(settings, 'PENDING_BALANCE_JOURNAL_COMPANIES', [])
+        if not companies:
+            return {'folded': 0}
+        filters = {'company_id__in': companies}
+    
+    with schema_context(get_public_schema_name()):
+        folded = ISPPayoutConfig.fold_pending_balances(**filters)
+    
+    return {'folded': folded}
+
+
+@shared_task(name='apps.billing.tasks.generate_voucher_batch')
+def generate_voucher_batch(schema_name, batch_id, count, job_id):
+    """
+    Generate a large number of vouchers for a VoucherBatch in the background.
+    
+    Queued by VoucherBatchViewSet.generate_vouchers above
+    VOUCHER_ASYNC_THRESHOLD; progress is readable via generation_status.
+    """
+    from django_tenants.utils import schema_context
+    from apps.billing.models.voucher_models import VoucherBatch
+    from apps.billing.services.voucher_generator import voucher_generator
+    
+    with schema_context(schema_name):
+        batch = VoucherBatch.objects.get(pk=batch_id)
+        return voucher_generator.run_job(batch, count, job_id)
+
+
+@shared_task(name='apps.billing.tasks.run_billing_cycle')
+def run_billing_cycle(schema_name, billing_cycle_id, run_id, user_id=None):
+    """
+    Run (or resume) a billing run for a BillingCycle in the background.
+    
+    Queued by InvoiceViewSet.bulk_generate. Issued invoices are notified by
+    send_billing_run_notifications once every chunk has committed.
+    """
+    from django_tenants.utils import schema_context
+    from apps.core.models import User
+    from apps.billing.models.billing_models import BillingCycle
+    from apps.billing.services.billing_run import billing_run_engine
+    
+    with schema_context(schema_name):
+        billing_cycle = BillingCycle.objects.get(pk=billing_cycle_id)
+        user = User.objects.filter(pk=user_id).first() if user_id else None
+        state = billing_run_engine.run(billing_cycle, run_id=run_id, user=user)
+    
+    if state['issue'] and state['created'] and not state['dry_run']:
+        send_billing_run_notifications.delay(schema_name, run_id)
+    
+    return {key: state[key] for key in ('run_id', 'status', 'created', 'skipped', 'total_amount')}
+
+
+@shared_task(name='apps.billing.tasks.send_billing_run_notifications')
+def send_billing_run_notifications(schema_name, run_id):
+    """
+    Post-run stage: SMS every invoice a billing run issued.
+    
+    Bulk-created invoices skip the post_save notification signal, so they
+    are notified here in one pass instead.
+    """
+    from django_tenants.utils import get_public_schema_name, schema_context
+    from apps.core.models import Company
+    from apps.billing.services.billing_run import billing_run_engine
+    
+    try:
+        with schema_context(get_public_schema_name()):
+            company = Company.objects.filter(tenant__schema_name=schema_name).first()
+        with schema_context(schema_name):
+            return billing_run_engine.notify(run_id, company)
+    except Exception as e:
+        logger.error(f"Billing run {run_id} notifications failed: {e}", exc_info=True)
+        return {'error': str(e)}
+
+
+@shared_task(name='apps.billing.tasks.run_due_settlements')
+def run_due_settlements():
+    """
+    Settle every ISP that is due, in parallel.
+    
+    Fans out one settle_company subtask per company; collect_settlement_results
+    receives all outcomes once they finish (chord).
+    """
+    from apps.subscriptions.services.settlement_runner import settlement_runner
+    
+    return settlement_runner.dispatch()
+
+
+@shared_task(bind=True, max_retries=20, name='apps.billing.tasks.settle_company')
+def settle_company(self, company_id, idempotency_key):
+    """
+    Settle one ISP, limited per payout channel.
+    
+    Always returns a result dict (never raises) so one failing ISP cannot
+    break the chord collecting the others.
+    """
+    import random
+    from apps.subscriptions.services.settlement_runner import ChannelBusy, settlement_runner
+    
+    try:
+        return settlement_runner.settle(company_id, idempotency_key)
+    except ChannelBusy as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(countdown=random.randint(10, 30))
+        return {'company_id': company_id, 'success': False, 'amount': None,
+                'message': f"Payout channel {e} busy; retries exhausted"}
+    except Exception as e:
+        logger.error(f"Settlement for company {company_id} failed: {e}", exc_info=True)
+        return {'company_id': company_id, 'success': False, 'amount': None, 'message': str(e)}
+
+
+@shared_task(name='apps.billing.tasks.collect_settlement_results')
+def collect_settlement_results(results, run_id):
+    """Chord callback: summarize a settlement run."""
+    from apps.subscriptions.services.settlement_runner import settlement_runner
+    
+    summary = settlement_runner.summarize(run_id, results)
+    
+    if summary['failed']:
+        logger.warning(f"Settlement run {run_id}: {summary}")
+    else:
+        logger.info(f"Settlement run {run_id}: {summary}")
+    
+    return summary
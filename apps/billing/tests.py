@@ -0,0 +1,426 @@
+import hashlib
+import hmac
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db import IntegrityError, connection
+from django.db.models.signals import post_save
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+from django_tenants.utils import schema_context, get_public_schema_name
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.core.models import Company, CheckoutRoute, User, WebhookEvent
+from apps.customers.models import Customer, ServiceConnection
+from apps.radius.signals_auto_sync import sync_customer_status_to_radius
+
+from .models.billing_models import BillingCycle, Invoice
+from .models.payment_models import InvoiceItemPayment, Payment
+from .models.voucher_models import Voucher, VoucherBatch
+from .services.billing_run import BillingRunEngine, billing_run_engine
+from .services.checkout_routing import CheckoutRoutingService
+from .services.payhero import PayHeroClient
+from .services.voucher_generator import VoucherGenerator
+from .services.webhook_ingestion import WebhookIngestionService
+from .tasks import run_billing_cycle
+from .views.InvoiceViews import InvoiceViewSet
+from .views.webhook_views import MpesaC2BConfirmationView, PayHeroWebhookMixin
+
+
+class ISPTenantTestCase(TenantTestCase):
+    """TenantTestCase whose tenant belongs to a Company (required by core.Tenant)."""
+
+    @classmethod
+    def setup_tenant(cls, tenant):
+        # The tenant is dropped after each class, its company is not
+        tenant.company, _ = Company.objects.get_or_create(name='Test ISP', defaults=dict(
+            slug='test-isp', email='isp@example.com',
+            phone_number='254700000000', address='Moi Avenue', city='Nairobi',
+        ))
+        tenant.subdomain = 'test'
+        tenant.database_name = 'test'
+
+
+class CheckoutRoutingTests(ISPTenantTestCase):
+    def setUp(self):
+        self.service = CheckoutRoutingService()
+        self.service.scan_fallback = False
+        self.visited = []
+
+    def finder(self, schema_name):
+        self.visited.append(schema_name)
+        return 'session' if connection.schema_name == self.tenant.schema_name else None
+
+    def route(self, checkout_request_id):
+        with schema_context(get_public_schema_name()):
+            CheckoutRoute.objects.create(
+                checkout_request_id=checkout_request_id, tenant=self.tenant,
+                schema_name=self.tenant.schema_name, kind='hotspot', object_id='1',
+            )
+
+    def test_reference_round_trip(self):
+        reference = self.service.build_reference('HS_123_ABCD', self.tenant.schema_name)
+        self.assertEqual(reference, f'HS_123_ABCD--{self.tenant.schema_name}')
+        self.assertEqual(self.service.parse_reference(reference), ('HS_123_ABCD', self.tenant.schema_name))
+        self.assertEqual(self.service.parse_reference('HS_123_ABCD'), ('HS_123_ABCD', None))
+
+    def test_resolves_through_valid_hint(self):
+        schema_name, obj = self.service.resolve(
+            'hotspot', 'ws_CO_1', f'HS_1--{self.tenant.schema_name}', self.finder
+        )
+        self.assertEqual((schema_name, obj), (self.tenant.schema_name, 'session'))
+        self.assertEqual(self.visited, [self.tenant.schema_name])
+
+    def test_resolves_through_route_table_without_hint(self):
+        self.route('ws_CO_2')
+        schema_name, obj = self.service.resolve('hotspot', 'ws_CO_2', 'HS_2', self.finder)
+        self.assertEqual((schema_name, obj), (self.tenant.schema_name, 'session'))
+
+    def test_malformed_hint_is_never_used_as_schema(self):
+        self.route('ws_CO_3')
+        for hint in ['x"; DROP TABLE core_tenant; --', 'Test', 'test,public', 'a b']:
+            self.visited = []
+            schema_name, obj = self.service.resolve('hotspot', 'ws_CO_3', f'HS_3--{hint}', self.finder)
+            self.assertEqual((schema_name, obj), (self.tenant.schema_name, 'session'))
+            self.assertEqual(self.visited, [self.tenant.schema_name])
+
+    def test_unknown_or_public_hint_falls_back_to_route_table(self):
+        self.route('ws_CO_4')
+        for hint in ['no_such_tenant', get_public_schema_name()]:
+            self.visited = []
+            schema_name, obj = self.service.resolve('hotspot', 'ws_CO_4', f'HS_4--{hint}', self.finder)
+            self.assertEqual(schema_name, self.tenant.schema_name)
+            self.assertNotIn(hint, self.visited)
+
+    def test_unrouted_checkout_without_scan(self):
+        self.assertEqual(self.service.resolve('hotspot', 'ws_CO_5', 'HS_5', self.finder), (None, None))
+        self.assertEqual(self.visited, [])
+
+
+class PayHeroSignatureTests(SimpleTestCase):
+    body = b'{"response":{"CheckoutRequestID":"ws_CO_1","ResultCode":0}}'
+
+    @override_settings(PAYHERO_WEBHOOK_SECRET='')
+    def test_skips_verification_when_secret_is_not_configured(self):
+        self.assertTrue(PayHeroClient().verify_webhook_signature(self.body, 'anything'))
+
+    @override_settings(PAYHERO_WEBHOOK_SECRET='', PAYHERO_REQUIRE_SIGNED_WEBHOOKS=True)
+    def test_rejects_when_signatures_are_required_but_secret_is_not_configured(self):
+        self.assertFalse(PayHeroClient().verify_webhook_signature(self.body, 'anything'))
+
+    @override_settings(DEBUG=True, PAYHERO_REQUIRE_SIGNED_WEBHOOKS=True)
+    def test_required_signatures_are_checked_with_debug_on(self):
+        request = APIRequestFactory().post('/api/v1/webhooks/payhero/billing/', {}, format='json')
+        self.assertFalse(PayHeroWebhookMixin().verify_signature(request))
+
+    @override_settings(PAYHERO_WEBHOOK_SECRET='s3cret')
+    def test_accepts_only_matching_signature(self):
+        signature = hmac.new(b's3cret', self.body, hashlib.sha256).hexdigest()
+        client = PayHeroClient()
+        self.assertTrue(client.verify_webhook_signature(self.body, signature))
+        self.assertFalse(client.verify_webhook_signature(self.body, '0' * 64))
+
+
+class WebhookIngestionTests(ISPTenantTestCase):
+    def setUp(self):
+        # The radius app ships no migrations, so its tables are not in test schemas
+        post_save.disconnect(sync_customer_status_to_radius, sender=Customer)
+        self.addCleanup(post_save.connect, sync_customer_status_to_radius, sender=Customer)
+
+        self.service = WebhookIngestionService()
+        user = User.objects.create_user(
+            email='jane@example.com', password='x',
+            phone_number='254711111111', first_name='Jane', last_name='Doe',
+        )
+        self.customer = Customer.objects.create(
+            user=user, customer_code='CUS-00001', id_number='12345678', outstanding_balance=Decimal('1000.00'),
+        )
+        self.method = InvoiceItemPayment.objects.create(
+            name='M-Pesa Paybill', code='MPESA', method_type='MPESA_PAYBILL',
+        )
+        self.payment = Payment.objects.create(
+            payment_number='PAY-1', customer=self.customer, amount=Decimal('300.00'),
+            payment_method=self.method, transaction_id='ws_CO_10',
+        )
+        with schema_context(get_public_schema_name()):
+            CheckoutRoute.objects.create(
+                checkout_request_id='ws_CO_10', tenant=self.tenant,
+                schema_name=self.tenant.schema_name, kind='billing', object_id=str(self.payment.pk),
+            )
+        self.callback = {
+            'CheckoutRequestID': 'ws_CO_10', 'ResultCode': 0, 'ResultDesc': 'Success',
+            'Amount': 300, 'MpesaReceiptNumber': 'QWE123RTY',
+        }
+
+    def events(self, **filters):
+        with schema_context(get_public_schema_name()):
+            return WebhookEvent.objects.filter(**filters).count()
+
+    def test_retried_callback_is_stored_once(self):
+        event_id, created = self.service.ingest('payhero', 'billing', 'ws_CO_10', self.callback)
+        self.assertTrue(created)
+        self.assertEqual(self.service.ingest('payhero', 'billing', 'ws_CO_10', self.callback), (None, False))
+        self.assertEqual(self.events(provider_reference='ws_CO_10'), 1)
+
+    def test_payhero_billing_payment_credits_customer_once(self):
+        event_id, _ = self.service.ingest('payhero', 'billing', 'ws_CO_10', self.callback)
+
+        result = self.service.process(event_id)
+        self.assertEqual(result['status'], 'processed')
+        self.assertEqual(result['outcome'], 'completed')
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.outstanding_balance, Decimal('700.00'))
+
+        # Processed events are not claimed again
+        self.assertEqual(self.service.process(event_id)['status'], 'skipped')
+        self.payment.refresh_from_db()
+        self.customer.refresh_from_db()
+        self.assertEqual(self.payment.status, 'COMPLETED')
+        self.assertEqual(self.customer.outstanding_balance, Decimal('700.00'))
+
+
+@override_settings(MPESA_C2B_ALLOWED_IPS=['196.201.214.200', '196.201.212.0/24'], MPESA_C2B_BEHIND_PROXY=False)
+class MpesaC2BConfirmationTests(ISPTenantTestCase):
+    callback = {
+        'TransactionType': 'Pay Bill', 'TransID': 'RKT1234XYZ', 'TransAmount': '500.00',
+        'BusinessShortCode': '600000', 'BillRefNumber': 'CUS-00001', 'MSISDN': '254711111111',
+    }
+
+    def post(self, remote_addr, **extra):
+        request = APIRequestFactory().post(
+            '/api/v1/billing/payments/mpesa/c2b/confirmation/', self.callback,
+            format='json', REMOTE_ADDR=remote_addr, **extra,
+        )
+        return MpesaC2BConfirmationView.as_view()(request)
+
+    def events(self):
+        with schema_context(get_public_schema_name()):
+            return WebhookEvent.objects.filter(provider='mpesa', event_type='c2b').count()
+
+    def test_rejects_callers_outside_allow_list(self):
+        self.assertEqual(self.post('41.90.1.1').status_code, 403)
+        # A forged X-Forwarded-For does not help when not behind a proxy
+        self.assertEqual(self.post('41.90.1.1', HTTP_X_FORWARDED_FOR='196.201.214.200').status_code, 403)
+        self.assertEqual(self.events(), 0)
+
+    def test_accepts_safaricom_once_per_trans_id(self):
+        self.assertEqual(self.post('196.201.214.200').data['ResultCode'], 0)
+        self.assertEqual(self.post('196.201.212.138').data['ResultCode'], 0)
+        self.assertEqual(self.events(), 1)
+
+
+class VoucherGenerationTests(ISPTenantTestCase):
+    def setUp(self):
+        self.batch = VoucherBatch.objects.create(
+            name='Hotspot 1 day', face_value=Decimal('50.00'), sale_price=Decimal('50.00'),
+            valid_to=timezone.now() + timedelta(days=30), quantity=25, prefix='HS', length=8,
+        )
+        self.generator = VoucherGenerator()
+        self.generator.chunk_size = 10
+
+    def test_generates_batch_in_chunks(self):
+        progress = []
+        vouchers = self.generator.generate(self.batch, 25, progress=lambda done, total: progress.append(done))
+
+        codes = [v.code for v in vouchers]
+        self.assertEqual(len(set(codes)), 25)
+        self.assertTrue(all(code.startswith('HS') and len(code) == 8 for code in codes))
+        self.assertEqual(progress, [10, 20, 25])
+        self.assertEqual(Voucher.objects.filter(batch=self.batch).count(), 25)
+        self.assertEqual((self.batch.issued_count, self.batch.available_count), (25, 0))
+
+    def test_batch_never_exceeds_its_quantity(self):
+        self.assertEqual(self.batch.generate_vouchers(30), [])
+        self.assertEqual(len(self.batch.generate_vouchers()), 25)
+        self.assertEqual(self.batch.generate_vouchers(), [])
+
+    def test_concurrent_generations_stop_at_quantity(self):
+        # A second request for the whole batch lands after the first chunk
+        other = VoucherBatch.objects.get(pk=self.batch.pk)
+        interleaved = []
+
+        def second_generation(done, total):
+            if not interleaved:
+                interleaved.extend(VoucherGenerator().generate(other, 25))
+
+        vouchers = self.generator.generate(self.batch, 25, progress=second_generation)
+
+        self.assertEqual((len(vouchers), len(interleaved)), (10, 15))
+        self.assertEqual(Voucher.objects.filter(batch=self.batch).count(), 25)
+        self.assertEqual((self.batch.issued_count, self.batch.available_count), (25, 0))
+
+    def test_one_background_job_per_batch(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            job_id = self.generator.start_job(self.batch, 25, connection.schema_name)
+            self.assertIsNotNone(job_id)
+            self.assertIsNone(self.generator.start_job(self.batch, 25, connection.schema_name))
+
+        self.assertEqual(self.generator.run_job(self.batch, 25, job_id)['created'], 25)
+        job = self.generator.job_status(job_id)
+        self.assertEqual((job['status'], job['schema_name']), ('completed', connection.schema_name))
+
+        # Once the first job is done a new one may start, but issues nothing
+        with self.captureOnCommitCallbacks(execute=False):
+            job_id = self.generator.start_job(self.batch, 25, connection.schema_name)
+        self.assertIsNotNone(job_id)
+        self.assertEqual(self.generator.run_job(self.batch, 25, job_id)['created'], 0)
+        self.assertEqual(Voucher.objects.filter(batch=self.batch).count(), 25)
+
+    def test_redraws_chunk_when_a_code_was_taken_concurrently(self):
+        taken = Voucher.objects.create(
+            batch=self.batch, code='HSTAKEN1', face_value=Decimal('50.00'), sale_price=Decimal('50.00'),
+            valid_from=self.batch.valid_from, valid_to=self.batch.valid_to,
+        )
+        draws = [[taken.code, 'HSFRESH1'], ['HSFRESH2', 'HSFRESH3']]
+        with mock.patch.object(self.generator, '_draw_codes', side_effect=draws):
+            vouchers = self.generator.generate(self.batch, 2)
+        self.assertEqual(sorted(v.code for v in vouchers), ['HSFRESH2', 'HSFRESH3'])
+
+    def test_other_integrity_errors_are_not_retried(self):
+        self.batch.max_uses = -1  # violates the PositiveIntegerField check
+        with mock.patch.object(self.generator, '_draw_codes', wraps=self.generator._draw_codes) as draw:
+            with self.assertRaises(IntegrityError):
+                self.generator.generate(self.batch, 5)
+        self.assertEqual(draw.call_count, 1)
+        self.assertFalse(Voucher.objects.filter(batch=self.batch).exists())
+
+
+class BillingRunEngineTests(ISPTenantTestCase):
+    def setUp(self):
+        # The radius app ships no migrations, so its tables are not in test schemas
+        post_save.disconnect(sync_customer_status_to_radius, sender=Customer)
+        self.addCleanup(post_save.connect, sync_customer_status_to_radius, sender=Customer)
+
+        self.engine = BillingRunEngine()
+        self.engine.chunk_size = 2
+        for engine in (self.engine, billing_run_engine):
+            patcher = mock.patch.object(engine, '_next_chunk', self.next_chunk(engine))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cycle = BillingCycle.objects.create(
+            name='October 2026', cycle_code='BC-2026-10', start_date=date(2026, 10, 1),
+            end_date=date(2026, 10, 31), due_date=date(2026, 11, 7),
+        )
+        # Full month: 3100 + 16% VAT
+        self.services = [self.service(n) for n in range(1, 4)]
+        # Activated on the 17th: 15 of 31 days at 100/day, + 16% VAT
+        self.prorated = self.service(4, activation_date=timezone.make_aware(datetime(2026, 10, 17, 9)))
+
+    @staticmethod
+    def next_chunk(engine):
+        # billing_plan lags its model in the migrations, so skip the plan
+        # join; these connections have no plan and are priced by monthly_price
+        def load(after_id):
+            return list(
+                ServiceConnection.objects
+                .filter(status='ACTIVE', pk__gt=after_id)
+                .select_related('customer__user')
+                .order_by('pk')[:engine.chunk_size]
+            )
+        return load
+
+    def service(self, n, **kwargs):
+        user = User.objects.create_user(
+            email=f'user{n}@example.com', password='x', phone_number=f'25471100{n:04d}',
+            first_name='Test', last_name=f'User {n}',
+        )
+        customer = Customer.objects.create(user=user, customer_code=f'CUS-{n}', id_number=f'ID{n}')
+        kwargs.setdefault('activation_date', timezone.make_aware(datetime(2026, 9, 1)))
+        # Static connections get no RADIUS credentials on save
+        return ServiceConnection.objects.create(
+            customer=customer, status='ACTIVE', auth_connection_type='STATIC',
+            download_speed=10, upload_speed=10, monthly_price=Decimal('3100.00'), **kwargs,
+        )
+
+    def test_dry_run_prorates_without_writing(self):
+        state = self.engine.run(self.cycle, dry_run=True)
+
+        self.assertEqual((state['status'], state['created'], state['chunks']), ('completed', 4, 2))
+        self.assertEqual(state['total_amount'], str(3 * Decimal('3596.00') + Decimal('1740.00')))
+        prorated = next(row for row in state['preview'] if row['service_connection_id'] == self.prorated.pk)
+        self.assertEqual((prorated['period_start'], prorated['total_amount']), ('2026-10-17', '1740.00'))
+        self.assertFalse(Invoice.objects.exists())
+
+    def test_already_billed_connections_are_skipped(self):
+        self.engine.run(self.cycle)
+        self.assertEqual(Invoice.objects.filter(billing_cycle=self.cycle).count(), 4)
+
+        # A second run (e.g. after its checkpoint was lost) bills nobody twice
+        state = self.engine.run(self.cycle)
+        self.assertEqual((state['created'], state['skipped'], state['total_amount']), (0, 4, '0.00'))
+        self.assertEqual(Invoice.objects.filter(billing_cycle=self.cycle).count(), 4)
+        self.cycle.refresh_from_db()
+        self.assertEqual(self.cycle.total_invoices, 4)
+
+    def test_failed_run_resumes_from_checkpoint(self):
+        insert, calls = self.engine._insert, []
+
+        def insert_then_fail(pairs):
+            calls.append(pairs)
+            if len(calls) == 2:
+                raise RuntimeError('connection lost')
+            insert(pairs)
+
+        run_id = self.engine.prepare(self.cycle)
+        with mock.patch.object(self.engine, '_insert', side_effect=insert_then_fail):
+            with self.assertRaises(RuntimeError):
+                self.engine.run(self.cycle, run_id=run_id)
+
+        state = self.engine.run_status(run_id)
+        self.assertEqual(state['status'], 'failed')
+        self.assertEqual((state['last_connection_id'], state['created']), (self.services[1].pk, 2))
+        self.assertEqual(Invoice.objects.count(), 2)
+
+        # Resuming continues after the checkpoint instead of re-reading the first chunk
+        state = self.engine.run(self.cycle, run_id=run_id)
+        self.assertEqual((state['status'], state['created'], state['skipped']), ('completed', 4, 0))
+        self.assertEqual(
+            set(Invoice.objects.values_list('service_connection_id', flat=True)),
+            {service.pk for service in self.services + [self.prorated]},
+        )
+
+    def test_one_run_per_cycle(self):
+        run_id = self.engine.prepare(self.cycle)
+        self.assertEqual(self.engine.active_run(self.cycle), run_id)
+        self.assertIsNone(self.engine.prepare(self.cycle))
+
+        # A run started without prepare() fails visibly instead of staying queued
+        with self.assertRaises(ValueError):
+            self.engine.run(self.cycle, run_id='conflicting')
+        state = self.engine.run_status('conflicting')
+        self.assertEqual(state['status'], 'failed')
+        self.assertIn('already has a run in progress', state['error'])
+
+        self.engine.run(self.cycle, run_id=run_id)
+        self.assertIsNone(self.engine.active_run(self.cycle))
+        self.assertIsNotNone(self.engine.prepare(self.cycle))
+
+    def test_runs_are_private_to_their_tenant(self):
+        run_id = self.engine.prepare(self.cycle)
+        self.assertEqual(self.engine.run_status(run_id)['schema_name'], connection.schema_name)
+
+        with schema_context(get_public_schema_name()):
+            self.assertIsNone(self.engine.run_status(run_id))
+
+    def test_dry_run_is_queued(self):
+        admin = User.objects.create_user(
+            email='admin@example.com', password='x', phone_number='254722000000',
+            first_name='Admin', last_name='User', is_superuser=True,
+        )
+        request = APIRequestFactory().post(
+            '/api/v1/billing/invoices/bulk_generate/',
+            {'billing_cycle_id': self.cycle.pk, 'dry_run': 'true'}, format='json',
+        )
+        force_authenticate(request, user=admin)
+        # Run the queued task in-process instead of on a worker
+        with mock.patch.object(run_billing_cycle, 'delay', run_billing_cycle), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = InvoiceViewSet.as_view({'post': 'bulk_generate'})(request)
+
+        self.assertEqual(response.status_code, 202)
+        state = billing_run_engine.run_status(response.data['run_id'])
+        self.assertEqual((state['status'], state['dry_run'], state['created']), ('completed', True, 4))
+        self.assertEqual(len(state['preview']), 4)
+        self.assertFalse(Invoice.objects.exists())
@@ -26,6 +26,7 @@ from .views.webhook_views import (
     PayHeroSubscriptionWebhookView,
     PayHeroHotspotWebhookView,
     PayHeroBillingWebhookView,
+    MpesaC2BConfirmationView,
 )
 
 router = DefaultRouter()
@@ -46,6 +47,9 @@ router.register(r'vouchers', VoucherViewSet, basename='voucher')
 # Removed voucher-usages registration
 
 urlpatterns = [
+    # Daraja C2B confirmation (PUBLIC - Safaricom IP allow-list)
+    path('payments/mpesa/c2b/confirmation/', MpesaC2BConfirmationView.as_view(), name='mpesa-c2b-confirmation'),
+
     path('', include(router.urls)),
 
     # Additional endpoints
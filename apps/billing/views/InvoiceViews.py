@@ -6,6 +6,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
+from django.db import connection, transaction
 from django.db.models import Q, Sum
 from rest_framework import serializers
 from decimal import Decimal
@@ -22,6 +23,8 @@ from ..serializers import (
 )
 
 from ..calculators.invoice_calculator import InvoiceCalculator
+from ..services.billing_run import billing_run_engine
+from ..tasks import run_billing_cycle
 
 
 class PlanViewSet(viewsets.ModelViewSet):
@@ -502,8 +505,17 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def bulk_generate(self, request):
-        """Bulk generate invoices for active services"""
+        """
+        Bulk generate invoices for active services (billing run)
+        
+        The run is queued and polled via billing_run_status; dry_run=true
+        prices the cycle and records totals without writing. Pass run_id to
+        resume a failed run from its last checkpoint.
+        """
         billing_cycle_id = request.data.get('billing_cycle_id')
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        issue = str(request.data.get('issue', '')).lower() in ('1', 'true', 'yes')
+        run_id = request.data.get('run_id')
         
         try:
             billing_cycle = BillingCycle.objects.get(id=billing_cycle_id)
@@ -513,16 +525,47 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        invoices = InvoiceCalculator.generate_bulk_invoices(
-            request.user.company,
-            billing_cycle
-        )
+        if run_id:
+            state = billing_run_engine.run_status(run_id)
+            if not state or state['schema_name'] != connection.schema_name \
+                    or state['billing_cycle_id'] != billing_cycle.pk:
+                return Response(
+                    {'status': 'error', 'message': 'Billing run not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            if billing_run_engine.active_run(billing_cycle) not in (None, run_id):
+                return Response(
+                    {'status': 'error', 'message': 'Another billing run for this cycle is in progress'},
+                    status=status.HTTP_409_CONFLICT
+                )
+        else:
+            run_id = billing_run_engine.prepare(billing_cycle, dry_run=dry_run, issue=issue)
+            if run_id is None:
+                return Response(
+                    {'status': 'error', 'message': 'Another billing run for this cycle is in progress'},
+                    status=status.HTTP_409_CONFLICT
+                )
+        
+        transaction.on_commit(lambda: run_billing_cycle.delay(
+            connection.schema_name, billing_cycle.pk, run_id, request.user.pk
+        ))
         
         return Response({
-            'status': 'success',
-            'message': f'Generated {len(invoices)} invoices',
-            'invoice_count': len(invoices)
-        })
+            'status': 'queued',
+            'message': f'Billing run queued for {billing_cycle.name}',
+            'run_id': run_id
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=False, methods=['get'])
+    def billing_run_status(self, request):
+        """Progress and totals of a billing run (?run_id=...)"""
+        state = billing_run_engine.run_status(request.query_params.get('run_id', ''))
+        if not state or state['schema_name'] != connection.schema_name:
+            return Response(
+                {'status': 'error', 'message': 'Billing run not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(state)
     
     @action(detail=False, methods=['get'])
     def overdue(self, request):
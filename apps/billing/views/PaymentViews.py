@@ -1,11 +1,10 @@
 # apps/billing/views/PaymentViews.py
-import requests
 import base64
 import json
 import logging
 from decimal import Decimal
 from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import viewsets, status, filters
@@ -27,6 +26,8 @@ from ..serializers import (
 )
 from ..integrations.mpesa_integration import MpesaSTKPush, MpesaCallback, MpesaValidation
 from ..integrations.africastalking import SMSService
+from ..services.webhook_ingestion import webhook_ingestion_service
+from utils.http_client import get_http_session
 
 logger = logging.getLogger(__name__)
 
@@ -235,7 +236,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
                     'Content-Type': 'application/json'
                 }
 
-                response = requests.post(
+                response = get_http_session('payhero').post(
                     'https://api.payhero.co.ke/v1.1/payments/initiate',
                     json=payload,
                     headers=headers,
@@ -398,46 +399,18 @@ class PaymentViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def mpesa_callback(self, request):
         callback_data = request.data
-        callback_handler = MpesaCallback()
-        result = callback_handler.handle_stk_callback(callback_data)
+        result = MpesaCallback.handle_stk_callback(callback_data)
         
-        if result['status'] == 'SUCCESS':
-            checkout_request_id = result['checkout_request_id']
-            try:
-                payment = Payment.objects.get(transaction_id=checkout_request_id, status='PENDING')
-            except Payment.DoesNotExist:
-                return Response({'status': 'error', 'message': 'Payment not found'}, status=status.HTTP_404_NOT_FOUND)
-            
-            transaction_data = result['transaction_data']
-            payment.mpesa_receipt = transaction_data['mpesa_receipt']
-            payment.mpesa_phone = transaction_data['phone_number']
-            payment.payment_date = timezone.now()
-            payment.mark_as_completed(payment.created_by)
-            
-            try:
-                sms_service = SMSService(payment.company)
-                sms_service.send_payment_confirmation(payment.customer, payment)
-            except Exception:
-                pass
-            
-            return Response({
-                'status': 'success',
-                'message': 'Payment processed successfully',
-                'payment_id': payment.id,
-                'receipt_number': payment.mpesa_receipt
-            })
-        else:
-            checkout_request_id = result['checkout_request_id']
-            try:
-                payment = Payment.objects.get(transaction_id=checkout_request_id)
-                payment.status = 'FAILED'
-                payment.failure_reason = result.get('error_message', 'Transaction failed')
-                payment.save()
-            except Payment.DoesNotExist:
-                pass
-            return Response({
-                'error': result.get('error_message', 'Transaction failed')
-            }, status=status.HTTP_400_BAD_REQUEST)
+        checkout_request_id = result.get('checkout_request_id')
+        if not checkout_request_id:
+            return Response({'ResultCode': 1, 'ResultDesc': 'Invalid callback'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Persisted and processed on the billing queue; retries are deduplicated
+        webhook_ingestion_service.ingest(
+            'mpesa', 'stk', checkout_request_id, callback_data,
+            schema_name=connection.schema_name,
+        )
+        return Response({'ResultCode': 0, 'ResultDesc': 'Accepted'})
 
     @action(detail=False, methods=['post'])
     def bank_transfer(self, request):
@@ -5,6 +5,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
+from django.db import connection
 from django.db.models import Q, Sum, Count
 from decimal import Decimal
 
@@ -18,6 +19,7 @@ from ..serializers import (
     VoucherRedeemSerializer
 )
 from ..integrations.africastalking import SMSService
+from ..services.voucher_generator import voucher_generator
 
 
 class VoucherBatchViewSet(viewsets.ModelViewSet):
@@ -66,7 +68,29 @@ class VoucherBatchViewSet(viewsets.ModelViewSet):
     def generate_vouchers(self, request, pk=None):
         """Generate vouchers for batch"""
         batch = self.get_object()
-        count = request.data.get('count')
+        try:
+            count = int(request.data.get('count') or 0)
+        except (TypeError, ValueError):
+            return Response(
+                {'status': 'error', 'message': 'count must be a number'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        remaining = batch.quantity - batch.issued_count
+        count = count or remaining
+        if voucher_generator.async_threshold <= count <= remaining:
+            # Large runs go to the billing queue; poll generation_status
+            job_id = voucher_generator.start_job(batch, count, connection.schema_name)
+            if job_id is None:
+                return Response(
+                    {'status': 'error', 'message': 'A generation job for this batch is already running'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return Response({
+                'status': 'queued',
+                'message': f'Generating {count} vouchers in the background',
+                'job_id': job_id,
+            }, status=status.HTTP_202_ACCEPTED)
         
         vouchers = batch.generate_vouchers(count)
         
@@ -77,6 +101,21 @@ class VoucherBatchViewSet(viewsets.ModelViewSet):
             'vouchers': VoucherSerializer(vouchers, many=True).data
         })
     
+    @action(detail=True, methods=['get'])
+    def generation_status(self, request, pk=None):
+        """Progress of a background generation job (?job_id=...)"""
+        batch = self.get_object()
+        job = voucher_generator.job_status(request.query_params.get('job_id', ''))
+        
+        # Batch pks repeat across tenant schemas
+        if not job or job.get('schema_name') != connection.schema_name or job.get('batch_id') != batch.pk:
+            return Response(
+                {'status': 'error', 'message': 'Generation job not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response(job)
+    
     @action(detail=True, methods=['get'])
     def vouchers(self, request, pk=None):
         """Get vouchers in batch"""
@@ -22,6 +22,7 @@ from django_tenants.utils import schema_context
 
 from apps.billing.models.hotspot_models import HotspotPlan, HotspotSession, HotspotBranding
 from apps.billing.services.payhero import PayHeroClient, PayHeroError
+from apps.billing.services.checkout_routing import checkout_routing_service
 from apps.network.models.router_models import Router
 from apps.subscriptions.models import CommissionLedger
 
@@ -175,10 +176,12 @@ class HotspotPurchaseView(APIView):
         try:
             client = PayHeroClient()
             
+            # Tenant hint lets the webhook skip the cross-tenant lookup
+            external_reference = checkout_routing_service.build_reference(session_id)
             response = client.stk_push(
                 phone_number=phone_number,
                 amount=int(plan.price),
-                reference=session_id,
+                reference=external_reference,
                 description=f"WiFi Access - {plan.name}",
                 callback_url=settings.PAYHERO_HOTSPOT_CALLBACK,
             )
@@ -186,6 +189,12 @@ class HotspotPurchaseView(APIView):
             if response.success:
                 session.payhero_checkout_id = response.checkout_request_id
                 session.save()
+                checkout_routing_service.register(
+                    kind='hotspot',
+                    checkout_request_id=response.checkout_request_id,
+                    object_id=session_id,
+                    external_reference=external_reference,
+                )
                 
                 # Mask phone number for display
                 masked_phone = phone_number[:4] + '***' + phone_number[-3:]
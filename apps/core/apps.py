@@ -4,3 +4,10 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
     label = 'core'
+
+    def ready(self):
+        """Import signals when app is ready"""
+        try:
+            import apps.core.signals  # noqa
+        except ImportError:
+            pass
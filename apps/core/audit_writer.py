@@ -0,0 +1,248 @@
+"""
+Asynchronous, batched audit log writer.
+
+AuditLogMiddleware used to run ``AuditLog.objects.create`` inside the
+response path of every authenticated mutation. With AUDIT_LOG_MODE set to a
+buffered mode the middleware only enqueues a plain dict and returns:
+
+    memory  → bounded in-process queue, drained by a daemon thread
+    redis   → Redis stream shared by all workers, drained by the
+              ``flush_audit_logs`` Celery task
+
+Records are grouped by schema and written with ``bulk_create``. When the
+buffer is full the record is dropped and counted instead of slowing the
+request down (``stats()['dropped']``).
+
+``timestamp`` is auto_now_add, so it records the write time; the lag is
+bounded by the flush interval.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import connection, transaction
+from django_tenants.utils import schema_context
+
+from utils.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogWriter:
+    """Buffers audit records and writes them in batches."""
+
+    MODE_SYNC = 'sync'
+    MODE_MEMORY = 'memory'
+    MODE_REDIS = 'redis'
+
+    STREAM_KEY = 'netily:audit_log:stream'
+    DROPPED_KEY = 'netily:audit_log:dropped'
+    LOCK_KEY = 'netily:audit_log:flush_lock'
+
+    FIELDS = ('user_id', 'action', 'model_name', 'object_id', 'object_repr',
+              'changes', 'ip_address', 'user_agent', 'tenant_id')
+
+    def __init__(self):
+        self.mode = getattr(settings, 'AUDIT_LOG_MODE', self.MODE_SYNC)
+        self.max_queue = getattr(settings, 'AUDIT_LOG_QUEUE_SIZE', 10000)
+        self.batch_size = getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 500)
+        self.flush_interval = getattr(settings, 'AUDIT_LOG_FLUSH_INTERVAL', 2)
+        self.max_body = getattr(settings, 'AUDIT_LOG_MAX_BODY', 4096)
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stats = {'queued': 0, 'dropped': 0, 'written': 0, 'failed': 0}
+
+    # ────────────────────────────────────────────────────────────────
+    # RECORD BUILDING
+    # ────────────────────────────────────────────────────────────────
+
+    def parse_body(self, body: bytes):
+        """Parse a request body for ``changes``, truncating oversized bodies unparsed."""
+        if not body:
+            return None
+        if len(body) > self.max_body:
+            return {
+                'truncated': True,
+                'size': len(body),
+                'preview': body[:self.max_body].decode('utf-8', errors='replace'),
+            }
+        try:
+            return json.loads(body.decode('utf-8'))
+        except Exception:
+            return {'data': 'Unable to parse'}
+
+    # ────────────────────────────────────────────────────────────────
+    # INTAKE
+    # ────────────────────────────────────────────────────────────────
+
+    def submit(self, record: dict):
+        """
+        Record one audit entry. ``record`` holds FIELDS plus ``schema_name``.
+        Never raises.
+        """
+        try:
+            if self.mode == self.MODE_MEMORY:
+                self._submit_memory(record)
+                return
+            if self.mode == self.MODE_REDIS and self._submit_redis(record):
+                return
+            self._write(record.get('schema_name'), [record])
+        except Exception as e:
+            # Never break the request due to logging failure
+            logger.warning(f"[AUDIT] Could not record audit entry: {e}")
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _drop(self):
+        self._count('dropped')
+        if self._stats['dropped'] % 100 == 1:
+            logger.warning(f"[AUDIT] Audit buffer full, {self._stats['dropped']} entries dropped so far")
+
+    def _submit_memory(self, record: dict):
+        try:
+            self._queue.put_nowait(record)
+            self._count('queued')
+        except queue.Full:
+            self._drop()
+        self._ensure_flusher()
+
+    def _submit_redis(self, record: dict) -> bool:
+        client = get_redis_client()
+        if client is None:
+            return False
+        try:
+            if client.xlen(self.STREAM_KEY) >= self.max_queue:
+                client.incr(self.DROPPED_KEY)
+                self._drop()
+                return True
+            client.xadd(self.STREAM_KEY, {'r': json.dumps(record, default=str)})
+            self._count('queued')
+            return True
+        except Exception as e:
+            logger.warning(f"[AUDIT] Redis stream unavailable, writing synchronously: {e}")
+            return False
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name='audit-log-flusher', daemon=True
+            )
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"[AUDIT] In-process flush failed: {e}")
+            finally:
+                connection.close()
+
+    # ────────────────────────────────────────────────────────────────
+    # FLUSH
+    # ────────────────────────────────────────────────────────────────
+
+    def _write(self, schema_name: str, records: List[dict]) -> int:
+        """bulk_create one schema's records; fall back to row-by-row on failure."""
+        from .models import AuditLog
+
+        objects = [AuditLog(**{field: record.get(field) for field in self.FIELDS}) for record in records]
+        with schema_context(schema_name or 'public'):
+            try:
+                with transaction.atomic():
+                    AuditLog.objects.bulk_create(objects, batch_size=self.batch_size)
+                written = len(objects)
+            except Exception as e:
+                logger.warning(f"[AUDIT] Bulk write failed for {schema_name}, retrying row by row: {e}")
+                written = 0
+                for obj in objects:
+                    try:
+                        with transaction.atomic():
+                            obj.save(force_insert=True)
+                        written += 1
+                    except Exception:
+                        self._count('failed')
+        self._count('written', written)
+        return written
+
+    def _write_grouped(self, records: List[dict]) -> int:
+        by_schema = defaultdict(list)
+        for record in records:
+            by_schema[record.get('schema_name')].append(record)
+        return sum(self._write(schema, rows) for schema, rows in by_schema.items())
+
+    def _flush_memory(self) -> int:
+        written = 0
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return written
+            written += self._write_grouped(batch)
+
+    def _flush_redis(self) -> int:
+        client = get_redis_client()
+        if client is None:
+            return 0
+        # One flusher at a time; entries are deleted only after they are written
+        if not client.set(self.LOCK_KEY, '1', nx=True, ex=60):
+            return 0
+        written = 0
+        try:
+            while True:
+                entries = client.xrange(self.STREAM_KEY, count=self.batch_size)
+                if not entries:
+                    return written
+                records = []
+                for _, fields in entries:
+                    try:
+                        records.append(json.loads(fields[b'r']))
+                    except Exception:
+                        self._count('failed')
+                written += self._write_grouped(records)
+                client.xdel(self.STREAM_KEY, *[entry_id for entry_id, _ in entries])
+        finally:
+            client.delete(self.LOCK_KEY)
+
+    def flush(self) -> Dict[str, int]:
+        """Write everything buffered so far. Returns the counters."""
+        if self.mode == self.MODE_MEMORY:
+            self._flush_memory()
+        elif self.mode == self.MODE_REDIS:
+            self._flush_redis()
+        return self.stats()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['pending'] = self._queue.qsize()
+        if self.mode == self.MODE_REDIS:
+            client = get_redis_client()
+            if client is not None:
+                try:
+                    stats['pending'] = client.xlen(self.STREAM_KEY)
+                    stats['dropped_total'] = int(client.get(self.DROPPED_KEY) or 0)
+                except Exception:
+                    pass
+        return stats
+
+
+# Singleton instance
+audit_log_writer = AuditLogWriter()
@@ -10,7 +10,8 @@ from django.conf import settings
 from django.http import HttpResponseForbidden, HttpResponse
 from django.core.exceptions import PermissionDenied
 
-from .models import AuditLog, Tenant, Domain, Company
+from .audit_writer import audit_log_writer
+from .tenant_cache import tenant_resolution_cache
 
 
 # ================================
@@ -71,56 +72,23 @@ class TenantMainMiddleware(MiddlewareMixin):
             # Extract subdomain (e.g., "dansted" from "dansted.localhost")
             subdomain = host.split('.')[0]
             
-            try:
-                # First, ensure we're in public schema to find tenant
-                connection.set_schema_to_public()
-                
-                # Find the tenant by subdomain in public schema
-                tenant = Tenant.objects.get(subdomain=subdomain, is_active=True)
-                
-                # Get company from tenant (in public schema)
-                company = None
-                try:
-                    company = tenant.company
-                except:
-                    # Company might not be accessible or doesn't exist
-                    pass
-                
+            # Cached: no queries once the host has been seen
+            tenant, company = tenant_resolution_cache.by_subdomain(subdomain)
+            
+            if tenant is None:
+                # Tenant not found - check if we have a domain record
+                tenant, company = tenant_resolution_cache.by_host(host)
+            
+            if tenant is not None:
                 # Now switch to tenant schema for the rest of the request
                 connection.set_tenant(tenant)
-                
-                # Set request attributes
                 request.tenant = tenant
                 request.company = company  # This is the company object from public schema
-                
-                print(f"DEBUG: Switched to tenant: {tenant.subdomain}, company: {company.name if company else 'None'}")  # Debug
-                
-            except Tenant.DoesNotExist:
-                # Tenant not found - check if we have a domain record
-                try:
-                    # Check Domain model for the exact domain
-                    domain = Domain.objects.get(domain=host)
-                    tenant = domain.tenant
-                    
-                    # Get company
-                    company = None
-                    try:
-                        company = tenant.company
-                    except:
-                        pass
-                    
-                    connection.set_tenant(tenant)
-                    request.tenant = tenant
-                    request.company = company
-                    
-                    print(f"DEBUG: Switched to tenant via Domain: {tenant.subdomain}")  # Debug
-                    
-                except Domain.DoesNotExist:
-                    # No tenant found - use public schema
-                    connection.set_schema_to_public()
-                    request.tenant = None
-                    request.company = None
-                    print(f"DEBUG: No tenant found for host: {host}, using public schema")  # Debug
+            else:
+                # No tenant found - use public schema
+                connection.set_schema_to_public()
+                request.tenant = None
+                request.company = None
         
         else:
             # For localhost or other hosts, use public schema
@@ -192,32 +160,29 @@ class AuditLogMiddleware(MiddlewareMixin):
     def log_action(self, request, response):
         try:
             path = request.path
-            model_name = self.extract_model_name(path)
             object_id = self.extract_object_id(path)
-            action = self.get_action_type(request.method)
 
             changes = None
             if request.method in ['POST', 'PUT', 'PATCH']:
                 try:
-                    body = request.body.decode('utf-8')
-                    if body:
-                        changes = json.loads(body)
+                    changes = audit_log_writer.parse_body(request.body)
                 except Exception:
                     changes = {'data': 'Unable to parse'}
 
             tenant = getattr(request, 'tenant', None)
 
-            AuditLog.objects.create(
-                user=request.user,
-                action=action,
-                model_name=model_name,
-                object_id=object_id,
-                object_repr=str(object_id) if object_id else '',
-                changes=changes,
-                ip_address=request.audit_log_info.get('ip_address'),
-                user_agent=request.audit_log_info.get('user_agent'),
-                tenant=tenant,
-            )
+            audit_log_writer.submit({
+                'user_id': request.user.pk,
+                'action': self.get_action_type(request.method),
+                'model_name': self.extract_model_name(path),
+                'object_id': object_id,
+                'object_repr': str(object_id) if object_id else '',
+                'changes': changes,
+                'ip_address': request.audit_log_info.get('ip_address'),
+                'user_agent': request.audit_log_info.get('user_agent'),
+                'tenant_id': tenant.pk if tenant else None,
+                'schema_name': connection.schema_name,
+            })
         except Exception:
             # Never break the request due to logging failure
             pass
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-16 20:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouterRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('router_id', models.BigIntegerField()),
+                ('auth_key', models.CharField(max_length=50, unique=True)),
+                ('nas_ip', models.GenericIPAddressField(blank=True, null=True, protocol='IPv4')),
+                ('vpn_ip', models.GenericIPAddressField(blank=True, null=True, protocol='IPv4')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='router_routes', to='core.tenant')),
+            ],
+            options={
+                'verbose_name': 'Router Route',
+                'verbose_name_plural': 'Router Routes',
+                'indexes': [models.Index(fields=['router_id'], name='core_router_router__30463b_idx'), models.Index(fields=['nas_ip'], name='core_router_nas_ip_b35adb_idx'), models.Index(fields=['vpn_ip'], name='core_router_vpn_ip_32dee6_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='routerroute',
+            constraint=models.UniqueConstraint(fields=('tenant', 'router_id'), name='uniq_router_route_tenant_router'),
+        ),
+    ]
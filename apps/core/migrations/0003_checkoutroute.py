@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-16 20:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_routerroute'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(default='payhero', max_length=20)),
+                ('checkout_request_id', models.CharField(max_length=100)),
+                ('external_reference', models.CharField(blank=True, default='', max_length=100)),
+                ('schema_name', models.CharField(max_length=63)),
+                ('kind', models.CharField(choices=[('hotspot', 'Hotspot Session'), ('billing', 'Customer Payment')], max_length=20)),
+                ('object_id', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkout_routes', to='core.tenant')),
+            ],
+            options={
+                'verbose_name': 'Checkout Route',
+                'verbose_name_plural': 'Checkout Routes',
+                'indexes': [models.Index(fields=['external_reference'], name='core_checko_externa_4e28fe_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='checkoutroute',
+            constraint=models.UniqueConstraint(fields=('provider', 'checkout_request_id'), name='uniq_checkout_route_provider_checkout'),
+        ),
+    ]
@@ -586,4 +586,164 @@ class GlobalSystemSettings(models.Model):
     def get_solo(cls):
         """Get or create the singleton instance"""
         obj, created = cls.objects.get_or_create(pk=1)
-        return obj
\ No newline at end of file
+        return obj
+
+
+class RouterRoute(models.Model):
+    """
+    Public-schema routing index for routers.
+
+    Routers live in tenant schemas, but heartbeats and authentication
+    requests arrive on public endpoints carrying only an auth_key, router id
+    or NAS IP. This table maps those identifiers to the owning tenant so a
+    request can go straight to the right schema instead of scanning all of
+    them. Rows are maintained by Router save/delete signals and can be
+    rebuilt with ``manage.py rebuild_router_index``.
+    """
+
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='router_routes'
+    )
+    router_id = models.BigIntegerField()
+    auth_key = models.CharField(max_length=50, unique=True)
+    nas_ip = models.GenericIPAddressField(protocol='IPv4', null=True, blank=True)
+    vpn_ip = models.GenericIPAddressField(protocol='IPv4', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'core'
+        verbose_name = 'Router Route'
+        verbose_name_plural = 'Router Routes'
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'router_id'], name='uniq_router_route_tenant_router'),
+        ]
+        indexes = [
+            models.Index(fields=['router_id']),
+            models.Index(fields=['nas_ip']),
+            models.Index(fields=['vpn_ip']),
+        ]
+
+    def __str__(self):
+        return f"{self.auth_key} -> {self.tenant_id}:{self.router_id}"
+
+
+class CheckoutRoute(models.Model):
+    """
+    Public-schema routing table for payment checkouts.
+
+    Payment callbacks (e.g. PayHero hotspot STK results) arrive on public
+    endpoints carrying only the provider's checkout id. The object they
+    settle lives in a tenant schema, so the initiating view records
+    checkout id -> (schema, object) here when it starts the payment.
+    """
+
+    KIND_CHOICES = (
+        ('hotspot', 'Hotspot Session'),
+        ('billing', 'Customer Payment'),
+    )
+
+    provider = models.CharField(max_length=20, default='payhero')
+    checkout_request_id = models.CharField(max_length=100)
+    external_reference = models.CharField(max_length=100, blank=True, default='')
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='checkout_routes'
+    )
+    schema_name = models.CharField(max_length=63)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        app_label = 'core'
+        verbose_name = 'Checkout Route'
+        verbose_name_plural = 'Checkout Routes'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['provider', 'checkout_request_id'],
+                name='uniq_checkout_route_provider_checkout'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['external_reference']),
+        ]
+
+    def __str__(self):
+        return f"{self.provider}:{self.checkout_request_id} -> {self.schema_name}:{self.object_id}"
+
+
+class WebhookEvent(models.Model):
+    """
+    Public-schema inbox for payment provider callbacks.
+
+    Callback endpoints persist the raw payload here and acknowledge at once;
+    ``apps.billing.tasks.process_webhook_event`` does the actual work. The
+    unique key on (provider, event_type, provider_reference) turns provider
+    retries of the same callback into no-ops.
+    """
+
+    PROVIDER_CHOICES = (
+        ('payhero', 'PayHero'),
+        ('mpesa', 'M-Pesa'),
+    )
+
+    STATUS_CHOICES = (
+        ('received', 'Received'),
+        ('processing', 'Processing'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+        ('dead', 'Dead'),
+    )
+
+    provider = models.CharField(max_length=20, choices=PROVIDER_CHOICES)
+    event_type = models.CharField(max_length=30)
+    provider_reference = models.CharField(max_length=100)
+    schema_name = models.CharField(max_length=63, blank=True, default='')
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='received')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'core'
+        verbose_name = 'Webhook Event'
+        verbose_name_plural = 'Webhook Events'
+        ordering = ['received_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['provider', 'event_type', 'provider_reference'],
+                name='uniq_webhook_event_provider_reference'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.provider}:{self.event_type}:{self.provider_reference} ({self.status})"
+
+
+class DocumentSequence(models.Model):
+    """
+    Per-tenant counter behind document numbers (INV-, PAY-, RCPT-, BATCH-,
+    CUS-). One row per sequence key; see apps.core.sequences.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'core'
+        verbose_name = 'Document Sequence'
+        verbose_name_plural = 'Document Sequences'
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
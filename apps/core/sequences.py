@@ -0,0 +1,119 @@
+"""
+Gap-free per-tenant document number sequences.
+
+Document numbers used to be derived from the newest existing row
+(``filter(number__startswith=...).order_by('-number').first()`` + 1). Each
+save paid an extra query, and that query got slower as the table grew. Two
+concurrent saves could also read the same "last" number and collide.
+
+Numbers now come from a counter row in ``core.DocumentSequence``, which lives
+in each tenant schema. The row is bumped with one upsert:
+
+    INSERT ... ON CONFLICT (name) DO UPDATE SET value = value + n RETURNING value
+
+The row lock is held until the caller's transaction ends. A rolled back
+document therefore also rolls back its number, so there are no gaps, and
+concurrent writers queue on that one row instead of producing duplicates.
+Keep the allocation and the INSERT in the same ``transaction.atomic()``
+block.
+
+Bulk generation reserves a whole block with one statement (``reserve``).
+
+The first allocation of a key seeds the counter from the highest number
+already in the table, so existing INV-YYYYMM-XXXXX / PAY-YYYYMMDD-XXXXX
+series continue where they left off.
+"""
+import logging
+from typing import List
+
+from django.db import connection, transaction
+from django.db.models import BigIntegerField, Max
+from django.db.models.functions import Cast, Substr
+
+logger = logging.getLogger(__name__)
+
+
+class SequenceAllocator:
+    """Allocates numbers (or blocks of numbers) from per-tenant counters."""
+
+    # ────────────────────────────────────────────────────────────────
+    # COUNTERS
+    # ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _table() -> str:
+        from .models import DocumentSequence
+        return connection.ops.quote_name(DocumentSequence._meta.db_table)
+
+    @staticmethod
+    def sequence_key(model, prefix: str) -> str:
+        return f"{model._meta.label_lower}:{prefix}"
+
+    @staticmethod
+    def max_existing(model, field: str, prefix: str) -> int:
+        """Highest numeric suffix already used with ``prefix`` (seed value)."""
+        result = (
+            model._default_manager
+            .filter(**{f'{field}__regex': rf'^{prefix}[0-9]+$'})
+            .aggregate(
+                highest=Max(Cast(Substr(field, len(prefix) + 1), BigIntegerField()))
+            )
+        )
+        return result['highest'] or 0
+
+    def allocate(self, model, field: str, prefix: str, count: int = 1) -> int:
+        """
+        Reserve ``count`` consecutive numbers for ``prefix``.
+
+        Returns:
+            The first number of the block
+        """
+        key = self.sequence_key(model, prefix)
+        table = self._table()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET value = value + %s, updated_at = NOW() "
+                f"WHERE name = %s RETURNING value",
+                [count, key]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                # First use of this key: continue after the legacy numbers
+                seed = self.max_existing(model, field, prefix)
+                cursor.execute(
+                    f"INSERT INTO {table} (name, value, updated_at) VALUES (%s, %s, NOW()) "
+                    f"ON CONFLICT (name) DO UPDATE SET value = {table}.value + %s, updated_at = NOW() "
+                    f"RETURNING value",
+                    [key, seed + count, count]
+                )
+                row = cursor.fetchone()
+
+        return row[0] - count + 1
+
+    # ────────────────────────────────────────────────────────────────
+    # FORMATTED NUMBERS
+    # ────────────────────────────────────────────────────────────────
+
+    def next_number(self, model, field: str, prefix: str, width: int = 0) -> str:
+        """Next formatted number, e.g. next_number(Invoice, 'invoice_number', 'INV-202601-', 5)."""
+        return f"{prefix}{self.allocate(model, field, prefix):0{width}d}"
+
+    def reserve(self, model, field: str, prefix: str, count: int, width: int = 0) -> List[str]:
+        """A block of ``count`` formatted numbers from a single statement (bulk_create)."""
+        if count <= 0:
+            return []
+        first = self.allocate(model, field, prefix, count)
+        return [f"{prefix}{n:0{width}d}" for n in range(first, first + count)]
+
+    def assign(self, instance, field: str, prefix: str, width: int = 0):
+        """Set ``field`` on an unsaved instance. Call inside the save transaction."""
+        if not transaction.get_connection().in_atomic_block:
+            logger.warning(
+                f"Sequence {prefix} allocated outside a transaction; a failed save leaves a gap"
+            )
+        setattr(instance, field, self.next_number(type(instance), field, prefix, width))
+
+
+# Singleton instance
+sequence_allocator = SequenceAllocator()
@@ -0,0 +1,58 @@
+"""
+Core signals: keep the tenant resolution cache in step with Tenant, Domain
+and Company changes.
+"""
+import logging
+
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django_tenants.utils import schema_context, get_public_schema_name
+
+from .models import Tenant, Domain, Company
+from .tenant_cache import tenant_resolution_cache
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(pre_save, sender=Tenant)
+def remember_tenant_subdomain(sender, instance, **kwargs):
+    """Keep the previous subdomain so its cache entry can be dropped on rename."""
+    instance._previous_subdomain = None
+    if instance.pk:
+        instance._previous_subdomain = (
+            Tenant.objects.filter(pk=instance.pk).values_list('subdomain', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidate_tenant_cache(sender, instance, **kwargs):
+    try:
+        previous = getattr(instance, '_previous_subdomain', None)
+        with schema_context(get_public_schema_name()):
+            tenant_resolution_cache.invalidate_tenant(
+                instance, extra_subdomains=[previous] if previous else []
+            )
+    except Exception as e:
+        logger.error(f"Failed to invalidate tenant cache for {instance.schema_name}: {e}")
+
+
+@receiver(post_save, sender=Domain)
+@receiver(post_delete, sender=Domain)
+def invalidate_domain_cache(sender, instance, **kwargs):
+    try:
+        tenant_resolution_cache.invalidate(tenant_resolution_cache.host_key(instance.domain))
+    except Exception as e:
+        logger.error(f"Failed to invalidate tenant cache for domain {instance.domain}: {e}")
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company_cache(sender, instance, **kwargs):
+    try:
+        with schema_context(get_public_schema_name()):
+            tenant = Tenant.objects.filter(company_id=instance.pk).first()
+            if tenant:
+                tenant_resolution_cache.invalidate_tenant(tenant)
+    except Exception as e:
+        logger.error(f"Failed to invalidate tenant cache for company {instance.pk}: {e}")
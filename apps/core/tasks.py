@@ -0,0 +1,28 @@
+"""
+Core Celery Tasks
+
+These tasks handle:
+1. Flushing buffered audit log entries (AUDIT_LOG_MODE='redis')
+"""
+
+import logging
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def flush_audit_logs():
+    """
+    Write audit entries buffered in the Redis stream with bulk_create.
+
+    Returns:
+        Dict with writer counters (written, dropped, pending, ...)
+    """
+    from apps.core.audit_writer import audit_log_writer
+
+    try:
+        return audit_log_writer.flush()
+    except Exception as e:
+        logger.error(f"[AUDIT TASK] Flush failed: {e}")
+        return {'error': str(e)}
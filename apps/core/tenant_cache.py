@@ -0,0 +1,182 @@
+"""
+Tenant resolution cache for TenantMainMiddleware.
+
+Resolving the tenant of a request used to cost up to three queries on every
+request (Tenant by subdomain, Domain by host, then tenant.company). Tenants
+change rarely, so the result is cached per host in two tiers:
+
+    process-local LRU  → 0 queries, 0 network round trips
+    Django cache       → 1 Redis GET (shared by all workers)
+    database           → only on a miss in both tiers
+
+Misses ("no tenant for this host") are cached too, for a shorter time, so
+scanners hitting random hosts do not reach the database.
+
+Entries are dropped from both tiers by the Tenant/Domain/Company signals in
+``apps.core.signals``. Other processes still hold their local copy until it
+expires (TENANT_CACHE_LOCAL_TTL, short by default).
+"""
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_MISS = object()
+
+
+class TenantResolutionCache:
+    """Two-tier (local LRU + shared cache) host -> (tenant, company) cache."""
+
+    KEY_PREFIX = 'tenant_resolve'
+    NEGATIVE = 'none'
+
+    def __init__(self):
+        self.ttl = getattr(settings, 'TENANT_CACHE_TTL', 600)
+        self.local_ttl = getattr(settings, 'TENANT_CACHE_LOCAL_TTL', 30)
+        self.negative_ttl = getattr(settings, 'TENANT_CACHE_NEGATIVE_TTL', 60)
+        self.max_entries = getattr(settings, 'TENANT_CACHE_SIZE', 2048)
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ────────────────────────────────────────────────────────────────
+    # KEYS
+    # ────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def subdomain_key(cls, subdomain: str) -> str:
+        return f"{cls.KEY_PREFIX}:sub:{subdomain.lower()}"
+
+    @classmethod
+    def host_key(cls, host: str) -> str:
+        return f"{cls.KEY_PREFIX}:host:{host.lower()}"
+
+    # ────────────────────────────────────────────────────────────────
+    # TIERS
+    # ────────────────────────────────────────────────────────────────
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return _MISS
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._local[key]
+                return _MISS
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key, value):
+        ttl = self.local_ttl if value != self.NEGATIVE else min(self.local_ttl, self.negative_ttl)
+        with self._lock:
+            self._local[key] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def _shared_get(self, key):
+        try:
+            value = cache.get(key, _MISS)
+        except Exception as e:
+            logger.warning(f"Tenant cache unavailable: {e}")
+            return _MISS
+        return value
+
+    def _shared_set(self, key, value):
+        try:
+            cache.set(key, value, self.negative_ttl if value == self.NEGATIVE else self.ttl)
+        except Exception as e:
+            logger.warning(f"Tenant cache unavailable: {e}")
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+        try:
+            cache.delete_many(list(keys))
+        except Exception as e:
+            logger.warning(f"Tenant cache invalidation failed for {keys}: {e}")
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    # ────────────────────────────────────────────────────────────────
+    # LOOKUP
+    # ────────────────────────────────────────────────────────────────
+
+    def _get(self, key, loader):
+        value = self._local_get(key)
+        if value is _MISS:
+            value = self._shared_get(key)
+            if value is _MISS:
+                value = loader()
+                self._shared_set(key, value)
+            self._local_set(key, value)
+
+        if value == self.NEGATIVE:
+            return None, None
+        tenant, company = value
+        # Requests must not share (and mutate) one model instance
+        return copy.copy(tenant), copy.copy(company) if company is not None else None
+
+    @staticmethod
+    def _with_company(tenant):
+        try:
+            company = tenant.company
+        except Exception:
+            # Company might not be accessible or doesn't exist
+            company = None
+        return tenant, company
+
+    def by_subdomain(self, subdomain: str):
+        """Return (tenant, company) for an active tenant subdomain, or (None, None)."""
+        from .models import Tenant
+
+        def load():
+            connection.set_schema_to_public()
+            tenant = Tenant.objects.select_related('company').filter(
+                subdomain=subdomain, is_active=True
+            ).first()
+            return self._with_company(tenant) if tenant else self.NEGATIVE
+
+        return self._get(self.subdomain_key(subdomain), load)
+
+    def by_host(self, host: str):
+        """Return (tenant, company) for a Domain record, or (None, None)."""
+        from .models import Domain
+
+        def load():
+            connection.set_schema_to_public()
+            domain = Domain.objects.select_related('tenant', 'tenant__company').filter(domain=host).first()
+            return self._with_company(domain.tenant) if domain else self.NEGATIVE
+
+        return self._get(self.host_key(host), load)
+
+    # ────────────────────────────────────────────────────────────────
+    # INVALIDATION
+    # ────────────────────────────────────────────────────────────────
+
+    def invalidate_tenant(self, tenant, extra_subdomains=()):
+        """Drop every entry that can resolve to this tenant."""
+        from .models import Domain
+
+        keys = [self.subdomain_key(s) for s in (tenant.subdomain, *extra_subdomains) if s]
+        if tenant.pk:
+            keys.extend(
+                self.host_key(domain)
+                for domain in Domain.objects.filter(tenant_id=tenant.pk).values_list('domain', flat=True)
+            )
+        if keys:
+            self.invalidate(*keys)
+
+
+# Singleton instance
+tenant_resolution_cache = TenantResolutionCache()
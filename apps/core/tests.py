@@ -0,0 +1,67 @@
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django_tenants.test.cases import TenantTestCase
+
+from apps.core.models import Company, DocumentSequence, User
+from apps.core.sequences import sequence_allocator
+from apps.customers.models import Customer
+from apps.radius.signals_auto_sync import sync_customer_status_to_radius
+
+
+class SequenceAllocatorTests(TenantTestCase):
+    @classmethod
+    def setup_tenant(cls, tenant):
+        # The tenant is dropped after each class, its company is not
+        tenant.company, _ = Company.objects.get_or_create(name='Test ISP', defaults=dict(
+            slug='test-isp', email='isp@example.com',
+            phone_number='254700000000', address='Moi Avenue', city='Nairobi',
+        ))
+        tenant.subdomain = 'test'
+        tenant.database_name = 'test'
+
+    def setUp(self):
+        # The radius app ships no migrations, so its tables are not in test schemas
+        post_save.disconnect(sync_customer_status_to_radius, sender=Customer)
+        self.addCleanup(post_save.connect, sync_customer_status_to_radius, sender=Customer)
+
+    def customer(self, n, **kwargs):
+        user = User.objects.create_user(
+            email=f'user{n}@example.com', password='x', phone_number=f'25471100{n:04d}',
+            first_name='Test', last_name=f'User {n}',
+        )
+        return Customer.objects.create(user=user, id_number=f'ID{n}', **kwargs)
+
+    def test_numbers_are_consecutive_per_prefix(self):
+        with transaction.atomic():
+            numbers = [sequence_allocator.next_number(Customer, 'customer_code', 'CUS-', 5) for _ in range(3)]
+            other = sequence_allocator.next_number(Customer, 'customer_code', 'VIP-', 5)
+        self.assertEqual(numbers, ['CUS-00001', 'CUS-00002', 'CUS-00003'])
+        self.assertEqual(other, 'VIP-00001')
+
+    def test_first_allocation_continues_legacy_numbers(self):
+        self.customer(1, customer_code='CUS-41')
+        self.customer(2, customer_code='CUS-7')
+        self.customer(3, customer_code='CUS-OLD')
+        self.assertEqual(self.customer(4).customer_code, 'CUS-42')
+        self.assertEqual(self.customer(5).customer_code, 'CUS-43')
+
+    def test_reserve_returns_one_contiguous_block(self):
+        with transaction.atomic():
+            block = sequence_allocator.reserve(Customer, 'customer_code', 'BATCH-', 4, width=3)
+            following = sequence_allocator.next_number(Customer, 'customer_code', 'BATCH-', 3)
+        self.assertEqual(block, ['BATCH-001', 'BATCH-002', 'BATCH-003', 'BATCH-004'])
+        self.assertEqual(following, 'BATCH-005')
+        self.assertEqual(sequence_allocator.reserve(Customer, 'customer_code', 'BATCH-', 0), [])
+
+    def test_rolled_back_save_leaves_no_gap(self):
+        self.assertEqual(self.customer(1).customer_code, 'CUS-1')
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            sequence_allocator.assign(Customer(), 'customer_code', 'CUS-')
+            raise RuntimeError('save failed')
+        self.assertEqual(self.customer(2).customer_code, 'CUS-2')
+
+    def test_counters_live_in_the_tenant_schema(self):
+        self.customer(1)
+        key = sequence_allocator.sequence_key(Customer, 'CUS-')
+        self.assertEqual(connection.schema_name, self.tenant.schema_name)
+        self.assertEqual(DocumentSequence.objects.get(name=key).value, 1)
@@ -1,7 +1,7 @@
 """
 Customer Management Models for ISP System
 """
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MinLengthValidator
 from django.utils import timezone
@@ -11,6 +11,7 @@ from django.conf import settings
  # ← Add this import
 
 from apps.core.models import Company
+from apps.core.sequences import sequence_allocator
 
 # Use Django's settings.AUTH_USER_MODEL for foreign keys
 User = get_user_model()
@@ -274,23 +275,20 @@ class Customer(models.Model):
         return self.status == 'ACTIVE'
     
     def update_balance(self, amount):
-        """Update customer's outstanding balance"""
-        self.outstanding_balance += amount
-        self.save(update_fields=['outstanding_balance', 'updated_at'])
+        """Update customer's outstanding balance (atomic increment, safe under concurrent payments)"""
+        Customer.objects.filter(pk=self.pk).update(
+            outstanding_balance=models.F('outstanding_balance') + amount,
+            updated_at=timezone.now(),
+        )
+        self.refresh_from_db(fields=['outstanding_balance', 'updated_at'])
     
     def save(self, *args, **kwargs):
-        # Generate customer code if not exists
-        if not self.customer_code:
-            # Format: CUS-{sequence} (no company ID needed - tenant scoped)
-            last_customer = Customer.objects.order_by('id').last()
-            sequence = 1
-            if last_customer and last_customer.customer_code:
-                try:
-                    sequence = int(last_customer.customer_code.split('-')[-1]) + 1
-                except (IndexError, ValueError):
-                    sequence = Customer.objects.count() + 1
-            self.customer_code = f"CUS-{sequence}"
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Generate customer code if not exists
+            if not self.customer_code:
+                # Format: CUS-{sequence} (no company ID needed - tenant scoped)
+                sequence_allocator.assign(self, 'customer_code', 'CUS-')
+            super().save(*args, **kwargs)
 
 
 class CustomerAddress(models.Model):  
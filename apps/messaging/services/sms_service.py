@@ -6,6 +6,8 @@ from django.conf import settings
 from django.utils import timezone
 from typing import List, Dict, Any, Optional, Union
 
+from utils.http_client import get_http_session
+
 from apps.messaging.models import SMSMessage, SMSTemplate, SMSCampaign
 from apps.customers.models import Customer  # if needed for customer lookup
 
@@ -195,7 +197,7 @@ class SMSService:
                 "Accept": "application/json"
             }
 
-            response = requests.get(url, headers=headers, timeout=10)
+            response = get_http_session('africastalking').get(url, headers=headers, timeout=10)
             response.raise_for_status()
 
             data = response.json()
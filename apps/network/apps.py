@@ -6,5 +6,10 @@ class NetworkConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.network'
     verbose_name = 'Network Management'
-    
 
+    def ready(self):
+        """Import signals when app is ready"""
+        try:
+            import apps.network.signals  # noqa
+        except ImportError:
+            pass
@@ -13,8 +13,9 @@ logger = logging.getLogger(__name__)
 class MikrotikAPI:
     """Mikrotik RouterOS API Client - Enhanced for ISP Management"""
     
-    def __init__(self, mikrotik_device):
+    def __init__(self, mikrotik_device, timeout: int = 30):
         self.device = mikrotik_device
+        self.timeout = timeout
         self.api = None
     
     def connect(self) -> bool:
@@ -37,7 +38,7 @@ class MikrotikAPI:
                     password=self.device.api_password,
                     host=target_ip,
                     port=self.device.api_port or 8728,
-                    timeout=30,
+                    timeout=self.timeout,
                     plain_login=True  # Required for ROS v7
                 )
                 logger.info(f"Connected to Mikrotik {self.device.name} ({target_ip})")
@@ -423,6 +424,57 @@ class MikrotikAPI:
         
         return results
 
+    def disconnect_users(self, usernames: List[str], connection_type: str = 'both') -> Dict[str, Dict[str, bool]]:
+        """
+        Disconnect many users over a single API connection.
+        
+        Reads /ip/hotspot/active and /ppp/active once and removes every
+        matching session in one remove call per table, instead of two table
+        reads and two connections per user as with disconnect_user().
+        
+        Args:
+            usernames: Usernames to disconnect
+            connection_type: 'hotspot', 'pppoe', or 'both'
+            
+        Returns:
+            Dict of username -> {'hotspot': bool, 'pppoe': bool}, True where
+            a session was found and removed
+            
+        Raises:
+            Exception if the router cannot be reached or a remove fails
+        """
+        wanted = set(usernames)
+        results = {username: {} for username in wanted}
+        
+        tables = []
+        if connection_type in ('hotspot', 'both'):
+            tables.append(('hotspot', '/ip/hotspot/active', 'user'))
+        if connection_type in ('pppoe', 'both'):
+            tables.append(('pppoe', '/ppp/active', 'name'))
+        
+        if not self.connect():
+            raise Exception(f"Cannot connect to {self.device.name}")
+        
+        try:
+            for kind, path, user_field in tables:
+                active = list(self.api.path(path))
+                matches = [s for s in active if s.get(user_field) in wanted]
+                
+                for username in wanted:
+                    results[username][kind] = False
+                if not matches:
+                    continue
+                
+                self.api.path(path).remove(*[s['.id'] for s in matches])
+                for session in matches:
+                    results[session[user_field]][kind] = True
+                
+                logger.info(f"Kicked {len(matches)} {kind} sessions from {self.device.name}")
+        finally:
+            self.disconnect()
+        
+        return results
+
     # ────────────────────────────────────────────────────────────────
     # POST-CONNECTION SETUP (Dashboard → Router via VPN)
     # ────────────────────────────────────────────────────────────────
@@ -5,6 +5,9 @@ from typing import Dict, List, Optional, Any
 import logging
 from datetime import datetime
 import uuid
+from urllib.parse import urlparse
+
+from utils.http_client import get_http_session
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +23,8 @@ class TR069Client:
             'Content-Type': 'application/xml',
             'SOAPAction': '',
         }
+        # Pooled session and circuit breaker per ACS host
+        self.http = get_http_session(f"tr069:{urlparse(self.base_url or '').netloc}")
     
     def _build_soap_envelope(self, body_content: str) -> str:
         """Build SOAP envelope for TR-069 requests"""
@@ -39,7 +44,7 @@ class TR069Client:
         try:
             envelope = self._build_soap_envelope(body)
             
-            response = requests.post(
+            response = self.http.post(
                 self.base_url,
                 data=envelope,
                 headers=self.headers,
@@ -0,0 +1,37 @@
+# apps/network/management/commands/rebuild_router_index.py
+from django.core.management.base import BaseCommand
+from django_tenants.utils import schema_context, get_public_schema_name
+
+from apps.core.models import Tenant
+from apps.network.services.router_index import router_index_service
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the public-schema router routing index from tenant Router tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            action='append',
+            dest='tenants',
+            help='Subdomain or schema name of a tenant to rebuild (repeatable). Defaults to all tenants.'
+        )
+
+    def handle(self, *args, **options):
+        tenants = None
+        if options['tenants']:
+            with schema_context(get_public_schema_name()):
+                tenants = list(
+                    Tenant.objects.filter(subdomain__in=options['tenants']) |
+                    Tenant.objects.filter(schema_name__in=options['tenants'])
+                )
+            if not tenants:
+                self.stdout.write(self.style.ERROR("No matching tenants found"))
+                return
+
+        stats = router_index_service.rebuild(tenants=tenants)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {stats['routers']} routers across {stats['tenants']} tenants "
+            f"({stats['errors']} errors)"
+        ))
@@ -0,0 +1,316 @@
+# apps/network/services/heartbeat_buffer.py
+"""
+Buffered Router Heartbeat Ingestion
+
+In the default ``sync`` mode every heartbeat POST saves the Router row
+directly. At fleet scale (thousands of MikroTiks reporting every minute)
+that is one UPDATE per router per minute on the tenant Router tables.
+
+The buffered modes record the reading and return immediately:
+
+    redis   → readings go into one Redis hash keyed "{schema}:{router_id}",
+              flushed by the ``flush_router_heartbeats`` Celery task
+    memory  → readings go into an in-process dict flushed by a daemon
+              thread (single-process deployments / development)
+
+Both stores coalesce naturally: a router that reports three times between
+flushes is written once, with its latest reading. The flush applies all
+readings of a tenant with one ``bulk_update`` and derives online/offline
+transitions (RouterEvent 'up' / 'down') while doing so. Readings of a tenant
+whose write fails go back into the buffer for the next flush, unless the
+router has reported again since.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_tenants.utils import schema_context, get_public_schema_name
+
+from utils.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatBuffer:
+    """Collects router heartbeats and writes them to tenant schemas in batches."""
+
+    MODE_SYNC = 'sync'
+    MODE_REDIS = 'redis'
+    MODE_MEMORY = 'memory'
+
+    REDIS_KEY = 'netily:router_heartbeats:pending'
+
+    UPDATE_FIELDS = ['last_seen', 'status', 'active_users', 'total_users', 'uptime', 'ip_address']
+
+    def __init__(self):
+        self.mode = getattr(settings, 'ROUTER_HEARTBEAT_MODE', self.MODE_SYNC)
+        self.flush_interval = getattr(settings, 'ROUTER_HEARTBEAT_FLUSH_INTERVAL', 30)
+        self.offline_after = getattr(settings, 'ROUTER_OFFLINE_AFTER', 300)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in (self.MODE_REDIS, self.MODE_MEMORY)
+
+    # ────────────────────────────────────────────────────────────────
+    # INTAKE
+    # ────────────────────────────────────────────────────────────────
+
+    def record(self, tenant_schema: str, router_id: int, data: dict) -> bool:
+        """
+        Buffer one heartbeat reading. Returns False if the reading could not
+        be buffered and the caller should save synchronously.
+        """
+        reading = {'ts': timezone.now().timestamp()}
+        for field in ('active_users', 'total_users', 'uptime', 'ip'):
+            if field in data:
+                reading[field] = data[field]
+
+        key = f"{tenant_schema}:{router_id}"
+
+        if self.mode == self.MODE_REDIS:
+            client = get_redis_client()
+            if client is None:
+                return False
+            try:
+                client.hset(self.REDIS_KEY, key, json.dumps(reading))
+                return True
+            except Exception as e:
+                logger.warning(f"[HEARTBEAT] Redis buffer unavailable, saving synchronously: {e}")
+                return False
+
+        if self.mode == self.MODE_MEMORY:
+            with self._lock:
+                self._pending[key] = reading
+            self._ensure_flusher()
+            return True
+
+        return False
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name='heartbeat-flusher', daemon=True
+            )
+            self._flusher.start()
+
+    def _flush_loop(self):
+        from django.db import connection
+
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"[HEARTBEAT] In-process flush failed: {e}")
+            finally:
+                connection.close()
+
+    # ────────────────────────────────────────────────────────────────
+    # DRAIN
+    # ────────────────────────────────────────────────────────────────
+
+    def _drain(self) -> Dict[Tuple[str, int], dict]:
+        """Atomically take every pending reading out of the buffer."""
+        raw = {}
+
+        if self.mode == self.MODE_REDIS:
+            client = get_redis_client()
+            if client is None:
+                return {}
+            processing_key = f"{self.REDIS_KEY}:flush:{uuid.uuid4().hex}"
+            try:
+                # RENAME is atomic: heartbeats arriving now land in a fresh hash
+                client.rename(self.REDIS_KEY, processing_key)
+            except Exception:
+                # Key does not exist -> nothing buffered
+                return {}
+            try:
+                raw = {k.decode(): v.decode() for k, v in client.hgetall(processing_key).items()}
+            finally:
+                client.delete(processing_key)
+            raw = {k: json.loads(v) for k, v in raw.items()}
+
+        elif self.mode == self.MODE_MEMORY:
+            with self._lock:
+                raw, self._pending = self._pending, {}
+
+        readings = {}
+        for key, reading in raw.items():
+            schema, _, router_id = key.rpartition(':')
+            try:
+                readings[(schema, int(router_id))] = reading
+            except ValueError:
+                continue
+        return readings
+
+    def _requeue(self, schema: str, readings: Dict[int, dict]):
+        """Put readings back for the next flush without overwriting newer ones."""
+        pending = {f"{schema}:{router_id}": reading for router_id, reading in readings.items()}
+
+        if self.mode == self.MODE_REDIS:
+            client = get_redis_client()
+            if client is None:
+                return
+            try:
+                pipe = client.pipeline(transaction=False)
+                for key, reading in pending.items():
+                    pipe.hsetnx(self.REDIS_KEY, key, json.dumps(reading))
+                pipe.execute()
+            except Exception as e:
+                logger.error(f"[HEARTBEAT] Could not requeue {len(pending)} readings for {schema}: {e}")
+
+        elif self.mode == self.MODE_MEMORY:
+            with self._lock:
+                for key, reading in pending.items():
+                    self._pending.setdefault(key, reading)
+
+    # ────────────────────────────────────────────────────────────────
+    # FLUSH
+    # ────────────────────────────────────────────────────────────────
+
+    def flush(self) -> dict:
+        """
+        Write buffered readings to their tenant schemas and mark routers that
+        stopped reporting as offline.
+        """
+        stats = {'readings': 0, 'routers_updated': 0, 'went_online': 0,
+                 'went_offline': 0, 'tenants': 0, 'errors': 0}
+
+        by_schema = defaultdict(dict)
+        for (schema, router_id), reading in self._drain().items():
+            by_schema[schema][router_id] = reading
+            stats['readings'] += 1
+
+        for schema, readings in by_schema.items():
+            try:
+                result = self._apply_tenant_readings(schema, readings)
+                stats['tenants'] += 1
+                stats['routers_updated'] += result['updated']
+                stats['went_online'] += result['went_online']
+            except Exception as e:
+                stats['errors'] += 1
+                logger.error(f"[HEARTBEAT] Flush failed for tenant {schema}, requeued: {e}")
+                self._requeue(schema, readings)
+
+        stats['went_offline'] = self.mark_stale_routers_offline()
+
+        if stats['readings'] or stats['went_offline']:
+            logger.info(f"[HEARTBEAT] Flush complete: {stats}")
+        return stats
+
+    def _apply_tenant_readings(self, schema: str, readings: Dict[int, dict]) -> dict:
+        from apps.network.models.router_models import Router, RouterEvent
+        from apps.network.services.router_index import router_index_service
+
+        result = {'updated': 0, 'went_online': 0}
+
+        with schema_context(schema):
+            routers = Router.objects.in_bulk(list(readings.keys()))
+            events = []
+            moved = []
+
+            for router_id, reading in readings.items():
+                router = routers.get(router_id)
+                if router is None:
+                    continue
+
+                if router.status != 'online':
+                    events.append(RouterEvent(
+                        router=router,
+                        schema_name=router.schema_name,
+                        event_type='up',
+                        message="Router came online (heartbeat received)",
+                        details={'previous_status': router.status},
+                    ))
+                    result['went_online'] += 1
+
+                router.last_seen = datetime.fromtimestamp(reading['ts'], tz=dt_timezone.utc)
+                router.status = 'online'
+                if 'active_users' in reading:
+                    router.active_users = reading['active_users']
+                if 'total_users' in reading:
+                    router.total_users = reading['total_users']
+                if 'uptime' in reading:
+                    router.uptime = reading['uptime']
+                if 'ip' in reading and reading['ip'] != router.ip_address:
+                    router.ip_address = reading['ip']
+                    moved.append(router)
+
+            with transaction.atomic():
+                Router.objects.bulk_update(routers.values(), self.UPDATE_FIELDS, batch_size=500)
+                if events:
+                    RouterEvent.objects.bulk_create(events, batch_size=500)
+
+            # bulk_update bypasses signals; keep the routing index in step
+            for router in moved:
+                router_index_service.index_router(router)
+
+            result['updated'] = len(routers)
+
+        return result
+
+    def mark_stale_routers_offline(self) -> int:
+        """
+        Flip routers that have not reported within ROUTER_OFFLINE_AFTER seconds
+        to offline and record a 'down' event for each.
+        """
+        from apps.core.models import RouterRoute
+        from apps.network.models.router_models import Router, RouterEvent
+
+        cutoff = timezone.now() - timedelta(seconds=self.offline_after)
+        total = 0
+
+        with schema_context(get_public_schema_name()):
+            schemas = list(
+                RouterRoute.objects.filter(tenant__is_active=True)
+                .values_list('tenant__schema_name', flat=True)
+                .distinct()
+            )
+
+        for schema in schemas:
+            try:
+                with schema_context(schema):
+                    with transaction.atomic():
+                        stale = list(
+                            Router.objects.select_for_update(skip_locked=True)
+                            .filter(status='online', last_seen__lt=cutoff)
+                            .only('id', 'schema_name', 'last_seen')
+                        )
+                        if not stale:
+                            continue
+                        Router.objects.filter(id__in=[r.id for r in stale]).update(status='offline')
+                        RouterEvent.objects.bulk_create([
+                            RouterEvent(
+                                router=router,
+                                schema_name=router.schema_name,
+                                event_type='down',
+                                message="Router went offline (no heartbeat)",
+                                details={'last_seen': router.last_seen.isoformat()},
+                            )
+                            for router in stale
+                        ], batch_size=500)
+                        total += len(stale)
+            except Exception as e:
+                logger.error(f"[HEARTBEAT] Offline sweep failed for tenant {schema}: {e}")
+
+        return total
+
+
+# Singleton instance
+heartbeat_buffer = HeartbeatBuffer()
@@ -0,0 +1,334 @@
+# apps/network/services/router_index.py
+"""
+Router Routing Index
+
+Public endpoints (heartbeat, authenticate, script downloads) only know an
+auth_key, router id or NAS IP. Routers live in tenant schemas, so without an
+index every request has to visit every tenant schema until it finds a match.
+
+This service keeps ``core.RouterRoute`` (public schema) in sync with the
+tenant ``Router`` tables and resolves identifiers through a small
+process-local LRU cache:
+
+    cache hit  → 0 queries to find the tenant
+    cache miss → 1 indexed query on public.core_routerroute
+
+Cached entries are always verified against the router row that is loaded
+afterwards, so a stale entry in another worker process costs one retry,
+never a wrong answer.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django_tenants.utils import schema_context, get_public_schema_name
+
+logger = logging.getLogger(__name__)
+
+_MISS = object()
+_UNAVAILABLE = object()
+
+
+class RouterIndexService:
+    """Maintains and queries the public-schema router routing index."""
+
+    def __init__(self):
+        self.cache_ttl = getattr(settings, 'ROUTER_INDEX_CACHE_TTL', 300)
+        self.negative_ttl = getattr(settings, 'ROUTER_INDEX_NEGATIVE_TTL', 30)
+        self.max_entries = getattr(settings, 'ROUTER_INDEX_CACHE_SIZE', 10000)
+        self.scan_fallback = getattr(settings, 'ROUTER_INDEX_SCAN_FALLBACK', True)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ────────────────────────────────────────────────────────────────
+    # PROCESS-LOCAL CACHE
+    # ────────────────────────────────────────────────────────────────
+
+    def _cache_get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return value
+
+    def _cache_set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.cache_ttl
+        with self._lock:
+            self._cache[key] = (time.monotonic() + ttl, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _cache_delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._cache.pop(key, None)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    @staticmethod
+    def _cache_keys(router_id=None, auth_key=None, nas_ip=None):
+        keys = []
+        if auth_key:
+            keys.append(('auth_key', auth_key))
+        if nas_ip:
+            keys.append(('nas_ip', str(nas_ip)))
+        if router_id is not None:
+            keys.append(('router_id', str(router_id)))
+        return keys
+
+    # ────────────────────────────────────────────────────────────────
+    # INDEX MAINTENANCE
+    # ────────────────────────────────────────────────────────────────
+
+    def _resolve_current_tenant(self):
+        """Return the Tenant instance for the active schema, or None on public."""
+        from apps.core.models import Tenant
+
+        schema_name = getattr(connection, 'schema_name', get_public_schema_name())
+        if schema_name == get_public_schema_name():
+            return None
+
+        tenant = getattr(connection, 'tenant', None)
+        if isinstance(tenant, Tenant):
+            return tenant
+
+        with schema_context(get_public_schema_name()):
+            return Tenant.objects.filter(schema_name=schema_name).first()
+
+    def index_router(self, router, tenant=None) -> bool:
+        """Upsert the routing entry for a router of the current (or given) tenant."""
+        from apps.core.models import RouterRoute
+
+        tenant = tenant or self._resolve_current_tenant()
+        if tenant is None or not router.pk or not router.auth_key:
+            return False
+
+        try:
+            with schema_context(get_public_schema_name()):
+                with transaction.atomic():
+                    # An auth_key can only route to one router; drop stale owners
+                    RouterRoute.objects.filter(auth_key=router.auth_key).exclude(
+                        tenant=tenant, router_id=router.pk
+                    ).delete()
+                    RouterRoute.objects.update_or_create(
+                        tenant=tenant,
+                        router_id=router.pk,
+                        defaults={
+                            'auth_key': router.auth_key,
+                            'nas_ip': router.ip_address or None,
+                            'vpn_ip': router.vpn_ip_address or None,
+                        }
+                    )
+        except Exception as e:
+            logger.error(f"[ROUTER INDEX] Failed to index router {router.pk}: {e}")
+            return False
+
+        self._cache_delete(*self._cache_keys(
+            router_id=router.pk,
+            auth_key=router.auth_key,
+            nas_ip=router.ip_address,
+        ))
+        return True
+
+    def unindex_router(self, router, tenant=None) -> bool:
+        """Remove the routing entry for a deleted router."""
+        from apps.core.models import RouterRoute
+
+        tenant = tenant or self._resolve_current_tenant()
+        if tenant is None:
+            return False
+
+        try:
+            with schema_context(get_public_schema_name()):
+                RouterRoute.objects.filter(tenant=tenant, router_id=router.pk).delete()
+        except Exception as e:
+            logger.error(f"[ROUTER INDEX] Failed to unindex router {router.pk}: {e}")
+            return False
+
+        self._cache_delete(*self._cache_keys(
+            router_id=router.pk,
+            auth_key=router.auth_key,
+            nas_ip=router.ip_address,
+        ))
+        return True
+
+    def rebuild(self, tenants=None) -> dict:
+        """
+        Rebuild the index from the tenant Router tables.
+
+        Each tenant is replaced atomically, so lookups keep working while the
+        rebuild runs.
+        """
+        from apps.core.models import Tenant, RouterRoute
+        from apps.network.models.router_models import Router
+
+        stats = {'tenants': 0, 'routers': 0, 'errors': 0}
+
+        with schema_context(get_public_schema_name()):
+            if tenants is None:
+                tenants = list(Tenant.objects.exclude(schema_name=get_public_schema_name()))
+
+        for tenant in tenants:
+            try:
+                with schema_context(tenant.schema_name):
+                    rows = list(Router.objects.values('id', 'auth_key', 'ip_address', 'vpn_ip_address'))
+
+                routes = [
+                    RouterRoute(
+                        tenant=tenant,
+                        router_id=row['id'],
+                        auth_key=row['auth_key'],
+                        nas_ip=row['ip_address'] or None,
+                        vpn_ip=row['vpn_ip_address'] or None,
+                    )
+                    for row in rows if row['auth_key']
+                ]
+
+                with schema_context(get_public_schema_name()):
+                    with transaction.atomic():
+                        RouterRoute.objects.filter(tenant=tenant).delete()
+                        RouterRoute.objects.filter(
+                            auth_key__in=[r.auth_key for r in routes]
+                        ).delete()
+                        RouterRoute.objects.bulk_create(routes, batch_size=1000)
+
+                stats['tenants'] += 1
+                stats['routers'] += len(routes)
+            except Exception as e:
+                logger.error(f"[ROUTER INDEX] Rebuild failed for tenant {tenant.schema_name}: {e}")
+                stats['errors'] += 1
+
+        self.clear_cache()
+        logger.info(f"[ROUTER INDEX] Rebuild complete: {stats}")
+        return stats
+
+    # ────────────────────────────────────────────────────────────────
+    # LOOKUP
+    # ────────────────────────────────────────────────────────────────
+
+    def _query_index(self, router_id=None, auth_key=None, nas_ip=None):
+        """Return (tenant, router_id) from the public index, _MISS, or _UNAVAILABLE."""
+        from apps.core.models import RouterRoute
+        from django.db.models import Q
+
+        if auth_key:
+            condition = Q(auth_key=auth_key)
+        elif nas_ip:
+            condition = Q(nas_ip=nas_ip) | Q(vpn_ip=nas_ip)
+        else:
+            condition = Q(router_id=router_id)
+
+        try:
+            # Savepoint: a failed lookup must not break the caller's transaction
+            with schema_context(get_public_schema_name()), transaction.atomic():
+                route = (
+                    RouterRoute.objects
+                    .select_related('tenant')
+                    .filter(condition, tenant__is_active=True)
+                    .order_by('tenant__subdomain')
+                    .first()
+                )
+        except DatabaseError as e:
+            logger.error(f"[ROUTER INDEX] Index lookup failed, scanning tenants: {e}")
+            return _UNAVAILABLE
+        if route is None:
+            return _MISS
+        return route.tenant, route.router_id
+
+    @staticmethod
+    def _matches(router, router_id=None, auth_key=None, nas_ip=None) -> bool:
+        if auth_key:
+            return router.auth_key == auth_key
+        if nas_ip:
+            return nas_ip in (router.ip_address, router.vpn_ip_address)
+        return str(router.pk) == str(router_id)
+
+    def _scan(self, router_id=None, auth_key=None, nas_ip=None):
+        """Legacy O(tenants) scan, used only for routers missing from the index."""
+        from apps.core.models import Tenant
+        from apps.network.models.router_models import Router
+        from django.db.models import Q
+
+        connection.set_schema_to_public()
+        for tenant in Tenant.objects.filter(is_active=True):
+            try:
+                connection.set_tenant(tenant)
+                if auth_key:
+                    router = Router.objects.filter(auth_key=auth_key).first()
+                elif nas_ip:
+                    router = Router.objects.filter(
+                        Q(ip_address=nas_ip) | Q(vpn_ip_address=nas_ip)
+                    ).first()
+                else:
+                    router = Router.objects.filter(id=router_id).first()
+                if router:
+                    return router, tenant
+            except Exception:
+                continue
+        return None, None
+
+    def find_router(self, router_id=None, auth_key=None, nas_ip=None) -> Tuple[Optional[object], Optional[object]]:
+        """
+        Resolve a router by auth_key, NAS IP or id.
+
+        Returns (router, tenant) with the connection left on the tenant
+        schema, or (None, None).
+        """
+        from apps.network.models.router_models import Router
+
+        lookup = {'router_id': router_id, 'auth_key': auth_key, 'nas_ip': nas_ip}
+        keys = self._cache_keys(**lookup)
+        if not keys:
+            return None, None
+        key = keys[0]
+
+        target = self._cache_get(key)
+        if target is _MISS:
+            return None, None
+        if target is None:
+            target = self._query_index(**lookup)
+        if target is _UNAVAILABLE:
+            # Index table missing or unreachable: answer from the tenant schemas
+            router, tenant = self._scan(**lookup)
+            return (router, tenant) if router is not None else (None, None)
+
+        if target is not _MISS:
+            tenant, pk = target
+            connection.set_tenant(tenant)
+            router = Router.objects.filter(pk=pk).first()
+            if router is not None and self._matches(router, **lookup):
+                self._cache_set(key, target)
+                return router, tenant
+            # Stale entry (router deleted or key rotated in another process)
+            self._cache_delete(key)
+
+        if not self.scan_fallback:
+            self._cache_set(key, _MISS, ttl=self.negative_ttl)
+            return None, None
+
+        router, tenant = self._scan(**lookup)
+        if router is None:
+            self._cache_set(key, _MISS, ttl=self.negative_ttl)
+            return None, None
+
+        logger.info(f"[ROUTER INDEX] Backfilling router {router.pk} of tenant {tenant.schema_name}")
+        self.index_router(router, tenant=tenant)
+        self._cache_set(key, (tenant, router.pk))
+        return router, tenant
+
+
+# Singleton instance
+router_index_service = RouterIndexService()
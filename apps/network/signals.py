@@ -0,0 +1,29 @@
+# apps/network/signals.py
+"""
+Network signals - keep the public router routing index in sync with Router rows.
+"""
+import logging
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models.router_models import Router
+from .services.router_index import router_index_service
+
+logger = logging.getLogger(__name__)
+
+# Only these fields feed the routing index; heartbeat saves touch none of them
+ROUTER_INDEX_FIELDS = {'auth_key', 'ip_address', 'vpn_ip_address'}
+
+
+@receiver(post_save, sender=Router)
+def index_router_on_save(sender, instance, created, update_fields=None, **kwargs):
+    """Upsert the routing index entry when routing identifiers change."""
+    if update_fields and not ROUTER_INDEX_FIELDS.intersection(update_fields):
+        return
+    router_index_service.index_router(instance)
+
+
+@receiver(post_delete, sender=Router)
+def unindex_router_on_delete(sender, instance, **kwargs):
+    """Drop the routing index entry of a deleted router."""
+    router_index_service.unindex_router(instance)
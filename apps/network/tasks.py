@@ -0,0 +1,76 @@
+"""
+Network Celery Tasks - Background Jobs for Router Monitoring
+
+These tasks handle:
+1. Flushing buffered router heartbeats to tenant Router tables
+2. Marking routers that stopped reporting as offline
+3. Polling routers and OLTs over SNMP (counters, CPU, memory)
+"""
+
+import logging
+from celery import shared_task
+from django_tenants.utils import get_tenant_model, schema_context
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def flush_router_heartbeats():
+    """
+    Write buffered heartbeats (ROUTER_HEARTBEAT_MODE='redis') to tenant schemas
+    and derive online/offline transitions.
+
+    Also runs in 'sync' mode, where the buffer is empty and only the offline
+    sweep does work.
+
+    Returns:
+        Dict with flush statistics
+    """
+    from apps.network.services.heartbeat_buffer import heartbeat_buffer
+
+    try:
+        return heartbeat_buffer.flush()
+    except Exception as e:
+        logger.error(f"[HEARTBEAT TASK] Flush failed: {e}")
+        return {'error': str(e)}
+
+
+@shared_task
+def poll_snmp_fleet():
+    """
+    Poll every router and OLT of every tenant over SNMP and store
+    DeviceSample / InterfaceSample rows.
+
+    Runs every 60 seconds via Celery Beat. Devices are polled concurrently
+    from one event loop, so a single worker covers the whole fleet.
+
+    Returns:
+        Dict with poll statistics
+    """
+    from apps.bandwidth.monitoring.snmp_poller import snmp_poller
+
+    try:
+        return snmp_poller.poll_fleet()
+    except Exception as e:
+        logger.error(f"[SNMP TASK] Fleet poll failed: {e}")
+        return {'error': str(e)}
+
+
+@shared_task
+def prune_snmp_samples():
+    """
+    Delete SNMP samples older than SNMP_SAMPLE_RETENTION_DAYS in every tenant.
+
+    Runs daily via Celery Beat.
+    """
+    from apps.bandwidth.monitoring.snmp_poller import snmp_poller
+
+    stats = {'device_samples': 0, 'interface_samples': 0}
+    for tenant in get_tenant_model().objects.exclude(schema_name='public'):
+        with schema_context(tenant.schema_name):
+            result = snmp_poller.prune()
+        stats['device_samples'] += result['device_samples']
+        stats['interface_samples'] += result['interface_samples']
+
+    logger.info(f"[SNMP TASK] Pruned samples: {stats}")
+    return stats
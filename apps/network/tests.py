@@ -0,0 +1,28 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .services.heartbeat_buffer import HeartbeatBuffer
+
+
+class HeartbeatBufferTests(SimpleTestCase):
+    def setUp(self):
+        self.buffer = HeartbeatBuffer()
+        self.buffer.mode = HeartbeatBuffer.MODE_MEMORY
+        patcher = mock.patch.object(self.buffer, 'mark_stale_routers_offline', return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failed_tenant_readings_are_requeued(self):
+        self.buffer._pending = {'isp_a:1': {'ts': 100.0}, 'isp_a:2': {'ts': 100.0}}
+
+        def fail_then_report(schema, readings):
+            # Router 2 reports again while the write is failing
+            self.buffer._pending['isp_a:2'] = {'ts': 130.0}
+            raise RuntimeError('connection lost')
+
+        with mock.patch.object(self.buffer, '_apply_tenant_readings', side_effect=fail_then_report):
+            stats = self.buffer.flush()
+
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(self.buffer._pending, {'isp_a:1': {'ts': 100.0}, 'isp_a:2': {'ts': 130.0}})
@@ -10,6 +10,8 @@ from django.db.models import Sum, Avg, F, Count
 from django.http import HttpResponse, Http404
 import textwrap  # <--- Add this
 from apps.network.services.mikrotik_script_generator import MikrotikScriptGenerator
+from apps.network.services.router_index import router_index_service
+from apps.network.services.heartbeat_buffer import heartbeat_buffer
 from rest_framework import serializers
 import json
 import logging
@@ -20,12 +22,22 @@ from apps.core.permissions import HasCompanyAccess
 import apps.network.integrations.mikrotik_api as mikrotik_api_module
 logger = logging.getLogger(__name__)
 
-def find_router_across_tenants(router_id=None, auth_key=None, router_name=None):
+def find_router_across_tenants(router_id=None, auth_key=None, router_name=None, nas_ip=None):
     """
     Helper function to search for a router across all tenants.
     Returns (router, tenant) or (None, None) if not found.
+
+    auth_key / router_id / nas_ip lookups go through the public routing
+    index (see services.router_index). Name lookups are not indexed and
+    still scan tenant schemas.
     """
     from django.db import connection
+
+    if router_id or auth_key or nas_ip:
+        return router_index_service.find_router(
+            router_id=router_id, auth_key=auth_key, nas_ip=nas_ip
+        )
+
     connection.set_schema_to_public()
     
     from apps.core.models import Tenant
@@ -38,11 +50,7 @@ def find_router_across_tenants(router_id=None, auth_key=None, router_name=None):
         try:
             connection.set_tenant(tenant)
             try:
-                if router_id:
-                    found_router = Router.objects.filter(id=router_id).first()
-                elif auth_key:
-                    found_router = Router.objects.filter(auth_key=auth_key).first()
-                elif router_name:
+                if router_name:
                     found_router = Router.objects.filter(name__icontains=router_name).first()
                     if not found_router:
                         found_router = Router.objects.filter(auth_key=router_name).first()
@@ -2291,11 +2299,28 @@ class RouterHeartbeatView(APIView):
             if not router:
                 return Response({"error": "Invalid key"}, status=404)
             
+            # Buffered intake: record the reading and let the flusher write it
+            if heartbeat_buffer.enabled and heartbeat_buffer.record(tenant.schema_name, router.id, data):
+                from django.db import connection
+                connection.set_schema_to_public()
+                return Response({
+                    "status": "ok",
+                    "router_id": router.id,
+                    "timestamp": timezone.now().isoformat()
+                })
+            
             # Switch to tenant schema
             from django.db import connection
             connection.set_tenant(tenant)
             
             # Update heartbeat
+            if router.status != 'online':
+                RouterEvent.objects.create(
+                    router=router,
+                    event_type='up',
+                    message="Router came online (heartbeat received)",
+                    details={'previous_status': router.status}
+                )
             router.last_seen = timezone.now()
             router.status = 'online'
             
@@ -2309,7 +2334,9 @@ class RouterHeartbeatView(APIView):
             if 'uptime' in data:
                 router.uptime = data['uptime']
             
-            if 'ip' in data:
+            # Only write ip_address when it changed, so routine heartbeats
+            # don't rewrite the routing index
+            if 'ip' in data and data['ip'] != router.ip_address:
                 router.ip_address = data['ip']
                 router.save(update_fields=['last_seen', 'status', 'ip_address', 'active_users', 'total_users', 'uptime'])
             else:
@@ -3,6 +3,8 @@ import requests
 from django.conf import settings
 from typing import Dict, Tuple, Optional
 
+from utils.http_client import get_http_session
+
 logger = logging.getLogger(__name__)
 
 class AfricasTalkingService:
@@ -45,7 +47,7 @@ class AfricasTalkingService:
             }
             
             # Send request
-            response = requests.post(
+            response = get_http_session('africastalking').post(
                 self.sms_url,
                 headers=self.headers,
                 data=payload,
@@ -122,7 +124,7 @@ class AfricasTalkingService:
         try:
             url = f"https://api.africastalking.com/version1/user"
             
-            response = requests.get(
+            response = get_http_session('africastalking').get(
                 url,
                 headers=self.headers,
                 params={'username': self.username},
@@ -183,7 +185,7 @@ class AfricasTalkingService:
                 'text': message
             }
             
-            response = requests.post(
+            response = get_http_session('africastalking').post(
                 url,
                 headers=self.headers,
                 data=payload,
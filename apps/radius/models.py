@@ -683,16 +683,12 @@ class CustomerRadiusCredentials(models.Model):
     def __str__(self):
         return f"RADIUS: {self.username} ({self.customer})"
     
-    def sync_to_radius(self):
+    def build_radius_attributes(self):
         """
-        Sync this customer's credentials to RADIUS tables.
-        Called automatically via signals.
+        Build the per-user check and reply attributes (excluding the password
+        and bandwidth profile attributes).
+        Returns (check_attrs, reply_attrs).
         """
-        from .services.radius_sync_service import RadiusSyncService
-        
-        service = RadiusSyncService()
-        
-        # Build attributes
         check_attrs = {}
         reply_attrs = {}
         
@@ -708,6 +704,20 @@ class CustomerRadiusCredentials(models.Model):
         if self.ip_pool:
             reply_attrs['Framed-Pool'] = self.ip_pool
         
+        return check_attrs, reply_attrs
+    
+    def sync_to_radius(self):
+        """
+        Sync this customer's credentials to RADIUS tables.
+        Called automatically via signals.
+        """
+        from .services.radius_sync_service import RadiusSyncService
+        
+        service = RadiusSyncService()
+        
+        # Build attributes
+        check_attrs, reply_attrs = self.build_radius_attributes()
+        
         # Create or update RADIUS user
         if self.is_enabled:
             service.create_radius_user(
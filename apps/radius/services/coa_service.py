@@ -16,9 +16,17 @@ CoA flow:
 Requires: pyrad library (pip install pyrad)
 """
 
+import hashlib
 import logging
+import random
+import select
 import socket
-from typing import Optional
+import struct
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 
 from django.conf import settings
 
@@ -338,3 +346,319 @@ END-VENDOR	Mikrotik
             return Dictionary(path)
         finally:
             os.unlink(path)
+
+
+# ════════════════════════════════════════════════════════════════════════════
+# BATCH CoA ENGINE
+# ════════════════════════════════════════════════════════════════════════════
+
+class BatchCoASender:
+    """
+    Pipelined CoA / Disconnect-Request sender for mass operations.
+    
+    CoAService sends one packet at a time on a fresh socket. At midnight
+    expiry or after a plan-wide speed change that means thousands of
+    sequential round trips. This engine instead:
+    
+    - keeps one persistent UDP socket per NAS (own source port, so each NAS
+      gets its own 256-entry identifier space)
+    - keeps up to RADIUS_COA_WINDOW requests in flight per socket
+    - matches responses by identifier and Response Authenticator
+    - retransmits unanswered requests with exponential backoff + jitter
+    - runs the NAS batches concurrently
+    
+    Packets are encoded here (RFC 2865 / RFC 5176), so pyrad is not needed.
+    
+    Each request is a dict:
+        {'username', 'nas_ip_address', 'session_id' (optional),
+         'code': 'disconnect' | 'coa', 'attributes': {...} (CoA only)}
+    """
+    
+    DISCONNECT_REQUEST, DISCONNECT_ACK, DISCONNECT_NAK = 40, 41, 42
+    COA_REQUEST, COA_ACK, COA_NAK = 43, 44, 45
+    
+    ACK_CODES = (DISCONNECT_ACK, COA_ACK)
+    NAK_CODES = (DISCONNECT_NAK, COA_NAK)
+    
+    # Attribute numbers (RFC 2865 / 2866) and MikroTik VSAs
+    ATTR_TYPES = {
+        'User-Name': (1, 'string'),
+        'NAS-IP-Address': (4, 'ipaddr'),
+        'Session-Timeout': (27, 'integer'),
+        'Idle-Timeout': (28, 'integer'),
+        'Calling-Station-Id': (31, 'string'),
+        'Acct-Session-Id': (44, 'string'),
+    }
+    MIKROTIK_VENDOR_ID = 14988
+    MIKROTIK_ATTR_TYPES = {
+        'Mikrotik-Rate-Limit': (8, 'string'),
+        'Mikrotik-Total-Limit': (17, 'integer'),
+    }
+    
+    def __init__(self, server: str = None, secret: str = None, direct: bool = None):
+        """
+        Args:
+            server: CoA proxy (FreeRADIUS). Default: VPN gateway, like CoAService
+            secret: Shared secret with the CoA target
+            direct: Send straight to each NAS IP instead of the proxy
+        """
+        self.server = server or getattr(settings, 'VPN_SERVER_IP', '10.8.0.1')
+        self.secret = (secret or getattr(settings, 'RADIUS_COA_SECRET', 'testing123')).encode('utf-8')
+        self.direct = direct if direct is not None else getattr(settings, 'RADIUS_COA_DIRECT', False)
+        self.window = min(getattr(settings, 'RADIUS_COA_WINDOW', 64), 256)
+        self.retries = getattr(settings, 'RADIUS_COA_RETRIES', 2)
+        self.timeout = getattr(settings, 'RADIUS_COA_BATCH_TIMEOUT', 2.0)
+        self.max_workers = getattr(settings, 'RADIUS_COA_WORKERS', 16)
+        self._sockets = {}
+        self._socket_locks = {}
+        self._lock = threading.Lock()
+    
+    # ────────────────────────────────────────────────────────────────
+    # PACKET ENCODING
+    # ────────────────────────────────────────────────────────────────
+    
+    @staticmethod
+    def _encode_value(value, kind: str) -> bytes:
+        if kind == 'ipaddr':
+            return socket.inet_aton(str(value))
+        if kind == 'integer':
+            return struct.pack('!I', int(value))
+        return str(value).encode('utf-8')
+    
+    def _encode_attributes(self, request: dict) -> bytes:
+        attrs = {}
+        if request.get('username'):
+            attrs['User-Name'] = request['username']
+        if request.get('nas_ip_address'):
+            attrs['NAS-IP-Address'] = request['nas_ip_address']
+        if request.get('session_id'):
+            attrs['Acct-Session-Id'] = request['session_id']
+        if request.get('calling_station_id'):
+            attrs['Calling-Station-Id'] = request['calling_station_id']
+        attrs.update(request.get('attributes') or {})
+        
+        data = b''
+        for name, value in attrs.items():
+            if name in self.ATTR_TYPES:
+                number, kind = self.ATTR_TYPES[name]
+                data += CoAService._build_radius_attribute(number, self._encode_value(value, kind))
+            elif name in self.MIKROTIK_ATTR_TYPES:
+                number, kind = self.MIKROTIK_ATTR_TYPES[name]
+                encoded = self._encode_value(value, kind)
+                vsa = struct.pack('!BB', number, 2 + len(encoded)) + encoded
+                data += CoAService._build_radius_attribute(
+                    26, struct.pack('!I', self.MIKROTIK_VENDOR_ID) + vsa
+                )
+            else:
+                logger.warning(f"Batch CoA: unsupported attribute {name}, skipped")
+        return data
+    
+    def _encode(self, request: dict, identifier: int):
+        """Return (packet, request_authenticator)."""
+        code = self.COA_REQUEST if request.get('code') == 'coa' else self.DISCONNECT_REQUEST
+        attrs = self._encode_attributes(request)
+        header = struct.pack('!BBH', code, identifier, 20 + len(attrs))
+        # RFC 5176: Request Authenticator = MD5(Code+ID+Length+16 zero octets+Attributes+Secret)
+        authenticator = hashlib.md5(header + b'\x00' * 16 + attrs + self.secret).digest()
+        return header + authenticator + attrs, authenticator
+    
+    def _verify(self, response: bytes, request_authenticator: bytes) -> bool:
+        if len(response) < 20:
+            return False
+        expected = hashlib.md5(
+            response[:4] + request_authenticator + response[20:] + self.secret
+        ).digest()
+        return expected == response[4:20]
+    
+    # ────────────────────────────────────────────────────────────────
+    # PERSISTENT SOCKETS
+    # ────────────────────────────────────────────────────────────────
+    
+    def _target(self, nas_ip: str):
+        return (nas_ip if self.direct else self.server, COA_PORT)
+    
+    def _socket_for(self, nas_ip: str):
+        with self._lock:
+            sock = self._sockets.get(nas_ip)
+            if sock is None:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.connect(self._target(nas_ip))
+                sock.setblocking(False)
+                self._sockets[nas_ip] = sock
+                self._socket_locks[nas_ip] = threading.Lock()
+            return sock, self._socket_locks[nas_ip]
+    
+    def _drop_socket(self, nas_ip: str):
+        with self._lock:
+            sock = self._sockets.pop(nas_ip, None)
+            self._socket_locks.pop(nas_ip, None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+    
+    def close(self):
+        for nas_ip in list(self._sockets):
+            self._drop_socket(nas_ip)
+    
+    # ────────────────────────────────────────────────────────────────
+    # WINDOWED SEND / RECEIVE
+    # ────────────────────────────────────────────────────────────────
+    
+    def _backoff(self, attempt: int) -> float:
+        return self.timeout * (2 ** attempt) * (1 + random.uniform(0, 0.25))
+    
+    def _send_to_nas(self, nas_ip: str, requests: List[dict]) -> Dict[str, Any]:
+        """Pipeline all requests for one NAS over its socket."""
+        started = time.monotonic()
+        metric = {'sent': len(requests), 'acked': 0, 'nacked': 0, 'timeouts': 0,
+                  'retries': 0, 'failed': [], 'status': 'ok'}
+        
+        try:
+            sock, sock_lock = self._socket_for(nas_ip)
+        except OSError as e:
+            metric.update(status='error', error=str(e), failed=[r.get('username') for r in requests])
+            metric['latency_ms'] = int((time.monotonic() - started) * 1000)
+            return metric
+        
+        with sock_lock:
+            pending = deque(requests)
+            free_ids = deque(random.sample(range(256), 256))
+            # identifier -> [request, packet, authenticator, attempts, resend_at]
+            outstanding = {}
+            
+            try:
+                while pending or outstanding:
+                    # Fill the window
+                    while pending and free_ids and len(outstanding) < self.window:
+                        request = pending.popleft()
+                        identifier = free_ids.popleft()
+                        packet, authenticator = self._encode(request, identifier)
+                        sock.send(packet)
+                        outstanding[identifier] = [
+                            request, packet, authenticator, 0,
+                            time.monotonic() + self._backoff(0)
+                        ]
+                    
+                    wait_for = max(0.0, min(entry[4] for entry in outstanding.values()) - time.monotonic())
+                    readable, _, _ = select.select([sock], [], [], wait_for)
+                    
+                    # Drain every response that has arrived
+                    while readable:
+                        try:
+                            response = sock.recv(4096)
+                        except BlockingIOError:
+                            break
+                        except ConnectionRefusedError:
+                            # ICMP port unreachable from an earlier send
+                            continue
+                        if len(response) < 20:
+                            continue
+                        entry = outstanding.get(response[1])
+                        # Late answers to a reused identifier fail verification
+                        if entry is None or not self._verify(response, entry[2]):
+                            continue
+                        del outstanding[response[1]]
+                        free_ids.append(response[1])
+                        if response[0] in self.ACK_CODES:
+                            metric['acked'] += 1
+                        else:
+                            metric['nacked'] += 1
+                            metric['failed'].append(entry[0].get('username'))
+                    
+                    # Retransmit or give up on overdue requests
+                    now = time.monotonic()
+                    for identifier, entry in list(outstanding.items()):
+                        if entry[4] > now:
+                            continue
+                        if entry[3] >= self.retries:
+                            del outstanding[identifier]
+                            free_ids.append(identifier)
+                            metric['timeouts'] += 1
+                            metric['failed'].append(entry[0].get('username'))
+                            continue
+                        entry[3] += 1
+                        entry[4] = now + self._backoff(entry[3])
+                        sock.send(entry[1])
+                        metric['retries'] += 1
+            
+            except OSError as e:
+                # Socket is unusable; remaining requests count as failed
+                self._drop_socket(nas_ip)
+                metric['status'] = 'error'
+                metric['error'] = str(e)
+                metric['failed'].extend(entry[0].get('username') for entry in outstanding.values())
+                metric['failed'].extend(request.get('username') for request in pending)
+        
+        if metric['timeouts'] and metric['status'] == 'ok':
+            metric['status'] = 'partial' if metric['acked'] or metric['nacked'] else 'timeout'
+        metric['latency_ms'] = int((time.monotonic() - started) * 1000)
+        return metric
+    
+    def send_batch(self, requests: List[dict]) -> Dict[str, Any]:
+        """
+        Send many CoA / Disconnect requests, grouped by NAS and run concurrently.
+        
+        Returns:
+            Dict with totals and per-NAS metrics under ``nas``
+        """
+        result = {'sent': 0, 'acked': 0, 'nacked': 0, 'timeouts': 0,
+                  'failed': [], 'nas': {}}
+        
+        by_nas = defaultdict(list)
+        for request in requests:
+            by_nas[str(request.get('nas_ip_address') or '')].append(request)
+        
+        if not by_nas:
+            return result
+        
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(by_nas)),
+            thread_name_prefix='coa-batch',
+        ) as pool:
+            futures = {
+                pool.submit(self._send_to_nas, nas_ip, nas_requests): nas_ip
+                for nas_ip, nas_requests in by_nas.items()
+            }
+            for future, nas_ip in futures.items():
+                metric = future.result()
+                result['nas'][nas_ip] = metric
+                for key in ('sent', 'acked', 'nacked', 'timeouts'):
+                    result[key] += metric[key]
+                result['failed'].extend(metric['failed'])
+        
+        logger.info(
+            f"Batch CoA: sent={result['sent']} acked={result['acked']} "
+            f"nacked={result['nacked']} timeouts={result['timeouts']} nas={len(by_nas)}"
+        )
+        return result
+    
+    def disconnect_sessions(self, sessions: List[dict]) -> Dict[str, Any]:
+        """Disconnect sessions given as dicts with username, nas_ip and session_id."""
+        return self.send_batch([
+            {
+                'code': 'disconnect',
+                'username': session['username'],
+                'nas_ip_address': session.get('nas_ip'),
+                'session_id': session.get('session_id'),
+            }
+            for session in sessions
+        ])
+    
+    def change_rate_limit(self, sessions: List[dict], rate_limit: str) -> Dict[str, Any]:
+        """Push a new Mikrotik-Rate-Limit to live sessions."""
+        return self.send_batch([
+            {
+                'code': 'coa',
+                'username': session['username'],
+                'nas_ip_address': session.get('nas_ip'),
+                'session_id': session.get('session_id'),
+                'attributes': {'Mikrotik-Rate-Limit': rate_limit},
+            }
+            for session in sessions
+        ])
+
+
+# Singleton instance
+batch_coa_sender = BatchCoASender()
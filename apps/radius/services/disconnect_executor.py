@@ -0,0 +1,202 @@
+# apps/radius/services/disconnect_executor.py
+"""
+Parallel Per-NAS Disconnect Executor
+
+``disconnect_expired_users`` used to walk routers one after another and call
+``MikrotikAPI.disconnect_user`` per user (two connections and two
+active-table reads each). One unreachable router held up every router after
+it for the full librouteros timeout.
+
+This executor fans out one worker per NAS on a bounded thread pool:
+
+    - routers are resolved up front through the router routing index
+    - each worker opens one API connection, reads the active tables once
+      and removes all of that NAS's users in a single batch
+    - each router gets its own deadline, timed from when its worker starts;
+      the run waits at most one deadline per wave of workers, and routers
+      still queued after that are reported as ``not_attempted``
+
+Per-router latency and outcome are returned so the Celery task result shows
+which routers were slow or failing.
+"""
+
+import logging
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class DisconnectExecutor:
+    """Disconnects users grouped by NAS IP, one concurrent worker per NAS."""
+
+    def __init__(self, max_workers: int = None, router_timeout: int = None):
+        self.max_workers = max_workers or getattr(settings, 'RADIUS_DISCONNECT_WORKERS', 16)
+        self.router_timeout = router_timeout or getattr(settings, 'RADIUS_DISCONNECT_ROUTER_TIMEOUT', 10)
+
+    def _resolve_routers(self, nas_ips: List[str]) -> Dict[str, object]:
+        """Map NAS IPs to Router instances (main thread: uses the DB)."""
+        from apps.network.services.router_index import router_index_service
+
+        routers = {}
+        try:
+            for nas_ip in nas_ips:
+                router, tenant = router_index_service.find_router(nas_ip=nas_ip)
+                if router is not None and router.is_active:
+                    routers[nas_ip] = router
+        finally:
+            connection.set_schema_to_public()
+        return routers
+
+    def _disconnect_on_router(self, router, usernames: List[str]) -> Dict:
+        """Worker body: one connection, one batch. No database access here."""
+        from apps.network.integrations.mikrotik_api import MikrotikAPI
+
+        started = time.monotonic()
+        metric = {
+            'router': router.name,
+            'users': len(usernames),
+            'disconnected': 0,
+            'status': 'ok',
+        }
+        try:
+            api = MikrotikAPI(router, timeout=self.router_timeout)
+            results = api.disconnect_users(usernames, connection_type='both')
+            metric['disconnected'] = sum(
+                1 for result in results.values() if result.get('pppoe') or result.get('hotspot')
+            )
+        except Exception as e:
+            metric['status'] = 'error'
+            metric['error'] = str(e)
+        metric['latency_ms'] = int((time.monotonic() - started) * 1000)
+        return metric
+
+    @staticmethod
+    def _unfinished(router, usernames: List[str], status: str, elapsed: float) -> Dict:
+        return {
+            'router': router.name,
+            'users': len(usernames),
+            'disconnected': 0,
+            'status': status,
+            'latency_ms': int(elapsed * 1000),
+        }
+
+    @staticmethod
+    def _record(result: Dict, nas_ip: str, metric: Dict):
+        result['routers'][nas_ip] = metric
+        result['disconnected'] += metric['disconnected']
+        if metric['status'] == 'ok':
+            logger.info(
+                f"[DISCONNECT TASK] Disconnected {metric['disconnected']}/{metric['users']} "
+                f"users from {metric['router']} in {metric['latency_ms']}ms"
+            )
+            return
+        result['errors'] += 1
+        if metric['status'] == 'error':
+            logger.error(f"[DISCONNECT TASK] Error processing router {nas_ip}: {metric.get('error')}")
+
+    def run(self, sessions_by_nas: Dict[str, List[str]]) -> Dict:
+        """
+        Disconnect users on every NAS concurrently.
+
+        Args:
+            sessions_by_nas: NAS IP -> usernames to disconnect
+
+        Returns:
+            Dict with totals and a per-NAS ``routers`` metrics map
+        """
+        result = {
+            'disconnected': 0,
+            'errors': 0,
+            'routers': {},
+        }
+        if not sessions_by_nas:
+            return result
+
+        routers = self._resolve_routers(list(sessions_by_nas))
+
+        for nas_ip in sessions_by_nas:
+            if nas_ip not in routers:
+                logger.warning(f"[DISCONNECT TASK] Router not found for NAS IP: {nas_ip}")
+                result['routers'][nas_ip] = {
+                    'router': None,
+                    'users': len(sessions_by_nas[nas_ip]),
+                    'disconnected': 0,
+                    'status': 'not_found',
+                    'latency_ms': 0,
+                }
+
+        if not routers:
+            return result
+
+        # Each worker performs a connect, two reads and up to two removes
+        router_deadline = self.router_timeout * 5
+        workers = min(self.max_workers, len(routers))
+        stop_at = time.monotonic() + router_deadline * math.ceil(len(routers) / workers)
+        started = {}
+
+        def work(nas_ip, router):
+            started[nas_ip] = time.monotonic()
+            return self._disconnect_on_router(router, sessions_by_nas[nas_ip])
+
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nas-disconnect')
+        try:
+            futures = {
+                pool.submit(work, nas_ip, router): nas_ip
+                for nas_ip, router in routers.items()
+            }
+            pending = set(futures)
+
+            while pending:
+                now = time.monotonic()
+                for future in [f for f in pending if not f.done()]:
+                    nas_ip = futures[future]
+                    if nas_ip in started and now - started[nas_ip] >= router_deadline:
+                        pending.discard(future)
+                        self._record(result, nas_ip, self._unfinished(
+                            routers[nas_ip], sessions_by_nas[nas_ip], 'timeout', now - started[nas_ip]
+                        ))
+                        logger.error(f"[DISCONNECT TASK] Router {nas_ip} missed its {router_deadline}s deadline")
+
+                done = {f for f in pending if f.done()}
+                for future in done:
+                    self._record(result, futures[future], future.result())
+                pending -= done
+                if not pending or now >= stop_at:
+                    break
+
+                # Wake up for the next completion, router deadline or the end of the run
+                wake_at = min(
+                    [stop_at] + [started[futures[f]] + router_deadline for f in pending if futures[f] in started]
+                )
+                wait(pending, timeout=max(wake_at - now, 0.01), return_when=FIRST_COMPLETED)
+
+            now = time.monotonic()
+            for future in pending:
+                nas_ip = futures[future]
+                if future.done():
+                    metric = future.result()
+                elif future.cancel() or nas_ip not in started:
+                    # Still queued behind slow routers: never contacted
+                    metric = self._unfinished(routers[nas_ip], sessions_by_nas[nas_ip], 'not_attempted', 0)
+                    logger.error(f"[DISCONNECT TASK] Router {nas_ip} was not attempted before the run ended")
+                else:
+                    metric = self._unfinished(
+                        routers[nas_ip], sessions_by_nas[nas_ip], 'timeout', now - started[nas_ip]
+                    )
+                    logger.error(f"[DISCONNECT TASK] Router {nas_ip} was still running when the run ended")
+                self._record(result, nas_ip, metric)
+        finally:
+            # Do not block on stragglers; their sockets time out on their own
+            pool.shutdown(wait=False)
+
+        return result
+
+
+# Singleton instance
+disconnect_executor = DisconnectExecutor()
@@ -0,0 +1,290 @@
+# apps/radius/services/radius_dirty_set.py
+"""
+Incremental RADIUS Sync - Per-Tenant Dirty Sets
+
+Signals in ``signals_auto_sync`` know exactly which RADIUS usernames changed
+(credential save, plan change, customer status, invoice status). Instead of
+re-deriving every user of every tenant each hour, those usernames are
+recorded in a per-tenant Redis set:
+
+    netily:radius:dirty:tenants          → SET of schemas with pending work
+    netily:radius:dirty:users:{schema}   → SET of usernames to re-sync
+
+``sync_dirty_radius_users`` drains the sets and pushes only those users
+through ``RadiusSyncService.bulk_sync_users``.
+
+The full pass is demoted to ``reconcile``: a checksum of tenant
+radcheck/radreply vs public.radcheck/radreply per username hash bucket.
+Only buckets whose checksums differ are repaired.
+"""
+
+import logging
+import uuid
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from utils.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class RadiusDirtySet:
+    """Records changed RADIUS usernames and syncs them in batches."""
+
+    MODE_IMMEDIATE = 'immediate'
+    MODE_INCREMENTAL = 'incremental'
+
+    TENANTS_KEY = 'netily:radius:dirty:tenants'
+    USERS_KEY = 'netily:radius:dirty:users:{schema}'
+
+    def __init__(self):
+        self.mode = getattr(settings, 'RADIUS_SYNC_MODE', self.MODE_IMMEDIATE)
+        self.buckets = getattr(settings, 'RADIUS_RECONCILE_BUCKETS', 256)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode == self.MODE_INCREMENTAL
+
+    # ────────────────────────────────────────────────────────────────
+    # INTAKE
+    # ────────────────────────────────────────────────────────────────
+
+    def mark(self, usernames: Iterable[str], schema: str = None) -> bool:
+        """
+        Record usernames of the current tenant as needing a RADIUS sync once
+        the surrounding transaction commits.
+
+        Returns False if incremental sync is off or Redis is unavailable, in
+        which case the caller should sync immediately.
+        """
+        if not self.enabled:
+            return False
+
+        usernames = [u for u in usernames if u]
+        if not usernames:
+            return True
+
+        client = get_redis_client()
+        if client is None:
+            return False
+
+        schema = schema or getattr(connection, 'schema_name', None)
+        if not schema or schema == 'public':
+            return False
+
+        def _record():
+            try:
+                pipe = client.pipeline()
+                pipe.sadd(self.USERS_KEY.format(schema=schema), *usernames)
+                pipe.sadd(self.TENANTS_KEY, schema)
+                pipe.execute()
+            except Exception as e:
+                # Lost marks are picked up by the checksum reconcile
+                logger.warning(f"[RADIUS DIRTY] Could not record {len(usernames)} users for {schema}: {e}")
+
+        transaction.on_commit(_record)
+        return True
+
+    # ────────────────────────────────────────────────────────────────
+    # DRAIN
+    # ────────────────────────────────────────────────────────────────
+
+    def pending_schemas(self) -> List[str]:
+        client = get_redis_client()
+        if client is None:
+            return []
+        try:
+            return sorted(s.decode() for s in client.smembers(self.TENANTS_KEY))
+        except Exception as e:
+            logger.warning(f"[RADIUS DIRTY] Could not read pending tenants: {e}")
+            return []
+
+    def _drain(self, schema: str) -> List[str]:
+        """Atomically take every pending username of a tenant."""
+        client = get_redis_client()
+        if client is None:
+            return []
+
+        key = self.USERS_KEY.format(schema=schema)
+        processing_key = f"{key}:flush:{uuid.uuid4().hex}"
+        try:
+            client.srem(self.TENANTS_KEY, schema)
+            # RENAME is atomic: marks arriving now land in a fresh set
+            client.rename(key, processing_key)
+        except Exception:
+            # Key does not exist -> nothing pending
+            return []
+        try:
+            return sorted(u.decode() for u in client.smembers(processing_key))
+        finally:
+            client.delete(processing_key)
+
+    def _requeue(self, schema: str, usernames: List[str]):
+        client = get_redis_client()
+        if client is None or not usernames:
+            return
+        try:
+            pipe = client.pipeline()
+            pipe.sadd(self.USERS_KEY.format(schema=schema), *usernames)
+            pipe.sadd(self.TENANTS_KEY, schema)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"[RADIUS DIRTY] Could not requeue {len(usernames)} users for {schema}: {e}")
+
+    def sync_pending(self, schema: str) -> Dict[str, int]:
+        """
+        Sync the pending usernames of one tenant. Must be called with the
+        connection on that tenant's schema.
+        """
+        stats = {'users': 0, 'synced': 0, 'missing': 0, 'errors': 0}
+
+        usernames = self._drain(schema)
+        stats['users'] = len(usernames)
+        if not usernames:
+            return stats
+
+        try:
+            result = self.sync_usernames(usernames)
+            stats['synced'] = result['synced']
+            stats['missing'] = result['missing']
+        except Exception as e:
+            logger.error(f"[RADIUS DIRTY] Sync failed for {schema}, requeueing {len(usernames)} users: {e}")
+            self._requeue(schema, usernames)
+            stats['errors'] = len(usernames)
+
+        return stats
+
+    def sync_usernames(self, usernames: List[str]) -> Dict[str, int]:
+        """Push the current credential state of the given usernames to RADIUS."""
+        from django.utils import timezone
+        from ..models import CustomerRadiusCredentials
+        from .radius_sync_service import RadiusSyncService
+
+        service = RadiusSyncService()
+        synced = 0
+        found = set()
+
+        for start in range(0, len(usernames), service.BULK_BATCH_SIZE):
+            chunk = usernames[start:start + service.BULK_BATCH_SIZE]
+            credentials = list(
+                CustomerRadiusCredentials.objects
+                .select_related('bandwidth_profile')
+                .filter(username__in=chunk)
+            )
+            if not credentials:
+                continue
+
+            service.bulk_sync_users([service.build_credentials_state(c) for c in credentials])
+            CustomerRadiusCredentials.objects.filter(
+                id__in=[c.id for c in credentials]
+            ).update(synced_to_radius=True, last_sync=timezone.now())
+
+            found.update(c.username for c in credentials)
+            synced += len(credentials)
+
+        # Deleted credentials are removed inline by the post_delete signal
+        return {'synced': synced, 'missing': len(set(usernames) - found)}
+
+    # ────────────────────────────────────────────────────────────────
+    # CHECKSUM RECONCILE
+    # ────────────────────────────────────────────────────────────────
+
+    def _bucket_sql(self, column: str = 'username') -> str:
+        return f"(('x' || substr(md5({column}), 1, 7))::bit(28)::int % {int(self.buckets)})"
+
+    def _checksums(self, cursor, check_table: str, reply_table: str, where: str, params: list) -> Dict[int, str]:
+        """
+        Checksum every username bucket of a radcheck/radreply pair.
+
+        ``op`` is left out on purpose: tenant tables use ':=' for replies
+        while public.radreply uses '='.
+        """
+        cursor.execute(f"""
+            SELECT {self._bucket_sql()} AS bucket,
+                   md5(string_agg(tag || '|' || username || '|' || attribute || '|' || value,
+                                  ',' ORDER BY tag, username, attribute, value))
+            FROM (
+                SELECT 'c' AS tag, username, attribute, value FROM {check_table} WHERE {where}
+                UNION ALL
+                SELECT 'r' AS tag, username, attribute, value FROM {reply_table} WHERE {where}
+            ) rows
+            GROUP BY 1
+        """, params + params)
+        return dict(cursor.fetchall())
+
+    def _bucket_usernames(self, cursor, buckets: List[int], schema: str) -> List[str]:
+        cursor.execute(f"""
+            SELECT username FROM radcheck WHERE {self._bucket_sql()} = ANY(%s)
+            UNION SELECT username FROM radreply WHERE {self._bucket_sql()} = ANY(%s)
+            UNION SELECT username FROM public.radcheck
+                WHERE tenant_schema = %s AND {self._bucket_sql()} = ANY(%s)
+            UNION SELECT username FROM public.radreply
+                WHERE tenant_schema = %s AND {self._bucket_sql()} = ANY(%s)
+        """, [buckets, buckets, schema, buckets, schema, buckets])
+        return sorted(row[0] for row in cursor.fetchall())
+
+    def _mirror_to_public(self, cursor, usernames: List[str], schema: str):
+        """Make public rows of non-credential users match the tenant tables."""
+        with transaction.atomic():
+            for table, op in (('radcheck', ':='), ('radreply', '=')):
+                cursor.execute(
+                    f"DELETE FROM public.{table} WHERE tenant_schema = %s AND username = ANY(%s)",
+                    [schema, usernames]
+                )
+                cursor.execute(f"""
+                    INSERT INTO public.{table}
+                        (username, attribute, op, value, tenant_schema, created_at, updated_at)
+                    SELECT username, attribute, %s, value, %s, NOW(), NOW()
+                    FROM {table} WHERE username = ANY(%s)
+                """, [op, schema, usernames])
+
+    def reconcile(self, schema: str) -> Dict[str, int]:
+        """
+        Compare tenant and public RADIUS tables bucket by bucket and repair
+        only the buckets that differ. Must be called with the connection on
+        the tenant's schema.
+        """
+        from ..models import CustomerRadiusCredentials
+
+        stats = {'buckets': self.buckets, 'mismatched_buckets': 0,
+                 'users_repaired': 0, 'users_mirrored': 0}
+
+        with connection.cursor() as cursor:
+            tenant_sums = self._checksums(cursor, 'radcheck', 'radreply', 'TRUE', [])
+            public_sums = self._checksums(
+                cursor, 'public.radcheck', 'public.radreply', 'tenant_schema = %s', [schema]
+            )
+
+            mismatched = sorted(
+                bucket for bucket in set(tenant_sums) | set(public_sums)
+                if tenant_sums.get(bucket) != public_sums.get(bucket)
+            )
+            stats['mismatched_buckets'] = len(mismatched)
+            if not mismatched:
+                return stats
+
+            usernames = self._bucket_usernames(cursor, mismatched, schema)
+
+        managed = set(
+            CustomerRadiusCredentials.objects
+            .filter(username__in=usernames)
+            .values_list('username', flat=True)
+        )
+        if managed:
+            stats['users_repaired'] = self.sync_usernames(sorted(managed))['synced']
+
+        # Users without credentials (manual entries, orphans): tenant is authoritative
+        unmanaged = [u for u in usernames if u not in managed]
+        if unmanaged:
+            with connection.cursor() as cursor:
+                self._mirror_to_public(cursor, unmanaged, schema)
+            stats['users_mirrored'] = len(unmanaged)
+
+        logger.info(f"[RADIUS RECONCILE] {schema}: {stats}")
+        return stats
+
+
+# Singleton instance
+radius_dirty_set = RadiusDirtySet()
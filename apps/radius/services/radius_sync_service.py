@@ -10,6 +10,7 @@ This service handles:
 6. DUAL-WRITE: Syncing to public schema for multi-tenant RADIUS auth
 """
 
+import io
 import re
 import logging
 from typing import Optional, Dict, List, Any
@@ -484,8 +485,7 @@ class RadiusSyncService:
         # Terminate active sessions in public schema (raw SQL)
         # Use a savepoint so a missing radacct table doesn't abort the outer transaction
         try:
-            from django.db import transaction as db_transaction
-            with db_transaction.atomic():
+            with transaction.atomic():
                 with connection.cursor() as cursor:
                     cursor.execute(
                         """
@@ -932,11 +932,17 @@ class RadiusSyncService:
         
         return result
     
-    def sync_all_customers(self) -> Dict[str, int]:
-        """Sync all customers to RADIUS."""
-        from apps.customers.models import Customer
+    def sync_all_customers(self, batch_size: int = None) -> Dict[str, int]:
+        """
+        Sync all customer RADIUS credentials of the current tenant.
         
-        customers = Customer.objects.filter(is_active=True)
+        Uses the set-based bulk path: desired radcheck/radreply state is built
+        in memory per batch and merged into tenant and public tables with a
+        handful of statements instead of several round trips per user.
+        """
+        from ..models import CustomerRadiusCredentials
+        
+        batch_size = batch_size or self.BULK_BATCH_SIZE
         
         stats = {
             'total': 0,
@@ -945,34 +951,442 @@ class RadiusSyncService:
             'errors': 0
         }
         
-        for customer in customers:
-            try:
-                result = self.sync_customer(customer)
-                stats['total'] += 1
-                
-                if result.get('status') == 'active':
-                    stats['active'] += 1
-                else:
-                    stats['disabled'] += 1
-                    
-            except Exception as e:
-                logger.error(f"Error syncing customer {customer.id}: {e}")
-                stats['errors'] += 1
+        credentials = (
+            CustomerRadiusCredentials.objects
+            .select_related('bandwidth_profile')
+            .order_by('id')
+        )
+        
+        batch = []
+        for cred in credentials.iterator(chunk_size=batch_size):
+            batch.append(cred)
+            if len(batch) >= batch_size:
+                self._sync_credentials_batch(batch, stats)
+                batch = []
+        if batch:
+            self._sync_credentials_batch(batch, stats)
         
         logger.info(f"Customer sync complete: {stats}")
         return stats
+    
+    def _sync_credentials_batch(self, batch, stats: Dict[str, int]) -> None:
+        from ..models import CustomerRadiusCredentials
+        
+        users = [self.build_credentials_state(cred) for cred in batch]
+        try:
+            self.bulk_sync_users(users)
+        except Exception as e:
+            logger.error(f"Bulk RADIUS sync failed for batch of {len(batch)}: {e}")
+            stats['errors'] += len(batch)
+            return
+        
+        CustomerRadiusCredentials.objects.filter(
+            id__in=[cred.id for cred in batch]
+        ).update(synced_to_radius=True, last_sync=timezone.now())
+        
+        stats['total'] += len(batch)
+        enabled = sum(1 for user in users if user['enabled'])
+        stats['active'] += enabled
+        stats['disabled'] += len(batch) - enabled
+    
+    # ────────────────────────────────────────────────────────────────
+    # BULK SYNC (SET-BASED)
+    # ────────────────────────────────────────────────────────────────
+    
+    BULK_BATCH_SIZE = 5000
+    
+    def build_credentials_state(self, credentials) -> Dict[str, Any]:
+        """
+        Build the desired RADIUS state of one CustomerRadiusCredentials row,
+        matching what ``sync_to_radius`` writes.
+        """
+        check_attrs, reply_attrs = credentials.build_radius_attributes()
+        if credentials.bandwidth_profile:
+            reply_attrs.update(credentials.bandwidth_profile.get_radius_attributes())
+        
+        return {
+            'username': credentials.username,
+            'password': credentials.password,
+            'customer_id': credentials.customer_id,
+            'check': check_attrs,
+            'reply': reply_attrs,
+            'groupname': None,
+            'enabled': credentials.is_enabled,
+        }
+    
+    @staticmethod
+    def _copy_value(value) -> str:
+        """Encode a value for PostgreSQL COPY text format."""
+        if value is None:
+            return '\\N'
+        return (
+            str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r')
+        )
+    
+    def _copy_rows(self, cursor, table: str, columns: List[str], rows: List[tuple]) -> None:
+        """Stream rows into a table with COPY ... FROM STDIN."""
+        if not rows:
+            return
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(self._copy_value(v) for v in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+    
+    def _stage_users(self, cursor, users: List[Dict[str, Any]]) -> None:
+        """Create temp staging tables and COPY the desired state into them."""
+        cursor.execute("""
+            CREATE TEMP TABLE _radius_stage_users (
+                username VARCHAR(64) PRIMARY KEY
+            ) ON COMMIT DROP;
+            CREATE TEMP TABLE _radius_stage_check (
+                username VARCHAR(64), attribute VARCHAR(64), value VARCHAR(253), customer_id BIGINT
+            ) ON COMMIT DROP;
+            CREATE TEMP TABLE _radius_stage_reply (
+                username VARCHAR(64), attribute VARCHAR(64), value VARCHAR(253), customer_id BIGINT
+            ) ON COMMIT DROP;
+            CREATE TEMP TABLE _radius_stage_group (
+                username VARCHAR(64), groupname VARCHAR(64), priority INTEGER
+            ) ON COMMIT DROP;
+        """)
+        
+        user_rows, check_rows, reply_rows, group_rows = [], [], [], []
+        for user in users:
+            username = user['username']
+            customer_id = user.get('customer_id')
+            user_rows.append((username,))
+            
+            check = {self.ATTR_PASSWORD: user['password']}
+            check.update(user.get('check') or {})
+            if not user.get('enabled', True):
+                check[self.ATTR_AUTH_TYPE] = 'Reject'
+            for attr, value in check.items():
+                check_rows.append((username, attr, str(value), customer_id))
+            
+            for attr, value in (user.get('reply') or {}).items():
+                reply_rows.append((username, attr, str(value), customer_id))
+            
+            if user.get('groupname'):
+                group_rows.append((username, user['groupname'], 1))
+        
+        self._copy_rows(cursor, '_radius_stage_users', ['username'], user_rows)
+        self._copy_rows(cursor, '_radius_stage_check', ['username', 'attribute', 'value', 'customer_id'], check_rows)
+        self._copy_rows(cursor, '_radius_stage_reply', ['username', 'attribute', 'value', 'customer_id'], reply_rows)
+        self._copy_rows(cursor, '_radius_stage_group', ['username', 'groupname', 'priority'], group_rows)
+        cursor.execute("ANALYZE _radius_stage_users, _radius_stage_check, _radius_stage_reply")
+    
+    def _merge_attributes(self, cursor, target: str, stage: str, op: str, public: bool) -> Dict[str, Any]:
+        """
+        Diff-and-merge one attribute table against its staging table in a
+        single statement: delete rows of staged users that are not desired,
+        insert desired rows that are missing, leave matching rows untouched.
+        """
+        if public:
+            insert_columns = "username, attribute, op, value, tenant_schema, created_at, updated_at"
+            insert_values = "s.username, s.attribute, %(op)s, s.value, %(schema)s, NOW(), NOW()"
+        else:
+            insert_columns = "username, attribute, op, value, customer_id"
+            insert_values = "s.username, s.attribute, %(op)s, s.value, s.customer_id"
+        
+        cursor.execute(f"""
+            WITH removed AS (
+                DELETE FROM {target} t
+                USING _radius_stage_users u
+                WHERE t.username = u.username
+                  AND NOT EXISTS (
+                      SELECT 1 FROM {stage} s
+                      WHERE s.username = t.username AND s.attribute = t.attribute
+                        AND s.value = t.value AND t.op = %(op)s
+                  )
+                RETURNING t.username, t.attribute, t.value
+            ), added AS (
+                INSERT INTO {target} ({insert_columns})
+                SELECT {insert_values}
+                FROM {stage} s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {target} t
+                    WHERE t.username = s.username AND t.attribute = s.attribute
+                      AND t.value = s.value AND t.op = %(op)s
+                )
+                RETURNING username, attribute, value
+            )
+            SELECT
+                (SELECT COUNT(*) FROM removed),
+                (SELECT COUNT(*) FROM added),
+                (SELECT ARRAY_AGG(username) FROM added
+                 WHERE attribute = %(auth_type)s AND value = 'Reject')
+        """, {'op': op, 'schema': self._get_tenant_schema(), 'auth_type': self.ATTR_AUTH_TYPE})
+        removed, added, rejected = cursor.fetchone()
+        return {'removed': removed, 'added': added, 'rejected': rejected or []}
+    
+    def _merge_groups(self, cursor, target: str, public: bool) -> Dict[str, int]:
+        """Diff-and-merge radusergroup for the staged users."""
+        if public:
+            insert_columns = "username, groupname, priority, tenant_schema"
+            insert_values = "s.username, s.groupname, s.priority, %(schema)s"
+        else:
+            insert_columns = "username, groupname, priority"
+            insert_values = "s.username, s.groupname, s.priority"
+        
+        cursor.execute(f"""
+            WITH removed AS (
+                DELETE FROM {target} t
+                USING _radius_stage_users u
+                WHERE t.username = u.username
+                  AND NOT EXISTS (
+                      SELECT 1 FROM _radius_stage_group s
+                      WHERE s.username = t.username AND s.groupname = t.groupname
+                        AND s.priority = t.priority
+                  )
+                RETURNING 1
+            ), added AS (
+                INSERT INTO {target} ({insert_columns})
+                SELECT {insert_values}
+                FROM _radius_stage_group s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {target} t
+                    WHERE t.username = s.username AND t.groupname = s.groupname
+                      AND t.priority = s.priority
+                )
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM removed), (SELECT COUNT(*) FROM added)
+        """, {'schema': self._get_tenant_schema()})
+        removed, added = cursor.fetchone()
+        return {'removed': removed, 'added': added}
+    
+    def bulk_sync_users(self, users: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Apply the desired RADIUS state of a batch of users to the tenant
+        tables and to public.* in a handful of statements.
+        
+        Each user dict has: username, password, customer_id, check (dict),
+        reply (dict), groupname (optional) and enabled (bool). Disabled users
+        get ``Auth-Type := Reject`` and users that become disabled in this
+        run have their open sessions terminated, like ``disable_radius_user``.
+        
+        Only the users in the batch are touched; rows of other users are
+        never read or written.
+        """
+        stats = {
+            'users': len(users),
+            'check_added': 0, 'check_removed': 0,
+            'reply_added': 0, 'reply_removed': 0,
+            'groups_added': 0, 'groups_removed': 0,
+            'public_sync': False,
+            'disconnected': 0,
+        }
+        if not users:
+            return stats
+        
+        newly_rejected = set()
+        
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                self._stage_users(cursor, users)
+                
+                # Tenant schema (Admin UI) - tenant tables use ':=' for replies too
+                check = self._merge_attributes(cursor, 'radcheck', '_radius_stage_check', ':=', public=False)
+                reply = self._merge_attributes(cursor, 'radreply', '_radius_stage_reply', ':=', public=False)
+                groups = self._merge_groups(cursor, 'radusergroup', public=False)
+                newly_rejected.update(check['rejected'])
+                
+                stats.update({
+                    'check_added': check['added'], 'check_removed': check['removed'],
+                    'reply_added': reply['added'], 'reply_removed': reply['removed'],
+                    'groups_added': groups['added'], 'groups_removed': groups['removed'],
+                })
+                
+                # ════════════════════════════════════════════════════════════
+                # DUAL-WRITE: Same merge against public schema for FreeRADIUS
+                # ════════════════════════════════════════════════════════════
+                try:
+                    with transaction.atomic():
+                        public_check = self._merge_attributes(
+                            cursor, 'public.radcheck', '_radius_stage_check', ':=', public=True
+                        )
+                        self._merge_attributes(
+                            cursor, 'public.radreply', '_radius_stage_reply', '=', public=True
+                        )
+                        self._merge_groups(cursor, 'public.radusergroup', public=True)
+                    newly_rejected.update(public_check['rejected'])
+                    stats['public_sync'] = True
+                except Exception as e:
+                    # Savepoint rolled back — tenant merge is kept
+                    logger.warning(f"[PUBLIC SYNC] Bulk merge to public schema failed: {e}")
+        
+        if newly_rejected:
+            stats['disconnected'] = self._terminate_sessions(sorted(newly_rejected))
+        
+        logger.info(
+            f"[BULK SYNC] {stats['users']} users: "
+            f"radcheck +{stats['check_added']}/-{stats['check_removed']}, "
+            f"radreply +{stats['reply_added']}/-{stats['reply_removed']}, "
+            f"public={stats['public_sync']}"
+        )
+        return stats
+    
+    def _terminate_sessions(self, usernames: List[str]) -> int:
+        """Close open accounting sessions for many users (set-based disconnect_user)."""
+        from ..models import RadAcct
+        
+        terminated = RadAcct.objects.filter(
+            username__in=usernames,
+            acctstoptime__isnull=True
+        ).update(acctstoptime=timezone.now(), acctterminatecause='Admin-Reset')
+        
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        UPDATE public.radacct
+                        SET acctstoptime = NOW(),
+                            acctterminatecause = 'Admin-Reset'
+                        WHERE username = ANY(%s) AND acctstoptime IS NULL
+                        """,
+                        [usernames]
+                    )
+                    terminated += cursor.rowcount
+        except Exception as e:
+            logger.warning(f"Failed to terminate public sessions for {len(usernames)} users: {e}")
+        
+        return terminated
 
-    def bulk_update_plan_users(self, plan, profile=None) -> Dict[str, Any]:
-        """Update all RADIUS users on a plan when the plan changes."""
+    def get_active_sessions(self, usernames: List[str]) -> List[Dict[str, str]]:
+        """Open accounting sessions (username, nas_ip, session_id) for the given users."""
+        if not usernames:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT username, host(nasipaddress), acctsessionid
+                FROM public.radacct
+                WHERE username = ANY(%s) AND acctstoptime IS NULL
+                """,
+                [list(usernames)]
+            )
+            return [
+                {'username': username, 'nas_ip': nas_ip, 'session_id': session_id}
+                for username, nas_ip, session_id in cursor.fetchall()
+            ]
+    
+    def push_rate_limit_coa(self, usernames: List[str], rate_limit: str) -> Dict[str, Any]:
+        """Push a new Mikrotik-Rate-Limit to the live sessions of many users via batch CoA."""
+        from .coa_service import batch_coa_sender
+        
+        sessions = self.get_active_sessions(usernames)
+        if not sessions:
+            return {'sent': 0, 'acked': 0, 'nacked': 0, 'timeouts': 0, 'failed': [], 'nas': {}}
+        return batch_coa_sender.change_rate_limit(sessions, rate_limit)
+    
+    def bulk_set_rate_limit(self, usernames: List[str], rate_limit: str) -> Dict[str, Any]:
+        """
+        Set Mikrotik-Rate-Limit for many users with one statement per schema.
+        
+        Existing rows whose value differs are updated, missing rows are
+        inserted; users whose rate already matches are not touched. Only
+        users that have a password row in the tenant radcheck are affected.
+        """
+        stats = {'total': len(usernames), 'updated': 0, 'inserted': 0, 'public_sync': False}
+        if not usernames:
+            return stats
+        
+        usernames = list(usernames)
+        
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # Tenant schema (Admin UI)
+                cursor.execute("""
+                    WITH targets AS (
+                        SELECT DISTINCT ON (username) username, customer_id
+                        FROM radcheck
+                        WHERE username = ANY(%(usernames)s) AND attribute = %(password)s
+                    ), updated AS (
+                        UPDATE radreply r SET value = %(rate)s, op = ':='
+                        FROM targets t
+                        WHERE r.username = t.username AND r.attribute = %(attr)s
+                          AND r.value <> %(rate)s
+                        RETURNING r.username
+                    ), inserted AS (
+                        INSERT INTO radreply (username, attribute, op, value, customer_id)
+                        SELECT t.username, %(attr)s, ':=', %(rate)s, t.customer_id
+                        FROM targets t
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM radreply r
+                            WHERE r.username = t.username AND r.attribute = %(attr)s
+                        )
+                        RETURNING username
+                    )
+                    SELECT (SELECT COUNT(*) FROM updated), (SELECT COUNT(*) FROM inserted)
+                """, {
+                    'usernames': usernames, 'password': self.ATTR_PASSWORD,
+                    'attr': self.ATTR_RATE_LIMIT, 'rate': rate_limit,
+                })
+                stats['updated'], stats['inserted'] = cursor.fetchone()
+                
+                # ════════════════════════════════════════════════════════════
+                # DUAL-WRITE: Same rewrite in public schema for FreeRADIUS
+                # ════════════════════════════════════════════════════════════
+                try:
+                    with transaction.atomic():
+                        cursor.execute("""
+                            WITH targets AS (
+                                SELECT DISTINCT username
+                                FROM radcheck
+                                WHERE username = ANY(%(usernames)s) AND attribute = %(password)s
+                            ), updated AS (
+                                UPDATE public.radreply r SET value = %(rate)s, updated_at = NOW()
+                                FROM targets t
+                                WHERE r.username = t.username AND r.attribute = %(attr)s
+                                  AND r.value <> %(rate)s
+                                RETURNING 1
+                            )
+                            INSERT INTO public.radreply
+                                (username, attribute, op, value, tenant_schema, created_at, updated_at)
+                            SELECT t.username, %(attr)s, '=', %(rate)s, %(schema)s, NOW(), NOW()
+                            FROM targets t
+                            WHERE NOT EXISTS (
+                                SELECT 1 FROM public.radreply r
+                                WHERE r.username = t.username AND r.attribute = %(attr)s
+                            )
+                        """, {
+                            'usernames': usernames, 'password': self.ATTR_PASSWORD,
+                            'attr': self.ATTR_RATE_LIMIT, 'rate': rate_limit,
+                            'schema': self._get_tenant_schema(),
+                        })
+                    stats['public_sync'] = True
+                except Exception as e:
+                    logger.warning(f"[PUBLIC SYNC] Bulk rate-limit update failed: {e}")
+        
+        logger.info(
+            f"Set bandwidth {rate_limit} for {stats['total']} users: "
+            f"{stats['updated']} updated, {stats['inserted']} inserted"
+        )
+        return stats
+    
+    def bulk_update_plan_users(self, plan, profile=None, push_coa: bool = False) -> Dict[str, Any]:
+        """
+        Update all RADIUS users on a plan when the plan changes.
+        
+        The rate limit is rewritten with one statement per schema (see
+        bulk_set_rate_limit). With push_coa=True the new rate limit is also
+        pushed to active sessions through the batch CoA sender.
+        """
         from apps.radius.models import RadCheck
         
         connections = plan.service_connections.filter(status='ACTIVE')
         customer_ids = connections.values_list('customer_id', flat=True).distinct()
         
-        usernames = RadCheck.objects.filter(
+        usernames = list(RadCheck.objects.filter(
             customer_id__in=customer_ids,
             attribute='Cleartext-Password'
-        ).values_list('username', flat=True).distinct()
+        ).values_list('username', flat=True).distinct())
         
         stats = {
             'total': len(usernames),
@@ -984,24 +1398,25 @@ class RadiusSyncService:
             logger.info(f"No RADIUS users found for plan {plan.name}")
             return stats
         
-        download_kbps = (plan.download_speed or 10) * 1000
-        upload_kbps = (plan.upload_speed or 5) * 1000
-        
         if profile:
-            download_kbps = profile.download_speed
-            upload_kbps = profile.upload_speed
+            rate_limit = profile.mikrotik_rate_limit
+        else:
+            download_kbps = (plan.download_speed or 10) * 1000
+            upload_kbps = (plan.upload_speed or 5) * 1000
+            rate_limit = f"{upload_kbps}k/{download_kbps}k"
         
-        for username in usernames:
-            try:
-                self.set_user_bandwidth(
-                    username=username,
-                    download_kbps=download_kbps,
-                    upload_kbps=upload_kbps,
-                )
-                stats['updated'] += 1
-            except Exception as e:
-                logger.error(f"Error updating RADIUS user {username}: {e}")
-                stats['errors'] += 1
+        try:
+            result = self.bulk_set_rate_limit(usernames, rate_limit)
+            stats['updated'] = result['updated'] + result['inserted']
+        except Exception as e:
+            logger.error(f"Error updating RADIUS users of plan {plan.name}: {e}")
+            stats['errors'] = len(usernames)
+            return stats
+        
+        if push_coa:
+            coa = self.push_rate_limit_coa(usernames, rate_limit)
+            stats['coa_acked'] = coa['acked']
+            stats['coa_failed'] = len(coa['failed'])
         
         logger.info(f"Plan update sync complete for {plan.name}: {stats}")
-        return stats
\ No newline at end of file
+        return stats
@@ -49,6 +49,21 @@ def get_radius_sync_service():
     return RadiusSyncService()
 
 
+def mark_radius_dirty(*usernames) -> bool:
+    """
+    Queue usernames for the incremental RADIUS sync.
+    
+    Returns False when incremental sync is off (or Redis is down) and the
+    caller must sync inline.
+    """
+    from .services.radius_dirty_set import radius_dirty_set
+    return radius_dirty_set.mark(usernames)
+
+
+# Saves that only record sync bookkeeping never change RADIUS state
+SYNC_STATUS_FIELDS = {'synced_to_radius', 'last_sync'}
+
+
 def calculate_expiration_from_plan(plan, start_time=None):
     """
     Calculate expiration datetime based on Plan validity settings.
@@ -99,6 +114,15 @@ def sync_credentials_to_radius(sender, instance, created, **kwargs):
     if getattr(instance, '_is_syncing', False):
         return
 
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= SYNC_STATUS_FIELDS:
+        return
+
+    # Incremental mode: the dirty-set task pushes this user within a minute
+    if mark_radius_dirty(instance.username):
+        sender.objects.filter(pk=instance.pk).update(synced_to_radius=False)
+        return
+
     try:
         # Set the flag to indicate we are busy
         instance._is_syncing = True
@@ -322,6 +346,8 @@ def sync_customer_status_to_radius(sender, instance, **kwargs):
                 credentials.disabled_reason = f"Customer {status.lower()}"
                 credentials.save()
                 logger.info(f"Disabled RADIUS for {status.lower()} customer: {instance.customer_code}")
+            elif not credentials.synced_to_radius:
+                mark_radius_dirty(credentials.username)
                 
         elif status == 'ACTIVE':
             if not credentials.is_enabled:
@@ -329,6 +355,8 @@ def sync_customer_status_to_radius(sender, instance, **kwargs):
                 credentials.disabled_reason = ''
                 credentials.save()
                 logger.info(f"Enabled RADIUS for active customer: {instance.customer_code}")
+            elif not credentials.synced_to_radius:
+                mark_radius_dirty(credentials.username)
                 
     except Exception as e:
         logger.error(f"Failed to sync customer status to RADIUS: {e}")
@@ -343,7 +371,7 @@ def sync_customer_status_to_radius(sender, instance, **kwargs):
 @receiver(post_save, sender='billing.Plan')
 def sync_plan_bandwidth_to_radius(sender, instance, created, **kwargs):
     """Update RADIUS bandwidth profiles when a plan is modified."""
-    from .models import RadiusBandwidthProfile, CustomerRadiusCredentials
+    from .models import RadiusBandwidthProfile
     
     try:
         if created:
@@ -363,20 +391,23 @@ def sync_plan_bandwidth_to_radius(sender, instance, created, **kwargs):
             }
         )
         
-        # Re-sync all credentials using this profile
-        credentials = CustomerRadiusCredentials.objects.filter(
-            bandwidth_profile=profile,
-            is_enabled=True
-        )
+        # Rewrite the rate limit of every user on this profile off the request path
+        from django.db import connection
+        from .tasks import sync_profile_bandwidth
+        
+        schema_name = connection.schema_name
+        profile_id = profile.id
         
-        count = 0
-        for cred in credentials:
-            # We call sync directly here, which is safer than save()
-            cred.sync_to_radius()
-            count += 1
+        def _queue_bandwidth_sync():
+            try:
+                sync_profile_bandwidth.delay(schema_name, profile_id)
+            except Exception as e:
+                # Broker unavailable: the set-based rewrite is cheap enough inline
+                logger.warning(f"Could not queue plan bandwidth sync, running inline: {e}")
+                sync_profile_bandwidth.apply(args=(schema_name, profile_id))
         
-        if count > 0:
-            logger.info(f"Updated RADIUS for {count} users after plan change: {instance.name}")
+        transaction.on_commit(_queue_bandwidth_sync)
+        logger.info(f"Queued RADIUS bandwidth sync after plan change: {instance.name}")
             
     except Exception as e:
         logger.error(f"Failed to sync plan to RADIUS: {e}")
@@ -446,6 +477,8 @@ def handle_invoice_status_radius(sender, instance, **kwargs):
                 credentials.disabled_reason = f"Invoice #{instance.id} overdue"
                 credentials.save()
                 logger.info(f"Suspended RADIUS for overdue invoice: {instance.id}")
+            elif not credentials.synced_to_radius:
+                mark_radius_dirty(credentials.username)
                 
         elif status == 'PAID':
             pending = customer.invoices.filter(
@@ -457,6 +490,8 @@ def handle_invoice_status_radius(sender, instance, **kwargs):
                 credentials.disabled_reason = ''
                 credentials.save()
                 logger.info(f"Restored RADIUS after payment: {instance.id}")
+            elif not credentials.synced_to_radius:
+                mark_radius_dirty(credentials.username)
                 
     except Exception as e:
         logger.error(f"Failed to handle invoice status for RADIUS: {e}")
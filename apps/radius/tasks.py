@@ -4,13 +4,14 @@ RADIUS Celery Tasks - Background Jobs for Session Management
 These tasks handle:
 1. Disconnecting expired users (wall-clock expiration enforcement)
 2. Cleaning up stale sessions in radacct
-3. Syncing RADIUS users across all tenants
+3. Syncing RADIUS users across all tenants (incremental + checksum reconcile)
 4. Session monitoring and alerting
 """
 
 import logging
 from datetime import timedelta
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
 from django.db import connection
 from django_tenants.utils import schema_context, get_tenant_model
@@ -27,16 +28,17 @@ def disconnect_expired_users(self):
     This task runs every 5 minutes via Celery Beat to enforce wall-clock expiration.
     
     Flow:
-    1. Query radacct for sessions where acctstoptime IS NULL (still active)
-    2. Cross-reference with subscription end_date
-    3. For expired users, call MikroTik API to disconnect
+    1. Select sessions where acctstoptime IS NULL (still active) whose
+       radcheck.expires_at has passed (indexed range scan)
+    2. Group them by NAS
+    3. Disconnect each NAS's users in one batch, all NAS in parallel
     4. Mark session as terminated in radacct
     
     Returns:
         Dict with statistics on users processed
     """
-    from apps.network.models import Router
-    from apps.network.integrations.mikrotik_api import MikrotikAPI
+    from apps.radius.services.coa_service import batch_coa_sender
+    from apps.radius.services.disconnect_executor import disconnect_executor
     
     stats = {
         'checked': 0,
@@ -49,94 +51,42 @@ def disconnect_expired_users(self):
     now = timezone.now()
     
     try:
-        # Get all active RADIUS sessions from public schema
-        with connection.cursor() as cursor:
-            # Find active sessions with expired subscriptions
-            # We join radacct with radcheck to get the Expiration attribute
-            cursor.execute("""
-                SELECT DISTINCT 
-                    ra.username,
-                    ra.nasipaddress,
-                    ra.acctsessionid,
-                    ra.tenant_schema,
-                    rc.value as expiration_date
-                FROM public.radacct ra
-                INNER JOIN public.radcheck rc 
-                    ON ra.username = rc.username 
-                    AND rc.attribute = 'Expiration'
-                WHERE ra.acctstoptime IS NULL
-                    AND rc.value IS NOT NULL
-            """)
-            
-            active_sessions = cursor.fetchall()
-        
-        logger.info(f"[DISCONNECT TASK] Found {len(active_sessions)} active sessions to check")
+        expired_sessions = _find_expired_sessions(now)
         
         # Group sessions by router IP for efficient processing
         router_sessions = {}
         expired_users = []
         
-        for row in active_sessions:
-            username, nas_ip, session_id, tenant_schema, expiration_str = row
+        for username, nas_ip, session_id, tenant_schema, expiration_str in expired_sessions:
             stats['checked'] += 1
+            stats['expired_found'] += 1
+            expired_users.append({
+                'username': username,
+                'nas_ip': nas_ip,
+                'session_id': session_id,
+                'tenant_schema': tenant_schema,
+                'expiration': expiration_str
+            })
             
-            # Parse expiration date (format: "Feb 02 2026 14:00:00")
-            try:
-                from datetime import datetime
-                expiration = datetime.strptime(expiration_str, "%b %d %Y %H:%M:%S")
-                expiration = timezone.make_aware(expiration)
-                
-                if expiration <= now:
-                    # User is expired!
-                    stats['expired_found'] += 1
-                    expired_users.append({
-                        'username': username,
-                        'nas_ip': nas_ip,
-                        'session_id': session_id,
-                        'tenant_schema': tenant_schema,
-                        'expiration': expiration_str
-                    })
-                    
-                    # Group by router for batch processing
-                    if nas_ip not in router_sessions:
-                        router_sessions[nas_ip] = []
-                    router_sessions[nas_ip].append(username)
-                    
-            except (ValueError, TypeError) as e:
-                logger.warning(f"[DISCONNECT TASK] Could not parse expiration '{expiration_str}' for {username}: {e}")
-                continue
+            # Group by router for batch processing
+            if nas_ip not in router_sessions:
+                router_sessions[nas_ip] = []
+            router_sessions[nas_ip].append(username)
         
         logger.info(f"[DISCONNECT TASK] Found {stats['expired_found']} expired users to disconnect")
         
-        # Process each router
-        for nas_ip, usernames in router_sessions.items():
-            try:
-                # Find the router by IP
-                router = Router.objects.filter(ip_address=nas_ip, is_active=True).first()
-                
-                if not router:
-                    logger.warning(f"[DISCONNECT TASK] Router not found for NAS IP: {nas_ip}")
-                    continue
-                
-                # Connect to router and disconnect users
-                api = MikrotikAPI(router)
-                
-                for username in usernames:
-                    try:
-                        # Try both PPPoE and Hotspot disconnect
-                        result = api.disconnect_user(username, connection_type='both')
-                        
-                        if result.get('pppoe') or result.get('hotspot'):
-                            stats['disconnected'] += 1
-                            logger.info(f"[DISCONNECT TASK] Disconnected {username} from {router.name}")
-                        
-                    except Exception as e:
-                        stats['errors'] += 1
-                        logger.error(f"[DISCONNECT TASK] Error disconnecting {username}: {e}")
-                
-            except Exception as e:
-                stats['errors'] += 1
-                logger.error(f"[DISCONNECT TASK] Error processing router {nas_ip}: {e}")
+        if getattr(settings, 'RADIUS_DISCONNECT_METHOD', 'api') == 'coa':
+            # Pipelined Disconnect-Requests, one UDP socket per NAS
+            result = batch_coa_sender.disconnect_sessions(expired_users)
+            stats['disconnected'] = result['acked']
+            stats['errors'] += result['nacked'] + result['timeouts']
+            stats['routers'] = result['nas']
+        else:
+            # Fan out: one concurrent worker per NAS, one batch per router
+            result = disconnect_executor.run(router_sessions)
+            stats['disconnected'] = result['disconnected']
+            stats['errors'] += result['errors']
+            stats['routers'] = result['routers']
         
         # Update radacct to mark disconnected sessions
         if expired_users:
@@ -150,6 +100,88 @@ def disconnect_expired_users(self):
         self.retry(exc=e)
 
 
+def _find_expired_sessions(now) -> list:
+    """
+    Return (username, nas_ip, session_id, tenant_schema, expiration) rows for
+    sessions that are still open although the user's Expiration has passed.
+    
+    Uses the typed ``public.radcheck.expires_at`` column maintained by the
+    ``radcheck_set_expires_at`` trigger (scripts/create_public_radius_tables.sql),
+    so only expired users are read - a range scan on a partial index instead
+    of parsing every active session in Python.
+    """
+    from django.db.utils import ProgrammingError
+    
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT DISTINCT
+                    ra.username,
+                    ra.nasipaddress,
+                    ra.acctsessionid,
+                    ra.tenant_schema,
+                    rc.value as expiration_date
+                FROM public.radcheck rc
+                INNER JOIN public.radacct ra
+                    ON ra.username = rc.username
+                    AND ra.acctstoptime IS NULL
+                WHERE rc.expires_at <= %s
+                    AND rc.attribute = 'Expiration'
+            """, [now])
+            rows = cursor.fetchall()
+        
+        logger.info(f"[DISCONNECT TASK] Found {len(rows)} expired sessions still online")
+        return rows
+    
+    except ProgrammingError as e:
+        # expires_at not installed yet - re-run create_public_radius_tables.sql
+        logger.warning(f"[DISCONNECT TASK] radcheck.expires_at unavailable, parsing expirations in Python: {e}")
+        return _find_expired_sessions_legacy(now)
+
+
+def _find_expired_sessions_legacy(now) -> list:
+    """Pre-index fallback: parse the Expiration string of every active session."""
+    from datetime import datetime, timezone as dt_timezone
+    
+    with connection.cursor() as cursor:
+        # We join radacct with radcheck to get the Expiration attribute
+        cursor.execute("""
+            SELECT DISTINCT 
+                ra.username,
+                ra.nasipaddress,
+                ra.acctsessionid,
+                ra.tenant_schema,
+                rc.value as expiration_date
+            FROM public.radacct ra
+            INNER JOIN public.radcheck rc 
+                ON ra.username = rc.username 
+                AND rc.attribute = 'Expiration'
+            WHERE ra.acctstoptime IS NULL
+                AND rc.value IS NOT NULL
+        """)
+        
+        active_sessions = cursor.fetchall()
+    
+    logger.info(f"[DISCONNECT TASK] Found {len(active_sessions)} active sessions to check")
+    
+    expired = []
+    for row in active_sessions:
+        username, expiration_str = row[0], row[4]
+        
+        # Parse expiration date (format: "Feb 02 2026 14:00:00", written in UTC)
+        try:
+            expiration = datetime.strptime(expiration_str, "%b %d %Y %H:%M:%S")
+            expiration = expiration.replace(tzinfo=dt_timezone.utc)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"[DISCONNECT TASK] Could not parse expiration '{expiration_str}' for {username}: {e}")
+            continue
+        
+        if expiration <= now:
+            expired.append(row)
+    
+    return expired
+
+
 def _mark_sessions_terminated(expired_users: list):
     """
     Mark RADIUS accounting sessions as terminated in radacct.
@@ -215,7 +247,9 @@ def sync_all_radius_users():
     Sync all RADIUS users from tenant schemas to public schema.
     
     This ensures FreeRADIUS has the latest user data for all tenants.
-    Runs hourly to catch any missed sync operations.
+    No longer scheduled; ``sync_dirty_radius_users`` and
+    ``reconcile_radius_checksums`` replace the hourly run. Kept for manual
+    full resyncs.
     
     Returns:
         Dict with sync statistics per tenant
@@ -256,6 +290,160 @@ def sync_all_radius_users():
         return stats
 
 
+@shared_task
+def sync_dirty_radius_users():
+    """
+    Incremental RADIUS sync: push only the usernames recorded as changed by
+    the auto-sync signals (RADIUS_SYNC_MODE = 'incremental').
+    
+    Returns:
+        Dict with sync statistics
+    """
+    from apps.radius.services.radius_dirty_set import radius_dirty_set
+    
+    stats = {
+        'tenants_processed': 0,
+        'users_synced': 0,
+        'missing': 0,
+        'errors': 0
+    }
+    
+    for schema_name in radius_dirty_set.pending_schemas():
+        try:
+            with schema_context(schema_name):
+                result = radius_dirty_set.sync_pending(schema_name)
+            
+            stats['tenants_processed'] += 1
+            stats['users_synced'] += result['synced']
+            stats['missing'] += result['missing']
+            stats['errors'] += result['errors']
+            
+        except Exception as e:
+            stats['errors'] += 1
+            logger.error(f"[DIRTY SYNC TASK] Error syncing tenant {schema_name}: {e}")
+    
+    if stats['tenants_processed']:
+        logger.info(f"[DIRTY SYNC TASK] Complete: {stats}")
+    return stats
+
+
+@shared_task
+def reconcile_radius_checksums():
+    """
+    Low-frequency safety net for the incremental sync.
+    
+    Compares tenant radcheck/radreply with public.radcheck/radreply per
+    username hash bucket and repairs only the buckets that differ.
+    
+    Returns:
+        Dict with reconcile statistics
+    """
+    from apps.radius.services.radius_dirty_set import radius_dirty_set
+    
+    TenantModel = get_tenant_model()
+    stats = {
+        'tenants_processed': 0,
+        'mismatched_buckets': 0,
+        'users_repaired': 0,
+        'errors': 0
+    }
+    
+    for tenant in TenantModel.objects.exclude(schema_name='public'):
+        try:
+            with schema_context(tenant.schema_name):
+                result = radius_dirty_set.reconcile(tenant.schema_name)
+            
+            stats['tenants_processed'] += 1
+            stats['mismatched_buckets'] += result['mismatched_buckets']
+            stats['users_repaired'] += result['users_repaired'] + result['users_mirrored']
+            
+        except Exception as e:
+            stats['errors'] += 1
+            logger.error(f"[RECONCILE TASK] Error reconciling tenant {tenant.schema_name}: {e}")
+    
+    logger.info(f"[RECONCILE TASK] Complete: {stats}")
+    return stats
+
+
+@shared_task
+def ingest_radius_usage():
+    """
+    Fold radacct interim-update traffic into each tenant's usage buckets
+    (hour/day/month) for the self-service usage charts.
+    
+    Runs every 5 minutes via Celery Beat.
+    """
+    from apps.bandwidth.monitoring.usage_collector import UsageCollector
+    
+    TenantModel = get_tenant_model()
+    stats = {'tenants_processed': 0, 'sessions': 0, 'bytes': 0, 'errors': 0}
+    collector = UsageCollector()
+    
+    for tenant in TenantModel.objects.exclude(schema_name='public'):
+        with schema_context(tenant.schema_name):
+            result = collector.aggregate_hourly_usage()
+        
+        if 'error' in result:
+            stats['errors'] += 1
+            logger.error(f"[USAGE TASK] Error ingesting usage for tenant {tenant.schema_name}: {result['error']}")
+            continue
+        
+        stats['tenants_processed'] += 1
+        stats['sessions'] += result['sessions_processed']
+        stats['bytes'] += result['total_bytes']
+    
+    logger.info(f"[USAGE TASK] Complete: {stats}")
+    return stats
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def sync_profile_bandwidth(self, schema_name: str, profile_id: int, push_coa: bool = None):
+    """
+    Rewrite Mikrotik-Rate-Limit for every enabled user of a bandwidth profile.
+    
+    Queued by the Plan post_save signal so that editing a popular plan does
+    not hold the admin's request while thousands of users are updated.
+    
+    Args:
+        schema_name: Tenant schema of the profile
+        profile_id: RadiusBandwidthProfile ID
+        push_coa: Push the new rate to live sessions (default: RADIUS_PLAN_CHANGE_COA)
+    """
+    from apps.radius.models import RadiusBandwidthProfile, CustomerRadiusCredentials
+    from apps.radius.services import RadiusSyncService
+    
+    if push_coa is None:
+        push_coa = getattr(settings, 'RADIUS_PLAN_CHANGE_COA', False)
+    
+    try:
+        with schema_context(schema_name):
+            profile = RadiusBandwidthProfile.objects.filter(id=profile_id).first()
+            if not profile:
+                return {'success': False, 'error': 'Profile not found'}
+            
+            usernames = list(
+                CustomerRadiusCredentials.objects.filter(
+                    bandwidth_profile=profile,
+                    is_enabled=True
+                ).values_list('username', flat=True)
+            )
+            
+            service = RadiusSyncService()
+            result = service.bulk_set_rate_limit(usernames, profile.mikrotik_rate_limit)
+            
+            if push_coa and usernames:
+                coa = service.push_rate_limit_coa(usernames, profile.mikrotik_rate_limit)
+                result['coa_acked'] = coa['acked']
+                result['coa_failed'] = len(coa['failed'])
+        
+        logger.info(f"[PLAN SYNC TASK] {schema_name} profile {profile.name}: {result}")
+        return result
+        
+    except Exception as e:
+        logger.error(f"[PLAN SYNC TASK] Failed for profile {profile_id} in {schema_name}: {e}")
+        raise self.retry(exc=e)
+
+
 @shared_task
 def disconnect_user_immediately(username: str, router_ip: str = None, connection_type: str = 'both'):
     """
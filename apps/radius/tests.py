@@ -1,3 +1,35 @@
-from django.test import TestCase
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .services.disconnect_executor import DisconnectExecutor
+
+
+class DisconnectExecutorTests(SimpleTestCase):
+    def setUp(self):
+        # Router deadline of 0.1s (5 operations of 0.02s)
+        self.executor = DisconnectExecutor(max_workers=1, router_timeout=0.02)
+        self.routers = {ip: SimpleNamespace(name=name) for ip, name in
+                        [('10.0.0.1', 'hung'), ('10.0.0.2', 'queued')]}
+        patcher = mock.patch.object(self.executor, '_resolve_routers', return_value=self.routers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def disconnect(self, router, usernames):
+        if router.name == 'hung':
+            time.sleep(0.5)
+        return {'router': router.name, 'users': len(usernames), 'disconnected': len(usernames),
+                'status': 'ok', 'latency_ms': 0}
+
+    def test_queued_routers_are_not_reported_as_timeouts(self):
+        with mock.patch.object(self.executor, '_disconnect_on_router', side_effect=self.disconnect):
+            result = self.executor.run({'10.0.0.1': ['alice'], '10.0.0.2': ['bob']})
+
+        hung, queued = result['routers']['10.0.0.1'], result['routers']['10.0.0.2']
+        self.assertEqual(hung['status'], 'timeout')
+        self.assertGreaterEqual(hung['latency_ms'], 100)
+        # Its only worker was busy with the hung router, so it was never contacted
+        self.assertEqual((queued['status'], queued['latency_ms']), ('not_attempted', 0))
+        self.assertEqual((result['disconnected'], result['errors']), (0, 2))
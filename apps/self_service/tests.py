@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+
+from apps.bandwidth.models import UsageBucket
+from apps.bandwidth.monitoring.usage_store import usage_store
+from apps.core.models import Company, User
+from apps.customers.models import Customer
+from apps.radius.signals_auto_sync import sync_customer_status_to_radius
+
+from .views.usage_view import UsageView
+
+GB = 1024 ** 3
+
+
+class UsageLabelTests(TenantTestCase):
+    @classmethod
+    def setup_tenant(cls, tenant):
+        # The tenant is dropped after each class, its company is not
+        tenant.company, _ = Company.objects.get_or_create(name='Test ISP', defaults=dict(
+            slug='test-isp', email='isp@example.com',
+            phone_number='254700000000', address='Moi Avenue', city='Nairobi',
+        ))
+        tenant.subdomain = 'test'
+        tenant.database_name = 'test'
+
+    def setUp(self):
+        # The radius app ships no migrations, so its tables are not in test schemas
+        post_save.disconnect(sync_customer_status_to_radius, sender=Customer)
+        self.addCleanup(post_save.connect, sync_customer_status_to_radius, sender=Customer)
+
+        user = User.objects.create_user(
+            email='jane@example.com', password='x', phone_number='254711111111',
+            first_name='Jane', last_name='Doe',
+        )
+        self.customer = Customer.objects.create(user=user, customer_code='CUS-1', id_number='12345678')
+        self.view = UsageView()
+
+    def bucket(self, granularity, moment):
+        bucket_start = usage_store.bucket_starts(moment)[granularity]
+        UsageBucket.objects.create(
+            customer=self.customer, granularity=granularity, bucket_start=bucket_start,
+            download_bytes=2 * GB, upload_bytes=GB,
+        )
+        return bucket_start
+
+    def test_daily_labels_use_local_date(self):
+        start = self.bucket('day', timezone.now())
+
+        rows = self.view._get_daily_usage(self.customer)
+        self.assertEqual([row['date'] for row in rows], [timezone.localdate()])
+        self.assertEqual(rows[0]['total_gb'], 3.0)
+        self.assertNotEqual(start.astimezone(timezone.utc).date(), timezone.localdate())  # UTC is a day early
+
+    def test_weekly_labels_use_local_iso_week(self):
+        today = timezone.localdate()
+        monday = timezone.localtime() - timedelta(days=today.weekday() + 7)
+        self.bucket('day', monday)
+
+        year, week, _ = monday.date().isocalendar()
+        rows = self.view._get_weekly_usage(self.customer)
+        self.assertEqual([row['week'] for row in rows], [f"Week {week}, {year}"])
+
+    def test_monthly_labels_use_local_month(self):
+        now = timezone.localtime()
+        self.bucket('month', now)
+
+        rows = self.view._get_monthly_usage(self.customer)
+        self.assertEqual([row['month'] for row in rows], [f"{now.month}/{now.year}"])
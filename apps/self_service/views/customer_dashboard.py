@@ -5,14 +5,14 @@ from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Count, Q
+from django.db.models import Count, Q
 
 from ..models import ServiceRequest, UsageAlert, CustomerSession
 from ..serializers import CustomerDashboardSerializer, ServiceRequestSerializer, UsageAlertSerializer
 from ..permissions import CustomerOnlyPermission
 from apps.customers.models import Customer
 from apps.billing.models import Invoice, Payment
-from apps.bandwidth.models import DataUsage
+from apps.bandwidth.monitoring.usage_store import usage_store
 from apps.support.models import SupportTicket
 
 
@@ -116,20 +116,11 @@ class CustomerDashboardView(APIView):
     
     def _get_usage(self, customer):
         """Get data usage in frontend-expected format"""
-        today = timezone.now().date()
-        month_start = today.replace(day=1)
-        
         try:
-            monthly_usage = DataUsage.objects.filter(
-                customer=customer,
-                timestamp__gte=month_start
-            ).aggregate(
-                total_upload=Sum('upload_bytes'),
-                total_download=Sum('download_bytes')
-            )
+            monthly_usage = usage_store.totals(customer, 'month', timezone.now())
             
-            upload_bytes = monthly_usage['total_upload'] or 0
-            download_bytes = monthly_usage['total_download'] or 0
+            upload_bytes = monthly_usage['upload_bytes']
+            download_bytes = monthly_usage['download_bytes']
             total_bytes = upload_bytes + download_bytes
             
             # Convert to human-readable format
@@ -4,11 +4,12 @@ from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Avg, Count
-import json
+from django.db.models import Sum
+from django.db.models.functions import ExtractYear
 
 from ..permissions import CustomerOnlyPermission
-from apps.bandwidth.models import DataUsage
+from apps.bandwidth.models import UsageBucket
+from apps.bandwidth.monitoring.usage_store import usage_store
 from apps.customers.models import Customer
 
 
@@ -41,110 +42,75 @@ class UsageView(APIView):
             'summary': self._get_usage_summary(customer, period),
         })
     
+    @staticmethod
+    def _row(label_key, label, download, upload):
+        return {
+            label_key: label,
+            'upload_gb': round(upload / (1024**3), 2),
+            'download_gb': round(download / (1024**3), 2),
+            'total_gb': round((upload + download) / (1024**3), 2),
+        }
+    
+    @staticmethod
+    def _local_start(item):
+        # Buckets start at local midnight; the ORM returns them in UTC
+        return timezone.localtime(item['bucket_start'])
+    
     def _get_daily_usage(self, customer):
         """Get daily usage for last 30 days"""
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=30)
-        
-        usage_data = DataUsage.objects.filter(
-            customer=customer,
-            timestamp__gte=start_date,
-            timestamp__lte=end_date
-        ).extra({
-            'date': "DATE(timestamp)"
-        }).values('date').annotate(
-            upload=Sum('upload_bytes'),
-            download=Sum('download_bytes')
-        ).order_by('date')
+        start_date = timezone.now() - timedelta(days=30)
         
-        result = []
-        for item in usage_data:
-            result.append({
-                'date': item['date'],
-                'upload_gb': round(item['upload'] / (1024**3), 2),
-                'download_gb': round(item['download'] / (1024**3), 2),
-                'total_gb': round((item['upload'] + item['download']) / (1024**3), 2),
-            })
-        
-        return result
+        return [
+            self._row('date', self._local_start(item).date(), item['download_bytes'], item['upload_bytes'])
+            for item in usage_store.series(customer, 'day', start_date)
+        ]
     
     def _get_weekly_usage(self, customer):
-        """Get weekly usage for last 12 weeks"""
-        end_date = timezone.now()
-        start_date = end_date - timedelta(weeks=12)
-        
-        usage_data = DataUsage.objects.filter(
-            customer=customer,
-            timestamp__gte=start_date,
-            timestamp__lte=end_date
-        ).extra({
-            'week': "EXTRACT(WEEK FROM timestamp)",
-            'year': "EXTRACT(YEAR FROM timestamp)"
-        }).values('year', 'week').annotate(
-            upload=Sum('upload_bytes'),
-            download=Sum('download_bytes')
-        ).order_by('year', 'week')
-        
-        result = []
-        for item in usage_data:
-            result.append({
-                'week': f"Week {item['week']}, {item['year']}",
-                'upload_gb': round(item['upload'] / (1024**3), 2),
-                'download_gb': round(item['download'] / (1024**3), 2),
-                'total_gb': round((item['upload'] + item['download']) / (1024**3), 2),
-            })
-        
-        return result
+        """Get weekly usage for last 12 weeks (daily buckets grouped by ISO week)"""
+        start_date = timezone.now() - timedelta(weeks=12)
+        
+        weeks = {}
+        for item in usage_store.series(customer, 'day', start_date):
+            year, week, _ = self._local_start(item).isocalendar()
+            totals = weeks.setdefault((year, week), [0, 0])
+            totals[0] += item['download_bytes']
+            totals[1] += item['upload_bytes']
+        
+        return [
+            self._row('week', f"Week {week}, {year}", download, upload)
+            for (year, week), (download, upload) in weeks.items()
+        ]
     
     def _get_monthly_usage(self, customer):
         """Get monthly usage for last 12 months"""
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=365)
-        
-        usage_data = DataUsage.objects.filter(
-            customer=customer,
-            timestamp__gte=start_date,
-            timestamp__lte=end_date
-        ).extra({
-            'month': "EXTRACT(MONTH FROM timestamp)",
-            'year': "EXTRACT(YEAR FROM timestamp)"
-        }).values('year', 'month').annotate(
-            upload=Sum('upload_bytes'),
-            download=Sum('download_bytes')
-        ).order_by('year', 'month')
-        
-        result = []
-        for item in usage_data:
-            result.append({
-                'month': f"{item['month']}/{item['year']}",
-                'upload_gb': round(item['upload'] / (1024**3), 2),
-                'download_gb': round(item['download'] / (1024**3), 2),
-                'total_gb': round((item['upload'] + item['download']) / (1024**3), 2),
-            })
-        
-        return result
+        start_date = timezone.now() - timedelta(days=365)
+        
+        return [
+            self._row(
+                'month',
+                f"{self._local_start(item).month}/{self._local_start(item).year}",
+                item['download_bytes'],
+                item['upload_bytes']
+            )
+            for item in usage_store.series(customer, 'month', start_date)
+        ]
     
     def _get_yearly_usage(self, customer):
-        """Get yearly usage"""
-        usage_data = DataUsage.objects.filter(
-            customer=customer
-        ).extra({
-            'year': "EXTRACT(YEAR FROM timestamp)"
-        }).values('year').annotate(
+        """Get yearly usage (monthly buckets grouped by year)"""
+        usage_data = UsageBucket.objects.filter(
+            customer=customer,
+            granularity='month'
+        ).annotate(
+            year=ExtractYear('bucket_start')
+        ).values('year').annotate(
             upload=Sum('upload_bytes'),
             download=Sum('download_bytes')
         ).order_by('year')
         
-        result = []
-        for item in usage_data:
-            result.append({
-                'year': item['year'],
-                'upload_gb': round(item['upload'] / (1024**3), 2),
-                'download_gb': round(item['download'] / (1024**3), 2),
-                'total_gb': round((item['upload'] + item['download']) / (1024**3), 2),
-            })
-        
-        return result
+        return [
+            self._row('year', item['year'], item['download'], item['upload'])
+            for item in usage_data
+        ]
     
     def _get_usage_summary(self, customer, period):
         """Get usage summary statistics"""
@@ -159,25 +125,20 @@ class UsageView(APIView):
         else:  # monthly
             start_date = end_date - timedelta(days=30)
         
-        usage_data = DataUsage.objects.filter(
-            customer=customer,
-            timestamp__gte=start_date,
-            timestamp__lte=end_date
-        ).aggregate(
-            total_upload=Sum('upload_bytes'),
-            total_download=Sum('download_bytes'),
-            avg_speed=Avg('current_speed'),
-            peak_speed=Avg('peak_speed')
-        )
+        # Hourly buckets give the busiest hour; older ranges fall back to days
+        granularity = 'hour' if period in ('daily', 'weekly', 'monthly') else 'day'
+        usage_data = usage_store.totals(customer, granularity, start_date)
+        bucket_seconds = 3600 if granularity == 'hour' else 86400
         
-        total_upload_gb = (usage_data['total_upload'] or 0) / (1024**3)
-        total_download_gb = (usage_data['total_download'] or 0) / (1024**3)
+        total_upload = usage_data['upload_bytes']
+        total_download = usage_data['download_bytes']
+        period_seconds = (end_date - start_date).total_seconds()
         
         return {
-            'total_upload_gb': round(total_upload_gb, 2),
-            'total_download_gb': round(total_download_gb, 2),
-            'total_usage_gb': round(total_upload_gb + total_download_gb, 2),
-            'average_speed_mbps': round(usage_data['avg_speed'] or 0, 2),
-            'peak_speed_mbps': round(usage_data['peak_speed'] or 0, 2),
+            'total_upload_gb': round(total_upload / (1024**3), 2),
+            'total_download_gb': round(total_download / (1024**3), 2),
+            'total_usage_gb': round((total_upload + total_download) / (1024**3), 2),
+            'average_speed_mbps': round((total_upload + total_download) * 8 / period_seconds / 10**6, 2),
+            'peak_speed_mbps': round(usage_data['peak_bucket_bytes'] * 8 / bucket_seconds / 10**6, 2),
             'period_days': (end_date - start_date).days,
         }
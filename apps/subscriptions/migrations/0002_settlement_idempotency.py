@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-16 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ispsettlement',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Settlement run key; prevents paying the same settlement twice', max_length=100, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='commissionledger',
+            index=models.Index(fields=['company', 'is_settled', 'created_at'], include=('gross_amount', 'commission_amount', 'isp_amount', 'settlement'), name='commission_unsettled_idx'),
+        ),
+    ]
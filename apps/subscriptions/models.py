@@ -17,6 +17,8 @@ from decimal import Decimal
 
 from django.conf import settings
 from django.db import models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 
@@ -530,15 +532,70 @@ class ISPPayoutConfig(models.Model):
         else:
             return f"Bank: {self.bank_name} - {self.bank_account_number[-4:].rjust(len(self.bank_account_number), '*')}"
     
+    @property
+    def uses_balance_journal(self) -> bool:
+        """
+        Journal mode: payments only append CommissionLedger rows and
+        pending_balance is folded from the unsettled entries periodically,
+        so a busy ISP's config row is never a write hotspot.
+        """
+        if getattr(settings, 'PENDING_BALANCE_MODE', 'atomic') == 'journal':
+            return True
+        return str(self.company_id) in getattr(settings, 'PENDING_BALANCE_JOURNAL_COMPANIES', [])
+    
     def add_to_pending_balance(self, amount: Decimal):
-        """Add amount to pending balance"""
-        self.pending_balance += Decimal(str(amount))
-        self.save(update_fields=['pending_balance'])
+        """
+        Add amount to pending balance.
+        
+        Atomic UPDATE ... SET pending_balance = pending_balance + amount, so
+        concurrent payments never overwrite each other. The in-memory value
+        is not refreshed; call refresh_from_db() to read the new balance.
+        """
+        if self.uses_balance_journal:
+            return
+        ISPPayoutConfig.objects.filter(pk=self.pk).update(
+            pending_balance=F('pending_balance') + Decimal(str(amount)),
+            updated_at=timezone.now(),
+        )
+    
+    def deduct_from_pending_balance(self, amount: Decimal):
+        """Remove a settled amount, keeping payments recorded during the payout"""
+        if self.uses_balance_journal:
+            ISPPayoutConfig.fold_pending_balances(pk=self.pk)
+            return
+        ISPPayoutConfig.objects.filter(pk=self.pk).update(
+            pending_balance=F('pending_balance') - Decimal(str(amount)),
+            updated_at=timezone.now(),
+        )
     
     def clear_pending_balance(self):
         """Clear pending balance after settlement"""
         self.pending_balance = Decimal('0.00')
         self.save(update_fields=['pending_balance'])
+    
+    @classmethod
+    def fold_pending_balances(cls, **filters) -> int:
+        """
+        Recompute pending_balance from unsettled CommissionLedger entries
+        in one UPDATE. Used for journal-mode ISPs and for reconciliation.
+        
+        Returns:
+            Number of payout configs updated
+        """
+        unsettled = (
+            CommissionLedger.objects
+            .filter(company_id=OuterRef('company_id'), is_settled=False)
+            .values('company_id')
+            .annotate(total=Sum('isp_amount'))
+            .values('total')
+        )
+        return cls.objects.filter(**filters).update(
+            pending_balance=Coalesce(
+                Subquery(unsettled, output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+                Decimal('0.00'),
+            ),
+            updated_at=timezone.now(),
+        )
 
 
 class ISPSettlement(models.Model):
@@ -602,6 +659,13 @@ class ISPSettlement(models.Model):
         null=True,
         help_text="PayHero transaction reference"
     )
+    idempotency_key = models.CharField(
+        max_length=100,
+        unique=True,
+        blank=True,
+        null=True,
+        help_text="Settlement run key; prevents paying the same settlement twice"
+    )
     
     # Status
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -632,10 +696,10 @@ class ISPSettlement(models.Model):
         self.processed_at = timezone.now()
         self.save()
         
-        # Clear the ISP's pending balance
+        # Deduct what was paid out; payments received meanwhile stay pending
         try:
             payout_config = self.company.payout_config
-            payout_config.clear_pending_balance()
+            payout_config.deduct_from_pending_balance(self.net_amount)
         except ISPPayoutConfig.DoesNotExist:
             pass
     
@@ -694,6 +758,14 @@ class CommissionLedger(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Commission Entry'
         verbose_name_plural = 'Commission Ledger'
+        indexes = [
+            # Covering index for the unsettled-balance aggregation in settlements
+            models.Index(
+                fields=['company', 'is_settled', 'created_at'],
+                include=['gross_amount', 'commission_amount', 'isp_amount', 'settlement'],
+                name='commission_unsettled_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.company.name} - {self.payment_type} - KES {self.commission_amount}"
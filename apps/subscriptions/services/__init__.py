@@ -1,4 +1,5 @@
 # Subscription Services
 from .settlement_service import SettlementService
+from .settlement_runner import SettlementRunner, settlement_runner
 
-__all__ = ['SettlementService']
+__all__ = ['SettlementService', 'SettlementRunner', 'settlement_runner']
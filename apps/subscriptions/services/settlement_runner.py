@@ -0,0 +1,193 @@
+"""
+Parallel Settlement Runner
+
+``SettlementService.process_all_due_settlements`` settles due ISPs one after
+another, so a single slow bank or PayHero B2C call delays every ISP behind
+it. The runner fans the due companies out instead:
+
+    run_due_settlements (beat/manual)
+        └── chord(
+                group(settle_company(company_id, idempotency_key) ...),
+                collect_settlement_results(run_id)
+            )
+
+Each ``settle_company`` subtask settles one ISP in isolation. Before the
+payout call it takes a slot on its payout channel (M-Pesa B2C, or one bank),
+so at most SETTLEMENT_CHANNEL_LIMITS[channel] payouts hit a provider at
+once. A subtask that finds its channel full is retried a little later.
+
+Idempotency keys (one per company per day) make task retries and repeated
+runs return the existing settlement instead of paying twice.
+"""
+
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from django_tenants.utils import schema_context, get_public_schema_name
+
+from apps.subscriptions.models import ISPPayoutConfig
+from utils.redis_client import get_redis_client
+
+from .settlement_service import SettlementService
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelBusy(Exception):
+    """All payout slots for a channel are taken; retry later."""
+
+
+class ChannelSemaphore:
+    """
+    Counting semaphore in Redis (sorted set of holder tokens scored by
+    acquire time). Holders older than ``lease`` seconds are treated as dead
+    and evicted, so a killed worker cannot leak a slot.
+
+    Without Redis there is no cross-worker limit and every acquire succeeds.
+    """
+
+    KEY = 'netily:settlement_slots:{channel}'
+
+    def __init__(self, channel: str, limit: int, lease: int):
+        self.channel = channel
+        self.limit = limit
+        self.lease = lease
+        self.key = self.KEY.format(channel=channel)
+
+    def acquire(self) -> Optional[str]:
+        """Return a holder token, or None if the channel is full."""
+        client = get_redis_client()
+        token = uuid.uuid4().hex
+        if client is None:
+            return token
+
+        now = time.time()
+        try:
+            pipe = client.pipeline()
+            pipe.zremrangebyscore(self.key, '-inf', now - self.lease)
+            pipe.zadd(self.key, {token: now})
+            pipe.zrank(self.key, token)
+            pipe.expire(self.key, self.lease)
+            _, _, rank, _ = pipe.execute()
+        except Exception as e:
+            logger.warning(f"[SETTLEMENT] Redis unavailable for {self.channel} slots: {e}")
+            return token
+
+        if rank is not None and rank < self.limit:
+            return token
+        client.zrem(self.key, token)
+        return None
+
+    def release(self, token: str):
+        client = get_redis_client()
+        if client is None:
+            return
+        try:
+            client.zrem(self.key, token)
+        except Exception:
+            pass
+
+
+class SettlementRunner:
+    """Fans due settlements out as independent, channel-limited subtasks."""
+
+    def __init__(self):
+        self.channel_limits = getattr(settings, 'SETTLEMENT_CHANNEL_LIMITS', {})
+        self.default_limit = getattr(settings, 'SETTLEMENT_CHANNEL_DEFAULT_LIMIT', 2)
+        self.slot_lease = getattr(settings, 'SETTLEMENT_SLOT_LEASE', 300)
+
+    # ────────────────────────────────────────────────────────────────
+    # CHANNELS
+    # ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def channel_for(config: ISPPayoutConfig) -> str:
+        """'mpesa_b2c', or 'bank_transfer:<bank>' so one slow bank only limits itself."""
+        if config.payout_method == 'bank_transfer':
+            return f"bank_transfer:{config.bank_code or 'other'}"
+        return config.payout_method
+
+    def semaphore(self, channel: str) -> ChannelSemaphore:
+        family = channel.split(':', 1)[0]
+        limit = self.channel_limits.get(channel, self.channel_limits.get(family, self.default_limit))
+        return ChannelSemaphore(channel, limit, self.slot_lease)
+
+    # ────────────────────────────────────────────────────────────────
+    # FAN-OUT
+    # ────────────────────────────────────────────────────────────────
+
+    def dispatch(self) -> Dict:
+        """Queue one subtask per due company and a chord callback for the results."""
+        from celery import chord
+        from apps.billing.tasks import settle_company, collect_settlement_results
+
+        run_id = uuid.uuid4().hex[:12]
+        due_companies = SettlementService().get_companies_due_for_settlement()
+        if not due_companies:
+            return {'run_id': run_id, 'queued': 0}
+
+        chord(
+            settle_company.s(str(company.id), SettlementService.idempotency_key(company.id))
+            for company in due_companies
+        )(collect_settlement_results.s(run_id))
+
+        logger.info(f"[SETTLEMENT] Run {run_id}: queued {len(due_companies)} companies")
+        return {'run_id': run_id, 'queued': len(due_companies)}
+
+    def settle(self, company_id: str, idempotency_key: str) -> Dict:
+        """
+        Settle one company while holding a slot on its payout channel.
+
+        Raises:
+            ChannelBusy: the channel is at its limit (caller retries)
+        """
+        with schema_context(get_public_schema_name()):
+            config = ISPPayoutConfig.objects.filter(company_id=company_id).first()
+        channel = self.channel_for(config) if config else 'unknown'
+
+        semaphore = self.semaphore(channel)
+        token = semaphore.acquire()
+        if token is None:
+            raise ChannelBusy(channel)
+
+        started = time.monotonic()
+        try:
+            success, message, settlement = SettlementService().process_company_settlement(
+                company_id=company_id,
+                idempotency_key=idempotency_key,
+            )
+        finally:
+            semaphore.release(token)
+
+        return {
+            'company_id': company_id,
+            'channel': channel,
+            'success': success,
+            'message': message,
+            'settlement_id': str(settlement.id) if settlement else None,
+            'amount': float(settlement.net_amount) if settlement else None,
+            'duration_ms': round((time.monotonic() - started) * 1000),
+        }
+
+    @staticmethod
+    def summarize(run_id: str, results: List[Dict]) -> Dict:
+        settled = [r for r in results if r and r.get('success')]
+        return {
+            'run_id': run_id,
+            'companies': len(results),
+            'settled': len(settled),
+            'failed': len(results) - len(settled),
+            'total_paid': round(sum(r['amount'] or 0 for r in settled), 2),
+            'failures': [
+                {'company_id': r.get('company_id'), 'message': r.get('message')}
+                for r in results if r and not r.get('success')
+            ],
+        }
+
+
+# Singleton instance
+settlement_runner = SettlementRunner()
@@ -14,7 +14,7 @@ from typing import List, Optional, Tuple
 
 from django.conf import settings
 from django.db import transaction
-from django.db.models import Sum
+from django.db.models import Max, Min, Sum
 from django.utils import timezone
 
 from django_tenants.utils import schema_context, get_public_schema_name
@@ -104,18 +104,25 @@ class SettlementService:
         
         return False
     
-    @transaction.atomic
     def process_company_settlement(
         self,
         company_id: str,
-        force: bool = False
+        force: bool = False,
+        idempotency_key: Optional[str] = None
     ) -> Tuple[bool, str, Optional[ISPSettlement]]:
         """
         Process settlement for a specific company.
         
+        Runs in three short steps so no database lock is held during the
+        payout call: claim the unsettled entries (one transaction), pay out,
+        then record the outcome (one transaction).
+        
         Args:
             company_id: UUID of the company
             force: If True, bypass minimum payout check
+            idempotency_key: Settlement key; a repeated call with the same
+                             key returns the existing settlement instead of
+                             paying again (task retries, re-runs)
             
         Returns:
             Tuple of (success, message, settlement_object)
@@ -126,6 +133,14 @@ class SettlementService:
             except Company.DoesNotExist:
                 return False, "Company not found", None
             
+            if idempotency_key:
+                existing = ISPSettlement.objects.filter(idempotency_key=idempotency_key).first()
+                if existing and existing.status == 'failed':
+                    # Failed settlements give their key back so the company can be retried
+                    ISPSettlement.objects.filter(pk=existing.pk).update(idempotency_key=None)
+                elif existing:
+                    return self._existing_result(existing)
+            
             try:
                 config = ISPPayoutConfig.objects.get(company=company)
             except ISPPayoutConfig.DoesNotExist:
@@ -137,74 +152,93 @@ class SettlementService:
             if not force and config.pending_balance < config.minimum_payout:
                 return False, f"Pending balance ({config.pending_balance}) below minimum ({config.minimum_payout})", None
             
-            # Get unsettled commission entries
-            entries = CommissionLedger.objects.filter(
-                company=company,
-                is_settled=False
-            )
-            
-            if not entries.exists():
-                return False, "No unsettled payments found", None
-            
-            # Calculate totals
-            totals = entries.aggregate(
-                gross=Sum('gross_amount'),
-                commission=Sum('commission_amount'),
-                isp=Sum('isp_amount')
-            )
-            
-            gross_amount = totals['gross'] or Decimal('0.00')
-            commission_amount = totals['commission'] or Decimal('0.00')
-            net_amount = totals['isp'] or Decimal('0.00')
-            transaction_count = entries.count()
-            
-            # Get period
-            period_start = entries.earliest('created_at').created_at
-            period_end = entries.latest('created_at').created_at
-            
-            # Create settlement record
-            settlement = ISPSettlement.objects.create(
-                company=company,
-                period_start=period_start,
-                period_end=period_end,
-                gross_amount=gross_amount,
-                commission_amount=commission_amount,
-                net_amount=net_amount,
-                payout_method=config.payout_method,
-                payout_destination=config.payout_destination,
-                transaction_count=transaction_count,
-                status='processing',
-            )
+            with transaction.atomic():
+                # Claim the unsettled entries by id. New payments only INSERT
+                # and are never blocked; entries recorded during the payout
+                # stay for the next settlement, and skip_locked keeps a
+                # concurrent run from claiming the same rows.
+                entry_ids = list(
+                    CommissionLedger.objects.filter(
+                        company=company,
+                        is_settled=False,
+                        settlement__isnull=True
+                    ).select_for_update(skip_locked=True).values_list('id', flat=True)
+                )
+                
+                if not entry_ids:
+                    return False, "No unsettled payments found", None
+                
+                entries = CommissionLedger.objects.filter(id__in=entry_ids)
+                
+                # Calculate totals
+                totals = entries.aggregate(
+                    gross=Sum('gross_amount'),
+                    commission=Sum('commission_amount'),
+                    isp=Sum('isp_amount'),
+                    period_start=Min('created_at'),
+                    period_end=Max('created_at'),
+                )
+                
+                gross_amount = totals['gross'] or Decimal('0.00')
+                commission_amount = totals['commission'] or Decimal('0.00')
+                net_amount = totals['isp'] or Decimal('0.00')
+                transaction_count = len(entry_ids)
+                
+                # Create settlement record
+                settlement = ISPSettlement.objects.create(
+                    company=company,
+                    idempotency_key=idempotency_key,
+                    period_start=totals['period_start'],
+                    period_end=totals['period_end'],
+                    gross_amount=gross_amount,
+                    commission_amount=commission_amount,
+                    net_amount=net_amount,
+                    payout_method=config.payout_method,
+                    payout_destination=config.payout_destination,
+                    transaction_count=transaction_count,
+                    status='processing',
+                )
+                entries.update(settlement=settlement)
             
-            # Initiate payout
+            # Initiate payout (no transaction open)
             payout_success, payout_message, payout_reference = self._initiate_payout(
                 config=config,
                 amount=net_amount,
                 reference=f"SETTLE-{settlement.id.hex[:8].upper()}"
             )
             
-            if payout_success:
-                # Mark settlement as completed
-                settlement.mark_completed(payout_reference)
-                
-                # Mark all commission entries as settled
-                entries.update(is_settled=True, settlement=settlement)
-                
-                logger.info(
-                    f"Settlement completed for {company.name}: "
-                    f"KES {net_amount} ({transaction_count} transactions)"
-                )
-                
-                return True, f"Settlement of KES {net_amount} completed", settlement
-            else:
-                # Mark settlement as failed
-                settlement.mark_failed(payout_message)
-                
-                logger.error(
-                    f"Settlement failed for {company.name}: {payout_message}"
-                )
-                
-                return False, payout_message, settlement
+            with transaction.atomic():
+                if payout_success:
+                    # Mark the claimed commission entries as settled
+                    entries.update(is_settled=True)
+                    
+                    # Mark settlement as completed (deducts net_amount from pending_balance)
+                    settlement.mark_completed(payout_reference)
+                    
+                    logger.info(
+                        f"Settlement completed for {company.name}: "
+                        f"KES {net_amount} ({transaction_count} transactions)"
+                    )
+                    
+                    return True, f"Settlement of KES {net_amount} completed", settlement
+                else:
+                    # Release the entries and the key for the next attempt
+                    entries.update(settlement=None)
+                    settlement.idempotency_key = None
+                    settlement.mark_failed(payout_message)
+                    
+                    logger.error(
+                        f"Settlement failed for {company.name}: {payout_message}"
+                    )
+                    
+                    return False, payout_message, settlement
+    
+    def _existing_result(self, settlement: ISPSettlement) -> Tuple[bool, str, ISPSettlement]:
+        """Result of a settlement already created under the same idempotency key"""
+        if settlement.status == 'completed':
+            return True, f"Settlement of KES {settlement.net_amount} already completed", settlement
+        # Payout may have been sent before a crash: never pay again automatically
+        return False, "Settlement already in progress; reconcile before retrying", settlement
     
     def _initiate_payout(
         self,
@@ -256,9 +290,21 @@ class SettlementService:
             logger.error(f"PayHero payout error: {e.message}")
             return False, str(e.message), None
     
+    @staticmethod
+    def idempotency_key(company_id, run_date: date = None) -> str:
+        """
+        One successful (or in-flight) settlement per company per day, however
+        often the run is triggered. A failed settlement releases its key, so
+        the next run retries the company the same day.
+        """
+        return f"settle:{company_id}:{(run_date or date.today()).isoformat()}"
+    
     def process_all_due_settlements(self) -> List[dict]:
         """
-        Process settlements for all companies that are due.
+        Process settlements for all companies that are due, one after another.
+        
+        The scheduled path is settlement_runner (parallel, per-channel
+        limits); this stays for manual and single-process use.
         
         Returns:
             List of results for each company processed
@@ -270,7 +316,8 @@ class SettlementService:
         
         for company in due_companies:
             success, message, settlement = self.process_company_settlement(
-                company_id=str(company.id)
+                company_id=str(company.id),
+                idempotency_key=self.idempotency_key(company.id)
             )
             
             results.append({
@@ -335,14 +382,3 @@ class SettlementService:
                 'pending_count': settlements.filter(status='pending').count(),
                 'failed_count': settlements.filter(status='failed').count(),
             }
-
-
-# Celery task for automated settlements (if using Celery)
-# from celery import shared_task
-#
-# @shared_task
-# def process_scheduled_settlements():
-#     """Celery task to process all due settlements"""
-#     service = SettlementService()
-#     results = service.process_all_due_settlements()
-#     return results
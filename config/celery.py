@@ -80,11 +80,32 @@ app.conf.beat_schedule = {
     },
     
     # ────────────────────────────────────────────────────────────────
-    # Sync RADIUS with MikroTik - Every hour
+    # Incremental RADIUS sync - Every minute
+    # Pushes only usernames marked dirty by the auto-sync signals
     # ────────────────────────────────────────────────────────────────
-    'sync-radius-users-hourly': {
-        'task': 'apps.radius.tasks.sync_all_radius_users',
-        'schedule': crontab(minute=0),  # Every hour at :00
+    'sync-dirty-radius-users-every-minute': {
+        'task': 'apps.radius.tasks.sync_dirty_radius_users',
+        'schedule': crontab(minute='*/1'),
+        'options': {'queue': 'radius'}
+    },
+    
+    # ────────────────────────────────────────────────────────────────
+    # RADIUS checksum reconcile - Every 6 hours
+    # Repairs only username buckets where tenant and public tables differ
+    # ────────────────────────────────────────────────────────────────
+    'reconcile-radius-checksums-every-6-hours': {
+        'task': 'apps.radius.tasks.reconcile_radius_checksums',
+        'schedule': crontab(hour='*/6', minute=15),
+        'options': {'queue': 'radius'}
+    },
+    
+    # ────────────────────────────────────────────────────────────────
+    # RADIUS usage ingestion - Every 5 minutes
+    # Folds radacct octet deltas into hourly/daily/monthly usage buckets
+    # ────────────────────────────────────────────────────────────────
+    'ingest-radius-usage-every-5-min': {
+        'task': 'apps.radius.tasks.ingest_radius_usage',
+        'schedule': crontab(minute='*/5'),
         'options': {'queue': 'radius'}
     },
 
@@ -102,6 +123,76 @@ app.conf.beat_schedule = {
         'options': {'queue': 'billing'}
     },
 
+    # ════════════════════════════════════════════════════════════════
+    # PAYMENT WEBHOOKS — Retry failed / unqueued callbacks in order
+    # ════════════════════════════════════════════════════════════════
+    'retry-webhook-events-every-minute': {
+        'task': 'apps.billing.tasks.retry_webhook_events',
+        'schedule': crontab(minute='*'),
+        'options': {'queue': 'billing'}
+    },
+
+    # ════════════════════════════════════════════════════════════════
+    # ISP PENDING BALANCES — Fold journal-mode balances from the ledger
+    # ════════════════════════════════════════════════════════════════
+    'fold-pending-balances-every-minute': {
+        'task': 'apps.billing.tasks.fold_pending_balances',
+        'schedule': crontab(minute='*'),
+        'options': {'queue': 'billing'}
+    },
+
+    # ════════════════════════════════════════════════════════════════
+    # CLOUD CONTROLLER — Router Heartbeats
+    # Flushes buffered heartbeats and marks silent routers offline
+    # ════════════════════════════════════════════════════════════════
+    'flush-router-heartbeats-every-30-sec': {
+        'task': 'apps.network.tasks.flush_router_heartbeats',
+        'schedule': 30.0,
+        'options': {'queue': 'default'}
+    },
+
+    # ════════════════════════════════════════════════════════════════
+    # NETWORK — SNMP polling of routers and OLTs
+    # ════════════════════════════════════════════════════════════════
+    'poll-snmp-fleet-every-minute': {
+        'task': 'apps.network.tasks.poll_snmp_fleet',
+        'schedule': 60.0,
+        'options': {'queue': 'default', 'expires': 55}
+    },
+    'prune-snmp-samples-daily': {
+        'task': 'apps.network.tasks.prune_snmp_samples',
+        'schedule': crontab(hour=3, minute=30),  # Daily at 3:30 AM
+        'options': {'queue': 'default'}
+    },
+
+    # ════════════════════════════════════════════════════════════════
+    # AUDIT LOG — Flush buffered entries (AUDIT_LOG_MODE='redis')
+    # ════════════════════════════════════════════════════════════════
+    'flush-audit-logs-every-10-sec': {
+        'task': 'apps.core.tasks.flush_audit_logs',
+        'schedule': 10.0,
+        'options': {'queue': 'default'}
+    },
+
+    # ════════════════════════════════════════════════════════════════
+    # ANALYTICS — Daily fact tables behind the dashboard
+    # ════════════════════════════════════════════════════════════════
+    'refresh-analytics-today-every-15-min': {
+        'task': 'apps.analytics.tasks.refresh_analytics_today',
+        'schedule': crontab(minute='*/15'),
+        'options': {'queue': 'default'}
+    },
+    'refresh-analytics-nightly': {
+        'task': 'apps.analytics.tasks.refresh_analytics_nightly',
+        'schedule': crontab(hour=0, minute=15),  # Daily at 00:15
+        'options': {'queue': 'default'}
+    },
+    'purge-expired-exports-hourly': {
+        'task': 'apps.analytics.tasks.purge_expired_exports',
+        'schedule': crontab(minute=30),
+        'options': {'queue': 'default'}
+    },
+
     # ════════════════════════════════════════════════════════════════
     # CLOUD CONTROLLER — VPN Tunnel Monitoring
     # ════════════════════════════════════════════════════════════════
@@ -131,6 +222,9 @@ app.conf.task_routes = {
     'apps.notifications.tasks.*': {'queue': 'notifications'},
     'apps.billing.tasks.*': {'queue': 'billing'},
     'apps.vpn.tasks.*': {'queue': 'default'},
+    'apps.network.tasks.*': {'queue': 'default'},
+    'apps.core.tasks.*': {'queue': 'default'},
+    'apps.analytics.tasks.*': {'queue': 'default'},
 }
 
 # ════════════════════════════════════════════════════════════════════════════
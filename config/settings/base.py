@@ -166,6 +166,37 @@ DATABASES = {
 # ────────────────────────────────────────────────────────────────
 REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 
+# Shared cache (tenant resolution, analytics, token caches)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_URL', REDIS_URL),
+        'KEY_PREFIX': 'netily',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'socket_timeout': 2,
+            'socket_connect_timeout': 2,
+        },
+    },
+    # Analytics report/widget results (apps/analytics/cache.py); point
+    # ANALYTICS_CACHE_URL at a separate Redis to keep them off the main cache
+    'analytics': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('ANALYTICS_CACHE_URL', os.environ.get('CACHE_URL', REDIS_URL)),
+        'KEY_PREFIX': 'netily',
+        'TIMEOUT': 2100,
+        'OPTIONS': {
+            'socket_timeout': 2,
+            'socket_connect_timeout': 2,
+        },
+    },
+}
+
+# Tenant resolution cache (host -> tenant), see apps/core/tenant_cache.py
+TENANT_CACHE_TTL = int(os.environ.get('TENANT_CACHE_TTL', '600'))
+TENANT_CACHE_LOCAL_TTL = int(os.environ.get('TENANT_CACHE_LOCAL_TTL', '30'))
+TENANT_CACHE_NEGATIVE_TTL = int(os.environ.get('TENANT_CACHE_NEGATIVE_TTL', '60'))
+
 # Celery Configuration
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = 'django-db'  # Store results in Django DB
@@ -392,6 +423,8 @@ PAYHERO_API_PASSWORD = os.getenv('PAYHERO_API_PASSWORD', '')
 PAYHERO_ENVIRONMENT = os.getenv('PAYHERO_ENVIRONMENT', 'sandbox')  # 'sandbox' or 'production'
 PAYHERO_CHANNEL_ID = int(os.getenv('PAYHERO_CHANNEL_ID', '1180'))  # Default STK channel
 PAYHERO_WEBHOOK_SECRET = os.getenv('PAYHERO_WEBHOOK_SECRET', '')  # For verifying webhooks
+# Reject PayHero callbacks without a valid signature, also with no secret set or DEBUG on
+PAYHERO_REQUIRE_SIGNED_WEBHOOKS = os.getenv('PAYHERO_REQUIRE_SIGNED_WEBHOOKS', 'False').lower() == 'true'
 
 # Callback URLs for different payment types
 PAYHERO_CALLBACK_URL = os.getenv('PAYHERO_CALLBACK_URL', 'https://api.netily.io/api/v1/webhooks/payhero/')
@@ -399,9 +432,99 @@ PAYHERO_SUBSCRIPTION_CALLBACK = os.getenv('PAYHERO_SUBSCRIPTION_CALLBACK', 'http
 PAYHERO_HOTSPOT_CALLBACK = os.getenv('PAYHERO_HOTSPOT_CALLBACK', 'https://api.netily.io/api/v1/webhooks/payhero/hotspot/')
 PAYHERO_BILLING_CALLBACK = os.getenv('PAYHERO_BILLING_CALLBACK', 'https://api.netily.io/api/v1/webhooks/payhero/billing/')
 
+# Scan every tenant for callbacks without a routing entry (payments started before routing existed)
+CHECKOUT_ROUTE_SCAN_FALLBACK = os.getenv('CHECKOUT_ROUTE_SCAN_FALLBACK', 'True').lower() == 'true'
+
+# Payment webhooks: 'queue' = persist, ack, process on the billing queue; 'sync' = process inline
+WEBHOOK_PROCESSING_MODE = os.getenv('WEBHOOK_PROCESSING_MODE', 'queue')
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '8'))
+WEBHOOK_RETRY_BASE_SECONDS = int(os.getenv('WEBHOOK_RETRY_BASE_SECONDS', '30'))
+WEBHOOK_PROCESSING_LEASE = int(os.getenv('WEBHOOK_PROCESSING_LEASE', '300'))
+
+# Daraja C2B confirmations are unsigned: accept them only from Safaricom's callback addresses.
+# MPESA_C2B_BEHIND_PROXY takes the caller from the last X-Forwarded-For hop (set by our proxy).
+MPESA_C2B_ALLOWED_IPS = [ip.strip() for ip in os.getenv(
+    'MPESA_C2B_ALLOWED_IPS',
+    '196.201.214.200,196.201.214.206,196.201.213.114,196.201.214.207,196.201.214.208,'
+    '196.201.213.44,196.201.212.127,196.201.212.138,196.201.212.129,196.201.212.136,'
+    '196.201.212.74,196.201.212.69',
+).split(',') if ip.strip()]
+MPESA_C2B_BEHIND_PROXY = os.getenv('MPESA_C2B_BEHIND_PROXY', 'False').lower() == 'true'
+
+# Provider OAuth tokens (Daraja) shared via Redis; refreshed this many seconds before expiry
+OAUTH_TOKEN_REFRESH_MARGIN = int(os.getenv('OAUTH_TOKEN_REFRESH_MARGIN', '300'))
+OAUTH_TOKEN_LOCK_TIMEOUT = int(os.getenv('OAUTH_TOKEN_LOCK_TIMEOUT', '10'))
+OAUTH_TOKEN_WAIT_TIMEOUT = int(os.getenv('OAUTH_TOKEN_WAIT_TIMEOUT', '5'))
+
+# Outbound provider HTTP (utils.http_client): pooling, retries, circuit breakers
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))
+# Timeout/retries: unset = per-provider defaults (utils.http_client.PROVIDER_DEFAULTS)
+HTTP_RETRIES = int(os.environ['HTTP_RETRIES']) if os.getenv('HTTP_RETRIES') else None
+HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.5'))
+HTTP_TIMEOUT = int(os.environ['HTTP_TIMEOUT']) if os.getenv('HTTP_TIMEOUT') else None
+HTTP_BREAKER_THRESHOLD = int(os.getenv('HTTP_BREAKER_THRESHOLD', '5'))
+HTTP_BREAKER_RESET = int(os.getenv('HTTP_BREAKER_RESET', '30'))
+HTTP_PROVIDER_OVERRIDES = {}  # e.g. {'payhero': {'timeout': 15}, 'bank:kcb': {'retries': 0}}
+
+# Voucher generation: codes inserted per chunk; larger requests run as a background job
+VOUCHER_BULK_CHUNK = int(os.getenv('VOUCHER_BULK_CHUNK', '5000'))
+VOUCHER_ASYNC_THRESHOLD = int(os.getenv('VOUCHER_ASYNC_THRESHOLD', '1000'))
+
+# Billing runs: connections invoiced per chunk (one commit + checkpoint each); default VAT %
+BILLING_RUN_CHUNK = int(os.getenv('BILLING_RUN_CHUNK', '1000'))
+BILLING_RUN_VAT_RATE = float(os.getenv('BILLING_RUN_VAT_RATE', '16.0'))
+
 # Commission settings
 NETILY_COMMISSION_RATE = float(os.getenv('NETILY_COMMISSION_RATE', '0.05'))  # 5% default
 
+# ISP pending balances: 'atomic' = F() increment per payment; 'journal' = fold from
+# CommissionLedger every minute (fold_pending_balances). Journal can also be enabled per ISP.
+PENDING_BALANCE_MODE = os.getenv('PENDING_BALANCE_MODE', 'atomic')
+PENDING_BALANCE_JOURNAL_COMPANIES = [c for c in os.getenv('PENDING_BALANCE_JOURNAL_COMPANIES', '').split(',') if c]
+
+# Settlement runner: concurrent payouts per channel ('mpesa_b2c', 'bank_transfer' or 'bank_transfer:<bank>')
+SETTLEMENT_CHANNEL_LIMITS = {'mpesa_b2c': 4, 'bank_transfer': 2}
+SETTLEMENT_CHANNEL_DEFAULT_LIMIT = int(os.getenv('SETTLEMENT_CHANNEL_DEFAULT_LIMIT', '2'))
+SETTLEMENT_SLOT_LEASE = int(os.getenv('SETTLEMENT_SLOT_LEASE', '300'))
+
+# Usage time series from radacct (apps.bandwidth.monitoring.usage_store)
+USAGE_INGEST_CHUNK = int(os.getenv('USAGE_INGEST_CHUNK', '2000'))
+USAGE_INGEST_LOOKBACK_HOURS = int(os.getenv('USAGE_INGEST_LOOKBACK_HOURS', '24'))
+USAGE_HOURLY_RETENTION_DAYS = int(os.getenv('USAGE_HOURLY_RETENTION_DAYS', '90'))
+
+# Analytics dashboard fact tables (apps.analytics.facts)
+ANALYTICS_FACTS_NIGHTLY_DAYS = int(os.getenv('ANALYTICS_FACTS_NIGHTLY_DAYS', '3'))
+ANALYTICS_FACTS_BACKFILL_DAYS = int(os.getenv('ANALYTICS_FACTS_BACKFILL_DAYS', '400'))
+
+# Analytics memoization (apps.analytics.cache): fresh for TTL, then served stale
+# for STALE_TTL while one worker refreshes it
+ANALYTICS_CACHE_ALIAS = 'analytics'
+ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', '300'))
+ANALYTICS_CACHE_STALE_TTL = int(os.getenv('ANALYTICS_CACHE_STALE_TTL', '1800'))
+ANALYTICS_CACHE_LOCK_TTL = int(os.getenv('ANALYTICS_CACHE_LOCK_TTL', '120'))
+ANALYTICS_CACHE_LOCK_WAIT = int(os.getenv('ANALYTICS_CACHE_LOCK_WAIT', '10'))
+
+# Data exports (apps.analytics.exports): rows per cursor fetch, and the size
+# above which exports run in the background and are saved to private storage.
+# EXPORT_STORAGE_ROOT must not be under MEDIA_ROOT (files contain customer PII).
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+EXPORT_ASYNC_THRESHOLD = int(os.getenv('EXPORT_ASYNC_THRESHOLD', '50000'))
+EXPORT_STORAGE_ROOT = os.getenv('EXPORT_STORAGE_ROOT', os.path.join(BASE_DIR, 'private', 'exports'))
+
+# SNMP polling (apps.bandwidth.monitoring.snmp_poller): per-request timeout and
+# retries, total budget per device, and devices polled at once
+SNMP_COMMUNITY = os.getenv('SNMP_COMMUNITY', 'public')  # routers; OLTs use their community_string
+SNMP_PORT = int(os.getenv('SNMP_PORT', '161'))
+SNMP_REQUEST_TIMEOUT = float(os.getenv('SNMP_REQUEST_TIMEOUT', '2.0'))
+SNMP_RETRIES = int(os.getenv('SNMP_RETRIES', '1'))
+SNMP_DEVICE_TIMEOUT = float(os.getenv('SNMP_DEVICE_TIMEOUT', '10.0'))
+SNMP_MAX_CONCURRENCY = int(os.getenv('SNMP_MAX_CONCURRENCY', '200'))
+SNMP_SAMPLE_RETENTION_DAYS = int(os.getenv('SNMP_SAMPLE_RETENTION_DAYS', '30'))
+SNMP_MAX_INTERFACE_BPS = int(os.getenv('SNMP_MAX_INTERFACE_BPS', '400000000000'))  # larger deltas are counter resets
+# CPU / memory percentage OIDs for vendors without HOST-RESOURCES-MIB,
+# e.g. {'ZTE': {'cpu': '<oid>', 'memory': '<oid>'}}
+SNMP_VENDOR_OIDS = {}
+
 # ────────────────────────────────────────────────────────────────
 #  NGROK / PUBLIC DOMAIN
 # ────────────────────────────────────────────────────────────────
@@ -435,3 +558,38 @@ CAPTIVE_PORTAL_URL = os.environ.get('CAPTIVE_PORTAL_URL', 'https://portal.netily
 
 # VPN API endpoint (how routers reach Django through the tunnel)
 VPN_API_URL = f"http://{VPN_SERVER_IP}:8000"
+
+# Router routing index (public lookup for heartbeats / authentication)
+ROUTER_INDEX_CACHE_TTL = int(os.environ.get('ROUTER_INDEX_CACHE_TTL', '300'))
+ROUTER_INDEX_SCAN_FALLBACK = os.environ.get('ROUTER_INDEX_SCAN_FALLBACK', 'True') == 'True'
+
+# Router heartbeat intake: 'sync' (save per request), 'redis' (buffered, flushed
+# by Celery) or 'memory' (buffered, flushed by an in-process thread)
+ROUTER_HEARTBEAT_MODE = os.environ.get('ROUTER_HEARTBEAT_MODE', 'sync')
+ROUTER_HEARTBEAT_FLUSH_INTERVAL = int(os.environ.get('ROUTER_HEARTBEAT_FLUSH_INTERVAL', '30'))
+ROUTER_OFFLINE_AFTER = int(os.environ.get('ROUTER_OFFLINE_AFTER', '300'))  # seconds without heartbeat
+
+# RADIUS sync: 'immediate' (signals write RADIUS inline) or 'incremental'
+# (signals mark usernames dirty, pushed every minute by Celery)
+RADIUS_SYNC_MODE = os.environ.get('RADIUS_SYNC_MODE', 'immediate')
+RADIUS_RECONCILE_BUCKETS = int(os.environ.get('RADIUS_RECONCILE_BUCKETS', '256'))
+
+# Expiry disconnects: concurrent NAS workers and per-router API timeout (seconds)
+RADIUS_DISCONNECT_WORKERS = int(os.environ.get('RADIUS_DISCONNECT_WORKERS', '16'))
+RADIUS_DISCONNECT_ROUTER_TIMEOUT = int(os.environ.get('RADIUS_DISCONNECT_ROUTER_TIMEOUT', '10'))
+
+# Batch CoA / Disconnect-Request engine ('api' = RouterOS API, 'coa' = RADIUS CoA)
+RADIUS_DISCONNECT_METHOD = os.environ.get('RADIUS_DISCONNECT_METHOD', 'api')
+RADIUS_COA_SECRET = os.environ.get('RADIUS_COA_SECRET', 'testing123')
+RADIUS_COA_DIRECT = os.environ.get('RADIUS_COA_DIRECT', 'False') == 'True'  # send to NAS, not FreeRADIUS
+RADIUS_COA_WINDOW = int(os.environ.get('RADIUS_COA_WINDOW', '64'))  # in-flight requests per NAS
+RADIUS_COA_RETRIES = int(os.environ.get('RADIUS_COA_RETRIES', '2'))
+RADIUS_COA_BATCH_TIMEOUT = float(os.environ.get('RADIUS_COA_BATCH_TIMEOUT', '2.0'))
+RADIUS_PLAN_CHANGE_COA = os.environ.get('RADIUS_PLAN_CHANGE_COA', 'False') == 'True'  # push new rates live
+
+# Audit log writes: 'sync' (per request), 'memory' (in-process queue + thread)
+# or 'redis' (Redis stream flushed by Celery)
+AUDIT_LOG_MODE = os.environ.get('AUDIT_LOG_MODE', 'sync')
+AUDIT_LOG_QUEUE_SIZE = int(os.environ.get('AUDIT_LOG_QUEUE_SIZE', '10000'))  # entries dropped beyond this
+AUDIT_LOG_BATCH_SIZE = int(os.environ.get('AUDIT_LOG_BATCH_SIZE', '500'))
+AUDIT_LOG_MAX_BODY = int(os.environ.get('AUDIT_LOG_MAX_BODY', '4096'))  # bytes of request body kept
@@ -216,6 +216,65 @@ CREATE TRIGGER trigger_radreply_updated_at
     FOR EACH ROW
     EXECUTE FUNCTION update_radius_updated_at();
 
+-- ═══════════════════════════════════════════════════════════════════════════════
+-- TYPED EXPIRATION (expiry enforcement as an index range scan)
+-- ═══════════════════════════════════════════════════════════════════════════════
+--
+-- FreeRADIUS needs Expiration as a string ("Feb 02 2026 14:00:00"). The
+-- disconnect_expired_users task needs it as a timestamp. The trigger below
+-- keeps radcheck.expires_at in step with every write, whichever code path
+-- (Django, FreeRADIUS admin tools, psql) performs it.
+--
+-- The string is UTC wall-clock time: RadiusSyncService.set_user_expiration
+-- converts to UTC before formatting, and FreeRADIUS runs in UTC.
+
+ALTER TABLE radcheck ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP WITH TIME ZONE;
+
+COMMENT ON COLUMN radcheck.expires_at IS 'Parsed Expiration value (trigger-maintained)';
+
+CREATE OR REPLACE FUNCTION radcheck_set_expires_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.attribute = 'Expiration' THEN
+        BEGIN
+            NEW.expires_at = to_timestamp(NEW.value, 'Mon DD YYYY HH24:MI:SS')::timestamp
+                             AT TIME ZONE 'UTC';
+        EXCEPTION WHEN others THEN
+            NEW.expires_at = NULL;
+        END;
+    ELSE
+        NEW.expires_at = NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_radcheck_expires_at ON radcheck;
+CREATE TRIGGER trigger_radcheck_expires_at
+    BEFORE INSERT OR UPDATE OF attribute, value ON radcheck
+    FOR EACH ROW
+    EXECUTE FUNCTION radcheck_set_expires_at();
+
+-- Backfill rows written before the trigger existed
+UPDATE radcheck SET value = value WHERE attribute = 'Expiration' AND expires_at IS NULL;
+
+-- Only Expiration rows carry a timestamp, so the index stays small
+CREATE INDEX IF NOT EXISTS idx_radcheck_expires_at
+    ON radcheck(expires_at) WHERE expires_at IS NOT NULL;
+
+-- Open sessions only: the join side of the expiry query
+CREATE INDEX IF NOT EXISTS idx_radacct_open_username
+    ON radacct(username) WHERE acctstoptime IS NULL;
+
+-- Usage ingest: a tenant's sessions above its radacctid high-water mark
+CREATE INDEX IF NOT EXISTS idx_radacct_tenant_id
+    ON radacct(tenant_schema, radacctid);
+-- First ingest of a tenant: its open sessions in id order, and sessions closed within the lookback
+CREATE INDEX IF NOT EXISTS idx_radacct_tenant_open
+    ON radacct(tenant_schema, radacctid) WHERE acctstoptime IS NULL;
+CREATE INDEX IF NOT EXISTS idx_radacct_tenant_stop
+    ON radacct(tenant_schema, acctstoptime);
+
 -- ═══════════════════════════════════════════════════════════════════════════════
 -- VERIFICATION QUERIES
 -- ═══════════════════════════════════════════════════════════════════════════════
@@ -0,0 +1,256 @@
+"""
+Shared outbound HTTP layer for provider clients (PayHero, Daraja, banks,
+TR-069 ACS, Africa's Talking).
+
+Module-level ``requests.get/post`` opens a new TCP+TLS connection per call
+and never retries. ``get_http_session(provider)`` returns a process-wide
+``requests.Session`` per provider with:
+
+    - per-host keep-alive connection pools (HTTP_POOL_SIZE)
+    - retries with exponential, jittered backoff. Connection failures are
+      retried for every method. Read errors and 502/503/504 responses are
+      retried only for idempotent methods, so an STK push is never sent
+      twice.
+    - a circuit breaker: after HTTP_BREAKER_THRESHOLD consecutive failures
+      calls fail fast with ``CircuitOpenError`` for HTTP_BREAKER_RESET
+      seconds, then a single trial request decides whether to close it
+    - a default timeout, so no call can hang a worker forever
+    - request count, error count and latency metrics (``http_metrics()``)
+
+``CircuitOpenError`` subclasses ``requests.exceptions.ConnectionError``, so
+existing ``except requests.exceptions.RequestException`` handlers keep
+working unchanged.
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+# Per-provider overrides of the HTTP_* settings
+PROVIDER_DEFAULTS = {
+    'payhero': {'timeout': 30},
+    'daraja': {'timeout': 30},
+    'bank': {'timeout': 30},
+    'tr069': {'timeout': 30, 'retries': 1},
+    'africastalking': {'timeout': 15},
+}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while a provider's breaker is open."""
+
+
+class JitteredRetry(Retry):
+    """urllib3 Retry with full jitter on the exponential backoff."""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker (closed → open → half-open → closed)."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, threshold: int, reset_timeout: float):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f"Circuit open for {self.name}; failing fast")
+                # Let exactly one trial request through
+                self.state = self.HALF_OPEN
+                return
+            if self.state == self.HALF_OPEN:
+                raise CircuitOpenError(f"Circuit half-open for {self.name}; trial request in flight")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"[HTTP] Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"[HTTP] Circuit for {self.name} opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ProviderMetrics:
+    """Request/error counters and a rolling latency window for one provider."""
+
+    WINDOW = 1000
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.short_circuited = 0
+        self.status_codes = {}
+        self._latencies = deque(maxlen=self.WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms: float, status_code: Optional[int] = None, error: bool = False):
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+            if status_code is not None:
+                self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+            self._latencies.append(latency_ms)
+
+    def record_short_circuit(self):
+        with self._lock:
+            self.short_circuited += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            snapshot = {
+                'requests': self.requests,
+                'errors': self.errors,
+                'short_circuited': self.short_circuited,
+                'status_codes': dict(self.status_codes),
+            }
+        if latencies:
+            snapshot['p50_ms'] = round(latencies[len(latencies) // 2], 1)
+            snapshot['p99_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 1)
+            snapshot['max_ms'] = round(latencies[-1], 1)
+        return snapshot
+
+
+class ProviderSession(requests.Session):
+    """requests.Session with a default timeout, circuit breaker and metrics."""
+
+    def __init__(self, provider: str, timeout: float, breaker: CircuitBreaker, metrics: ProviderMetrics):
+        super().__init__()
+        self.provider = provider
+        self.default_timeout = timeout
+        self.breaker = breaker
+        self.metrics = metrics
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', self.default_timeout)
+
+        try:
+            self.breaker.before_request()
+        except CircuitOpenError:
+            self.metrics.record_short_circuit()
+            raise
+
+        started = time.monotonic()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception:
+            self.metrics.record((time.monotonic() - started) * 1000, error=True)
+            self.breaker.record_failure()
+            raise
+
+        failed = response.status_code >= 500
+        self.metrics.record((time.monotonic() - started) * 1000, response.status_code, error=failed)
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+
+_sessions: Dict[str, ProviderSession] = {}
+_lock = threading.Lock()
+
+
+def _option(provider: str, name: str, default):
+    # 'bank:equity' and 'tr069:acs.example.com' use the 'bank' / 'tr069' options
+    family = provider.split(':', 1)[0]
+    overrides = getattr(settings, 'HTTP_PROVIDER_OVERRIDES', {})
+    for key in (provider, family):
+        if name in overrides.get(key, {}):
+            return overrides[key][name]
+    # Then the global HTTP_* setting, then the built-in provider default
+    configured = getattr(settings, f'HTTP_{name.upper()}', None)
+    if configured is not None:
+        return configured
+    return PROVIDER_DEFAULTS.get(family, {}).get(name, default)
+
+
+def _build_session(provider: str) -> ProviderSession:
+    retries = _option(provider, 'retries', 3)
+    retry = JitteredRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=_option(provider, 'backoff_factor', 0.5),
+        status_forcelist=(502, 503, 504),
+        allowed_methods=IDEMPOTENT_METHODS,
+        raise_on_status=False,
+        respect_retry_after_header=True,
+    )
+    pool_size = _option(provider, 'pool_size', 20)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = ProviderSession(
+        provider,
+        timeout=_option(provider, 'timeout', 30),
+        breaker=CircuitBreaker(
+            provider,
+            threshold=_option(provider, 'breaker_threshold', 5),
+            reset_timeout=_option(provider, 'breaker_reset', 30),
+        ),
+        metrics=ProviderMetrics(),
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_http_session(provider: str) -> ProviderSession:
+    """
+    Return the process-wide pooled session for ``provider``.
+
+    Each provider name gets its own circuit breaker; use a suffix
+    ('bank:kcb', 'tr069:<host>') when one endpoint failing must not trip
+    the others.
+    """
+    session = _sessions.get(provider)
+    if session is not None:
+        return session
+    with _lock:
+        session = _sessions.get(provider)
+        if session is None:
+            session = _sessions[provider] = _build_session(provider)
+    return session
+
+
+def http_metrics() -> Dict[str, Dict]:
+    """Metrics and breaker state of every provider used in this process."""
+    return {
+        provider: {**session.metrics.snapshot(), 'circuit': session.breaker.state}
+        for provider, session in list(_sessions.items())
+    }
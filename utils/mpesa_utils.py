@@ -7,9 +7,11 @@ import json
 from datetime import datetime
 from typing import Dict, Optional, Tuple
 from django.conf import settings
-from django.utils import timezone
 import logging
 
+from utils.http_client import get_http_session
+from utils.token_cache import oauth_token_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -39,46 +41,45 @@ class MpesaService:
         self.account_balance_url = f'{self.base_url}/mpesa/accountbalance/v1/query'
         self.reversal_url = f'{self.base_url}/mpesa/reversal/v1/request'
         
-        # Cache for access token
-        self._access_token = None
-        self._token_expiry = None
+        # Pooled keep-alive session for the platform credentials
+        self.http = get_http_session('daraja:platform')
+    
+    def _token_key(self) -> str:
+        """Token cache key for the platform Daraja credentials"""
+        return oauth_token_cache.credential_key(
+            'daraja', None, getattr(settings, 'MPESA_ENVIRONMENT', 'sandbox'), self.consumer_key
+        )
+    
+    def _fetch_access_token(self) -> Tuple[str, int]:
+        """Request a new access token from Daraja"""
+        # Encode consumer key and secret
+        auth_string = f"{self.consumer_key}:{self.consumer_secret}"
+        encoded_auth = base64.b64encode(auth_string.encode()).decode()
+        
+        headers = {
+            'Authorization': f'Basic {encoded_auth}',
+            'Content-Type': 'application/json',
+        }
+        
+        response = self.http.get(self.token_url, headers=headers)
+        response.raise_for_status()
+        
+        data = response.json()
+        # Usually 3599 seconds
+        return data.get('access_token'), int(data.get('expires_in', 3600))
     
     def get_access_token(self) -> str:
         """
         Get M-Pesa API access token.
         
+        Shared by every instance, worker and Celery process through
+        utils.token_cache, and refreshed shortly before it expires.
+        
         Returns:
             str: Access token
         """
-        # Check if token is still valid
-        if self._access_token and self._token_expiry:
-            if timezone.now() < self._token_expiry:
-                return self._access_token
-        
-        # Generate new token
         try:
-            # Encode consumer key and secret
-            auth_string = f"{self.consumer_key}:{self.consumer_secret}"
-            encoded_auth = base64.b64encode(auth_string.encode()).decode()
-            
-            headers = {
-                'Authorization': f'Basic {encoded_auth}',
-                'Content-Type': 'application/json',
-            }
-            
-            response = requests.get(self.token_url, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
-            self._access_token = data.get('access_token')
-            
-            # Set token expiry (usually 1 hour)
-            expires_in = data.get('expires_in', 3600)
-            self._token_expiry = timezone.now() + timezone.timedelta(seconds=expires_in - 60)  # Subtract 1 minute for safety
-            
-            logger.info("M-Pesa access token generated successfully")
-            return self._access_token
-            
+            return oauth_token_cache.get_token(self._token_key(), self._fetch_access_token)
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to get M-Pesa access token: {str(e)}")
             raise Exception(f"Failed to get M-Pesa access token: {str(e)}")
@@ -128,7 +129,7 @@ class MpesaService:
                 'Content-Type': 'application/json',
             }
             
-            response = requests.post(self.stk_push_url, json=data, headers=headers)
+            response = self.http.post(self.stk_push_url, json=data, headers=headers)
             response.raise_for_status()
             
             result = response.json()
@@ -184,7 +185,7 @@ class MpesaService:
                 'Content-Type': 'application/json',
             }
             
-            response = requests.post(self.query_url, json=data, headers=headers)
+            response = self.http.post(self.query_url, json=data, headers=headers)
             response.raise_for_status()
             
             result = response.json()
@@ -294,7 +295,7 @@ class MpesaService:
                 'Content-Type': 'application/json',
             }
             
-            response = requests.post(self.b2c_url, json=data, headers=headers)
+            response = self.http.post(self.b2c_url, json=data, headers=headers)
             response.raise_for_status()
             
             result = response.json()
@@ -352,7 +353,7 @@ class MpesaService:
                 'Content-Type': 'application/json',
             }
             
-            response = requests.post(self.account_balance_url, json=data, headers=headers)
+            response = self.http.post(self.account_balance_url, json=data, headers=headers)
             response.raise_for_status()
             
             result = response.json()
@@ -410,7 +411,7 @@ class MpesaService:
                 'Content-Type': 'application/json',
             }
             
-            response = requests.post(self.reversal_url, json=data, headers=headers)
+            response = self.http.post(self.reversal_url, json=data, headers=headers)
             response.raise_for_status()
             
             result = response.json()
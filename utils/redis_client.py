@@ -0,0 +1,55 @@
+"""
+Shared Redis connection for application-level buffers and caches.
+
+Celery already talks to Redis through its broker; this module gives the rest
+of the code base a single lazily-created client (with its own connection
+pool) instead of every service opening connections of its own.
+"""
+import logging
+import threading
+from typing import Any, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_redis_client() -> Optional[Any]:
+    """
+    Return the process-wide Redis client, or None if Redis is not available.
+
+    Callers are expected to fall back to an in-process or synchronous path
+    when this returns None.
+    """
+    global _client
+    if _client is not None:
+        return _client
+
+    with _lock:
+        if _client is not None:
+            return _client
+        try:
+            import redis
+        except ImportError:
+            logger.warning("redis package not installed; Redis-backed features disabled")
+            return None
+
+        url = getattr(settings, 'REDIS_URL', None)
+        if not url:
+            return None
+
+        try:
+            _client = redis.Redis.from_url(
+                url,
+                socket_timeout=getattr(settings, 'REDIS_SOCKET_TIMEOUT', 2),
+                socket_connect_timeout=getattr(settings, 'REDIS_SOCKET_TIMEOUT', 2),
+                health_check_interval=30,
+            )
+        except Exception as e:
+            logger.error(f"Could not create Redis client for {url}: {e}")
+            return None
+
+    return _client
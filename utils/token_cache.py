@@ -0,0 +1,208 @@
+"""
+Shared OAuth access-token cache for payment provider clients.
+
+Daraja issues client-credential tokens valid for about an hour, but every
+``MpesaSTKPush`` call and every new ``MpesaService`` instance fetched a
+fresh one, costing an extra TLS round trip per payment request. Tokens are
+now cached per credential set in two tiers:
+
+    process-local dict  → 0 network round trips
+    Redis               → 1 GET, shared by gunicorn workers and Celery
+    provider            → only when both tiers are empty or near expiry
+
+Only one process fetches a token at a time (Redis SET NX lock, plus a
+thread lock within a process); others wait briefly for its result.
+Tokens are refreshed OAUTH_TOKEN_REFRESH_MARGIN seconds before
+``expires_in`` so callers never hold an expired token. The caller that
+wins the lock refreshes, and everyone else keeps the still-valid token.
+
+Without Redis the cache still works, per process.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from django.conf import settings
+
+from utils.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class OAuthTokenCache:
+    """Two-tier (local + Redis) single-flight token cache."""
+
+    KEY_PREFIX = 'netily:oauth_token'
+
+    def __init__(self):
+        self.refresh_margin = getattr(settings, 'OAUTH_TOKEN_REFRESH_MARGIN', 300)
+        self.lock_timeout = getattr(settings, 'OAUTH_TOKEN_LOCK_TIMEOUT', 10)
+        self.wait_timeout = getattr(settings, 'OAUTH_TOKEN_WAIT_TIMEOUT', 5)
+        self._local = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    # ────────────────────────────────────────────────────────────────
+    # KEYS
+    # ────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def credential_key(cls, provider: str, scope, environment: str, client_id: str) -> str:
+        """
+        Key for one credential set, e.g. one company's Daraja app.
+
+        The client id is hashed into the key so rotated credentials never
+        reuse a token issued for the old ones.
+        """
+        digest = hashlib.sha256((client_id or '').encode()).hexdigest()[:12]
+        return f"{provider}:{scope or 'default'}:{environment}:{digest}"
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.KEY_PREFIX}:{key}"
+
+    def _thread_lock(self, key: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    # ────────────────────────────────────────────────────────────────
+    # TIERS
+    # ────────────────────────────────────────────────────────────────
+
+    def _read(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return (token, expires_at) from the local tier, then Redis."""
+        entry = self._local.get(key)
+        if entry and entry[1] > time.time():
+            return entry
+
+        client = get_redis_client()
+        if client is None:
+            return None
+        try:
+            raw = client.get(self._redis_key(key))
+        except Exception as e:
+            logger.warning(f"[TOKEN CACHE] Redis unavailable: {e}")
+            return None
+        if not raw:
+            return None
+
+        data = json.loads(raw)
+        entry = (data['token'], float(data['expires_at']))
+        if entry[1] <= time.time():
+            return None
+        self._local[key] = entry
+        return entry
+
+    def _write(self, key: str, token: str, expires_in: int):
+        expires_at = time.time() + expires_in
+        self._local[key] = (token, expires_at)
+
+        client = get_redis_client()
+        if client is None:
+            return
+        try:
+            client.set(
+                self._redis_key(key),
+                json.dumps({'token': token, 'expires_at': expires_at}),
+                ex=max(int(expires_in), 1),
+            )
+        except Exception as e:
+            logger.warning(f"[TOKEN CACHE] Could not share token for {key}: {e}")
+
+    def invalidate(self, key: str):
+        """Drop a token the provider rejected (e.g. HTTP 401)."""
+        self._local.pop(key, None)
+        client = get_redis_client()
+        if client is None:
+            return
+        try:
+            client.delete(self._redis_key(key))
+        except Exception as e:
+            logger.warning(f"[TOKEN CACHE] Could not invalidate {key}: {e}")
+
+    # ────────────────────────────────────────────────────────────────
+    # SINGLE-FLIGHT REFRESH
+    # ────────────────────────────────────────────────────────────────
+
+    def _acquire_refresh(self, key: str) -> Tuple[bool, Optional[object]]:
+        """Try to become the one process refreshing ``key``."""
+        client = get_redis_client()
+        if client is None:
+            return True, None
+        try:
+            acquired = client.set(f"{self._redis_key(key)}:lock", '1', nx=True, ex=self.lock_timeout)
+            return bool(acquired), client
+        except Exception:
+            # Redis down: refresh locally rather than fail the payment
+            return True, None
+
+    def _release_refresh(self, key: str, client):
+        if client is None:
+            return
+        try:
+            client.delete(f"{self._redis_key(key)}:lock")
+        except Exception:
+            pass
+
+    def _wait_for_refresh(self, key: str) -> Optional[Tuple[str, float]]:
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            entry = self._read(key)
+            if entry and entry[1] - time.time() > self.refresh_margin:
+                return entry
+        return None
+
+    def get_token(self, key: str, fetch: Callable[[], Tuple[str, int]], force_refresh: bool = False) -> str:
+        """
+        Return a valid access token for ``key``.
+
+        Args:
+            key: Credential key (see ``credential_key``)
+            fetch: Calls the provider; returns (access_token, expires_in seconds).
+                   May raise; the exception propagates to the caller.
+            force_refresh: Ignore cached tokens (after a 401)
+
+        Returns:
+            The access token
+        """
+        entry = None if force_refresh else self._read(key)
+        if entry and entry[1] - time.time() > self.refresh_margin:
+            return entry[0]
+
+        with self._thread_lock(key):
+            # Another thread may have refreshed while we waited
+            current = None if force_refresh else self._read(key)
+            if current and current[1] - time.time() > self.refresh_margin:
+                return current[0]
+
+            acquired, client = self._acquire_refresh(key)
+            if not acquired:
+                if current:
+                    # Still valid, another process is already refreshing it
+                    return current[0]
+                refreshed = self._wait_for_refresh(key)
+                if refreshed:
+                    return refreshed[0]
+                logger.warning(f"[TOKEN CACHE] Timed out waiting for refresh of {key}, fetching directly")
+
+            try:
+                token, expires_in = fetch()
+                self._write(key, token, int(expires_in))
+                logger.info(f"[TOKEN CACHE] Refreshed token for {key} (expires in {expires_in}s)")
+                return token
+            except Exception as e:
+                if current:
+                    # Early refresh failed; the old token is still valid
+                    logger.warning(f"[TOKEN CACHE] Refresh of {key} failed, using current token: {e}")
+                    return current[0]
+                raise
+            finally:
+                if acquired:
+                    self._release_refresh(key, client)
+
+
+# Singleton instance
+oauth_token_cache = OAuthTokenCache()